@@ -5,14 +5,15 @@ from dataclasses import dataclass, asdict
 from enum import Enum
 import json
 import hashlib
-import hmac
-import os
 from flask import request, g
 from collections import deque
-import threading
 import sqlite3
 from contextlib import contextmanager
 
+from src.security.local_limiter import LocalLimiter
+from src.security.audit_writer import BatchWriter
+from backend.src.services.audit_store import AuditEventStore
+
 class AuditEventType(Enum):
     """Tipos de eventos de auditoria"""
     # Autenticação
@@ -98,7 +99,9 @@ class SecurityAnalyzer:
     def __init__(self):
         self.failed_logins = deque(maxlen=10000)
         self.suspicious_ips = set()
-        self.rate_limits = {}
+        # Contadores por usuário:ip:endpoint (tamanho fixo, teto de chaves e varredura de ociosas)
+        self.rate_limits = LocalLimiter(max_keys=50000)
+        self.rate_limits.start_sweeper()
         self.logger = structlog.get_logger("security")
     
     def analyze_login_attempt(self, user_email: str, ip_address: str, success: bool) -> RiskLevel:
@@ -132,22 +135,10 @@ class SecurityAnalyzer:
     
     def analyze_request_pattern(self, user_id: int, ip_address: str, endpoint: str) -> RiskLevel:
         """Analisar padrão de requests"""
-        now = datetime.now()
         key = f"{user_id}:{ip_address}:{endpoint}"
         
-        if key not in self.rate_limits:
-            self.rate_limits[key] = deque(maxlen=100)
-        
-        # Limpar requests antigos (últimos 5 minutos)
-        self.rate_limits[key] = deque([
-            req_time for req_time in self.rate_limits[key]
-            if now - req_time < timedelta(minutes=5)
-        ], maxlen=100)
-        
-        self.rate_limits[key].append(now)
-        
-        # Verificar rate limiting
-        requests_count = len(self.rate_limits[key])
+        # Requests nos últimos 5 minutos (estimativa sliding window)
+        requests_count = self.rate_limits.record(key, window=300)
         
         if requests_count > 100:  # Mais de 100 requests em 5 minutos
             return RiskLevel.CRITICAL
@@ -165,43 +156,31 @@ class SecurityAnalyzer:
 class AuditLogger:
     """Logger de auditoria com persistência"""
     
-    def __init__(self, db_path: str = "audit.db"):
+    def __init__(self, db_path: str = "audit.db", max_queue: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 0.5,
+                 retention_days: int = 365):
         self.db_path = db_path
         self.logger = structlog.get_logger("audit")
         self.security_analyzer = SecurityAnalyzer()
+        self.store = AuditEventStore(db_path, retention_days=retention_days)
+        
+        # Escrita em background: conexão persistente usada só pelo writer
+        self._writer_conn = self.store.connect()
+        self._writer_conn.execute("PRAGMA synchronous=NORMAL")
         self._init_database()
+        self.writer = BatchWriter(
+            self._write_batch,
+            max_queue=max_queue,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            spill_path=f"{db_path}.spill.jsonl",
+            name='audit-writer'
+        )
+        self.writer.start()
         
     def _init_database(self):
-        """Inicializar banco de dados de auditoria"""
-        with self._get_db_connection() as conn:
-            conn.execute("""
-                CREATE TABLE IF NOT EXISTS audit_events (
-                    id TEXT PRIMARY KEY,
-                    timestamp TEXT NOT NULL,
-                    event_type TEXT NOT NULL,
-                    user_id INTEGER,
-                    user_email TEXT,
-                    ip_address TEXT NOT NULL,
-                    user_agent TEXT,
-                    resource_type TEXT,
-                    resource_id TEXT,
-                    action TEXT NOT NULL,
-                    details TEXT,
-                    risk_level TEXT NOT NULL,
-                    success BOOLEAN NOT NULL,
-                    error_message TEXT,
-                    session_id TEXT,
-                    request_id TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Índices para performance
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_timestamp ON audit_events(timestamp)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_user_id ON audit_events(user_id)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_event_type ON audit_events(event_type)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_risk_level ON audit_events(risk_level)")
-            conn.execute("CREATE INDEX IF NOT EXISTS idx_ip_address ON audit_events(ip_address)")
+        """Inicializar banco de dados de auditoria (partições mensais + rollups diários)"""
+        self.store.init_schema(self._writer_conn)
     
     @contextmanager
     def _get_db_connection(self):
@@ -316,36 +295,29 @@ class AuditLogger:
         return event
     
     def _save_to_database(self, event: AuditEvent):
-        """Salvar evento no banco de dados"""
-        try:
-            with self._get_db_connection() as conn:
-                conn.execute("""
-                    INSERT INTO audit_events (
-                        id, timestamp, event_type, user_id, user_email,
-                        ip_address, user_agent, resource_type, resource_id,
-                        action, details, risk_level, success, error_message,
-                        session_id, request_id
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    event.id,
-                    event.timestamp.isoformat(),
-                    event.event_type.value,
-                    event.user_id,
-                    event.user_email,
-                    event.ip_address,
-                    event.user_agent,
-                    event.resource_type,
-                    event.resource_id,
-                    event.action,
-                    json.dumps(event.details),
-                    event.risk_level.value,
-                    event.success,
-                    event.error_message,
-                    event.session_id,
-                    event.request_id
-                ))
-        except Exception as e:
-            self.logger.error("failed_to_save_audit_event", error=str(e), event_id=event.id)
+        """Enfileirar evento para gravação em lote"""
+        self.writer.submit((
+            event.id,
+            event.timestamp.timestamp(),
+            event.event_type.value,
+            event.user_id,
+            event.user_email,
+            event.ip_address,
+            event.user_agent,
+            event.resource_type,
+            event.resource_id,
+            event.action,
+            json.dumps(event.details),
+            event.risk_level.value,
+            int(event.success),
+            event.error_message,
+            event.session_id,
+            event.request_id
+        ))
+    
+    def _write_batch(self, rows: List[tuple]):
+        """Gravar lote de eventos em uma única transação"""
+        self.store.insert_many(self._writer_conn, rows)
     
     def _send_security_alert(self, event: AuditEvent):
         """Enviar alerta de segurança"""
@@ -370,41 +342,20 @@ class AuditLogger:
                    limit: int = 100) -> List[Dict[str, Any]]:
         """Obter eventos de auditoria"""
         
-        query = "SELECT * FROM audit_events WHERE 1=1"
-        params = []
-        
-        if user_id:
-            query += " AND user_id = ?"
-            params.append(user_id)
-        
-        if event_type:
-            query += " AND event_type = ?"
-            params.append(event_type.value)
-        
-        if risk_level:
-            query += " AND risk_level = ?"
-            params.append(risk_level.value)
-        
-        if start_date:
-            query += " AND timestamp >= ?"
-            params.append(start_date.isoformat())
-        
-        if end_date:
-            query += " AND timestamp <= ?"
-            params.append(end_date.isoformat())
-        
-        query += " ORDER BY timestamp DESC LIMIT ?"
-        params.append(limit)
+        # Inclui eventos ainda na fila do writer
+        self.writer.flush()
         
         try:
             with self._get_db_connection() as conn:
-                cursor = conn.execute(query, params)
-                events = []
-                for row in cursor.fetchall():
-                    event_dict = dict(row)
-                    event_dict['details'] = json.loads(event_dict['details'] or '{}')
-                    events.append(event_dict)
-                return events
+                return self.store.query_events(
+                    conn,
+                    user_id=user_id,
+                    event_type=event_type.value if event_type else None,
+                    risk_level=risk_level.value if risk_level else None,
+                    start_ts=start_date.timestamp() if start_date else None,
+                    end_ts=end_date.timestamp() if end_date else None,
+                    limit=limit
+                )
         except Exception as e:
             self.logger.error("failed_to_get_audit_events", error=str(e))
             return []
@@ -412,46 +363,21 @@ class AuditLogger:
     def get_security_summary(self, days: int = 7) -> Dict[str, Any]:
         """Obter resumo de segurança"""
         start_date = datetime.now() - timedelta(days=days)
+        self.writer.flush()
         
         try:
             with self._get_db_connection() as conn:
-                # Total de eventos
-                total_events = conn.execute(
-                    "SELECT COUNT(*) FROM audit_events WHERE timestamp >= ?",
-                    (start_date.isoformat(),)
-                ).fetchone()[0]
-                
-                # Eventos por nível de risco
-                risk_summary = {}
-                for risk in RiskLevel:
-                    count = conn.execute(
-                        "SELECT COUNT(*) FROM audit_events WHERE timestamp >= ? AND risk_level = ?",
-                        (start_date.isoformat(), risk.value)
-                    ).fetchone()[0]
-                    risk_summary[risk.value] = count
-                
-                # Top IPs suspeitos
-                suspicious_ips = conn.execute("""
-                    SELECT ip_address, COUNT(*) as count 
-                    FROM audit_events 
-                    WHERE timestamp >= ? AND risk_level IN ('high', 'critical')
-                    GROUP BY ip_address 
-                    ORDER BY count DESC 
-                    LIMIT 10
-                """, (start_date.isoformat(),)).fetchall()
-                
-                # Tentativas de login falhadas
-                failed_logins = conn.execute(
-                    "SELECT COUNT(*) FROM audit_events WHERE timestamp >= ? AND event_type = ? AND success = 0",
-                    (start_date.isoformat(), AuditEventType.LOGIN_FAILED.value)
-                ).fetchone()[0]
+                # Dias completos vêm do rollup diário; só o dia parcial lê eventos
+                summary = self.store.summary(
+                    conn,
+                    start_date.timestamp(),
+                    [risk.value for risk in RiskLevel],
+                    AuditEventType.LOGIN_FAILED.value
+                )
                 
                 return {
                     'period_days': days,
-                    'total_events': total_events,
-                    'risk_summary': risk_summary,
-                    'suspicious_ips': [dict(row) for row in suspicious_ips],
-                    'failed_logins': failed_logins,
+                    **summary,
                     'generated_at': datetime.now().isoformat()
                 }
         except Exception as e:
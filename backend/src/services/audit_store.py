@@ -0,0 +1,289 @@
+"""
+Armazenamento de eventos de auditoria particionado por mês
+
+- Uma tabela por mês (audit_events_pYYYYMM) com timestamp em epoch (REAL),
+  colunas tipadas e índices compostos (filtro, ts) que atendem os filtros do
+  painel já na ordem de `ts DESC`;
+- consultas por período só tocam as partições do intervalo, da mais nova
+  para a mais antiga, parando quando o LIMIT é atingido;
+- rollups diários (por tipo/risco/sucesso e por IP de alto risco) mantidos
+  por triggers na mesma transação do INSERT: o resumo de segurança lê dias
+  inteiros do rollup e só o dia parcial do início da janela nas partições;
+- retenção remove partições inteiras (DROP TABLE) em vez de DELETE.
+"""
+import json
+import time
+import sqlite3
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DAY = 86400
+PARTITION_PREFIX = 'audit_events_p'
+
+COLUMNS = (
+    'id', 'ts', 'event_type', 'user_id', 'user_email', 'ip_address', 'user_agent',
+    'resource_type', 'resource_id', 'action', 'details', 'risk_level', 'success',
+    'error_message', 'session_id', 'request_id'
+)
+
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_daily_rollup (
+    day INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    risk_level TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, event_type, risk_level, success)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS audit_daily_ip_rollup (
+    day INTEGER NOT NULL,
+    ip_address TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (day, ip_address)
+) WITHOUT ROWID;
+"""
+
+_PARTITION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    event_type TEXT NOT NULL,
+    user_id INTEGER,
+    user_email TEXT,
+    ip_address TEXT NOT NULL,
+    user_agent TEXT,
+    resource_type TEXT,
+    resource_id TEXT,
+    action TEXT NOT NULL,
+    details TEXT,
+    risk_level TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    error_message TEXT,
+    session_id TEXT,
+    request_id TEXT
+);
+CREATE INDEX IF NOT EXISTS {name}_ts ON {name}(ts);
+CREATE INDEX IF NOT EXISTS {name}_user_ts ON {name}(user_id, ts);
+CREATE INDEX IF NOT EXISTS {name}_type_ts ON {name}(event_type, ts, success);
+CREATE INDEX IF NOT EXISTS {name}_risk_ts ON {name}(risk_level, ts, ip_address);
+
+CREATE TRIGGER IF NOT EXISTS {name}_rollup AFTER INSERT ON {name} BEGIN
+    INSERT INTO audit_daily_rollup (day, event_type, risk_level, success, count)
+    VALUES (CAST(NEW.ts / 86400 AS INTEGER), NEW.event_type, NEW.risk_level, NEW.success, 1)
+    ON CONFLICT (day, event_type, risk_level, success) DO UPDATE SET count = count + 1;
+
+    INSERT INTO audit_daily_ip_rollup (day, ip_address, count)
+    SELECT CAST(NEW.ts / 86400 AS INTEGER), NEW.ip_address, 1
+    WHERE NEW.risk_level IN ('high', 'critical')
+    ON CONFLICT (day, ip_address) DO UPDATE SET count = count + 1;
+END;
+"""
+
+
+def partition_name(ts: float) -> str:
+    moment = datetime.fromtimestamp(ts, tz=timezone.utc)
+    return f"{PARTITION_PREFIX}{moment.year:04d}{moment.month:02d}"
+
+
+def partition_bounds(name: str) -> Tuple[float, float]:
+    """[início, fim) da partição em epoch"""
+    year, month = int(name[-6:-2]), int(name[-2:])
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + (month == 12), month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start.timestamp(), end.timestamp()
+
+
+class AuditEventStore:
+    """Eventos de auditoria em partições mensais com rollups diários"""
+
+    def __init__(self, db_path: str, retention_days: int = 365):
+        self.db_path = db_path
+        self.retention_days = retention_days
+        self._partitions = set()
+        self._last_retention = 0.0
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_schema(self, conn: sqlite3.Connection):
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_ROLLUP_SCHEMA)
+        self._partitions = set(self.partitions(conn))
+        self._migrate_legacy(conn)
+
+    def partitions(self, conn: sqlite3.Connection) -> List[str]:
+        """Partições existentes, da mais nova para a mais antiga"""
+        rows = conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?",
+            (f"{PARTITION_PREFIX}[0-9][0-9][0-9][0-9][0-9][0-9]",)
+        ).fetchall()
+        return sorted((row[0] for row in rows), reverse=True)
+
+    def _ensure_partition(self, conn: sqlite3.Connection, name: str):
+        if name not in self._partitions:
+            conn.executescript(_PARTITION_SCHEMA.format(name=name))
+            self._partitions.add(name)
+
+    def insert_many(self, conn: sqlite3.Connection, rows: Iterable[Sequence[Any]]):
+        """Insere linhas (na ordem de COLUMNS) em uma transação, agrupadas por partição"""
+        by_partition: Dict[str, List[Sequence[Any]]] = {}
+        for row in rows:
+            by_partition.setdefault(partition_name(row[1]), []).append(tuple(row))
+
+        for name in by_partition:
+            self._ensure_partition(conn, name)
+
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        with conn:
+            for name, partition_rows in by_partition.items():
+                conn.executemany(
+                    f"INSERT OR IGNORE INTO {name} ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                    partition_rows
+                )
+
+        if self.retention_days and time.time() - self._last_retention > 3600:
+            self.apply_retention(conn)
+
+    def _migrate_legacy(self, conn: sqlite3.Connection):
+        """Move a tabela única antiga (timestamp ISO) para as partições"""
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'audit_events'"
+        ).fetchone()
+        if not exists:
+            return
+
+        cursor = conn.execute(
+            "SELECT id, timestamp, event_type, user_id, user_email, ip_address, user_agent, "
+            "resource_type, resource_id, action, details, risk_level, success, "
+            "error_message, session_id, request_id FROM audit_events"
+        )
+        while True:
+            chunk = cursor.fetchmany(5000)
+            if not chunk:
+                break
+            rows = []
+            for row in chunk:
+                row = list(row)
+                row[1] = datetime.fromisoformat(row[1]).timestamp()
+                row[12] = int(bool(row[12]))
+                rows.append(row)
+            self.insert_many(conn, rows)
+        with conn:
+            conn.execute("ALTER TABLE audit_events RENAME TO audit_events_legacy")
+
+    def apply_retention(self, conn: sqlite3.Connection, days: Optional[int] = None) -> List[str]:
+        """Remove partições e rollups inteiramente fora da retenção"""
+        days = days or self.retention_days
+        cutoff = time.time() - days * DAY
+        dropped = []
+        with conn:
+            for name in self.partitions(conn):
+                if partition_bounds(name)[1] <= cutoff:
+                    conn.execute(f"DROP TABLE {name}")
+                    self._partitions.discard(name)
+                    dropped.append(name)
+            conn.execute("DELETE FROM audit_daily_rollup WHERE day < ?", (int(cutoff // DAY),))
+            conn.execute("DELETE FROM audit_daily_ip_rollup WHERE day < ?", (int(cutoff // DAY),))
+        self._last_retention = time.time()
+        return dropped
+
+    def _partitions_between(self, conn: sqlite3.Connection, start_ts: Optional[float],
+                            end_ts: Optional[float]) -> List[str]:
+        selected = []
+        for name in self.partitions(conn):
+            lower, upper = partition_bounds(name)
+            if (start_ts is None or upper > start_ts) and (end_ts is None or lower <= end_ts):
+                selected.append(name)
+        return selected
+
+    def query_events(self, conn: sqlite3.Connection, user_id: Optional[int] = None,
+                     event_type: Optional[str] = None, risk_level: Optional[str] = None,
+                     start_ts: Optional[float] = None, end_ts: Optional[float] = None,
+                     limit: int = 100) -> List[Dict[str, Any]]:
+        """Eventos mais recentes primeiro, lendo só as partições do intervalo"""
+        conditions, params = [], []
+        if user_id:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if event_type:
+            conditions.append("event_type = ?")
+            params.append(event_type)
+        if risk_level:
+            conditions.append("risk_level = ?")
+            params.append(risk_level)
+        if start_ts is not None:
+            conditions.append("ts >= ?")
+            params.append(start_ts)
+        if end_ts is not None:
+            conditions.append("ts <= ?")
+            params.append(end_ts)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        events: List[Dict[str, Any]] = []
+        for name in self._partitions_between(conn, start_ts, end_ts):
+            rows = conn.execute(
+                f"SELECT * FROM {name} {where} ORDER BY ts DESC LIMIT ?",
+                params + [limit - len(events)]
+            ).fetchall()
+            for row in rows:
+                event = dict(row)
+                event['timestamp'] = datetime.fromtimestamp(event.pop('ts')).isoformat()
+                event['details'] = json.loads(event['details'] or '{}')
+                events.append(event)
+            if len(events) >= limit:
+                break
+        return events
+
+    def _window_counts(self, conn: sqlite3.Connection, start_ts: float):
+        """Contagens desde `start_ts`: dias completos do rollup + dia parcial das partições"""
+        first_full_day = int(start_ts // DAY) + 1
+        edge_end = first_full_day * DAY
+
+        counts: Counter = Counter()
+        ips: Counter = Counter()
+        for row in conn.execute(
+            "SELECT event_type, risk_level, success, SUM(count) FROM audit_daily_rollup "
+            "WHERE day >= ? GROUP BY event_type, risk_level, success", (first_full_day,)
+        ):
+            counts[(row[0], row[1], row[2])] += row[3]
+        for row in conn.execute(
+            "SELECT ip_address, SUM(count) FROM audit_daily_ip_rollup WHERE day >= ? GROUP BY ip_address",
+            (first_full_day,)
+        ):
+            ips[row[0]] += row[1]
+
+        for name in self._partitions_between(conn, start_ts, edge_end):
+            for row in conn.execute(
+                f"SELECT event_type, risk_level, success, COUNT(*) FROM {name} "
+                f"WHERE ts >= ? AND ts < ? GROUP BY event_type, risk_level, success",
+                (start_ts, edge_end)
+            ):
+                counts[(row[0], row[1], row[2])] += row[3]
+            for row in conn.execute(
+                f"SELECT ip_address, COUNT(*) FROM {name} WHERE risk_level IN ('high', 'critical') "
+                f"AND ts >= ? AND ts < ? GROUP BY ip_address",
+                (start_ts, edge_end)
+            ):
+                ips[row[0]] += row[1]
+        return counts, ips
+
+    def summary(self, conn: sqlite3.Connection, start_ts: float, risk_levels: Iterable[str],
+                failed_login_type: str) -> Dict[str, Any]:
+        """Totais, eventos por risco, top IPs de alto risco e logins falhados"""
+        counts, ips = self._window_counts(conn, start_ts)
+        risk_summary = {risk: 0 for risk in risk_levels}
+        failed_logins = 0
+        for (event_type, risk_level, success), count in counts.items():
+            risk_summary[risk_level] = risk_summary.get(risk_level, 0) + count
+            if event_type == failed_login_type and not success:
+                failed_logins += count
+        return {
+            'total_events': sum(counts.values()),
+            'risk_summary': risk_summary,
+            'suspicious_ips': [{'ip_address': ip, 'count': count} for ip, count in ips.most_common(10)],
+            'failed_logins': failed_logins
+        }
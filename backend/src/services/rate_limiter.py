@@ -1,15 +1,15 @@
 import time
 import redis
 from typing import Dict, Optional, Tuple
-from datetime import datetime, timedelta
-from collections import defaultdict, deque
 from flask import request, g, jsonify
 import functools
 import hashlib
-import json
 from dataclasses import dataclass
 import structlog
 
+from src.security.local_limiter import LocalLimiter
+from src.security.rate_limit_engine import RateLimitEngine
+
 @dataclass
 class RateLimitRule:
     """Regra de rate limiting"""
@@ -22,7 +22,9 @@ class RateLimiter:
     
     def __init__(self, redis_client: Optional[redis.Redis] = None):
         self.redis_client = redis_client
-        self.memory_store = defaultdict(lambda: deque(maxlen=1000))
+        self.engine = RateLimitEngine(redis_client) if redis_client is not None else None
+        self.memory_store = LocalLimiter(max_keys=100000)
+        self.memory_store.start_sweeper()
         self.logger = structlog.get_logger("rate_limiter")
         
         # Regras padrão por endpoint
@@ -104,76 +106,29 @@ class RateLimiter:
         )
     
     def _check_redis_limit(self, key: str, rule: RateLimitRule) -> Tuple[bool, Dict]:
-        """Verificar limite usando Redis"""
-        try:
-            pipe = self.redis_client.pipeline()
-            now = time.time()
-            window_start = now - rule.window
-            
-            # Limpar requests antigos
-            pipe.zremrangebyscore(key, 0, window_start)
-            
-            # Contar requests na janela atual
-            pipe.zcard(key)
-            
-            # Adicionar request atual
-            pipe.zadd(key, {str(now): now})
-            
-            # Definir expiração
-            pipe.expire(key, rule.window + 60)
-            
-            results = pipe.execute()
-            current_requests = results[1]
-            
-            # Verificar se excedeu o limite
-            allowed = current_requests <= rule.requests
-            
-            # Calcular tempo para reset
-            if current_requests > 0:
-                oldest_request = self.redis_client.zrange(key, 0, 0, withscores=True)
-                if oldest_request:
-                    reset_time = oldest_request[0][1] + rule.window
-                else:
-                    reset_time = now + rule.window
-            else:
-                reset_time = now + rule.window
-            
-            return allowed, {
-                'limit': rule.requests,
-                'remaining': max(0, rule.requests - current_requests),
-                'reset': int(reset_time),
-                'retry_after': int(reset_time - now) if not allowed else 0
-            }
-            
-        except Exception as e:
-            self.logger.error("redis_rate_limit_error", error=str(e))
-            # Fallback para memória em caso de erro no Redis
-            return self._check_memory_limit(key, rule)
+        """Verificar limite usando Redis (script Lua atômico, com lote local de tokens)"""
+        decision = self.engine.hit(key, rule.requests, rule.window, burst=rule.burst)
+        info = decision.to_dict()
+        return decision.allowed, {
+            'limit': info['limit'],
+            'remaining': info['remaining'],
+            'reset': info['reset_time'],
+            'retry_after': info['retry_after'] if not decision.allowed else 0
+        }
     
     def _check_memory_limit(self, key: str, rule: RateLimitRule) -> Tuple[bool, Dict]:
-        """Verificar limite usando memória local"""
+        """Verificar limite usando memória local (contadores limitados em número de chaves)"""
+        granted, remaining, retry_after, reset_after = self.memory_store.acquire(
+            key, rule.requests + rule.burst, rule.window
+        )
+        allowed = granted > 0
         now = time.time()
-        window_start = now - rule.window
-        
-        # Limpar requests antigos
-        requests = self.memory_store[key]
-        while requests and requests[0] < window_start:
-            requests.popleft()
-        
-        # Adicionar request atual
-        requests.append(now)
-        
-        current_requests = len(requests)
-        allowed = current_requests <= rule.requests
-        
-        # Calcular tempo para reset
-        reset_time = (requests[0] + rule.window) if requests else (now + rule.window)
         
         return allowed, {
             'limit': rule.requests,
-            'remaining': max(0, rule.requests - current_requests),
-            'reset': int(reset_time),
-            'retry_after': int(reset_time - now) if not allowed else 0
+            'remaining': remaining,
+            'reset': int(now + reset_after),
+            'retry_after': int(retry_after) + 1 if not allowed else 0
         }
     
     def check_limit(self, custom_key: Optional[str] = None, custom_rule: Optional[RateLimitRule] = None) -> Tuple[bool, Dict]:
@@ -191,10 +146,11 @@ class RateLimiter:
         rule = custom_rule or self._get_rule(endpoint_key)
         
         # Verificar limite
-        if self.redis_client:
+        if self.engine is not None:
             try:
                 return self._check_redis_limit(key, rule)
-            except:
+            except Exception as e:
+                self.logger.error("redis_rate_limit_error", error=str(e))
                 return self._check_memory_limit(key, rule)
         else:
             return self._check_memory_limit(key, rule)
@@ -243,18 +199,18 @@ class RateLimiter:
             return stats
         
         try:
-            # Buscar todas as chaves relacionadas ao cliente
-            pattern = f"rate_limit:*:{client_id}"
-            keys = self.redis_client.keys(pattern)
-            
-            for key in keys:
-                key_str = key.decode() if isinstance(key, bytes) else key
-                endpoint = key_str.split(':')[1]
+            # Uma chave por endpoint já usado pelo cliente
+            for endpoint in self.default_rules:
+                key = f"rate_limit:{endpoint}:{client_id}"
+                rule = self.default_rules[endpoint]
+                decision = self.engine.peek(key, rule.requests, rule.window, burst=rule.burst)
                 
-                # Contar requests na janela atual
-                count = self.redis_client.zcard(key)
-                stats['endpoints'][endpoint] = count
-                stats['total_requests'] += count
+                # Requests consumidos na janela atual
+                count = rule.requests + rule.burst - decision.remaining
+                if count > 0:
+                    stats['endpoints'][endpoint] = count
+                    stats['total_requests'] += count
+            stats['engine'] = self.engine.stats()
             
         except Exception as e:
             self.logger.error("get_stats_error", error=str(e))
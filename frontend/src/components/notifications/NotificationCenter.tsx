@@ -147,6 +147,15 @@ const NotificationCenter: React.FC = () => {
       }
     });
 
+    // Notificações criadas em lote chegam agrupadas em um único evento
+    socket.on('new_notifications', (data: { notifications: Notification[] }) => {
+      setNotifications(prev => [...data.notifications, ...prev]);
+      
+      if (audioRef.current && settings?.browser_enabled) {
+        audioRef.current.play().catch(console.error);
+      }
+    });
+
     socket.on('unread_count_updated', (data: { count: number }) => {
       setUnreadCount(data.count);
     });
@@ -1,25 +1,30 @@
-import json
 import hashlib
-from typing import Any, Optional, Dict, List
+from typing import Any, Optional, Dict
 from datetime import datetime, timedelta
 import logging
+from collections import OrderedDict
 from functools import wraps
-import pickle
+import threading
 import os
 
+from .disk_cache import DiskCache, MISSING
+
 logger = logging.getLogger(__name__)
 
 
 class CacheService:
-    """Serviço de cache em memória e arquivo."""
+    """Serviço de cache em memória e disco (SQLite)."""
     
-    def __init__(self, cache_dir: str = "cache", default_ttl: int = 3600):
+    def __init__(self, cache_dir: str = "cache", default_ttl: int = 3600,
+                 max_memory_items: int = 1000, max_disk_bytes: int = 512 * 1024 * 1024):
         self.cache_dir = cache_dir
         self.default_ttl = default_ttl
-        self.memory_cache: Dict[str, Dict] = {}
+        self.max_memory_items = max_memory_items
+        self.memory_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
         
-        # Criar diretório de cache
-        os.makedirs(cache_dir, exist_ok=True)
+        # Um único arquivo SQLite em vez de um arquivo por chave
+        self.disk = DiskCache(os.path.join(cache_dir, "cache.sqlite3"), max_bytes=max_disk_bytes)
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Gerar chave única para cache."""
@@ -32,6 +37,14 @@ class CacheService:
             return True
         return datetime.now() > cached_item['expires_at']
     
+    def _remember(self, key: str, cached_item: Dict) -> None:
+        """Guardar na memória, descartando o item menos recente se cheio."""
+        with self._lock:
+            self.memory_cache[key] = cached_item
+            self.memory_cache.move_to_end(key)
+            while len(self.memory_cache) > self.max_memory_items:
+                self.memory_cache.popitem(last=False)
+    
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """Armazenar item no cache."""
         ttl = ttl or self.default_ttl
@@ -45,120 +58,84 @@ class CacheService:
         }
         
         # Cache em memória
-        self.memory_cache[key] = cached_item
+        self._remember(key, cached_item)
         
-        # Cache em arquivo para persistência
+        # Cache em disco para persistência
         try:
-            cache_file = os.path.join(self.cache_dir, f"{key}.cache")
-            with open(cache_file, 'wb') as f:
-                pickle.dump(cached_item, f)
+            self.disk.set(key, cached_item, ttl)
         except Exception as e:
-            logger.warning(f"Erro ao salvar cache em arquivo: {e}")
+            logger.warning(f"Erro ao salvar cache em disco: {e}")
     
     def get(self, key: str) -> Optional[Any]:
         """Recuperar item do cache."""
         # Tentar cache em memória primeiro
-        if key in self.memory_cache:
-            cached_item = self.memory_cache[key]
-            if not self._is_expired(cached_item):
-                return cached_item['value']
-            else:
+        with self._lock:
+            cached_item = self.memory_cache.get(key)
+            if cached_item is not None:
+                if not self._is_expired(cached_item):
+                    self.memory_cache.move_to_end(key)
+                    return cached_item['value']
                 del self.memory_cache[key]
         
-        # Tentar cache em arquivo
+        # Tentar cache em disco
         try:
-            cache_file = os.path.join(self.cache_dir, f"{key}.cache")
-            if os.path.exists(cache_file):
-                with open(cache_file, 'rb') as f:
-                    cached_item = pickle.load(f)
-                
-                if not self._is_expired(cached_item):
-                    # Restaurar para memória
-                    self.memory_cache[key] = cached_item
-                    return cached_item['value']
-                else:
-                    os.remove(cache_file)
+            cached_item = self.disk.get(key)
+            if cached_item is not MISSING:
+                # Restaurar para memória
+                self._remember(key, cached_item)
+                return cached_item['value']
         except Exception as e:
-            logger.warning(f"Erro ao ler cache de arquivo: {e}")
+            logger.warning(f"Erro ao ler cache de disco: {e}")
         
         return None
     
     def delete(self, key: str) -> None:
         """Remover item do cache."""
-        # Remover da memória
-        if key in self.memory_cache:
-            del self.memory_cache[key]
+        with self._lock:
+            self.memory_cache.pop(key, None)
         
-        # Remover arquivo
         try:
-            cache_file = os.path.join(self.cache_dir, f"{key}.cache")
-            if os.path.exists(cache_file):
-                os.remove(cache_file)
+            self.disk.delete(key)
         except Exception as e:
-            logger.warning(f"Erro ao remover cache de arquivo: {e}")
+            logger.warning(f"Erro ao remover cache de disco: {e}")
     
     def clear(self) -> None:
         """Limpar todo o cache."""
-        # Limpar memória
-        self.memory_cache.clear()
+        with self._lock:
+            self.memory_cache.clear()
         
-        # Limpar arquivos
         try:
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.cache'):
-                    os.remove(os.path.join(self.cache_dir, filename))
+            self.disk.clear()
         except Exception as e:
-            logger.warning(f"Erro ao limpar cache de arquivos: {e}")
+            logger.warning(f"Erro ao limpar cache em disco: {e}")
     
     def cleanup_expired(self) -> int:
         """Limpar itens expirados do cache."""
         expired_count = 0
         
-        # Limpar memória
-        expired_keys = []
-        for key, cached_item in self.memory_cache.items():
-            if self._is_expired(cached_item):
-                expired_keys.append(key)
-        
-        for key in expired_keys:
-            del self.memory_cache[key]
-            expired_count += 1
+        with self._lock:
+            expired_keys = [key for key, item in self.memory_cache.items() if self._is_expired(item)]
+            for key in expired_keys:
+                del self.memory_cache[key]
+        expired_count += len(expired_keys)
         
-        # Limpar arquivos
         try:
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.cache'):
-                    cache_file = os.path.join(self.cache_dir, filename)
-                    try:
-                        with open(cache_file, 'rb') as f:
-                            cached_item = pickle.load(f)
-                        
-                        if self._is_expired(cached_item):
-                            os.remove(cache_file)
-                            expired_count += 1
-                    except Exception:
-                        # Arquivo corrompido, remover
-                        os.remove(cache_file)
-                        expired_count += 1
+            expired_count += self.disk.cleanup_expired()
         except Exception as e:
-            logger.warning(f"Erro na limpeza de arquivos: {e}")
+            logger.warning(f"Erro na limpeza do cache em disco: {e}")
         
         return expired_count
     
     def get_stats(self) -> Dict:
         """Obter estatísticas do cache."""
         memory_items = len(self.memory_cache)
-        file_items = 0
-        
-        try:
-            file_items = len([f for f in os.listdir(self.cache_dir) if f.endswith('.cache')])
-        except Exception:
-            pass
+        disk_stats = self.disk.stats()
         
         return {
             'memory_items': memory_items,
-            'file_items': file_items,
-            'total_items': memory_items + file_items,
+            'file_items': disk_stats['entries'],
+            'total_items': memory_items + disk_stats['entries'],
+            'disk': disk_stats,
             'cache_dir': self.cache_dir
         }
 
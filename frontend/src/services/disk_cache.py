@@ -0,0 +1,161 @@
+import os
+import time
+import pickle
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_expires_at ON entries (expires_at);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed_at ON entries (accessed_at);
+
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals (id, entries, bytes) VALUES (0, 0, 0);
+
+CREATE TRIGGER IF NOT EXISTS entries_after_insert AFTER INSERT ON entries BEGIN
+    UPDATE totals SET entries = entries + 1, bytes = bytes + NEW.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_after_delete AFTER DELETE ON entries BEGIN
+    UPDATE totals SET entries = entries - 1, bytes = bytes - OLD.size WHERE id = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_after_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE totals SET bytes = bytes - OLD.size + NEW.size WHERE id = 0;
+END;
+"""
+
+
+class DiskCache:
+    """Cache persistente em um único arquivo SQLite com LRU limitado por tamanho.
+
+    Substitui um arquivo por chave: totais de entradas e bytes são mantidos
+    por triggers (estatísticas em O(1)), a expiração usa índice e a remoção
+    do menos usado acontece quando o limite de bytes é ultrapassado.
+    """
+
+    # Evita uma escrita por leitura: o horário de acesso só é atualizado
+    # quando está mais velho que esta janela
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """Recuperar item não expirado."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, accessed_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return default
+
+            if now - accessed_at > self.TOUCH_INTERVAL:
+                self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        try:
+            return pickle.loads(value)
+        except Exception as e:
+            logger.warning(f"Item de cache corrompido {key}: {e}")
+            self.delete(key)
+            return default
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        """Armazenar item, removendo os menos usados se exceder o limite."""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+                "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                (key, data, len(data), now + ttl, now)
+            )
+            if self._totals()[1] > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount > 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def cleanup_expired(self) -> int:
+        """Remover itens expirados (usa o índice de expiração)."""
+        with self._lock:
+            return self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def _totals(self):
+        return self._conn.execute("SELECT entries, bytes FROM totals WHERE id = 0").fetchone()
+
+    def _evict(self) -> None:
+        """Remove expirados e depois os menos acessados até 90% do limite."""
+        self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        target = int(self.max_bytes * 0.9)
+        while True:
+            entries, size = self._totals()
+            if size <= target or entries == 0:
+                break
+            removed = self._conn.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                (max(1, entries // 20),)
+            ).rowcount
+            self.evictions += removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Estatísticas sem varrer o disco."""
+        with self._lock:
+            entries, size = self._totals()
+        return {
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'path': self.path
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
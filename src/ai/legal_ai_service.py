@@ -7,6 +7,8 @@ import re
 from datetime import datetime
 from flask import current_app
 
+from src.monitoring.request_timing import timed
+
 class DocumentType(Enum):
     """Tipos de documentos jurídicos"""
     CONTRATO = "contrato"
@@ -79,6 +81,11 @@ class LegalAIService:
             openai.api_key = api_key
             self.client = openai
     
+    def _chat(self, **kwargs):
+        """Chamada ao modelo, com o tempo atribuído à requisição corrente"""
+        with timed('ai'):
+            return self.client.ChatCompletion.create(**kwargs)
+    
     def analyze_document(self, content: str, context: LegalContext) -> Dict[str, Any]:
         """Análise avançada de documento jurídico"""
         if not self.client:
@@ -87,7 +94,7 @@ class LegalAIService:
         try:
             prompt = self._build_analysis_prompt(content, context)
             
-            response = self.client.ChatCompletion.create(
+            response = self._chat(
                 model="gpt-4-turbo-preview",
                 messages=[
                     {"role": "system", "content": self.system_prompts['document_review']},
@@ -124,7 +131,7 @@ class LegalAIService:
             template = self.legal_templates.get(document_type, {}).get(legal_area.value, "")
             prompt = self._build_generation_prompt(document_type, legal_area, parameters, template)
             
-            response = self.client.ChatCompletion.create(
+            response = self._chat(
                 model="gpt-4-turbo-preview",
                 messages=[
                     {"role": "system", "content": self.system_prompts['document_generation']},
@@ -164,7 +171,7 @@ class LegalAIService:
         try:
             prompt = self._build_clause_suggestion_prompt(document_type, existing_content, context)
             
-            response = self.client.ChatCompletion.create(
+            response = self._chat(
                 model="gpt-4-turbo-preview",
                 messages=[
                     {"role": "system", "content": self.system_prompts['clause_suggestion']},
@@ -196,7 +203,7 @@ class LegalAIService:
         try:
             prompt = self._build_research_prompt(query, legal_area)
             
-            response = self.client.ChatCompletion.create(
+            response = self._chat(
                 model="gpt-4-turbo-preview",
                 messages=[
                     {"role": "system", "content": self.system_prompts['legal_research']},
@@ -0,0 +1,259 @@
+"""
+Motor de previsão das séries diárias do escritório
+
+Cada série (receita faturável, processos novos, entregas no prazo, demanda
+por área) é ajustada uma vez por dia por mínimos quadrados:
+
+    y(t) = a + b·t + sazonalidade semanal (3 harmônicos) + anual (2 harmônicos)
+
+Os parâmetros ajustados ficam no cache compartilhado, com chave
+tenant:série:dia. Uma previsão para qualquer horizonte é só um produto
+matricial sobre esses parâmetros e não toca o banco. Séries com várias
+colunas (ex.: uma por área jurídica) são ajustadas de uma vez, com `lstsq`
+sobre a matriz de observações.
+"""
+import time
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+
+from extensions import db
+from models.analytics import UserDailyActivity
+from models.kanban import KanbanTimeEntry
+from models.process import Process
+from src.cache import cached
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DAYS = 730
+MIN_TREND_DAYS = 14
+MIN_WEEKLY_DAYS = 28
+MIN_YEARLY_DAYS = 400
+WEEKLY_HARMONICS = 3
+YEARLY_HARMONICS = 2
+RECENT_DAYS = 30
+ACCURACY_DAYS = 90
+YEAR = 365.25
+Z_95 = 1.96
+
+
+def _design(t: np.ndarray, trend: bool, weekly: int, yearly: int) -> np.ndarray:
+    """Matriz de regressores: intercepto, tendência e pares seno/cosseno"""
+    t = t.astype(float)
+    columns = [np.ones_like(t)]
+    if trend:
+        columns.append(t)
+    for period, harmonics in ((7.0, weekly), (YEAR, yearly)):
+        for k in range(1, harmonics + 1):
+            angle = 2 * np.pi * k * t / period
+            columns += [np.sin(angle), np.cos(angle)]
+    return np.column_stack(columns)
+
+
+@dataclass
+class SeriesModel:
+    """Parâmetros ajustados de uma série (uma coluna por rótulo)"""
+    series: str
+    labels: List[str]
+    start: int                 # ordinal do primeiro dia do histórico (t = 0)
+    days: int                  # dias de histórico usados no ajuste
+    trend: bool
+    weekly: int
+    yearly: int
+    coef: np.ndarray           # regressores × colunas
+    residual_std: np.ndarray   # desvio padrão diário dos resíduos
+    accuracy: np.ndarray       # 1 - WAPE do ajuste nos últimos ACCURACY_DAYS dias
+    level: np.ndarray          # média diária ajustada nos últimos RECENT_DAYS dias
+    recent: np.ndarray         # total observado nos últimos RECENT_DAYS dias
+    fitted_on: str
+
+    @classmethod
+    def fit(cls, series: str, labels: Sequence[str], start_day: date, values: np.ndarray,
+            fitted_on: str) -> 'SeriesModel':
+        """Ajusta todas as colunas de `values` (dias × colunas) de uma vez"""
+        values = np.asarray(values, dtype=float).reshape(len(values), -1)
+        recent = values[-RECENT_DAYS:].sum(axis=0)
+
+        # Dias anteriores ao primeiro registro não são zeros reais (o escritório não usava o sistema)
+        active = np.flatnonzero(values.any(axis=1))
+        offset = int(active[0]) if active.size else len(values) - 1
+        values = values[offset:]
+        n = len(values)
+
+        trend = n >= MIN_TREND_DAYS
+        weekly = WEEKLY_HARMONICS if n >= MIN_WEEKLY_DAYS else 0
+        yearly = YEARLY_HARMONICS if n >= MIN_YEARLY_DAYS else 0
+        X = _design(np.arange(n), trend, weekly, yearly)
+        coef = np.linalg.lstsq(X, values, rcond=None)[0]
+
+        fitted = X @ coef
+        residuals = values - fitted
+        residual_std = np.sqrt((residuals ** 2).sum(axis=0) / max(n - X.shape[1], 1))
+        observed = np.abs(values[-ACCURACY_DAYS:]).sum(axis=0)
+        error = np.abs(residuals[-ACCURACY_DAYS:]).sum(axis=0)
+        accuracy = np.where(observed > 0, 1 - error / np.where(observed > 0, observed, 1), 0.0)
+
+        return cls(
+            series=series, labels=list(labels), start=start_day.toordinal() + offset, days=n,
+            trend=trend, weekly=weekly, yearly=yearly, coef=coef, residual_std=residual_std,
+            accuracy=np.clip(accuracy, 0, 1), level=np.maximum(fitted[-RECENT_DAYS:].mean(axis=0), 0),
+            recent=recent, fitted_on=fitted_on
+        )
+
+    @property
+    def slope(self) -> np.ndarray:
+        """Variação diária da tendência por coluna"""
+        return self.coef[1] if self.trend else np.zeros(self.coef.shape[1])
+
+    def _future(self, days: int) -> np.ndarray:
+        return np.arange(self.days, self.days + days)
+
+    def predict(self, days: int) -> np.ndarray:
+        """Previsão diária (dias × colunas) a partir do dia seguinte ao histórico"""
+        X = _design(self._future(days), self.trend, self.weekly, self.yearly)
+        return np.maximum(X @ self.coef, 0)
+
+    def forecast(self, days: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Total previsto para os próximos `days` dias e intervalo de 95% por coluna"""
+        total = self.predict(days).sum(axis=0)
+        margin = Z_95 * self.residual_std * np.sqrt(days)
+        return total, np.maximum(total - margin, 0), total + margin
+
+    def seasonal_effect(self, days: int) -> np.ndarray:
+        """Peso da sazonalidade no total previsto (fração sobre a tendência pura)"""
+        t = self._future(days).astype(float)
+        base = self.coef[0] + (np.outer(t, self.coef[1]) if self.trend else 0)
+        base_total = np.maximum(np.broadcast_to(base, (days, self.coef.shape[1])), 0).sum(axis=0)
+        total = self.predict(days).sum(axis=0)
+        return np.where(base_total > 0, total / np.where(base_total > 0, base_total, 1) - 1, 0.0)
+
+    def monthly_change(self) -> np.ndarray:
+        """Variação relativa da tendência em 30 dias"""
+        return np.where(self.level > 0, self.slope * 30 / np.where(self.level > 0, self.level, 1), 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: getattr(self, name) for name in self.__dataclass_fields__}
+        return {name: value.tolist() if isinstance(value, np.ndarray) else value for name, value in data.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SeriesModel':
+        arrays = ('coef', 'residual_std', 'accuracy', 'level', 'recent')
+        values = {name: np.asarray(data[name], dtype=float) if name in arrays else data[name]
+                  for name in cls.__dataclass_fields__}
+        return cls(**values)
+
+
+def _day(value) -> date:
+    """date(...) volta como str no SQLite e como date nos demais bancos"""
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+def _daily_matrix(rows, start_day: date, days: int, labels: List[str]) -> np.ndarray:
+    """Linhas (dia, rótulo, valor) -> matriz dias × rótulos preenchida com zero"""
+    matrix = np.zeros((days, len(labels)))
+    index = {label: column for column, label in enumerate(labels)}
+    origin = start_day.toordinal()
+    for day, label, value in rows:
+        matrix[_day(day).toordinal() - origin, index[label]] = float(value or 0)
+    return matrix
+
+
+class Forecaster:
+    """Ajusta as séries uma vez por dia e responde previsões com os parâmetros em cache"""
+
+    FIT_TTL = 26 * 3600
+
+    def __init__(self, history_days: int = HISTORY_DAYS):
+        self.history_days = history_days
+        self.loaders = {
+            'revenue': self._load_revenue,
+            'cases': self._load_cases,
+            'delivery': self._load_delivery,
+            'demand': self._load_demand,
+        }
+
+    def model(self, series: str, tenant_id: Optional[int] = None, today: date = None) -> SeriesModel:
+        """Modelo ajustado hoje (histórico até ontem); ajusta na primeira chamada do dia"""
+        if series not in self.loaders:
+            raise ValueError(f"Série desconhecida: {series}")
+        today = today or datetime.utcnow().date()
+        return SeriesModel.from_dict(self._fitted(tenant_id, series, today.isoformat()))
+
+    @cached(
+        'analytics:forecast_model',
+        ttl=FIT_TTL,
+        key_builder=lambda self, tenant_id, series, day: f"{tenant_id or 'all'}:{series}:{day}"
+    )
+    def _fitted(self, tenant_id: Optional[int], series: str, day: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        end_day = date.fromisoformat(day) - timedelta(days=1)
+        start_day = end_day - timedelta(days=self.history_days - 1)
+        labels, values = self.loaders[series](tenant_id, start_day, end_day)
+        model = SeriesModel.fit(series, labels, start_day, values, day)
+        logger.info(f"Série {series} ({tenant_id or 'all'}) ajustada com {model.days} dias "
+                    f"em {(time.perf_counter() - started) * 1000:.0f}ms")
+        return model.to_dict()
+
+    # === SÉRIES ===
+
+    def _window(self, column, start_day: date, end_day: date):
+        start = datetime.combine(start_day, datetime.min.time())
+        end = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+        return column >= start, column < end
+
+    def _load_revenue(self, tenant_id, start_day, end_day) -> Tuple[List[str], np.ndarray]:
+        """Receita faturável por dia (minutos × valor-hora dos apontamentos)"""
+        day = func.date(KanbanTimeEntry.start_time)
+        query = db.session.query(
+            day, func.sum(KanbanTimeEntry.duration_minutes * KanbanTimeEntry.hourly_rate) / 60.0
+        ).filter(
+            KanbanTimeEntry.is_billable.is_(True),
+            KanbanTimeEntry.hourly_rate.isnot(None),
+            *self._window(KanbanTimeEntry.start_time, start_day, end_day)
+        )
+        if tenant_id:
+            query = query.filter(KanbanTimeEntry.user_id == tenant_id)
+        rows = [(d, 'revenue', value) for d, value in query.group_by(day)]
+        return ['revenue'], _daily_matrix(rows, start_day, self.history_days, ['revenue'])
+
+    def _load_cases(self, tenant_id, start_day, end_day) -> Tuple[List[str], np.ndarray]:
+        """Processos cadastrados por dia"""
+        day = func.date(Process.created_at)
+        query = db.session.query(day, func.count()).filter(*self._window(Process.created_at, start_day, end_day))
+        if tenant_id:
+            query = query.filter(Process.usuario_id == tenant_id)
+        rows = [(d, 'cases', value) for d, value in query.group_by(day)]
+        return ['cases'], _daily_matrix(rows, start_day, self.history_days, ['cases'])
+
+    def _load_demand(self, tenant_id, start_day, end_day) -> Tuple[List[str], np.ndarray]:
+        """Processos cadastrados por dia e área jurídica (uma coluna por área)"""
+        day = func.date(Process.created_at)
+        query = db.session.query(day, Process.area, func.count()).filter(
+            *self._window(Process.created_at, start_day, end_day)
+        )
+        if tenant_id:
+            query = query.filter(Process.usuario_id == tenant_id)
+        rows = query.group_by(day, Process.area).all()
+        labels = sorted({area for _, area, _ in rows})
+        return labels, _daily_matrix(rows, start_day, self.history_days, labels)
+
+    def _load_delivery(self, tenant_id, start_day, end_day) -> Tuple[List[str], np.ndarray]:
+        """Cards concluídos no prazo e cards concluídos com prazo, dos rollups diários"""
+        labels = ['cards_completed_on_time', 'cards_completed_with_deadline']
+        query = db.session.query(
+            UserDailyActivity.day, *[func.sum(getattr(UserDailyActivity, name)) for name in labels]
+        ).filter(UserDailyActivity.day.between(start_day, end_day))
+        if tenant_id:
+            query = query.filter(UserDailyActivity.user_id == tenant_id)
+        rows = []
+        for d, *values in query.group_by(UserDailyActivity.day):
+            rows += [(d, label, value) for label, value in zip(labels, values)]
+        return labels, _daily_matrix(rows, start_day, self.history_days, labels)
+
+
+# Instância global
+forecaster = Forecaster()
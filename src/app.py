@@ -42,6 +42,20 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 
+# Instrumentação de requisições: um único hook mede e os sinks recebem em background
+from src.monitoring.request_timing import MetricsSink, SlowLogSink, init_request_timing
+from src.monitoring.performance_metrics import monitor as performance_monitor
+init_request_timing(app, [
+    MetricsSink(),
+    performance_monitor,
+    SlowLogSink(float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', 1000)), app.logger)
+])
+
+# Compressão br/gzip das respostas textuais
+from src.performance.compression import init_compression
+app.config['COMPRESS_ENABLED'] = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+init_compression(app)
+
 # Headers de segurança para produção - CORS CORRIGIDO
 @app.after_request
 def after_request(response):
@@ -95,6 +109,9 @@ from src.models.kanban import KanbanBoard
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+# Compactador de rollups de analytics: só nos processos que o habilitarem
+app.config['ANALYTICS_ROLLUP_COMPACTOR'] = os.getenv('ANALYTICS_ROLLUP_COMPACTOR', 'false').lower() == 'true'
+
 # Registrar blueprints
 def register_blueprints():
     from src.routes.auth import auth_bp
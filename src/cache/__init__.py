@@ -0,0 +1,30 @@
+"""
+Subsistema de cache unificado do JurisIA
+
+`cache` é a instância compartilhada (L1 em memória + Redis) usada pelos
+serviços de cache legados em `src/services/cache_service.py` e
+`src/performance/`.
+"""
+from src.config import Config
+
+from .codec import Codec, CodecError
+from .local import LocalCache, MISSING
+from .tiered import TieredCache, NamespaceStats
+
+cache = TieredCache.from_url(
+    getattr(Config, 'REDIS_URL', None),
+    local=LocalCache(max_entries=getattr(Config, 'CACHE_LOCAL_MAX_ENTRIES', 10000)),
+    default_ttl=getattr(Config, 'CACHE_DEFAULT_TIMEOUT', 300),
+    local_ttl=getattr(Config, 'CACHE_LOCAL_TTL', 60),
+    codec=Codec(
+        format=getattr(Config, 'CACHE_CODEC', 'msgpack'),
+        compression=getattr(Config, 'CACHE_COMPRESSION', 'lz4'),
+        threshold=getattr(Config, 'CACHE_COMPRESSION_THRESHOLD', 1024)
+    )
+)
+cache.start_invalidation_listener()
+
+from .stampede import StampedeProtector, cached
+
+__all__ = ['Codec', 'CodecError', 'LocalCache', 'TieredCache', 'NamespaceStats', 'MISSING', 'cache',
+           'StampedeProtector', 'cached']
@@ -0,0 +1,164 @@
+"""
+Benchmark dos codecs de cache sobre payloads representativos do JurisIA
+
+Uso:
+    python -m src.cache.benchmark [--iterations 200] [--json]
+
+Compara tempo de serialização, desserialização e tamanho para cada
+combinação formato/compressão disponível, usando dicts com o formato de
+Document.to_dict, listas de templates e o blob do overview de analytics.
+"""
+import sys
+import json
+import pickle
+import random
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from .codec import Codec, FORMATS, MSGPACK_AVAILABLE, LZ4_AVAILABLE, ZSTD_AVAILABLE
+
+LOREM = (
+    "Cláusula primeira. O CONTRATANTE se obriga a pagar ao CONTRATADO o valor "
+    "ajustado, na forma e prazos estabelecidos neste instrumento, sob pena de "
+    "multa de dois por cento e juros de mora de um por cento ao mês. "
+)
+
+
+def document_payload(index: int) -> Dict[str, Any]:
+    """Mesmo formato de Document.to_dict(incluir_conteudo=True)"""
+    now = datetime(2025, 6, 1) + timedelta(hours=index)
+    return {
+        'id': index,
+        'titulo': f'Contrato de Prestação de Serviços nº {index}',
+        'descricao': 'Contrato padrão de prestação de serviços advocatícios',
+        'tipo': 'contrato',
+        'status': 'rascunho',
+        'user_id': 7,
+        'template_id': 3,
+        'versao': 2,
+        'versao_principal': True,
+        'documento_pai_id': None,
+        'colaborativo': index % 2 == 0,
+        'publico': False,
+        'tags': ['contrato', 'serviços', 'cliente-pj'],
+        'palavras_chave': ['prestação', 'honorários', 'rescisão'],
+        'tamanho_estimado': 5400,
+        'tempo_leitura': 4,
+        'bloqueado_para_edicao': False,
+        'bloqueado_por_user_id': None,
+        'bloqueado_em': None,
+        'created_at': now.isoformat(),
+        'updated_at': now.isoformat(),
+        'conteudo': LOREM * 30,
+        'variaveis': {'contratante': 'ACME Ltda.', 'valor': '15.000,00', 'foro': 'São Paulo'}
+    }
+
+
+def template_payload(index: int) -> Dict[str, Any]:
+    return {
+        'id': index,
+        'nome': f'Template {index}',
+        'categoria': random.choice(['contrato', 'petição', 'parecer', 'procuração']),
+        'descricao': 'Modelo revisado pela equipe jurídica',
+        'variaveis': [{'nome': f'campo_{i}', 'tipo': 'texto', 'obrigatorio': i % 2 == 0} for i in range(8)],
+        'uso_count': random.randint(0, 5000),
+        'avaliacao_media': round(random.uniform(3, 5), 2),
+        'publico': True
+    }
+
+
+def analytics_payload() -> Dict[str, Any]:
+    """Formato de AnalyticsService.get_dashboard_overview"""
+    days = [(datetime(2025, 6, 1) + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(90)]
+    return {
+        'period': {'start_date': days[0], 'end_date': days[-1], 'range': '90days'},
+        'documents': {'total': 1532, 'created': 120, 'by_type': {'contrato': 800, 'petição': 500, 'parecer': 232},
+                      'timeline': [{'date': d, 'count': random.randint(0, 40)} for d in days]},
+        'kanban': {'total_cards': 421, 'completed': 300, 'completion_rate': 71.26},
+        'wiki': {'pages': 88, 'views': 12034},
+        'ai_usage': {'requests': 5421, 'tokens': 1823311,
+                     'by_day': [{'date': d, 'requests': random.randint(0, 200)} for d in days]},
+        'productivity': {'heatmap': [[random.randint(0, 20) for _ in range(24)] for _ in range(7)]},
+        'notifications': {'sent': 3021, 'read_rate': 0.82}
+    }
+
+
+def payloads() -> Dict[str, Any]:
+    random.seed(42)
+    return {
+        'document': document_payload(1),
+        'documents_page': [document_payload(i) for i in range(50)],
+        'templates_list': [template_payload(i) for i in range(200)],
+        'analytics_overview': analytics_payload()
+    }
+
+
+def candidates() -> Dict[str, Any]:
+    """Baseline (pickle e json puros, sem cabeçalho) + combinações do Codec"""
+    runners = {
+        'pickle (legado)': (
+            lambda v: pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL),
+            pickle.loads
+        ),
+        'json stdlib (legado)': (
+            lambda v: json.dumps(v, default=str).encode('utf-8'),
+            lambda d: json.loads(d.decode('utf-8'))
+        )
+    }
+    formats = [name for name in FORMATS if name != 'msgpack' or MSGPACK_AVAILABLE]
+    compressions = ['none', 'zlib']
+    if LZ4_AVAILABLE:
+        compressions.append('lz4')
+    if ZSTD_AVAILABLE:
+        compressions.append('zstd')
+    for fmt in formats:
+        for compression in compressions:
+            codec = Codec(format=fmt, compression=compression, threshold=1024)
+            runners[f'{fmt}+{compression}'] = (codec.encode, codec.decode)
+    return runners
+
+
+def run(iterations: int = 200) -> List[Dict[str, Any]]:
+    results = []
+    for payload_name, payload in payloads().items():
+        for name, (encode, decode) in candidates().items():
+            data = encode(payload)
+            encode_time = timeit.timeit(lambda: encode(payload), number=iterations) / iterations
+            decode_time = timeit.timeit(lambda: decode(data), number=iterations) / iterations
+            results.append({
+                'payload': payload_name,
+                'codec': name,
+                'bytes': len(data),
+                'encode_us': round(encode_time * 1e6, 1),
+                'decode_us': round(decode_time * 1e6, 1)
+            })
+    return results
+
+
+def print_table(results: List[Dict[str, Any]]):
+    current = None
+    for row in results:
+        if row['payload'] != current:
+            current = row['payload']
+            print(f"\n{current}")
+            print(f"  {'codec':<22}{'bytes':>10}{'encode µs':>12}{'decode µs':>12}")
+        print(f"  {row['codec']:<22}{row['bytes']:>10}{row['encode_us']:>12}{row['decode_us']:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark dos codecs de cache')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args(argv)
+
+    results = run(args.iterations)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+    else:
+        print_table(results)
+
+
+if __name__ == '__main__':
+    main()
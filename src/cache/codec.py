@@ -0,0 +1,189 @@
+"""
+Codecs de serialização para valores em cache
+
+Cada valor gravado começa com um byte de cabeçalho: o nibble alto identifica
+o formato (msgpack, JSON, pickle) e o nibble baixo a compressão (zstd, lz4,
+zlib ou nenhuma). A leitura não precisa adivinhar o formato, e valores que
+o formato estruturado não representa sem perda caem para pickle.
+Valores antigos gravados com pickle puro (sem cabeçalho) continuam legíveis.
+"""
+import json
+import zlib
+import pickle
+import logging
+from typing import Any, Callable, Dict, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import lz4.frame
+    LZ4_AVAILABLE = True
+except ImportError:
+    LZ4_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Formatos (nibble alto) — nunca 0x8, primeiro byte de um pickle sem cabeçalho
+FORMAT_PICKLE = 0x1
+FORMAT_JSON = 0x2
+FORMAT_MSGPACK = 0x3
+
+# Compressão (nibble baixo)
+COMPRESSION_NONE = 0x0
+COMPRESSION_ZLIB = 0x1
+COMPRESSION_LZ4 = 0x2
+COMPRESSION_ZSTD = 0x3
+
+FORMATS = {'pickle': FORMAT_PICKLE, 'json': FORMAT_JSON, 'msgpack': FORMAT_MSGPACK}
+COMPRESSIONS = {'none': COMPRESSION_NONE, 'zlib': COMPRESSION_ZLIB,
+                'lz4': COMPRESSION_LZ4, 'zstd': COMPRESSION_ZSTD}
+
+_LEGACY_PICKLE = 0x80
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class CodecError(ValueError):
+    """Valor em cache com cabeçalho desconhecido ou corrompido"""
+
+
+def _json_dumps(value: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        # Tipos que o JSON não representa sem perda (datetime, Decimal, chaves
+        # não-string) levantam TypeError e caem para pickle
+        return orjson.dumps(value, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(value, separators=(',', ':'), allow_nan=False).encode('utf-8')
+
+
+def _json_loads(data: Buffer) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+
+def _msgpack_dumps(value: Any) -> bytes:
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def _msgpack_loads(data: Buffer) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def _pickle_dumps(value: Any) -> bytes:
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _zstd_decompress(data: Buffer) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+class Codec:
+    """Serializa valores com cabeçalho de formato/compressão de um byte"""
+
+    def __init__(self, format: str = 'msgpack', compression: str = 'lz4', threshold: int = 1024):
+        self.format = self._resolve_format(format)
+        self.compression = self._resolve_compression(compression)
+        self.threshold = threshold
+
+        self._dumps: Dict[int, Callable[[Any], bytes]] = {FORMAT_PICKLE: _pickle_dumps, FORMAT_JSON: _json_dumps}
+        self._loads: Dict[int, Callable[[Buffer], Any]] = {FORMAT_PICKLE: pickle.loads, FORMAT_JSON: _json_loads}
+        if MSGPACK_AVAILABLE:
+            self._dumps[FORMAT_MSGPACK] = _msgpack_dumps
+            self._loads[FORMAT_MSGPACK] = _msgpack_loads
+
+        self._compress: Dict[int, Callable[[bytes], bytes]] = {COMPRESSION_ZLIB: lambda d: zlib.compress(d, 1)}
+        self._decompress: Dict[int, Callable[[Buffer], bytes]] = {COMPRESSION_ZLIB: zlib.decompress}
+        if LZ4_AVAILABLE:
+            self._compress[COMPRESSION_LZ4] = lz4.frame.compress
+            self._decompress[COMPRESSION_LZ4] = lz4.frame.decompress
+        if ZSTD_AVAILABLE:
+            self._compress[COMPRESSION_ZSTD] = _zstd_compress
+            self._decompress[COMPRESSION_ZSTD] = _zstd_decompress
+
+    @staticmethod
+    def _resolve_format(name: str) -> int:
+        fmt = FORMATS.get(name, FORMAT_MSGPACK)
+        if fmt == FORMAT_MSGPACK and not MSGPACK_AVAILABLE:
+            logger.warning("⚠️ msgpack não instalado, cache usando JSON")
+            fmt = FORMAT_JSON
+        return fmt
+
+    @staticmethod
+    def _resolve_compression(name: str) -> int:
+        compression = COMPRESSIONS.get(name, COMPRESSION_ZLIB)
+        if compression == COMPRESSION_ZSTD and not ZSTD_AVAILABLE:
+            compression = COMPRESSION_LZ4
+        if compression == COMPRESSION_LZ4 and not LZ4_AVAILABLE:
+            compression = COMPRESSION_ZLIB
+        return compression
+
+    def _structured(self, value: Any) -> Tuple[int, bytes]:
+        """Formato configurado para dict/list/escalares; pickle para o resto
+
+        Como em JSON, tuplas voltam como listas.
+        """
+        if self.format != FORMAT_PICKLE and isinstance(value, (dict, list, tuple, str, int, float)):
+            try:
+                data = self._dumps[self.format](value)
+                return self.format, data
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return FORMAT_PICKLE, _pickle_dumps(value)
+
+    def encode(self, value: Any) -> bytes:
+        fmt, data = self._structured(value)
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(data) >= self.threshold:
+            compressed = self._compress[self.compression](data)
+            if len(compressed) < len(data):
+                data, compression = compressed, self.compression
+        return bytes(((fmt << 4) | compression,)) + data
+
+    def decode(self, data: Buffer) -> Any:
+        """Decodifica sem copiar o payload (aceita bytes ou memoryview)"""
+        view = memoryview(data)
+        if not view:
+            raise CodecError("Valor de cache vazio")
+        header = view[0]
+        if header == _LEGACY_PICKLE:
+            return pickle.loads(view)
+
+        fmt, compression = header >> 4, header & 0x0F
+        loads = self._loads.get(fmt)
+        decompress = self._decompress.get(compression)
+        if loads is None or (compression != COMPRESSION_NONE and decompress is None):
+            raise CodecError(f"Cabeçalho de cache desconhecido: {header:#04x}")
+
+        payload = view[1:]
+        if decompress is not None:
+            payload = decompress(payload)
+        return loads(payload)
+
+    def describe(self) -> Dict[str, str]:
+        names = {v: k for k, v in FORMATS.items()}
+        compressions = {v: k for k, v in COMPRESSIONS.items()}
+        return {
+            'format': names[self.format],
+            'compression': compressions[self.compression],
+            'threshold': self.threshold
+        }
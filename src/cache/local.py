@@ -0,0 +1,127 @@
+"""
+Camada de cache em memória do processo
+
+LRU limitado por número de entradas, com TTL por entrada e locks por shard.
+Leituras não bloqueiam: a entrada é lida sem lock e a atualização da ordem
+LRU só acontece se o lock do shard estiver livre naquele instante.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List
+
+MISSING = object()
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at')
+
+    def __init__(self, value: Any, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at
+
+
+class LocalCache:
+    """LRU com TTL por entrada, particionado em shards"""
+
+    def __init__(self, max_entries: int = 10000, shards: int = 16, default_ttl: int = 60):
+        self.default_ttl = default_ttl
+        self._shards: List[OrderedDict] = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._per_shard = max(1, max_entries // shards)
+        self.evictions = 0
+        self.expirations = 0
+
+    def _index(self, key: str) -> int:
+        return hash(key) % len(self._shards)
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        """Obtém valor não expirado (sem bloquear em leituras concorrentes)"""
+        index = self._index(key)
+        shard = self._shards[index]
+        entry = shard.get(key)
+        if entry is None:
+            return default
+
+        if entry.expires_at <= time.monotonic():
+            with self._locks[index]:
+                if shard.get(key) is entry:
+                    del shard[key]
+                    self.expirations += 1
+            return default
+
+        lock = self._locks[index]
+        if lock.acquire(blocking=False):
+            try:
+                if key in shard:
+                    shard.move_to_end(key)
+            finally:
+                lock.release()
+        return entry.value
+
+    def set(self, key: str, value: Any, ttl: int = None):
+        """Armazena valor; remove o menos recente do shard se estiver cheio"""
+        ttl = self.default_ttl if ttl is None else ttl
+        index = self._index(key)
+        shard = self._shards[index]
+        with self._locks[index]:
+            shard[key] = _Entry(value, time.monotonic() + ttl)
+            shard.move_to_end(key)
+            while len(shard) > self._per_shard:
+                shard.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index].pop(key, None) is not None
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        return sum(1 for key in keys if self.delete(key))
+
+    def clear(self, prefix: str = None) -> int:
+        """Remove todas as entradas (ou apenas as que começam com `prefix`)"""
+        removed = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                if prefix is None:
+                    removed += len(shard)
+                    shard.clear()
+                else:
+                    for key in [k for k in shard if k.startswith(prefix)]:
+                        del shard[key]
+                        removed += 1
+        return removed
+
+    def delete_where(self, predicate: Callable[[str], bool]) -> int:
+        """Remove as entradas cujas chaves satisfazem o predicado"""
+        removed = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                for key in [k for k in shard if predicate(k)]:
+                    del shard[key]
+                    removed += 1
+        return removed
+
+    def cleanup_expired(self) -> int:
+        """Remove entradas expiradas de todos os shards"""
+        now = time.monotonic()
+        removed = 0
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                for key in [k for k, entry in shard.items() if entry.expires_at <= now]:
+                    del shard[key]
+                    removed += 1
+        self.expirations += removed
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self),
+            'max_entries': self._per_shard * len(self._shards),
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
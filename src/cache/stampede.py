@@ -0,0 +1,280 @@
+"""
+Cache de funções protegido contra stampede
+
+Quando uma chave muito acessada expira, apenas um chamador recomputa:
+- dentro do processo, as chamadas concorrentes aguardam a mesma execução;
+- entre processos, um lock curto no Redis elege quem recomputa;
+- valores vencidos continuam sendo servidos (stale-while-revalidate)
+  enquanto um único chamador atualiza;
+- a expiração antecipada probabilística (XFetch) espalha as recomputações
+  antes do vencimento, proporcional ao custo de cada cálculo.
+"""
+import math
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from .local import MISSING
+from .tiered import TieredCache
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = MISSING
+        self.error = None
+
+
+class StampedeProtector:
+    """Obtém do cache ou recomputa uma chave com no máximo uma recomputação simultânea"""
+
+    WAIT_INTERVAL = 0.05
+
+    def __init__(self, cache: TieredCache, ttl: int = 300, stale_ttl: int = None,
+                 beta: float = 1.0, lock_timeout: float = 10.0, cache_none: bool = False):
+        self.cache = cache
+        self.ttl = ttl
+        self.stale_ttl = ttl if stale_ttl is None else stale_ttl
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.cache_none = cache_none
+        self._flights: Dict[str, _Flight] = {}
+        self._flights_lock = threading.Lock()
+        self._metrics = {
+            'hits': 0,
+            'misses': 0,
+            'stale_served': 0,
+            'early_refreshes': 0,
+            'computations': 0,
+            'coalesced': 0
+        }
+
+    # ---- Envelope ----
+
+    def _should_refresh(self, created_at: float, delta: float) -> bool:
+        """Vencido, ou expiração antecipada sorteada (XFetch)"""
+        fresh_until = created_at + self.ttl
+        now = time.time()
+        if now >= fresh_until:
+            return True
+        if self.beta > 0 and delta > 0:
+            if now - delta * self.beta * math.log(1.0 - random.random()) >= fresh_until:
+                self._metrics['early_refreshes'] += 1
+                return True
+        return False
+
+    def _store(self, key: str, value: Any, started: float, tags: Optional[Iterable[str]]):
+        if value is None and not self.cache_none:
+            return
+        envelope = (value, time.time(), time.time() - started)
+        self.cache.set(key, envelope, self.ttl + self.stale_ttl, tags=tags)
+
+    def _lookup(self, key: str):
+        """Retorna (valor, precisa_atualizar) ou (MISSING, True)"""
+        envelope = self.cache.get(key)
+        if envelope is None:
+            return MISSING, True
+        value, created_at, delta = envelope
+        return value, self._should_refresh(created_at, delta)
+
+    # ---- Execução síncrona ----
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any],
+                       tags: Optional[Iterable[str]] = None) -> Any:
+        value, refresh = self._lookup(key)
+        if not refresh:
+            self._metrics['hits'] += 1
+            return value
+        if value is not MISSING:
+            return self._refresh_stale(key, value, compute, tags)
+        self._metrics['misses'] += 1
+        return self._single_flight(key, compute, tags)
+
+    def _refresh_stale(self, key: str, stale: Any, compute: Callable[[], Any], tags) -> Any:
+        """Um chamador recomputa; os demais recebem o valor atual sem esperar"""
+        with self._flights_lock:
+            if key in self._flights:
+                self._metrics['stale_served'] += 1
+                return stale
+            flight = self._flights[key] = _Flight()
+
+        try:
+            token = self.cache.acquire_lock(key, self.lock_timeout)
+            if token is None:
+                self._metrics['stale_served'] += 1
+                return stale
+            try:
+                flight.result = self._compute(key, compute, tags)
+            finally:
+                self.cache.release_lock(key, token)
+            return flight.result
+        except Exception as e:
+            logger.error(f"Erro ao atualizar cache {key}, servindo valor anterior: {e}")
+            self._metrics['stale_served'] += 1
+            return stale
+        finally:
+            flight.event.set()
+            with self._flights_lock:
+                self._flights.pop(key, None)
+
+    def _single_flight(self, key: str, compute: Callable[[], Any], tags) -> Any:
+        """Sem valor em cache: uma execução por chave, as demais aguardam o resultado"""
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self._metrics['coalesced'] += 1
+            if flight.event.wait(self.lock_timeout):
+                if flight.error is not None:
+                    raise flight.error
+                if flight.result is not MISSING:
+                    return flight.result
+            return compute()
+
+        try:
+            token = self.cache.acquire_lock(key, self.lock_timeout)
+            if token is None:
+                # Outro processo está recomputando: aguarda o valor aparecer no cache
+                value = self._wait_for_value(key)
+                if value is not MISSING:
+                    flight.result = value
+                    return value
+            try:
+                flight.result = self._compute(key, compute, tags)
+            finally:
+                if token is not None:
+                    self.cache.release_lock(key, token)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            flight.event.set()
+            with self._flights_lock:
+                self._flights.pop(key, None)
+
+    def _wait_for_value(self, key: str) -> Any:
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.WAIT_INTERVAL)
+            envelope = self.cache.get(key)
+            if envelope is not None:
+                self._metrics['coalesced'] += 1
+                return envelope[0]
+        return MISSING
+
+    def _compute(self, key: str, compute: Callable[[], Any], tags) -> Any:
+        started = time.time()
+        value = compute()
+        self._metrics['computations'] += 1
+        self._store(key, value, started, tags)
+        return value
+
+    # ---- Execução assíncrona ----
+
+    async def get_or_compute_async(self, key: str, compute: Callable[[], Any],
+                                   tags: Optional[Iterable[str]] = None) -> Any:
+        """Variante para corrotinas; a coordenação é feita apenas pelo lock"""
+        value, refresh = self._lookup(key)
+        if not refresh:
+            self._metrics['hits'] += 1
+            return value
+
+        token = self.cache.acquire_lock(key, self.lock_timeout)
+        if token is None:
+            if value is not MISSING:
+                self._metrics['stale_served'] += 1
+                return value
+            deadline = time.monotonic() + self.lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(self.WAIT_INTERVAL)
+                envelope = self.cache.get(key)
+                if envelope is not None:
+                    self._metrics['coalesced'] += 1
+                    return envelope[0]
+
+        if value is MISSING:
+            self._metrics['misses'] += 1
+        try:
+            started = time.time()
+            result = compute()
+            if asyncio.iscoroutine(result):
+                result = await result
+            self._metrics['computations'] += 1
+            self._store(key, result, started, tags)
+            return result
+        finally:
+            if token is not None:
+                self.cache.release_lock(key, token)
+
+    def metrics(self) -> Dict[str, Any]:
+        return dict(self._metrics)
+
+
+def default_key(func: Callable, args: tuple, kwargs: dict) -> str:
+    """Hash dos argumentos da chamada"""
+    raw = f"{func.__module__}.{func.__qualname__}:{args!r}:{sorted(kwargs.items())!r}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def cached(namespace: str, ttl: int = 300, key_builder: Callable[..., str] = None,
+           tags: Callable[..., Iterable[str]] = None, stale_ttl: int = None,
+           beta: float = 1.0, lock_timeout: float = 10.0, cache: TieredCache = None,
+           key_prefix: str = 'jurisia:'):
+    """Decorador de cache com proteção contra stampede
+
+    `key_builder` e `tags` recebem os mesmos argumentos da função decorada e
+    retornam, respectivamente, o identificador da chave e as tags das
+    entidades das quais o resultado deriva.
+    """
+    def decorator(func):
+        protector = None
+
+        def get_protector() -> StampedeProtector:
+            nonlocal protector
+            if protector is None:
+                if cache is None:
+                    from . import cache as shared_cache
+                    target = shared_cache
+                else:
+                    target = cache
+                protector = StampedeProtector(target, ttl=ttl, stale_ttl=stale_ttl,
+                                              beta=beta, lock_timeout=lock_timeout)
+                wrapper.stampede = protector
+            return protector
+
+        def build(args, kwargs):
+            identifier = key_builder(*args, **kwargs) if key_builder else default_key(func, args, kwargs)
+            entry_tags = tags(*args, **kwargs) if tags else None
+            return f"{key_prefix}{namespace}:{identifier}", entry_tags
+
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                key, entry_tags = build(args, kwargs)
+                return await get_protector().get_or_compute_async(
+                    key, lambda: func(*args, **kwargs), entry_tags
+                )
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                key, entry_tags = build(args, kwargs)
+                return get_protector().get_or_compute(
+                    key, lambda: func(*args, **kwargs), entry_tags
+                )
+
+        wrapper.get_protector = get_protector
+        return wrapper
+    return decorator
@@ -0,0 +1,430 @@
+"""
+Cache em duas camadas: memória do processo (L1) + Redis (L2)
+
+Leituras consultam primeiro o L1 (LRU/TTL limitado) e depois o Redis.
+Escritas e remoções são publicadas no canal de invalidação do Redis para
+que todos os workers descartem a cópia local da chave.
+
+Entradas podem ser associadas a tags das entidades de que derivam
+(`document:42`, `user:7`); cada tag é um set no Redis com as chaves
+dependentes, e invalidar uma tag custa O(chaves marcadas), sem KEYS/SCAN.
+"""
+import json
+import time
+import uuid
+import fnmatch
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.monitoring.request_timing import add_time
+
+from .codec import Codec
+from .local import LocalCache, MISSING
+
+logger = logging.getLogger(__name__)
+
+# Grava o valor e registra a chave nos sets das tags; o set vive pelo menos
+# tanto quanto a entrada mais longa que referencia
+_SET_TAGGED_SCRIPT = """
+local ttl = tonumber(ARGV[2])
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ttl)
+for i = 2, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    if redis.call('TTL', KEYS[i]) < ttl then
+        redis.call('EXPIRE', KEYS[i], ttl)
+    end
+end
+return 1
+"""
+
+# Remove as chaves marcadas e os próprios sets de tag; retorna as chaves removidas
+_INVALIDATE_TAGS_SCRIPT = """
+local keys = {}
+for i = 1, #KEYS do
+    for _, key in ipairs(redis.call('SMEMBERS', KEYS[i])) do
+        keys[#keys + 1] = key
+    end
+    redis.call('UNLINK', KEYS[i])
+end
+for i = 1, #keys, 500 do
+    redis.call('UNLINK', unpack(keys, i, math.min(i + 499, #keys)))
+end
+return keys
+"""
+
+# Libera o lock apenas se ainda pertencer a quem o adquiriu
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class NamespaceStats:
+    """Contadores por namespace (aproximados sob concorrência, sem lock)"""
+    __slots__ = ('local_hits', 'redis_hits', 'misses', 'sets', 'deletes')
+
+    def __init__(self):
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.deletes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        hits = self.local_hits + self.redis_hits
+        total = hits + self.misses
+        return {
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'deletes': self.deletes,
+            'hit_ratio': round(hits / total, 4) if total else 0.0
+        }
+
+
+class TieredCache:
+    """Cache L1 (memória) + L2 (Redis) com invalidação via pub/sub"""
+
+    CHANNEL = 'jurisia:cache:invalidate'
+
+    def __init__(self, redis_client=None, local: LocalCache = None,
+                 default_ttl: int = 300, local_ttl: int = 60, key_prefix: str = 'jurisia:',
+                 codec: Codec = None):
+        self.redis = redis_client
+        self.local = local or LocalCache(default_ttl=local_ttl)
+        self.codec = codec or Codec()
+        self.default_ttl = default_ttl
+        self.local_ttl = local_ttl
+        self.key_prefix = key_prefix
+        self.instance_id = uuid.uuid4().hex
+        self._stats: Dict[str, NamespaceStats] = defaultdict(NamespaceStats)
+        self._listener = None
+        self._listening = False
+        # Índice de tags em memória (usado apenas sem Redis)
+        self._local_tags: Dict[str, Set[str]] = defaultdict(set)
+        self._local_tag_refs = 0
+        self._tags_lock = threading.Lock()
+        # Locks curtos em memória (usados apenas sem Redis)
+        self._local_locks: Dict[str, tuple] = {}
+        self._set_tagged = None
+        self._invalidate_tags = None
+        self._release_lock = None
+        if redis_client is not None:
+            self._set_tagged = redis_client.register_script(_SET_TAGGED_SCRIPT)
+            self._invalidate_tags = redis_client.register_script(_INVALIDATE_TAGS_SCRIPT)
+            self._release_lock = redis_client.register_script(_RELEASE_LOCK_SCRIPT)
+
+    @classmethod
+    def from_url(cls, redis_url: Optional[str], **kwargs) -> 'TieredCache':
+        """Cria o cache conectando ao Redis se disponível (senão apenas L1)"""
+        redis_client = None
+        if redis_url:
+            try:
+                import redis
+                redis_client = redis.from_url(redis_url, decode_responses=False)
+                redis_client.ping()
+                logger.info("✅ Redis conectado para cache em duas camadas")
+            except Exception as e:
+                logger.warning(f"⚠️ Redis não disponível, cache apenas em memória: {e}")
+                redis_client = None
+        return cls(redis_client=redis_client, **kwargs)
+
+    # ---- Helpers ----
+
+    def namespace_of(self, key: str) -> str:
+        """Namespace para métricas: primeiro segmento após o prefixo global"""
+        if key.startswith(self.key_prefix):
+            key = key[len(self.key_prefix):]
+        return key.split(':', 1)[0]
+
+    def _serialize(self, value: Any) -> bytes:
+        return self.codec.encode(value)
+
+    def _deserialize(self, data: bytes) -> Any:
+        return self.codec.decode(data)
+
+    def tag_key(self, tag: str) -> str:
+        return f"{self.key_prefix}tag:{tag}"
+
+    # ---- Operações ----
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Obtém valor (L1 -> Redis), promovendo para o L1 em hit no Redis"""
+        stats = self._stats[self.namespace_of(key)]
+        value = self.local.get(key)
+        if value is not MISSING:
+            stats.local_hits += 1
+            return value
+
+        if self.redis is not None:
+            started = time.perf_counter()
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.get(key)
+                pipe.ttl(key)
+                data, ttl = pipe.execute()
+                if data is not None:
+                    value = self._deserialize(data)
+                    self.local.set(key, value, min(self.local_ttl, ttl) if ttl and ttl > 0 else self.local_ttl)
+                    stats.redis_hits += 1
+                    return value
+            except Exception as e:
+                logger.error(f"Erro ao ler cache {key} do Redis: {e}")
+            finally:
+                add_time('cache', time.perf_counter() - started)
+
+        stats.misses += 1
+        return default
+
+    def set(self, key: str, value: Any, ttl: int = None, tags: Iterable[str] = None) -> bool:
+        """Armazena no Redis e no L1; avisa os outros workers"""
+        ttl = self.default_ttl if ttl is None else ttl
+        tags = list(tags or ())
+        self._stats[self.namespace_of(key)].sets += 1
+        self.local.set(key, value, min(ttl, self.local_ttl))
+
+        if self.redis is None:
+            if tags:
+                self._index_local_tags(key, tags)
+            return True
+        started = time.perf_counter()
+        try:
+            if tags:
+                self._set_tagged(
+                    keys=[key] + [self.tag_key(tag) for tag in tags],
+                    args=[self._serialize(value), ttl]
+                )
+            else:
+                self.redis.set(key, self._serialize(value), ex=ttl)
+            self._publish({'keys': [key]})
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao gravar cache {key} no Redis: {e}")
+            return False
+        finally:
+            add_time('cache', time.perf_counter() - started)
+
+    def delete(self, key: str) -> bool:
+        return self.delete_many([key]) > 0
+
+    def delete_many(self, keys: Iterable[str]) -> int:
+        """Remove chaves das duas camadas e publica a invalidação"""
+        keys = list(keys)
+        if not keys:
+            return 0
+        removed = self.local.delete_many(keys)
+        for key in keys:
+            self._stats[self.namespace_of(key)].deletes += 1
+
+        if self.redis is not None:
+            try:
+                removed = max(removed, self.redis.delete(*keys))
+                self._publish({'keys': keys})
+            except Exception as e:
+                logger.error(f"Erro ao remover chaves do Redis: {e}")
+        return removed
+
+    def exists(self, key: str) -> bool:
+        if self.local.get(key) is not MISSING:
+            return True
+        if self.redis is not None:
+            try:
+                return bool(self.redis.exists(key))
+            except Exception as e:
+                logger.error(f"Erro ao verificar cache {key}: {e}")
+        return False
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """Remove todas as entradas marcadas com as tags (custo O(chaves marcadas))"""
+        if not tags:
+            return 0
+        if self.redis is None:
+            with self._tags_lock:
+                keys = set()
+                for tag in tags:
+                    tagged = self._local_tags.pop(tag, set())
+                    self._local_tag_refs -= len(tagged)
+                    keys |= tagged
+            return self.local.delete_many(keys)
+
+        try:
+            keys = self._invalidate_tags(keys=[self.tag_key(tag) for tag in tags])
+        except Exception as e:
+            logger.error(f"Erro ao invalidar tags {tags}: {e}")
+            return 0
+        keys = list({key.decode() if isinstance(key, bytes) else key for key in keys})
+        if keys:
+            self.local.delete_many(keys)
+            for key in keys:
+                self._stats[self.namespace_of(key)].deletes += 1
+            self._publish({'keys': keys})
+        return len(keys)
+
+    def _index_local_tags(self, key: str, tags: List[str]):
+        with self._tags_lock:
+            for tag in tags:
+                self._local_tags[tag].add(key)
+            self._local_tag_refs += len(tags)
+            if self._local_tag_refs > 2 * self.local.stats()['max_entries']:
+                # Descarta referências a chaves já removidas do L1 pelo LRU/TTL
+                self._local_tag_refs = 0
+                for tag in list(self._local_tags):
+                    alive = {k for k in self._local_tags[tag] if self.local.get(k) is not MISSING}
+                    if alive:
+                        self._local_tags[tag] = alive
+                        self._local_tag_refs += len(alive)
+                    else:
+                        del self._local_tags[tag]
+
+    def delete_pattern(self, pattern: str) -> int:
+        """Remove chaves por padrão glob (varre o keyspace do Redis com SCAN).
+
+        Caro em keyspaces grandes; prefira invalidate_tags.
+        """
+        removed = 0
+        if self.redis is not None:
+            try:
+                batch = []
+                for key in self.redis.scan_iter(match=pattern, count=500):
+                    batch.append(key.decode() if isinstance(key, bytes) else key)
+                    if len(batch) >= 500:
+                        removed += self.delete_many(batch)
+                        batch = []
+                if batch:
+                    removed += self.delete_many(batch)
+            except Exception as e:
+                logger.error(f"Erro ao remover padrão {pattern}: {e}")
+        self._clear_local_pattern(pattern)
+        self._publish({'pattern': pattern})
+        return removed
+
+    def _clear_local_pattern(self, pattern: str) -> int:
+        return self.local.delete_where(lambda key: fnmatch.fnmatchcase(key, pattern))
+
+    def clear(self) -> int:
+        """Limpa o L1 de todos os workers (o Redis expira por TTL)"""
+        removed = self.local.clear()
+        self._publish({'pattern': '*'})
+        return removed
+
+    # ---- Locks de recomputação ----
+
+    def acquire_lock(self, name: str, timeout: float) -> Optional[str]:
+        """Lock curto entre processos (SET NX PX); retorna o token ou None se ocupado"""
+        token = uuid.uuid4().hex
+        lock_key = f"{self.key_prefix}lock:{name}"
+        if self.redis is not None:
+            try:
+                if self.redis.set(lock_key, token, nx=True, px=int(timeout * 1000)):
+                    return token
+                return None
+            except Exception as e:
+                logger.error(f"Erro ao adquirir lock {name}: {e}")
+                # Sem Redis utilizável, segue só com a proteção local
+                return token
+
+        now = time.monotonic()
+        with self._tags_lock:
+            current = self._local_locks.get(lock_key)
+            if current is not None and current[1] > now:
+                return None
+            self._local_locks[lock_key] = (token, now + timeout)
+        return token
+
+    def release_lock(self, name: str, token: str):
+        lock_key = f"{self.key_prefix}lock:{name}"
+        if self.redis is not None:
+            try:
+                self._release_lock(keys=[lock_key], args=[token])
+            except Exception as e:
+                logger.error(f"Erro ao liberar lock {name}: {e}")
+            return
+        with self._tags_lock:
+            current = self._local_locks.get(lock_key)
+            if current is not None and current[0] == token:
+                del self._local_locks[lock_key]
+
+    # ---- Invalidação entre processos ----
+
+    def _publish(self, message: Dict[str, Any]):
+        if self.redis is None:
+            return
+        try:
+            message['origin'] = self.instance_id
+            self.redis.publish(self.CHANNEL, json.dumps(message))
+        except Exception as e:
+            logger.error(f"Erro ao publicar invalidação de cache: {e}")
+
+    def handle_invalidation(self, raw: Any):
+        """Aplica uma mensagem de invalidação recebida de outro worker"""
+        message = json.loads(raw)
+        if message.get('origin') == self.instance_id:
+            return
+        if 'keys' in message:
+            self.local.delete_many(message['keys'])
+        if 'pattern' in message:
+            if message['pattern'] == '*':
+                self.local.clear()
+            else:
+                self._clear_local_pattern(message['pattern'])
+
+    def start_invalidation_listener(self):
+        """Assina o canal de invalidação em uma thread de background"""
+        if self.redis is None or self._listening:
+            return
+        self._listening = True
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def stop_invalidation_listener(self):
+        self._listening = False
+
+    def _listen(self):
+        while self._listening:
+            pubsub = None
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                # Mensagens perdidas durante a reconexão: descarta o L1 inteiro
+                self.local.clear()
+                while self._listening:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        self.handle_invalidation(message['data'])
+            except Exception as e:
+                logger.error(f"Erro no listener de invalidação de cache: {e}")
+                time.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    # ---- Métricas ----
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {name: stats.to_dict() for name, stats in list(self._stats.items())}
+        hits = sum(s['local_hits'] + s['redis_hits'] for s in namespaces.values())
+        total = hits + sum(s['misses'] for s in namespaces.values())
+        stats = {
+            'hit_ratio': round(hits / total, 4) if total else 0.0,
+            'redis_connected': self.redis is not None,
+            'codec': self.codec.describe(),
+            'local': self.local.stats(),
+            'namespaces': namespaces
+        }
+        if self.redis is not None:
+            try:
+                stats['redis_keys'] = self.redis.dbsize()
+            except Exception:
+                pass
+        return stats
+
+    def reset_stats(self):
+        self._stats.clear()
@@ -100,6 +100,8 @@ class Config:
     # Rate Limiting
     RATE_LIMIT_REQUESTS = int(os.getenv('RATE_LIMIT_REQUESTS', 100))
     RATE_LIMIT_PERIOD = int(os.getenv('RATE_LIMIT_PERIOD', 3600))  # 1 hour
+    RATE_LIMIT_ALGORITHM = os.getenv('RATE_LIMIT_ALGORITHM', 'gcra')  # gcra | sliding_window
+    RATE_LIMIT_MAX_LEASE = int(os.getenv('RATE_LIMIT_MAX_LEASE', '20'))
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -123,6 +125,29 @@ class Config:
     REDIS_SSL = os.getenv('REDIS_SSL', 'false').lower() == 'true'
     CACHE_TYPE = os.getenv('CACHE_TYPE', 'redis')
     CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', '300'))
+    CACHE_LOCAL_MAX_ENTRIES = int(os.getenv('CACHE_LOCAL_MAX_ENTRIES', '10000'))
+    CACHE_LOCAL_TTL = int(os.getenv('CACHE_LOCAL_TTL', '60'))
+    CACHE_CODEC = os.getenv('CACHE_CODEC', 'msgpack')
+    CACHE_COMPRESSION = os.getenv('CACHE_COMPRESSION', 'lz4')
+    CACHE_COMPRESSION_THRESHOLD = int(os.getenv('CACHE_COMPRESSION_THRESHOLD', '1024'))
+    NOTIFICATION_UNREAD_RECONCILE_INTERVAL = int(os.getenv('NOTIFICATION_UNREAD_RECONCILE_INTERVAL', '300'))
+    
+    # ==== ROLLUPS DE ANALYTICS ====
+    # Compactador em background (desligado por padrão; alternativa: `flask analytics compact-rollups`
+    # em um agendador). Com Redis, um lock garante um único executor entre workers.
+    ANALYTICS_ROLLUP_COMPACTOR = os.getenv('ANALYTICS_ROLLUP_COMPACTOR', 'false').lower() == 'true'
+    ANALYTICS_ROLLUP_INTERVAL = int(os.getenv('ANALYTICS_ROLLUP_INTERVAL', '300'))
+    ANALYTICS_ROLLUP_BACKFILL_DAYS = int(os.getenv('ANALYTICS_ROLLUP_BACKFILL_DAYS', '400'))
+    
+    # ==== COMPRESSÃO DE RESPOSTAS ====
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))         # gzip 1-9
+    COMPRESS_BR_LEVEL = int(os.getenv('COMPRESS_BR_LEVEL', '4'))   # brotli 0-11
+    
+    # ==== AMOSTRAGEM DO SISTEMA ====
+    SYSTEM_SAMPLE_INTERVAL = int(os.getenv('SYSTEM_SAMPLE_INTERVAL', '10'))   # segundos
+    SYSTEM_SAMPLE_CAPACITY = int(os.getenv('SYSTEM_SAMPLE_CAPACITY', '360'))  # amostras no ring buffer
     
     # ==== CONFIGURAÇÕES DE CLOUD STORAGE ====
     CLOUD_STORAGE_PROVIDER = os.getenv('CLOUD_STORAGE_PROVIDER', 'local')  # aws, gcp, local
@@ -175,6 +200,17 @@ class Config:
     WEBSOCKET_ENABLED = os.getenv('WEBSOCKET_ENABLED', 'true').lower() == 'true'
     WEBSOCKET_PORT = int(os.getenv('WEBSOCKET_PORT', '5006'))
     COLLABORATION_ENABLED = os.getenv('COLLABORATION_ENABLED', 'true').lower() == 'true'
+    # Fila de mensagens Socket.IO (ex.: redis://...) para múltiplos workers
+    SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+    PRESENCE_REDIS_URL = os.getenv('PRESENCE_REDIS_URL', SOCKETIO_MESSAGE_QUEUE)
+    PRESENCE_FLUSH_INTERVAL = float(os.getenv('PRESENCE_FLUSH_INTERVAL', '0.5'))
+    # Intervalo (ms) dos frames agregados de cursor/digitação por sala
+    WEBSOCKET_COALESCE_TICK_MS = int(os.getenv('WEBSOCKET_COALESCE_TICK_MS', '75'))
+    # Edição colaborativa: persistência em lote com debounce (segundos)
+    COLLABORATION_REDIS_URL = os.getenv('COLLABORATION_REDIS_URL', PRESENCE_REDIS_URL)
+    COLLABORATION_FLUSH_INTERVAL = float(os.getenv('COLLABORATION_FLUSH_INTERVAL', '2'))
+    COLLABORATION_SAVE_DEBOUNCE = float(os.getenv('COLLABORATION_SAVE_DEBOUNCE', '2'))
+    COLLABORATION_SAVE_MAX_DELAY = float(os.getenv('COLLABORATION_SAVE_MAX_DELAY', '10'))
     
     # ==== CONFIGURAÇÕES DE PERFORMANCE ====
     # Paginação
@@ -311,6 +347,7 @@ class TestingConfig(Config):
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=5)
     WTF_CSRF_ENABLED = False
     BACKUP_ENABLED = False
+    ANALYTICS_ROLLUP_COMPACTOR = False
 
 config = {
     'development': DevelopmentConfig,
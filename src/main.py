@@ -2,7 +2,7 @@
 import os
 import sys
 import traceback
-from flask import Flask, jsonify, request, g, current_app
+from flask import Flask, jsonify, g, current_app
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
@@ -18,7 +18,7 @@ os.chdir(project_root)
 
 from src.extensions import db, jwt, cors, migrate, init_extensions, bcrypt
 from src.config import config
-from src.utils.logger import setup_logging, log_request, log_response, metrics_collector
+from src.utils.logger import setup_logging, metrics_collector
 from src.utils.backup_simple import BackupManager
 
 # Importar sistemas de monitoramento e auditoria
@@ -59,31 +59,18 @@ def create_app(config_name=None):
     from src.middleware.security import security_middleware
     security_middleware.init_app(app)
     
-    # Middleware para logging e métricas
-    @app.before_request
-    def before_request():
-        log_request()
-        metrics_collector.increment('requests')
-        
-        # Log user activity for metrics
-        from flask_jwt_extended import get_jwt_identity
-        try:
-            if request.endpoint and request.endpoint != 'static':
-                user_id = get_jwt_identity()
-                if user_id:
-                    metrics_collector.increment('users_active', user_id)
-        except:
-            pass  # JWT not required for this endpoint
+    # Instrumentação de requisições: um hook mede e os sinks recebem em background
+    from src.monitoring.request_timing import SlowLogSink, init_request_timing
+    from src.monitoring.performance_metrics import monitor as performance_monitor
+    init_request_timing(app, [
+        metrics_collector,
+        performance_monitor,
+        SlowLogSink(app.config.get('SLOW_REQUEST_THRESHOLD_MS', 1000), app.logger)
+    ])
     
-    @app.after_request
-    def after_request(response):
-        log_response(response)
-        
-        # Count errors
-        if response.status_code >= 400:
-            metrics_collector.increment('errors')
-        
-        return response
+    # Compressão br/gzip das respostas textuais (configuração COMPRESS_*)
+    from src.performance.compression import init_compression
+    init_compression(app)
     
     # Importar modelos
     from src.models.user import User
@@ -3,7 +3,6 @@ from datetime import datetime, timedelta
 from typing import Dict, Any
 from flask import request, g, current_app
 from functools import wraps
-import time
 
 from src.config import Config
 
@@ -26,10 +25,7 @@ class SecurityMiddleware:
     
     def before_request(self):
         """Executado antes de cada requisição"""
-        g.start_time = time.time()
-        
-        # Log da requisição
-        self.log_request()
+        # Tempo e log da requisição ficam na instrumentação única (src/monitoring/request_timing.py)
         
         # Verificar rate limiting
         if self.is_rate_limited():
@@ -51,9 +47,6 @@ class SecurityMiddleware:
         # Adicionar headers de segurança
         self.add_security_headers(response)
         
-        # Log da resposta
-        self.log_response(response)
-        
         return response
     
     def teardown(self, exception=None):
@@ -181,34 +174,6 @@ class SecurityMiddleware:
                     
         except Exception as e:
             self.logger.error(f"Erro na detecção de ataques: {str(e)}")
-    
-    def log_request(self):
-        """Log detalhado da requisição"""
-        try:
-            ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-            user_agent = request.headers.get('User-Agent', '')
-            
-            self.logger.info(
-                f"Request: {request.method} {request.path} - "
-                f"IP: {ip} - "
-                f"User-Agent: {user_agent[:100]}..."
-            )
-            
-        except Exception as e:
-            self.logger.error(f"Erro no log da requisição: {str(e)}")
-    
-    def log_response(self, response):
-        """Log da resposta"""
-        try:
-            duration = time.time() - g.get('start_time', time.time())
-            
-            self.logger.info(
-                f"Response: {response.status_code} - "
-                f"Duration: {duration:.3f}s"
-            )
-            
-        except Exception as e:
-            self.logger.error(f"Erro no log da resposta: {str(e)}")
 
 # Instância global do middleware
 security_middleware = SecurityMiddleware() 
\ No newline at end of file
@@ -0,0 +1,85 @@
+from src.extensions import db
+from datetime import datetime
+from sqlalchemy import Index
+
+# Contadores diários por usuário (nome da coluna -> descrição). A ordem define
+# a ordem das colunas e é usada pelo compactador e pelas leituras agregadas.
+ACTIVITY_COUNTERS = {
+    'documents_created': 'Documentos criados',
+    'documents_updated': 'Documentos atualizados (criados em dias anteriores)',
+    'documents_size': 'Soma do tamanho estimado (caracteres) dos documentos criados',
+    'cards_created': 'Cards criados em boards do usuário (dono ou equipe)',
+    'cards_completed': 'Cards concluídos em boards do usuário (dono ou equipe)',
+    'cards_completed_own': 'Cards criados pelo usuário e concluídos',
+    'cards_completed_on_time': 'Cards criados pelo usuário concluídos até o prazo',
+    'cards_completed_with_deadline': 'Cards criados pelo usuário concluídos e com prazo',
+    'minutes_logged': 'Minutos registrados',
+    'billable_minutes': 'Minutos faturáveis registrados',
+    'wiki_articles': 'Artigos publicados',
+    'wiki_comments': 'Comentários feitos',
+    'wiki_likes_given': 'Curtidas dadas',
+    'wiki_likes_received': 'Curtidas recebidas nos artigos do usuário',
+    'ai_requests': 'Requisições de IA',
+    'ai_successful': 'Requisições de IA bem-sucedidas',
+    'ai_tokens': 'Tokens de IA consumidos',
+    'ai_response_ms': 'Soma do tempo de resposta da IA (ms)',
+    'notifications_received': 'Notificações recebidas',
+    'notifications_read': 'Notificações lidas',
+    'notification_read_seconds': 'Soma do tempo até a leitura (s)',
+}
+
+
+class UserDailyActivity(db.Model):
+    """Rollup diário de atividade por usuário (mantido pelo compactador de analytics)"""
+    __tablename__ = 'analytics_daily_activity'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+
+    documents_created = db.Column(db.Integer, nullable=False, default=0)
+    documents_updated = db.Column(db.Integer, nullable=False, default=0)
+    documents_size = db.Column(db.BigInteger, nullable=False, default=0)
+    cards_created = db.Column(db.Integer, nullable=False, default=0)
+    cards_completed = db.Column(db.Integer, nullable=False, default=0)
+    cards_completed_own = db.Column(db.Integer, nullable=False, default=0)
+    cards_completed_on_time = db.Column(db.Integer, nullable=False, default=0)
+    cards_completed_with_deadline = db.Column(db.Integer, nullable=False, default=0)
+    minutes_logged = db.Column(db.Integer, nullable=False, default=0)
+    billable_minutes = db.Column(db.Integer, nullable=False, default=0)
+    wiki_articles = db.Column(db.Integer, nullable=False, default=0)
+    wiki_comments = db.Column(db.Integer, nullable=False, default=0)
+    wiki_likes_given = db.Column(db.Integer, nullable=False, default=0)
+    wiki_likes_received = db.Column(db.Integer, nullable=False, default=0)
+    ai_requests = db.Column(db.Integer, nullable=False, default=0)
+    ai_successful = db.Column(db.Integer, nullable=False, default=0)
+    ai_tokens = db.Column(db.BigInteger, nullable=False, default=0)
+    ai_response_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    notifications_received = db.Column(db.Integer, nullable=False, default=0)
+    notifications_read = db.Column(db.Integer, nullable=False, default=0)
+    notification_read_seconds = db.Column(db.BigInteger, nullable=False, default=0)
+
+    # Eventos de atividade do dia por hora (UTC): 24 contadores uint16 little-endian;
+    # nulo quando o usuário não teve atividade própria no dia
+    hourly_activity = db.Column(db.LargeBinary(48))
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        data = {'user_id': self.user_id, 'day': self.day.isoformat()}
+        data.update({name: getattr(self, name) for name in ACTIVITY_COUNTERS})
+        return data
+
+
+class UserDailyBreakdown(db.Model):
+    """Contagens diárias por categoria (tipo de documento, tipo de requisição de IA...)"""
+    __tablename__ = 'analytics_daily_breakdown'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    metric = db.Column(db.String(30), primary_key=True)  # 'document_type', 'ai_request_type', 'notification_type'
+    key = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+Index('idx_analytics_daily_activity_day', UserDailyActivity.day)
+Index('idx_analytics_daily_breakdown_metric', UserDailyBreakdown.user_id, UserDailyBreakdown.metric, UserDailyBreakdown.day)
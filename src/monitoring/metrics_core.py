@@ -0,0 +1,504 @@
+"""
+Núcleo de métricas sem lock no caminho quente
+
+Cada thread escreve no seu próprio shard, e as leituras somam os shards.
+Registrar um evento não cria objetos: um incremento é uma soma num atributo
+do shard, e um valor de histograma é um índice de bucket (frexp) mais
+algumas somas.
+
+- Counter: total acumulado e, opcionalmente, uma janela deslizante;
+- Histogram: buckets log-lineares fixos (8 por oitava, erro relativo de
+  até 12,5% nos quantis, a largura de um bucket), com p50/p95/p99
+  acumulados e na janela;
+- Gauge: último valor (atribuição simples, atômica no CPython);
+- LastSeen: chaves vistas recentemente (usuários ativos).
+
+A janela é um anel de fatias de tempo: cada fatia guarda a época
+(monotonic // duração da fatia) em que foi escrita, e fatias vencidas são
+zeradas na próxima escrita. Shards de threads encerradas são somados a um
+shard "aposentado", então a memória depende só de threads vivas × métricas
+e não do volume de eventos.
+"""
+import math
+import time
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_frexp = math.frexp
+_monotonic = time.monotonic
+
+SUB_BUCKETS = 8
+MIN_EXPONENT = -10    # menor bucket regular começa em 2^-11 (~0,0005)
+MAX_EXPONENT = 30     # maior bucket regular termina em 2^29 (~5e8)
+BUCKETS = (MAX_EXPONENT - MIN_EXPONENT) * SUB_BUCKETS + 2   # + underflow (0) e overflow (último)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _bounds() -> Tuple[List[float], List[float]]:
+    lower, upper = [0.0], [2.0 ** (MIN_EXPONENT - 1)]
+    for index in range(1, BUCKETS - 1):
+        exponent = (index - 1) // SUB_BUCKETS + MIN_EXPONENT
+        sub = (index - 1) % SUB_BUCKETS
+        width = 2.0 ** exponent / (2 * SUB_BUCKETS)
+        lower.append(2.0 ** (exponent - 1) + sub * width)
+        upper.append(2.0 ** (exponent - 1) + (sub + 1) * width)
+    lower.append(2.0 ** (MAX_EXPONENT - 1))
+    upper.append(float('inf'))
+    return lower, upper
+
+
+BUCKET_LOWER, BUCKET_UPPER = _bounds()
+
+
+def bucket_index(value: float) -> int:
+    """Bucket log-linear de um valor (0 para valores <= 0 ou abaixo da faixa)"""
+    if value <= 0:
+        return 0
+    mantissa, exponent = _frexp(value)
+    index = (exponent - MIN_EXPONENT) * SUB_BUCKETS + int((mantissa - 0.5) * (2 * SUB_BUCKETS)) + 1
+    if index < 0:
+        return 0
+    return index if index < BUCKETS else BUCKETS - 1
+
+
+def quantiles_from_buckets(buckets: List[int], count: int, qs: Iterable[float] = QUANTILES,
+                           low: float = None, high: float = None) -> Dict[str, float]:
+    """Quantis por interpolação linear dentro do bucket, limitados a [low, high]"""
+    result = {}
+    if not count:
+        return {f"p{int(q * 100)}": 0.0 for q in qs}
+    targets = sorted(qs)
+    cumulative = 0
+    position = 0
+    for index, bucket in enumerate(buckets):
+        if not bucket:
+            continue
+        while position < len(targets) and cumulative + bucket >= targets[position] * count:
+            fraction = (targets[position] * count - cumulative) / bucket
+            upper = BUCKET_UPPER[index] if index < BUCKETS - 1 else BUCKET_LOWER[index]
+            value = BUCKET_LOWER[index] + (upper - BUCKET_LOWER[index]) * fraction
+            if low is not None:
+                value = max(value, low)
+            if high is not None:
+                value = min(value, high)
+            result[f"p{int(targets[position] * 100)}"] = value
+            position += 1
+        cumulative += bucket
+    for q in targets[position:]:
+        result[f"p{int(q * 100)}"] = high if high is not None else BUCKET_LOWER[-1]
+    return result
+
+
+class Window:
+    """Janela deslizante de `seconds` dividida em `slots` fatias"""
+
+    def __init__(self, seconds: float = 60, slots: int = 6):
+        self.seconds = seconds
+        self.slots = slots
+        self.slot_seconds = seconds / slots
+        self.per_second = 1.0 / self.slot_seconds
+
+    def epoch(self, now: float = None) -> int:
+        return int((_monotonic() if now is None else now) * self.per_second)
+
+    def covered(self, started: float, now: float = None) -> float:
+        """Segundos efetivamente cobertos: fatias completas + a atual, limitado ao tempo de vida"""
+        now = _monotonic() if now is None else now
+        span = (self.slots - 1) * self.slot_seconds + (now % self.slot_seconds)
+        return max(min(span, now - started), 1e-9)
+
+
+class _Owner:
+    """Fica no threading.local; quando a thread termina devolve o shard ao agregado"""
+    __slots__ = ('metric', 'cell')
+
+    def __init__(self, metric: '_Sharded', cell):
+        self.metric = metric
+        self.cell = cell
+
+    def __del__(self):
+        try:
+            self.metric._retire(self.cell)
+        except Exception:
+            pass
+
+
+class _Sharded:
+    """Base das métricas com um shard por thread"""
+    kind = ''
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...] = (), window: Window = None):
+        self.name = name
+        self.labels = labels
+        self.window = window
+        self.started = _monotonic()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cells = []
+        self._retired = self._new_cell()
+
+    def _new_cell(self):
+        raise NotImplementedError
+
+    def _merge(self, into, cell):
+        raise NotImplementedError
+
+    def _register(self):
+        cell = self._new_cell()
+        with self._lock:
+            self._cells.append(cell)
+        self._local.cell = cell
+        self._local.owner = _Owner(self, cell)
+        return cell
+
+    def _retire(self, cell):
+        with self._lock:
+            self._cells = [live for live in self._cells if live is not cell]
+            self._merge(self._retired, cell)
+
+    def _all_cells(self) -> list:
+        with self._lock:
+            return self._cells + [self._retired]
+
+    def _merge_window(self, into, cell, *fields):
+        """Soma as fatias da janela de `cell` em `into` respeitando as épocas"""
+        for slot, epoch in enumerate(cell.epochs):
+            if epoch > into.epochs[slot]:
+                into.epochs[slot] = epoch
+                for field in fields:
+                    getattr(into, field)[slot] = getattr(cell, field)[slot]
+            elif epoch == into.epochs[slot] and epoch >= 0:
+                for field in fields:
+                    target = getattr(into, field)
+                    if isinstance(target[slot], list):
+                        target[slot] = [a + b for a, b in zip(target[slot], getattr(cell, field)[slot])]
+                    else:
+                        target[slot] += getattr(cell, field)[slot]
+
+    def _live_slots(self, cell, now_epoch: int) -> List[int]:
+        oldest = now_epoch - self.window.slots
+        return [slot for slot, epoch in enumerate(cell.epochs) if oldest < epoch <= now_epoch]
+
+    def reset(self):
+        with self._lock:
+            for cell in self._cells:
+                self._clear(cell)
+            self._retired = self._new_cell()
+            self.started = _monotonic()
+
+    def _clear(self, cell):
+        fresh = self._new_cell()
+        for field in fresh.__slots__:
+            setattr(cell, field, getattr(fresh, field))
+
+
+class _CounterCell:
+    __slots__ = ('value', 'epochs', 'counts')
+
+    def __init__(self, slots: int):
+        self.value = 0
+        self.epochs = [-1] * slots
+        self.counts = [0] * slots
+
+
+class Counter(_Sharded):
+    """Contador acumulado com taxa na janela deslizante"""
+    kind = 'counter'
+
+    def _new_cell(self):
+        return _CounterCell(self.window.slots if self.window else 0)
+
+    def _merge(self, into, cell):
+        into.value += cell.value
+        if self.window:
+            self._merge_window(into, cell, 'counts')
+
+    def inc(self, amount: float = 1):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._register()
+        cell.value += amount
+        window = self.window
+        if window is not None:
+            epoch = int(_monotonic() * window.per_second)
+            slot = epoch % window.slots
+            if cell.epochs[slot] != epoch:
+                cell.epochs[slot] = epoch
+                cell.counts[slot] = 0
+            cell.counts[slot] += amount
+
+    @property
+    def value(self) -> float:
+        return sum(cell.value for cell in self._all_cells())
+
+    def window_total(self) -> float:
+        if not self.window:
+            return 0
+        now_epoch = self.window.epoch()
+        return sum(cell.counts[slot] for cell in self._all_cells() for slot in self._live_slots(cell, now_epoch))
+
+    def rate(self, per: float = 1.0) -> float:
+        """Taxa na janela (por segundo, ou por `per` segundos: per=60 dá por minuto)"""
+        if not self.window:
+            return 0.0
+        return self.window_total() / self.window.covered(self.started) * per
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = {'value': self.value}
+        if self.window:
+            data['window_total'] = self.window_total()
+            data['rate_per_minute'] = round(self.rate(60), 3)
+        return data
+
+
+class _HistogramCell:
+    __slots__ = ('count', 'sum', 'min', 'max', 'buckets', 'epochs', 'w_counts', 'w_sums', 'w_buckets')
+
+    def __init__(self, slots: int):
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.buckets = [0] * BUCKETS
+        self.epochs = [-1] * slots
+        self.w_counts = [0] * slots
+        self.w_sums = [0.0] * slots
+        self.w_buckets = [[0] * BUCKETS for _ in range(slots)]
+
+
+_ZEROS = [0] * BUCKETS
+
+
+class Histogram(_Sharded):
+    """Histograma de buckets fixos com quantis acumulados e na janela"""
+    kind = 'histogram'
+
+    def _new_cell(self):
+        return _HistogramCell(self.window.slots if self.window else 0)
+
+    def _merge(self, into, cell):
+        into.count += cell.count
+        into.sum += cell.sum
+        into.min = min(into.min, cell.min)
+        into.max = max(into.max, cell.max)
+        into.buckets = [a + b for a, b in zip(into.buckets, cell.buckets)]
+        if self.window:
+            self._merge_window(into, cell, 'w_counts', 'w_sums', 'w_buckets')
+
+    def observe(self, value: float):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = self._register()
+        cell.count += 1
+        cell.sum += value
+        if value < cell.min:
+            cell.min = value
+        if value > cell.max:
+            cell.max = value
+
+        # bucket_index em linha (evita uma chamada por evento)
+        if value > 0:
+            mantissa, exponent = _frexp(value)
+            index = (exponent - MIN_EXPONENT) * SUB_BUCKETS + int((mantissa - 0.5) * (2 * SUB_BUCKETS)) + 1
+            if index < 0:
+                index = 0
+            elif index >= BUCKETS:
+                index = BUCKETS - 1
+        else:
+            index = 0
+        cell.buckets[index] += 1
+
+        window = self.window
+        if window is not None:
+            epoch = int(_monotonic() * window.per_second)
+            slot = epoch % window.slots
+            if cell.epochs[slot] != epoch:
+                cell.epochs[slot] = epoch
+                cell.w_counts[slot] = 0
+                cell.w_sums[slot] = 0.0
+                cell.w_buckets[slot][:] = _ZEROS
+            cell.w_counts[slot] += 1
+            cell.w_sums[slot] += value
+            cell.w_buckets[slot][index] += 1
+
+    def time(self) -> 'Timer':
+        """Context manager que observa a duração do bloco em milissegundos"""
+        return Timer(self)
+
+    def _collect(self, windowed: bool) -> Tuple[int, float, List[int], float, float]:
+        cells = self._all_cells()
+        buckets = [0] * BUCKETS
+        count, total = 0, 0.0
+        low, high = float('inf'), float('-inf')
+        if windowed:
+            now_epoch = self.window.epoch()
+            for cell in cells:
+                for slot in self._live_slots(cell, now_epoch):
+                    count += cell.w_counts[slot]
+                    total += cell.w_sums[slot]
+                    buckets = [a + b for a, b in zip(buckets, cell.w_buckets[slot])]
+        else:
+            for cell in cells:
+                count += cell.count
+                total += cell.sum
+                buckets = [a + b for a, b in zip(buckets, cell.buckets)]
+        for cell in cells:
+            if cell.count:
+                low, high = min(low, cell.min), max(high, cell.max)
+        return count, total, buckets, low, high
+
+    def _summary(self, windowed: bool) -> Dict[str, Any]:
+        count, total, buckets, low, high = self._collect(windowed)
+        data = {'count': count, 'sum': total, 'avg': total / count if count else 0}
+        if not windowed:
+            data['min'] = low if count else 0
+            data['max'] = high if count else 0
+        data.update(quantiles_from_buckets(buckets, count, low=low if count else None,
+                                           high=high if count else None))
+        return data
+
+    def summary(self) -> Dict[str, Any]:
+        """count, sum, avg, min, max, p50, p95, p99 desde o início"""
+        return self._summary(False)
+
+    def window_summary(self) -> Dict[str, Any]:
+        """count, sum, avg e quantis só na janela deslizante"""
+        if not self.window:
+            return {}
+        data = self._summary(True)
+        data['rate_per_minute'] = round(data['count'] / self.window.covered(self.started) * 60, 3)
+        return data
+
+    def quantile(self, q: float, windowed: bool = False) -> float:
+        count, _, buckets, low, high = self._collect(windowed and bool(self.window))
+        return quantiles_from_buckets(buckets, count, (q,), low, high)[f"p{int(q * 100)}"]
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = self.summary()
+        if self.window:
+            data['window'] = self.window_summary()
+        return data
+
+
+class Timer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe((time.perf_counter() - self.started) * 1000)
+
+
+class Gauge:
+    """Último valor definido"""
+    kind = 'gauge'
+    __slots__ = ('name', 'labels', 'value', 'updated_at')
+
+    def __init__(self, name: str, labels: Tuple[Tuple[str, str], ...] = (), window: Window = None):
+        self.name = name
+        self.labels = labels
+        self.value = 0.0
+        self.updated_at = 0.0
+
+    def set(self, value: float):
+        self.value = value
+        self.updated_at = _monotonic()
+
+    def reset(self):
+        self.value = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'value': self.value}
+
+
+class LastSeen:
+    """Chaves vistas nos últimos `ttl` segundos; escrita é uma atribuição em dict"""
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._seen: Dict[Any, float] = {}
+
+    def touch(self, key):
+        self._seen[key] = _monotonic()
+
+    def count(self) -> int:
+        """Quantidade de chaves ativas; remove as vencidas"""
+        cutoff = _monotonic() - self.ttl
+        active = 0
+        for key, seen_at in list(self._seen.items()):
+            if seen_at >= cutoff:
+                active += 1
+            elif self._seen.get(key, cutoff) < cutoff:
+                self._seen.pop(key, None)
+        return active
+
+    def reset(self):
+        self._seen.clear()
+
+
+def label_key(labels: Optional[Dict[str, Any]]) -> Tuple[Tuple[str, str], ...]:
+    if not labels:
+        return ()
+    return tuple(sorted((str(key), str(value)) for key, value in labels.items()))
+
+
+class MetricsRegistry:
+    """Registro de métricas por (tipo, nome, labels)
+
+    Obter uma métrica é uma consulta em dict; guarde a referência nos caminhos
+    quentes (ex.: no decorador) para não montar a chave de labels a cada evento.
+    """
+
+    def __init__(self, default_window: Window = None):
+        self.default_window = default_window
+        self._metrics: Dict[Tuple[str, str, tuple], Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, labels, window):
+        key = (cls.kind, name, labels if isinstance(labels, tuple) else label_key(labels))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls(name, key[2], window=window)
+        return metric
+
+    def counter(self, name: str, labels: Dict[str, Any] = None, window: Window = None) -> Counter:
+        return self._get(Counter, name, labels, window)
+
+    def histogram(self, name: str, labels: Dict[str, Any] = None, window: Window = None) -> Histogram:
+        return self._get(Histogram, name, labels, window)
+
+    def gauge(self, name: str, labels: Dict[str, Any] = None) -> Gauge:
+        return self._get(Gauge, name, labels, None)
+
+    def metrics(self, kind: str = None) -> List[Any]:
+        return [metric for (metric_kind, _, _), metric in list(self._metrics.items())
+                if kind is None or metric_kind == kind]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """{'counters': {...}, 'gauges': {...}, 'histograms': {...}} com nomes `nome#k=v,...`"""
+        result = {'counters': {}, 'gauges': {}, 'histograms': {}}
+        for metric in self.metrics():
+            result[metric.kind + 's'][full_name(metric.name, metric.labels)] = metric.snapshot()
+        return result
+
+    def reset(self):
+        for metric in self.metrics():
+            metric.reset()
+
+
+def full_name(name: str, labels: Tuple[Tuple[str, str], ...]) -> str:
+    """Nome com labels no formato `nome#k=v,k2=v2` (ordem alfabética)"""
+    if not labels:
+        return name
+    return f"{name}#{','.join(f'{key}={value}' for key, value in labels)}"
@@ -4,14 +4,15 @@ Métricas em tempo real para aplicação jurídica
 """
 import time
 import psutil
-import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from collections import deque
 import logging
 import json
 
+from src.monitoring.system_sampler import SystemSample, SystemSampler, system_sampler
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -21,9 +22,10 @@ class SystemMetrics:
     cpu_usage: float
     memory_usage: float
     disk_usage: float
-    network_io: Dict[str, int]
+    network_io: Dict[str, float]
     active_connections: int
     response_time: float
+    disk_io: Dict[str, float] = field(default_factory=dict)
 
 @dataclass
 class ApplicationMetrics:
@@ -39,18 +41,20 @@ class ApplicationMetrics:
 class PerformanceMonitor:
     """Monitor de performance em tempo real"""
     
-    def __init__(self, retention_minutes: int = 60):
+    SAMPLE_EVERY = 10  # segundos
+    
+    def __init__(self, retention_minutes: int = 60, sampler: SystemSampler = None):
         self.retention_minutes = retention_minutes
         self.max_samples = retention_minutes * 6  # 1 sample a cada 10s
+        self.sampler = sampler or system_sampler
         
         # Buffers circulares para métricas
         self.system_metrics = deque(maxlen=self.max_samples)
         self.app_metrics = deque(maxlen=self.max_samples)
         self.request_logs = deque(maxlen=1000)
         
-        # Threading para coleta contínua
+        # Coleta contínua: amostras do sampler compartilhado
         self.monitoring_active = False
-        self.monitor_thread = None
         
         # Contadores para métricas da aplicação
         self.request_counter = 0
@@ -76,75 +80,57 @@ class PerformanceMonitor:
             return
         
         self.monitoring_active = True
-        self.monitor_thread = threading.Thread(target=self._monitoring_loop, daemon=True)
-        self.monitor_thread.start()
+        self.sampler.subscribe(self._on_sample, every=self.SAMPLE_EVERY)
+        self.sampler.start()
         logger.info("Monitoramento de performance iniciado")
     
     def stop_monitoring(self):
         """Parar monitoramento"""
         self.monitoring_active = False
-        if self.monitor_thread:
-            self.monitor_thread.join(timeout=5)
+        self.sampler.unsubscribe(self._on_sample)
         logger.info("Monitoramento de performance parado")
     
-    def _monitoring_loop(self):
-        """Loop principal de monitoramento"""
-        while self.monitoring_active:
-            try:
-                # Coletar métricas do sistema
-                system_metrics = self._collect_system_metrics()
-                self.system_metrics.append(system_metrics)
-                
-                # Coletar métricas da aplicação
-                app_metrics = self._collect_app_metrics()
-                self.app_metrics.append(app_metrics)
-                
-                # Verificar alertas
-                self._check_alerts(system_metrics, app_metrics)
-                
-                time.sleep(10)  # Coleta a cada 10 segundos
-                
-            except Exception as e:
-                logger.error(f"Erro no loop de monitoramento: {e}")
-                time.sleep(30)  # Aguardar mais tempo em caso de erro
-    
-    def _collect_system_metrics(self) -> SystemMetrics:
-        """Coletar métricas do sistema operacional"""
-        
-        # CPU
-        cpu_usage = psutil.cpu_percent(interval=1)
-        
-        # Memória
-        memory = psutil.virtual_memory()
-        memory_usage = memory.percent
-        
-        # Disco
-        disk = psutil.disk_usage('/')
-        disk_usage = disk.percent
-        
-        # Rede
-        network = psutil.net_io_counters()
-        network_io = {
-            'bytes_sent': network.bytes_sent,
-            'bytes_recv': network.bytes_recv,
-            'packets_sent': network.packets_sent,
-            'packets_recv': network.packets_recv
-        }
+    def _on_sample(self, sample: SystemSample):
+        """Recebe cada amostra do sampler (na thread dele)"""
+        system_metrics = self._collect_system_metrics(sample)
+        self.system_metrics.append(system_metrics)
         
-        # Conexões ativas (simulado)
-        active_connections = len(psutil.net_connections())
+        # Coletar métricas da aplicação
+        app_metrics = self._collect_app_metrics()
+        self.app_metrics.append(app_metrics)
         
-        # Tempo de resposta simulado
-        response_time = self._get_average_response_time()
+        # Verificar alertas
+        self._check_alerts(system_metrics, app_metrics)
+    
+    def _collect_system_metrics(self, sample: Optional[SystemSample] = None) -> Optional[SystemMetrics]:
+        """Métricas do sistema a partir de uma amostra do sampler compartilhado
+
+        Sem amostra, usa a última publicada (None antes da primeira): ler os
+        contadores aqui trocaria a base dos deltas da thread do sampler.
+        """
+        sample = sample or self.sampler.latest()
+        if sample is None:
+            return None
         
         return SystemMetrics(
-            timestamp=datetime.now(),
-            cpu_usage=cpu_usage,
-            memory_usage=memory_usage,
-            disk_usage=disk_usage,
-            network_io=network_io,
-            active_connections=active_connections,
-            response_time=response_time
+            timestamp=datetime.fromtimestamp(sample.timestamp),
+            cpu_usage=sample.cpu_percent,
+            memory_usage=sample.memory_percent,
+            disk_usage=sample.disk_percent,
+            network_io={
+                'bytes_sent': sample.net_bytes_sent,
+                'bytes_recv': sample.net_bytes_recv,
+                'packets_sent': sample.net_packets_sent,
+                'packets_recv': sample.net_packets_recv,
+                'bytes_sent_per_sec': sample.net_sent_rate,
+                'bytes_recv_per_sec': sample.net_recv_rate
+            },
+            active_connections=sample.connections,
+            response_time=self._get_average_response_time(),
+            disk_io={
+                'read_bytes_per_sec': sample.disk_read_rate,
+                'write_bytes_per_sec': sample.disk_write_rate
+            }
         )
     
     def _collect_app_metrics(self) -> ApplicationMetrics:
@@ -296,6 +282,12 @@ class PerformanceMonitor:
         
         self.request_logs.append(request_log)
     
+    def handle(self, records):
+        """Sink da instrumentação de requisições (tempos em ms)"""
+        for record in records:
+            self.log_request(record.ip, record.label, record.method,
+                             record.duration_ms, record.status)
+    
     def get_current_status(self) -> Dict[str, Any]:
         """Obter status atual do sistema"""
         
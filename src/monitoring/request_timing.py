@@ -0,0 +1,291 @@
+"""
+Instrumentação única de requisições HTTP
+
+Um só par de hooks (before/after_request) mede cada requisição e monta um
+RequestRecord com rota (template, não o path), status, duração total e a
+quebra do tempo gasto em banco, cache e IA. O registro é enfileirado e uma
+thread entrega os lotes aos sinks (métricas, auditoria, log de lentas), de
+modo que a requisição só paga a medição e um `put` na fila.
+
+Quem gasta tempo fora da view informa a requisição corrente:
+
+    with timed('ai'):
+        response = client.chat.completions.create(...)
+
+O tempo de banco (e o profiling por fingerprint) vem dos eventos de cursor
+instalados pelo SQLProfiler (sql_profiler.py).
+"""
+import os
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from flask import g, request
+
+from src.security.audit_writer import BatchWriter
+
+try:
+    from flask_jwt_extended import get_jwt_identity
+    JWT_AVAILABLE = True
+except ImportError:
+    JWT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPONENTS = ('db', 'cache', 'ai')
+UNMATCHED_ROUTE = '<unmatched>'
+
+_active: ContextVar[Optional['RequestRecord']] = ContextVar('request_timing', default=None)
+
+
+@dataclass
+class RequestRecord:
+    """Medição de uma requisição (tempos em ms)"""
+    request_id: str
+    method: str
+    started: float                  # perf_counter no início
+    started_at: float               # epoch no início
+    route: Optional[str] = None     # template da regra, ex.: /api/documents/<int:id>
+    endpoint: Optional[str] = None
+    path: str = ''
+    status: int = 0
+    duration_ms: float = 0.0
+    response_size: Optional[int] = None
+    ip: Optional[str] = None
+    user_agent: str = ''
+    user_id: Optional[str] = None
+    breakdown: Dict[str, float] = field(default_factory=dict)
+    calls: Dict[str, int] = field(default_factory=dict)
+    queries: Dict[str, list] = field(default_factory=dict)   # fingerprint -> [execuções, ms, máx. ms, statement]
+
+    def add(self, component: str, seconds: float):
+        self.breakdown[component] = self.breakdown.get(component, 0.0) + seconds * 1000
+        self.calls[component] = self.calls.get(component, 0) + 1
+
+    @property
+    def label(self) -> str:
+        """Rota usada como rótulo de métricas (sem cardinalidade por path)"""
+        return self.route or UNMATCHED_ROUTE
+
+    @property
+    def other_ms(self) -> float:
+        """Tempo fora de banco, cache e IA (view, serialização, hooks)"""
+        return max(self.duration_ms - sum(self.breakdown.values()), 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'request_id': self.request_id,
+            'timestamp': datetime.utcfromtimestamp(self.started_at).isoformat(),
+            'method': self.method,
+            'route': self.label,
+            'endpoint': self.endpoint,
+            'path': self.path,
+            'status_code': self.status,
+            'duration_ms': round(self.duration_ms, 3),
+            'breakdown_ms': {name: round(value, 3) for name, value in self.breakdown.items()},
+            'calls': dict(self.calls),
+            'other_ms': round(self.other_ms, 3),
+            'response_size': self.response_size,
+            'ip': self.ip,
+            'user_id': self.user_id
+        }
+
+
+def current_record() -> Optional[RequestRecord]:
+    """Registro da requisição em andamento (None fora de requisição)"""
+    return _active.get()
+
+
+def add_time(component: str, seconds: float):
+    """Soma `seconds` ao componente da requisição corrente, se houver"""
+    record = _active.get()
+    if record is not None:
+        record.add(component, seconds)
+
+
+@contextmanager
+def timed(component: str):
+    """Mede o bloco e atribui o tempo ao componente da requisição corrente"""
+    record = _active.get()
+    if record is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.add(component, time.perf_counter() - started)
+
+
+def _current_user_id() -> Optional[str]:
+    if not JWT_AVAILABLE:
+        return None
+    try:
+        identity = get_jwt_identity()
+    except Exception:
+        # Rota sem verificação de JWT
+        return None
+    return str(identity) if identity is not None else None
+
+
+class RequestInstrumentation:
+    """Hooks únicos de medição e despacho assíncrono para os sinks"""
+
+    def __init__(self, app=None, sinks: Iterable[Any] = None):
+        self.sinks = tuple(sinks or ())
+        self.writer = None
+        self.response_header = True
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.response_header = app.config.get('REQUEST_TIMING_HEADER', True)
+        self.writer = BatchWriter(
+            self._dispatch,
+            max_queue=app.config.get('REQUEST_TIMING_QUEUE', 10000),
+            batch_size=500,
+            flush_interval=0.5,
+            block_timeout=0,
+            name='request-timing'
+        )
+        self.writer.start()
+
+        # Primeiro before_request e último after_request: mede também os demais hooks
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.after_request_funcs.setdefault(None, []).insert(0, self._finish)
+        app.teardown_request(self._teardown)
+        app.extensions['request_timing'] = self
+
+        from src.monitoring.sql_profiler import sql_profiler
+        sql_profiler.init_app(app, self)
+
+    def add_sink(self, sink: Any):
+        """Registra um sink (objeto com `handle(records)`); chamado na thread de despacho"""
+        if sink not in self.sinks:
+            self.sinks = self.sinks + (sink,)
+
+    def _start(self):
+        req = request._get_current_object()
+        record = RequestRecord(
+            request_id=req.headers.get('X-Request-ID', '')[:64] or os.urandom(4).hex(),
+            method=req.method,
+            started=time.perf_counter(),
+            started_at=time.time()
+        )
+        g.request_id = record.request_id
+        g.request_timing = record
+        _active.set(record)
+
+    def _finish(self, response):
+        record = g.pop('request_timing', None)
+        _active.set(None)
+        if record is None:
+            return response
+
+        duration = time.perf_counter() - record.started
+        req = request._get_current_object()
+        record.duration_ms = duration * 1000
+        record.status = response.status_code
+        record.route = req.url_rule.rule if req.url_rule is not None else None
+        record.endpoint = req.endpoint
+        record.path = req.path
+        record.ip = req.headers.get('X-Forwarded-For', req.remote_addr)
+        record.user_agent = req.headers.get('User-Agent', '')[:200]
+        record.user_id = _current_user_id()
+        if not response.is_streamed:
+            record.response_size = response.content_length
+
+        if self.response_header:
+            response.headers['X-Response-Time'] = f"{duration:.3f}s"
+        self.writer.submit(record)
+        return response
+
+    def _teardown(self, exception=None):
+        _active.set(None)
+
+    def _dispatch(self, records: List[RequestRecord]):
+        for sink in self.sinks:
+            try:
+                sink.handle(records)
+            except Exception as e:
+                logger.error(f"Erro no sink de requisições {type(sink).__name__}: {e}")
+
+    def flush(self, timeout: float = 5.0):
+        """Entrega aos sinks tudo o que está na fila (síncrono)"""
+        if self.writer is not None:
+            self.writer.flush(timeout)
+
+
+def init_request_timing(app, sinks: Iterable[Any] = None) -> RequestInstrumentation:
+    """Instala a instrumentação uma vez por app e acrescenta `sinks`"""
+    instrumentation = app.extensions.get('request_timing')
+    if instrumentation is None:
+        instrumentation = RequestInstrumentation(app)
+    for sink in sinks or ():
+        instrumentation.add_sink(sink)
+    return instrumentation
+
+
+# === SINKS ===
+
+class MetricsSink:
+    """Métricas por rota e quebra por componente no MonitoringService"""
+
+    def __init__(self, service=None):
+        self.service = service
+        self.enabled = True
+
+    def _resolve(self):
+        if self.service is None and self.enabled:
+            try:
+                from src.services.monitoring_service import monitoring_service
+                self.service = monitoring_service
+            except ImportError as e:
+                self.enabled = False
+                logger.error(f"Métricas de requisição desativadas: {e}")
+        return self.service
+
+    def handle(self, records: List[RequestRecord]):
+        service = self._resolve()
+        if service is None:
+            return
+        for record in records:
+            service.record_request(record.method, record.label, record.status,
+                                   record.duration_ms / 1000, record.user_id, record.breakdown)
+
+
+class AuditSink:
+    """Encaminha as requisições para a trilha de auditoria HTTP"""
+
+    def __init__(self, audit_logger):
+        self.audit_logger = audit_logger
+
+    def handle(self, records: List[RequestRecord]):
+        for record in records:
+            self.audit_logger.log_http_request(record)
+
+
+class SlowLogSink:
+    """Loga requisições acima do limite com a quebra de tempo"""
+
+    def __init__(self, threshold_ms: float = 1000.0, log: logging.Logger = None):
+        self.threshold_ms = threshold_ms
+        self.log = log or logger
+
+    def handle(self, records: List[RequestRecord]):
+        for record in records:
+            if record.duration_ms < self.threshold_ms:
+                continue
+            parts = ', '.join(
+                f"{name} {record.breakdown[name]:.0f}ms/{record.calls[name]}"
+                for name in COMPONENTS if name in record.breakdown
+            )
+            self.log.warning(
+                f"Requisição lenta [{record.request_id}]: {record.method} {record.label} "
+                f"{record.status} {record.duration_ms:.0f}ms ({parts or 'sem I/O medido'}, "
+                f"resto {record.other_ms:.0f}ms)"
+            )
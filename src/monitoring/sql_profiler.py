@@ -0,0 +1,337 @@
+"""
+Profiling de SQL por fingerprint e por requisição
+
+Cada statement é normalizado em um fingerprint (literais, binds e listas
+IN/VALUES viram `?`), de modo que a mesma query com valores diferentes é
+contada uma vez só. Durante uma requisição, contagem e tempo por
+fingerprint ficam no RequestRecord da instrumentação; ao fim, o sink
+agrega por rota e sinaliza N+1 (o mesmo fingerprint executado mais de
+`n_plus_one_threshold` vezes na mesma requisição, ex.: `pode_acessar`
+chamado por item de uma listagem).
+
+Queries acima de `slow_query_ms` têm o plano (EXPLAIN) capturado no
+máximo uma vez por fingerprint a cada `explain_interval` segundos.
+"""
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from flask import g
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.monitoring.request_timing import current_record
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_ROUTE = '<background>'
+MAX_ROUTES_PER_FINGERPRINT = 20
+STATEMENT_PREVIEW = 1000
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_BINDS = re.compile(r'%\(\w+\)s|%s|(?<![:\w]):\w+|\$\d+|\?')
+_NUMBERS = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])')
+_IN_LISTS = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_VALUES_ROWS = re.compile(r'(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+')
+_SPACES = re.compile(r'\s+')
+
+_EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN (FORMAT TEXT) ',
+    'mysql': 'EXPLAIN ',
+    'mariadb': 'EXPLAIN ',
+}
+
+
+@lru_cache(maxsize=4096)
+def normalize(statement: str) -> str:
+    """Texto do statement sem literais nem binds, com listas colapsadas"""
+    text = _COMMENTS.sub(' ', statement)
+    text = _STRINGS.sub('?', text)
+    text = _BINDS.sub('?', text)
+    text = _NUMBERS.sub('?', text)
+    text = _IN_LISTS.sub('IN (?)', text)
+    text = _VALUES_ROWS.sub(r'\1', text)
+    return _SPACES.sub(' ', text).strip()
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Identificador curto e estável do statement normalizado"""
+    return hashlib.md5(normalize(statement).encode()).hexdigest()[:12]
+
+
+@dataclass
+class FingerprintStats:
+    """Agregado de um fingerprint desde o último reset"""
+    fingerprint: str
+    statement: str
+    count: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    slow: int = 0
+    requests: int = 0
+    n_plus_one: int = 0
+    routes: Dict[str, List[float]] = field(default_factory=dict)   # rota -> [execuções, ms]
+    explain: Optional[Dict[str, Any]] = None
+
+    def add(self, count: int, total_ms: float, max_ms: float, route: str):
+        self.count += count
+        self.total_ms += total_ms
+        self.max_ms = max(self.max_ms, max_ms)
+        per_route = self.routes.get(route)
+        if per_route is None:
+            if len(self.routes) >= MAX_ROUTES_PER_FINGERPRINT:
+                return
+            per_route = self.routes[route] = [0, 0.0]
+        per_route[0] += count
+        per_route[1] += total_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        routes = sorted(self.routes.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'fingerprint': self.fingerprint,
+            'statement': self.statement,
+            'count': self.count,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0,
+            'max_ms': round(self.max_ms, 3),
+            'slow': self.slow,
+            'requests': self.requests,
+            'per_request': round(self.count / self.requests, 2) if self.requests else None,
+            'n_plus_one': self.n_plus_one,
+            'routes': [{'route': route, 'count': count, 'total_ms': round(ms, 3)}
+                       for route, (count, ms) in routes],
+            'explain': self.explain
+        }
+
+
+@dataclass
+class RouteStats:
+    """Queries por requisição de uma rota"""
+    requests: int = 0
+    queries: int = 0
+    db_ms: float = 0.0
+    max_queries: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'queries': self.queries,
+            'queries_per_request': round(self.queries / self.requests, 2) if self.requests else 0,
+            'db_ms_per_request': round(self.db_ms / self.requests, 3) if self.requests else 0,
+            'max_queries': self.max_queries
+        }
+
+
+class SQLProfiler:
+    """Eventos de cursor do SQLAlchemy -> tempo de banco da requisição + estatísticas por fingerprint"""
+
+    def __init__(self, slow_query_ms: float = 200.0, n_plus_one_threshold: int = 10,
+                 explain_interval: float = 600.0, max_fingerprints: int = 1000):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.explain_interval = explain_interval
+        self.max_fingerprints = max_fingerprints
+        self.response_header = False
+        self._lock = threading.Lock()
+        self._stats: 'OrderedDict[str, FingerprintStats]' = OrderedDict()
+        self._routes: Dict[str, RouteStats] = {}
+        self._n_plus_one = deque(maxlen=200)
+        self._explained: Dict[str, float] = {}
+        self._explaining = threading.local()
+        self.started_at = datetime.utcnow()
+
+    def init_app(self, app, instrumentation):
+        """Configura pelo app, instala os eventos e assina os registros da instrumentação"""
+        self.slow_query_ms = app.config.get('SQL_SLOW_QUERY_MS', self.slow_query_ms)
+        self.n_plus_one_threshold = app.config.get('SQL_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        self.explain_interval = app.config.get('SQL_EXPLAIN_INTERVAL', self.explain_interval)
+        self.response_header = app.config.get('SQL_PROFILE_HEADER', False)
+        self.install()
+        instrumentation.add_sink(self)
+        if self.response_header:
+            app.after_request(self._add_header)
+
+    def install(self):
+        """Registra os eventos de cursor em todas as engines (idempotente)"""
+        if not event.contains(Engine, 'before_cursor_execute', self._before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # === EVENTOS (thread da requisição) ===
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._profile_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_profile_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        elapsed_ms = elapsed * 1000
+        fp = fingerprint(statement)
+
+        record = current_record()
+        if record is not None:
+            record.add('db', elapsed)
+            per_query = record.queries.get(fp)
+            if per_query is None:
+                record.queries[fp] = [1, elapsed_ms, elapsed_ms, statement]
+            else:
+                per_query[0] += 1
+                per_query[1] += elapsed_ms
+                per_query[2] = max(per_query[2], elapsed_ms)
+        else:
+            self.track(statement, elapsed_ms)
+
+        if elapsed_ms >= self.slow_query_ms:
+            self._on_slow_query(conn, fp, statement, parameters, executemany, elapsed_ms)
+
+    def _on_slow_query(self, conn, fp, statement, parameters, executemany, elapsed_ms):
+        logger.warning(f"Query lenta ({elapsed_ms:.0f}ms) [{fp}]: {normalize(statement)[:300]}")
+        with self._lock:
+            self._stats_for(fp, statement).slow += 1
+            now = time.monotonic()
+            due = now - self._explained.get(fp, float('-inf')) >= self.explain_interval
+            if due:
+                self._explained[fp] = now
+        if due and not executemany:
+            plan = self._explain(conn, statement, parameters)
+            if plan is not None:
+                with self._lock:
+                    self._stats_for(fp, statement).explain = {
+                        'plan': plan,
+                        'duration_ms': round(elapsed_ms, 3),
+                        'captured_at': datetime.utcnow().isoformat()
+                    }
+
+    def _explain(self, conn, statement, parameters) -> Optional[List[str]]:
+        """Plano da query na mesma conexão, direto no DBAPI (sem disparar os eventos)"""
+        prefix = _EXPLAIN_PREFIX.get(conn.dialect.name)
+        if prefix is None or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return None
+        if getattr(self._explaining, 'active', False):
+            return None
+        self._explaining.active = True
+        try:
+            cursor = conn.connection.dbapi_connection.cursor()
+            try:
+                cursor.execute(prefix + statement, parameters)
+                return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Erro ao capturar EXPLAIN: {e}")
+            return None
+        finally:
+            self._explaining.active = False
+
+    def _add_header(self, response):
+        record = g.get('request_timing')
+        if record is not None and record.queries:
+            count = sum(per_query[0] for per_query in record.queries.values())
+            flagged = [f"{fp}x{per_query[0]}" for fp, per_query in record.queries.items()
+                       if per_query[0] > self.n_plus_one_threshold]
+            value = f"count={count}; time_ms={record.breakdown.get('db', 0.0):.1f}"
+            if flagged:
+                value += f"; n_plus_one={','.join(flagged)}"
+            response.headers['X-DB-Queries'] = value
+        return response
+
+    # === AGREGAÇÃO (thread de despacho) ===
+
+    def track(self, statement: str, elapsed_ms: float, route: str = BACKGROUND_ROUTE):
+        """Agrega uma execução avulsa (fora de requisição)"""
+        with self._lock:
+            self._stats_for(fingerprint(statement), statement).add(1, elapsed_ms, elapsed_ms, route)
+
+    def _stats_for(self, fp: str, statement: str) -> FingerprintStats:
+        stats = self._stats.get(fp)
+        if stats is None:
+            stats = self._stats[fp] = FingerprintStats(fp, normalize(statement)[:STATEMENT_PREVIEW])
+            if len(self._stats) > self.max_fingerprints:
+                evicted, _ = self._stats.popitem(last=False)
+                self._explained.pop(evicted, None)
+        else:
+            self._stats.move_to_end(fp)
+        return stats
+
+    def handle(self, records):
+        """Sink da instrumentação: agrega por rota e sinaliza N+1"""
+        with self._lock:
+            for record in records:
+                route = self._routes.get(record.label)
+                if route is None:
+                    route = self._routes[record.label] = RouteStats()
+                queries = record.calls.get('db', 0)
+                route.requests += 1
+                route.queries += queries
+                route.db_ms += record.breakdown.get('db', 0.0)
+                route.max_queries = max(route.max_queries, queries)
+
+                for fp, (count, total_ms, max_ms, statement) in record.queries.items():
+                    stats = self._stats_for(fp, statement)
+                    stats.add(count, total_ms, max_ms, record.label)
+                    stats.requests += 1
+                    if count > self.n_plus_one_threshold:
+                        stats.n_plus_one += 1
+                        self._n_plus_one.append({
+                            'timestamp': datetime.utcfromtimestamp(record.started_at).isoformat(),
+                            'request_id': record.request_id,
+                            'route': record.label,
+                            'fingerprint': fp,
+                            'count': count,
+                            'total_ms': round(total_ms, 3),
+                            'statement': stats.statement[:300]
+                        })
+                        logger.warning(f"Possível N+1 em {record.method} {record.label} "
+                                       f"[{record.request_id}]: {count}x [{fp}] {stats.statement[:200]}")
+
+    # === CONSULTA ===
+
+    def report(self, limit: int = 50, sort: str = 'total_ms') -> Dict[str, Any]:
+        """Resumo para o endpoint administrativo"""
+        with self._lock:
+            fingerprints = [stats.to_dict() for stats in self._stats.values()]
+            routes = {route: stats.to_dict() for route, stats in self._routes.items()}
+            n_plus_one = list(self._n_plus_one)
+        fingerprints.sort(key=lambda item: item.get(sort) or 0, reverse=True)
+        return {
+            'since': self.started_at.isoformat(),
+            'thresholds': {
+                'slow_query_ms': self.slow_query_ms,
+                'n_plus_one': self.n_plus_one_threshold
+            },
+            'fingerprints': fingerprints[:limit],
+            'routes': dict(sorted(routes.items(), key=lambda item: item[1]['queries_per_request'],
+                                  reverse=True)),
+            'n_plus_one': n_plus_one[::-1]
+        }
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        """Fingerprints com execuções acima do limite, mais lentos primeiro"""
+        with self._lock:
+            slow = [stats.to_dict() for stats in self._stats.values() if stats.slow]
+        return sorted(slow, key=lambda item: item['avg_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._routes.clear()
+            self._n_plus_one.clear()
+            self._explained.clear()
+            self.started_at = datetime.utcnow()
+
+
+# Instância global
+sql_profiler = SQLProfiler()
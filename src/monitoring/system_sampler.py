@@ -0,0 +1,268 @@
+"""
+Amostragem única das métricas do sistema
+
+Uma thread lê os contadores do sistema operacional a cada `interval`
+segundos e publica um SystemSample em um ring buffer. O PerformanceMonitor
+e o SystemMonitor leem desse buffer (ou assinam as amostras) em vez de
+coletar cada um por conta própria. Nada bloqueia e nada varre o host:
+
+- CPU (sistema e processo) e taxas de rede/disco por segundo saem da
+  diferença entre os contadores desta amostra e os da anterior, sem
+  `cpu_percent(interval=1)`;
+- conexões TCP são só as do próprio processo: inodes dos sockets em
+  /proc/self/fd cruzados com /proc/self/net/tcp{,6}, em vez de
+  `psutil.net_connections()`, que percorre todos os processos do host.
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import psutil
+
+from src.config import Config
+
+logger = logging.getLogger(__name__)
+
+TCP_TABLES = ('/proc/self/net/tcp', '/proc/self/net/tcp6')
+TCP_ESTABLISHED = '01'
+MB = 1024 * 1024
+GB = 1024 * MB
+
+
+@dataclass
+class SystemSample:
+    """Uma leitura do sistema; taxas em unidades por segundo"""
+    timestamp: float
+    interval: float                  # segundos desde a amostra anterior (0 na primeira)
+    cpu_percent: float
+    memory_percent: float
+    memory_available_mb: float
+    disk_percent: float
+    disk_free_gb: float
+    net_bytes_sent: int              # contadores acumulados (para quem quiser o total)
+    net_bytes_recv: int
+    net_packets_sent: int
+    net_packets_recv: int
+    net_sent_rate: float
+    net_recv_rate: float
+    disk_read_rate: float
+    disk_write_rate: float
+    process_cpu_percent: float
+    process_rss_mb: float
+    process_threads: int
+    connections: int                 # TCP estabelecidas do próprio processo
+    open_sockets: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _rate(current: int, previous: Optional[int], elapsed: float) -> float:
+    """Taxa por segundo; contadores que voltaram (reinício, overflow) contam como 0"""
+    if previous is None or elapsed <= 0 or current < previous:
+        return 0.0
+    return (current - previous) / elapsed
+
+
+def _socket_inodes() -> Optional[set]:
+    try:
+        fds = os.scandir('/proc/self/fd')
+    except OSError:
+        return None
+    inodes = set()
+    with fds:
+        for fd in fds:
+            try:
+                target = os.readlink(fd.path)
+            except OSError:
+                continue  # fd fechado durante a varredura
+            if target.startswith('socket:['):
+                inodes.add(target[8:-1])
+    return inodes
+
+
+def _process_connections(process: psutil.Process) -> tuple:
+    """(TCP estabelecidas, sockets abertos) do próprio processo"""
+    inodes = _socket_inodes()
+    if inodes is None:
+        # Sem /proc (macOS, Windows): consulta por processo, ainda sem varrer o host
+        # net_connections no psutil >= 6; connections nas versões anteriores
+        connections = getattr(process, 'net_connections', process.connections)('tcp')
+        established = sum(1 for conn in connections if conn.status == psutil.CONN_ESTABLISHED)
+        return established, len(connections)
+
+    established = 0
+    if inodes:
+        for table in TCP_TABLES:
+            try:
+                with open(table) as lines:
+                    next(lines, None)
+                    for line in lines:
+                        fields = line.split()
+                        if len(fields) > 9 and fields[3] == TCP_ESTABLISHED and fields[9] in inodes:
+                            established += 1
+            except OSError:
+                continue
+    return established, len(inodes)
+
+
+class SystemSampler:
+    """Thread única de amostragem com ring buffer e assinantes"""
+
+    def __init__(self, interval: float = 10.0, capacity: int = 360, disk_path: str = '/'):
+        self.interval = interval
+        self.disk_path = disk_path
+        self.samples = deque(maxlen=capacity)
+        self._process = psutil.Process()
+        self._previous: Optional[Dict[str, Any]] = None
+        self._subscribers: List[list] = []     # [callback, a cada N segundos, última entrega]
+        self._lock = threading.Lock()
+        self._sample_lock = threading.Lock()   # leitura dos contadores + troca de _previous
+        self._stop = threading.Event()
+        self._thread = None
+
+    # === CICLO DE VIDA ===
+
+    def start(self):
+        """Inicia a thread (idempotente); a leitura inicial é a base dos deltas da primeira amostra"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._previous is None:
+                self.sample()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def subscribe(self, callback: Callable[[SystemSample], None], every: float = None):
+        """Entrega as amostras a `callback` na thread do sampler, no máximo a cada `every` segundos"""
+        with self._lock:
+            if all(subscriber[0] != callback for subscriber in self._subscribers):
+                self._subscribers.append([callback, every or 0, 0.0])
+
+    def unsubscribe(self, callback: Callable[[SystemSample], None]):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] != callback]
+
+    def _run(self):
+        next_run = time.monotonic() + self.interval
+        while not self._stop.wait(max(next_run - time.monotonic(), 0)):
+            next_run = max(next_run + self.interval, time.monotonic())
+            try:
+                self._publish(self.sample())
+            except Exception as e:
+                logger.error(f"Erro na amostragem do sistema: {e}")
+
+    def _publish(self, sample: SystemSample):
+        self.samples.append(sample)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            callback, every, last = subscriber
+            # Meia amostra de folga: o relógio da thread oscila em torno do intervalo
+            if sample.timestamp - last < every - self.interval / 2:
+                continue
+            subscriber[2] = sample.timestamp
+            try:
+                callback(sample)
+            except Exception as e:
+                logger.error(f"Erro no assinante de métricas do sistema: {e}")
+
+    # === LEITURA ===
+
+    def sample(self) -> SystemSample:
+        """Lê os contadores e calcula as taxas contra a leitura anterior.
+
+        Cada chamada vira a base da próxima: fora da thread do sampler, prefira
+        `latest()`. A leitura e a troca da base são atômicas entre threads.
+        """
+        with self._sample_lock:
+            return self._read()
+
+    def _read(self) -> SystemSample:
+        now = time.time()
+        cpu = psutil.cpu_times()
+        # guest já está incluído em user; iowait é tempo ocioso para o percentual
+        cpu_total = sum(cpu) - getattr(cpu, 'guest', 0) - getattr(cpu, 'guest_nice', 0)
+        cpu_idle = cpu.idle + getattr(cpu, 'iowait', 0)
+        process_cpu = self._process.cpu_times()
+        process_busy = process_cpu.user + process_cpu.system
+        net = psutil.net_io_counters()
+        disk_io = psutil.disk_io_counters()
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+        connections, open_sockets = _process_connections(self._process)
+
+        current = {
+            'timestamp': now,
+            'cpu_total': cpu_total,
+            'cpu_idle': cpu_idle,
+            'process_busy': process_busy,
+            'net_sent': net.bytes_sent if net else 0,
+            'net_recv': net.bytes_recv if net else 0,
+            'disk_read': disk_io.read_bytes if disk_io else 0,
+            'disk_write': disk_io.write_bytes if disk_io else 0,
+        }
+        previous = self._previous or {}
+        self._previous = current
+        elapsed = now - previous['timestamp'] if previous else 0.0
+
+        cpu_percent = process_cpu_percent = 0.0
+        if previous:
+            total_delta = cpu_total - previous['cpu_total']
+            if total_delta > 0:
+                busy_delta = total_delta - (cpu_idle - previous['cpu_idle'])
+                cpu_percent = min(max(busy_delta / total_delta * 100, 0.0), 100.0)
+            if elapsed > 0:
+                process_cpu_percent = max(process_busy - previous['process_busy'], 0.0) / elapsed * 100
+
+        return SystemSample(
+            timestamp=now,
+            interval=elapsed,
+            cpu_percent=round(cpu_percent, 2),
+            memory_percent=memory.percent,
+            memory_available_mb=memory.available / MB,
+            disk_percent=disk.percent,
+            disk_free_gb=disk.free / GB,
+            net_bytes_sent=current['net_sent'],
+            net_bytes_recv=current['net_recv'],
+            net_packets_sent=net.packets_sent if net else 0,
+            net_packets_recv=net.packets_recv if net else 0,
+            net_sent_rate=_rate(current['net_sent'], previous.get('net_sent'), elapsed),
+            net_recv_rate=_rate(current['net_recv'], previous.get('net_recv'), elapsed),
+            disk_read_rate=_rate(current['disk_read'], previous.get('disk_read'), elapsed),
+            disk_write_rate=_rate(current['disk_write'], previous.get('disk_write'), elapsed),
+            process_cpu_percent=round(process_cpu_percent, 2),
+            process_rss_mb=self._process.memory_info().rss / MB,
+            process_threads=self._process.num_threads(),
+            connections=connections,
+            open_sockets=open_sockets
+        )
+
+    def latest(self) -> Optional[SystemSample]:
+        return self.samples[-1] if self.samples else None
+
+    def history(self, seconds: float = None) -> List[SystemSample]:
+        """Amostras do buffer, opcionalmente só as dos últimos `seconds`"""
+        samples = list(self.samples)
+        if seconds is None:
+            return samples
+        cutoff = time.time() - seconds
+        return [sample for sample in samples if sample.timestamp >= cutoff]
+
+
+# Instância global
+system_sampler = SystemSampler(
+    interval=getattr(Config, 'SYSTEM_SAMPLE_INTERVAL', 10),
+    capacity=getattr(Config, 'SYSTEM_SAMPLE_CAPACITY', 360)
+)
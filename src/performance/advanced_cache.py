@@ -1,20 +1,19 @@
 """
 Sistema de Cache Avançado com Redis e Otimizações de Performance
 """
-import redis
 import json
 import hashlib
 from typing import Any, Optional, List, Dict, Union
 from functools import wraps
+from collections import deque
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 import asyncio
-import pickle
-from sqlalchemy import event
-from sqlalchemy.engine import Engine
-import time
 import logging
 
+from src.cache import Codec, LocalCache, TieredCache, StampedeProtector
+from src.monitoring.sql_profiler import SQLProfiler, sql_profiler
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -32,139 +31,66 @@ class AdvancedCacheManager:
     
     def __init__(self, config: CacheConfig):
         self.config = config
-        self.redis_client = redis.from_url(config.redis_url, decode_responses=False)
-        self.memory_cache = {}
-        self.cache_stats = {
-            'hits': 0,
-            'misses': 0,
-            'memory_hits': 0,
-            'redis_hits': 0,
-            'invalidations': 0
-        }
-        
-    def _generate_key(self, prefix: str, *args: Any) -> str:
+        self.cache = TieredCache.from_url(
+            config.redis_url,
+            local=LocalCache(max_entries=config.max_memory_cache),
+            default_ttl=config.default_ttl,
+            codec=Codec(threshold=config.compression_threshold)
+        )
+        self.cache.start_invalidation_listener()
+        self.redis_client = self.cache.redis
+        self._protectors: Dict[int, StampedeProtector] = {}
+        
+    def _generate_key(self, prefix: str, *args: Any, **kwargs: Any) -> str:
         """Gerar chave única para cache"""
         key_data = f"{prefix}:{':'.join(str(arg) for arg in args)}"
-        return hashlib.md5(key_data.encode()).hexdigest()[:16]
-    
-    def _serialize_data(self, data: Any) -> bytes:
-        """Serializar dados com compressão opcional"""
-        serialized = pickle.dumps(data)
-        
-        if len(serialized) > self.config.compression_threshold:
-            import gzip
-            serialized = gzip.compress(serialized)
-            
-        return serialized
-    
-    def _deserialize_data(self, data: bytes) -> Any:
-        """Deserializar dados com descompressão"""
-        try:
-            # Tentar descomprimir primeiro
-            import gzip
-            data = gzip.decompress(data)
-        except:
-            pass  # Dados não comprimidos
-            
-        return pickle.loads(data)
+        if kwargs:
+            key_data += ':' + ':'.join(f"{k}={v}" for k, v in sorted(kwargs.items()))
+        return f"{prefix}:{hashlib.md5(key_data.encode()).hexdigest()[:16]}"
     
     async def get(self, key: str) -> Optional[Any]:
         """Buscar item no cache (memória -> Redis)"""
-        # Tentar memória primeiro
-        if key in self.memory_cache:
-            self.cache_stats['hits'] += 1
-            self.cache_stats['memory_hits'] += 1
-            return self.memory_cache[key]['data']
-        
-        # Tentar Redis
-        try:
-            data = self.redis_client.get(key)
-            if data:
-                deserialized = self._deserialize_data(data)
-                
-                # Adicionar à memória se há espaço
-                if len(self.memory_cache) < self.config.max_memory_cache:
-                    self.memory_cache[key] = {
-                        'data': deserialized,
-                        'timestamp': time.time()
-                    }
-                
-                self.cache_stats['hits'] += 1
-                self.cache_stats['redis_hits'] += 1
-                return deserialized
-        except Exception as e:
-            logger.warning(f"Redis cache error: {e}")
-        
-        self.cache_stats['misses'] += 1
-        return None
+        return self.cache.get(key)
     
-    async def set(self, key: str, value: Any, ttl: Optional[int] = None) -> bool:
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None,
+                  tags: Optional[List[str]] = None) -> bool:
         """Armazenar item no cache"""
+        return self.cache.set(key, value, ttl or self.config.default_ttl, tags=tags)
+    
+    async def get_or_compute(self, key: str, compute, ttl: Optional[int] = None,
+                             tags: Optional[List[str]] = None) -> Any:
+        """Buscar no cache ou recomputar com proteção contra stampede"""
         ttl = ttl or self.config.default_ttl
-        
-        try:
-            # Armazenar no Redis
-            serialized = self._serialize_data(value)
-            self.redis_client.setex(key, ttl, serialized)
-            
-            # Armazenar na memória se há espaço
-            if len(self.memory_cache) < self.config.max_memory_cache:
-                self.memory_cache[key] = {
-                    'data': value,
-                    'timestamp': time.time()
-                }
-            
-            return True
-        except Exception as e:
-            logger.error(f"Cache set error: {e}")
-            return False
+        protector = self._protectors.get(ttl)
+        if protector is None:
+            protector = self._protectors.setdefault(ttl, StampedeProtector(self.cache, ttl=ttl))
+        return await protector.get_or_compute_async(key, compute, tags)
     
-    async def invalidate(self, pattern: str) -> int:
-        """Invalidar cache por padrão"""
-        count = 0
-        
-        # Invalidar memória
-        keys_to_remove = [k for k in self.memory_cache.keys() if pattern in k]
-        for key in keys_to_remove:
-            del self.memory_cache[key]
-            count += 1
-        
-        # Invalidar Redis
-        try:
-            redis_keys = self.redis_client.keys(f"*{pattern}*")
-            if redis_keys:
-                self.redis_client.delete(*redis_keys)
-                count += len(redis_keys)
-        except Exception as e:
-            logger.error(f"Redis invalidation error: {e}")
-        
-        self.cache_stats['invalidations'] += count
-        return count
+    async def invalidate(self, *tags: str) -> int:
+        """Invalidar entradas associadas às tags (ex.: document:42)"""
+        return self.cache.invalidate_tags(*tags)
     
     def get_stats(self) -> Dict:
         """Obter estatísticas do cache"""
-        total_requests = self.cache_stats['hits'] + self.cache_stats['misses']
-        hit_rate = (self.cache_stats['hits'] / total_requests * 100) if total_requests > 0 else 0
-        
-        return {
-            'hit_rate': round(hit_rate, 2),
-            'total_requests': total_requests,
-            'memory_cache_size': len(self.memory_cache),
-            'redis_connected': self._redis_health_check(),
-            **self.cache_stats
-        }
-    
-    def _redis_health_check(self) -> bool:
-        """Verificar saúde do Redis"""
-        try:
-            self.redis_client.ping()
-            return True
-        except:
-            return False
+        return self.cache.stats()
 
 # Decoradores para cache automático
+def _format_tags(templates: Optional[List[str]], args, kwargs) -> List[str]:
+    """Preenche tags como 'document:{document_id}' com os argumentos da chamada"""
+    tags = []
+    for template in templates or []:
+        try:
+            tags.append(template.format(*args, **kwargs))
+        except (IndexError, KeyError):
+            logger.warning(f"Tag de cache {template} sem argumento correspondente")
+    return tags
+
 def cache_result(key_prefix: str, ttl: Optional[int] = None, invalidate_on: Optional[List[str]] = None):
-    """Decorator para cache automático de resultados"""
+    """Decorator para cache automático de resultados
+
+    `invalidate_on` lista tags de entidades (ex.: 'document:{document_id}')
+    cuja invalidação remove o resultado.
+    """
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
@@ -175,70 +101,44 @@ def cache_result(key_prefix: str, ttl: Optional[int] = None, invalidate_on: Opti
             # Gerar chave do cache
             cache_key = cache_manager._generate_key(key_prefix, *args, **kwargs)
             
-            # Tentar buscar no cache
-            cached_result = await cache_manager.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Executar função
-            if asyncio.iscoroutinefunction(func):
-                result = await func(*args, **kwargs)
-            else:
-                result = func(*args, **kwargs)
-            
-            # Armazenar resultado
-            await cache_manager.set(cache_key, result, ttl)
-            
-            return result
+            # Buscar no cache ou executar (uma única execução concorrente por chave)
+            return await cache_manager.get_or_compute(
+                cache_key,
+                lambda: func(*args, **kwargs),
+                ttl,
+                tags=_format_tags(invalidate_on, args, kwargs)
+            )
         
         return wrapper
     return decorator
 
 class QueryOptimizer:
-    """Otimizador de queries SQL"""
+    """Otimizador de queries SQL (fachada sobre o profiler por fingerprint)"""
     
-    def __init__(self):
-        self.query_stats = {}
-        self.slow_query_threshold = 1.0  # 1 segundo
+    def __init__(self, profiler: SQLProfiler = None):
+        self.profiler = profiler or sql_profiler
+    
+    @property
+    def slow_query_threshold(self) -> float:
+        return self.profiler.slow_query_ms / 1000
     
     def track_query(self, statement, parameters, execution_time):
-        """Rastrear performance de queries"""
-        query_hash = hashlib.md5(str(statement).encode()).hexdigest()[:8]
-        
-        if query_hash not in self.query_stats:
-            self.query_stats[query_hash] = {
-                'statement': str(statement),
-                'count': 0,
-                'total_time': 0,
-                'avg_time': 0,
-                'max_time': 0,
-                'slow_queries': 0
-            }
-        
-        stats = self.query_stats[query_hash]
-        stats['count'] += 1
-        stats['total_time'] += execution_time
-        stats['avg_time'] = stats['total_time'] / stats['count']
-        stats['max_time'] = max(stats['max_time'], execution_time)
-        
-        if execution_time > self.slow_query_threshold:
-            stats['slow_queries'] += 1
-            logger.warning(f"Slow query detected: {execution_time:.2f}s - {statement}")
+        """Rastrear performance de queries (execution_time em segundos)"""
+        self.profiler.track(str(statement), execution_time * 1000)
     
     def get_slow_queries(self) -> List[Dict]:
         """Obter queries lentas"""
-        slow_queries = []
-        for query_hash, stats in self.query_stats.items():
-            if stats['slow_queries'] > 0:
-                slow_queries.append({
-                    'hash': query_hash,
-                    'avg_time': stats['avg_time'],
-                    'slow_count': stats['slow_queries'],
-                    'total_count': stats['count'],
-                    'statement': stats['statement'][:200] + '...' if len(stats['statement']) > 200 else stats['statement']
-                })
-        
-        return sorted(slow_queries, key=lambda x: x['avg_time'], reverse=True)
+        return [
+            {
+                'hash': stats['fingerprint'],
+                'avg_time': stats['avg_ms'] / 1000,
+                'slow_count': stats['slow'],
+                'total_count': stats['count'],
+                'statement': stats['statement'][:200] + '...' if len(stats['statement']) > 200 else stats['statement'],
+                'explain': stats['explain']
+            }
+            for stats in self.profiler.slow_queries()
+        ]
 
 # Singleton para gerenciador global
 cache_manager = None
@@ -249,34 +149,40 @@ def init_performance_optimizations(app, config: CacheConfig):
     global cache_manager
     cache_manager = AdvancedCacheManager(config)
     
-    # Configurar interceptação de queries
-    @event.listens_for(Engine, "before_cursor_execute")
-    def receive_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-        context._query_start_time = time.time()
-    
-    @event.listens_for(Engine, "after_cursor_execute")
-    def receive_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
-        execution_time = time.time() - context._query_start_time
-        query_optimizer.track_query(statement, parameters, execution_time)
+    # Interceptação de queries: eventos do SQLProfiler, instalados com a instrumentação
+    from src.monitoring.request_timing import init_request_timing
+    init_request_timing(app)
     
     # Adicionar rotas de monitoramento
+    register_performance_routes(app)
+    
+    # Compressão de resposta (br/gzip) do corpo, com suporte a streaming
+    if 'compression' not in app.extensions:
+        from src.performance.compression import init_compression
+        init_compression(app)
+    
+    return cache_manager
+
+def _is_admin(user_id) -> bool:
+    from src.models.user import User
+    user = User.query.get(user_id)
+    return bool(user and getattr(user, 'is_admin', False))
+
+def register_performance_routes(app):
+    """Rotas de monitoramento (JWT; queries lentas e EXPLAIN só para admins)"""
+    from flask_jwt_extended import jwt_required, get_jwt_identity
+    
     @app.route('/api/performance/cache-stats')
+    @jwt_required()
     def get_cache_stats():
         return cache_manager.get_stats()
     
     @app.route('/api/performance/slow-queries')
+    @jwt_required()
     def get_slow_queries():
+        if not _is_admin(get_jwt_identity()):
+            return {'error': 'Unauthorized'}, 403
         return {'slow_queries': query_optimizer.get_slow_queries()}
-    
-    # Middleware de compressão de resposta
-    @app.after_request
-    def compress_response(response):
-        if response.content_length and response.content_length > 1024:
-            # Comprimir respostas grandes
-            response.headers['Content-Encoding'] = 'gzip'
-        return response
-    
-    return cache_manager
 
 # Utilitários de performance
 class PerformanceMonitor:
@@ -284,22 +190,24 @@ class PerformanceMonitor:
     
     def __init__(self):
         self.metrics = {
-            'request_times': [],
+            'request_times': deque(maxlen=1000),  # últimas 1000 requests
             'memory_usage': [],
             'active_connections': 0
         }
     
-    def track_request(self, endpoint: str, duration: float):
+    def track_request(self, endpoint: str, duration: float, timestamp: datetime = None):
         """Rastrear tempo de request"""
         self.metrics['request_times'].append({
             'endpoint': endpoint,
             'duration': duration,
-            'timestamp': datetime.utcnow()
+            'timestamp': timestamp or datetime.utcnow()
         })
-        
-        # Manter apenas últimas 1000 requests
-        if len(self.metrics['request_times']) > 1000:
-            self.metrics['request_times'] = self.metrics['request_times'][-1000:]
+    
+    def handle(self, records):
+        """Sink da instrumentação de requisições"""
+        for record in records:
+            self.track_request(record.label, record.duration_ms / 1000,
+                               datetime.utcfromtimestamp(record.started_at))
     
     def get_avg_response_time(self, minutes: int = 5) -> float:
         """Obter tempo médio de resposta"""
@@ -318,24 +226,9 @@ performance_monitor = PerformanceMonitor()
 
 # Middleware para rastreamento automático
 def performance_middleware(app):
-    """Middleware para rastreamento de performance"""
-    
-    @app.before_request
-    def before_request():
-        from flask import g, request
-        g.start_time = time.time()
-    
-    @app.after_request
-    def after_request(response):
-        from flask import g, request
-        
-        if hasattr(g, 'start_time'):
-            duration = time.time() - g.start_time
-            performance_monitor.track_request(request.endpoint or 'unknown', duration)
-            
-            # Adicionar header de tempo de resposta
-            response.headers['X-Response-Time'] = f"{duration:.3f}s"
-        
-        return response
+    """Alimenta o performance_monitor a partir da instrumentação única de requisições"""
+    from src.monitoring.request_timing import init_request_timing
     
-    return app 
\ No newline at end of file
+    # Medição e header X-Response-Time ficam no hook da instrumentação
+    init_request_timing(app, [performance_monitor])
+    return app
@@ -0,0 +1,168 @@
+"""
+Compressão de respostas HTTP (brotli/gzip)
+
+Negocia `Accept-Encoding` (br preferido quando disponível, respeitando os
+q-values), comprime apenas tipos textuais (JSON, HTML, CSV...) acima de
+`COMPRESS_MIN_SIZE` e marca `Vary: Accept-Encoding` em toda resposta
+compressível. Respostas em streaming são comprimidas chunk a chunk, com
+flush a cada chunk para não segurar o envio. PDF, DOCX, imagens e arquivos
+servidos com `send_file` passam intactos.
+"""
+import zlib
+import logging
+from typing import Iterable, Iterator, Optional
+
+from flask import request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/xhtml+xml',
+    'application/ld+json',
+    'application/problem+json',
+    'application/vnd.api+json',
+    'image/svg+xml',
+}
+# text/event-stream fica de fora: proxies costumam segurar SSE comprimido
+EXCLUDED_MIMETYPES = {'text/event-stream'}
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        # wbits 31: stream deflate com cabeçalho e trailer gzip
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, level: int):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ResponseCompressor:
+    """after_request que comprime o corpo de fato (e não só o header)"""
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.levels = {'gzip': 6, 'br': 4}
+        self.encodings = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('COMPRESS_ENABLED', True):
+            return
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.levels = {
+            'gzip': app.config.get('COMPRESS_LEVEL', self.levels['gzip']),
+            'br': app.config.get('COMPRESS_BR_LEVEL', self.levels['br'])
+        }
+        app.after_request(self.after_request)
+        app.extensions['compression'] = self
+
+    def _encoder(self, encoding: str):
+        if encoding == 'br':
+            return _BrotliEncoder(self.levels['br'])
+        return _GzipEncoder(self.levels['gzip'])
+
+    @staticmethod
+    def is_compressible(mimetype: Optional[str]) -> bool:
+        if not mimetype or mimetype in EXCLUDED_MIMETYPES:
+            return False
+        return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+    def negotiate(self, accept_encoding) -> Optional[str]:
+        """Melhor codificação aceita pelo cliente (q > 0); br vence empates"""
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = accept_encoding.quality(encoding)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def after_request(self, response):
+        if not self.is_compressible(response.mimetype):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if (request.method == 'HEAD'
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers
+                or 'Content-Range' in response.headers
+                or response.direct_passthrough
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            inner = response.response
+            response.response = self._stream(inner, encoding)
+            response.headers.pop('Content-Length', None)
+            # O gerador de compressão pode nunca ser iterado (HEAD, desconexão):
+            # o iterável original é fechado junto com a resposta
+            close = getattr(inner, 'close', None)
+            if close is not None:
+                response.call_on_close(close)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            encoder = self._encoder(encoding)
+            compressed = encoder.compress(data) + encoder.finish()
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        # Representações diferentes não podem compartilhar ETag forte
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+    def _stream(self, chunks: Iterable, encoding: str) -> Iterator[bytes]:
+        """Comprime um corpo em streaming sem acumulá-lo (quem fecha `chunks` é a resposta)"""
+        encoder = self._encoder(encoding)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if not chunk:
+                continue
+            data = encoder.compress(chunk) + encoder.flush()
+            if data:
+                yield data
+        yield encoder.finish()
+
+
+def init_compression(app) -> ResponseCompressor:
+    """Instala a compressão de respostas no app"""
+    return ResponseCompressor(app)
@@ -1,14 +1,48 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from services.analytics_service import analytics_service
+from services.analytics_service import analytics_service, PERIOD_DAYS
+from services.activity_rollups import activity_rollups
+from services import analytics_export
+import os
+import time
+import click
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
 
 analytics_bp = Blueprint('analytics', __name__)
 
+@analytics_bp.record_once
+def start_rollup_compactor(state):
+    """Mantém os rollups diários de atividade que alimentam o dashboard
+
+    Só com ANALYTICS_ROLLUP_COMPACTOR ligado (nunca em testes); entre workers,
+    o lock no Redis deixa um único executor por ciclo.
+    """
+    app = state.app
+    if not app.config.get('ANALYTICS_ROLLUP_COMPACTOR', False) or app.testing:
+        return
+    activity_rollups.start_compactor(
+        app,
+        interval=app.config.get('ANALYTICS_ROLLUP_INTERVAL', 300),
+        backfill_days=app.config.get('ANALYTICS_ROLLUP_BACKFILL_DAYS', 400),
+        redis_url=app.config.get('REDIS_URL')
+    )
+
+@analytics_bp.cli.command('compact-rollups')
+@click.option('--backfill-days', type=int, default=0,
+              help='Recalcula os últimos N dias em vez de só os recentes')
+def compact_rollups_command(backfill_days):
+    """Compacta os rollups de analytics uma vez (para cron/agendador)"""
+    started = time.time()
+    if backfill_days:
+        rows = activity_rollups.backfill(backfill_days)
+    else:
+        rows = activity_rollups.compact_recent()['rows']
+    click.echo(f"Rollups de analytics: {rows} linhas em {time.time() - started:.1f}s")
+
 @analytics_bp.route('/dashboard/overview', methods=['GET'])
 @jwt_required()
 def get_dashboard_overview():
@@ -277,17 +311,9 @@ def get_period_comparison():
         # Obter métricas dos dois períodos
         current_metrics = analytics_service.get_dashboard_overview(user_id, current_period)
         
-        # Para o período anterior, usar as mesmas funções mas com datas diferentes
+        # Período anterior: mesmas métricas, lidas dos rollups diários
         previous_end = current_start
-        
-        # Simular métricas do período anterior (implementação simplificada)
-        previous_metrics = {
-            'documents': {'created': 5, 'updated': 3, 'total': 15},
-            'kanban': {'cards_created': 8, 'cards_completed': 6, 'total_hours': 25.5},
-            'wiki': {'articles_created': 2, 'total_views': 150, 'likes_received': 8},
-            'ai_usage': {'total_requests': 45, 'success_rate': 92.5},
-            'productivity': {'productivity_score': 78.5}
-        }
+        previous_metrics = analytics_service.get_period_metrics(user_id, previous_start, previous_end)
         
         # Calcular comparações
         comparison = {
@@ -332,66 +358,105 @@ def get_period_comparison():
 @analytics_bp.route('/export', methods=['POST'])
 @jwt_required()
 def export_analytics():
-    """Exporta dados de analytics em formato CSV/Excel"""
+    """Exporta dados de analytics em CSV, Excel (XLSX) ou Parquet
+    
+    Corpo: type (csv|excel|parquet), dataset (daily_activity|breakdown|documents|time_entries),
+    categories, period ou start_date/end_date (ISO), delivery (download|storage).
+    As linhas são lidas em lotes e escritas em stream; `download` devolve o arquivo
+    em resposta chunked e `storage` envia ao storage configurado e retorna URL assinada
+    (com o storage local, que não assina URLs, a entrega volta a ser `download`).
+    """
     try:
         user_id = get_jwt_identity()
-        data = request.get_json()
+        data = request.get_json() or {}
         
-        export_type = data.get('type', 'csv')  # csv, excel, pdf
+        export_type = data.get('type', 'csv')
+        dataset_name = data.get('dataset', 'daily_activity')
         categories = data.get('categories', ['documents', 'kanban', 'wiki'])
-        period = data.get('period', '30days')
+        delivery = data.get('delivery', 'download')
         
-        if export_type not in ['csv', 'excel', 'pdf']:
+        if export_type == 'pdf':
+            return jsonify({
+                'success': False,
+                'message': 'Exportação pdf não implementada ainda'
+            }), 501
+        if export_type not in analytics_export.FORMATS:
             return jsonify({
                 'success': False,
                 'message': 'Tipo de exportação inválido'
             }), 400
+        if (export_type == 'excel' and not analytics_export.XLSX_AVAILABLE) or \
+                (export_type == 'parquet' and not analytics_export.PARQUET_AVAILABLE):
+            return jsonify({
+                'success': False,
+                'message': f'Exportação {export_type} indisponível neste servidor'
+            }), 501
+        if delivery not in ('download', 'storage'):
+            return jsonify({
+                'success': False,
+                'message': 'Entrega inválida. Use: download, storage'
+            }), 400
+        try:
+            expires_in = int(data.get('expires_in', 3600))
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'expires_in deve ser um número de segundos'
+            }), 400
+        expires_in = min(max(expires_in, 60), analytics_export.MAX_URL_EXPIRES_IN)
+        if delivery == 'storage' and not analytics_export.storage_delivery_available():
+            logger.info("Storage local sem URL assinada; exportação entregue por download")
+            delivery = 'download'
+        
+        try:
+            if data.get('start_date') or data.get('end_date'):
+                end_day = date.fromisoformat(data['end_date']) if data.get('end_date') else datetime.utcnow().date()
+                start_day = date.fromisoformat(data['start_date']) if data.get('start_date') else end_day - timedelta(days=29)
+                label = f'{start_day.isoformat()}_{end_day.isoformat()}'
+            else:
+                label = data.get('period', '30days')
+                if label not in PERIOD_DAYS:
+                    raise ValueError('Período inválido')
+                start_day, end_day = analytics_service._period_days(
+                    datetime.utcnow() - timedelta(days=PERIOD_DAYS[label]), datetime.utcnow()
+                )
+            if start_day > end_day:
+                raise ValueError('start_date deve ser anterior a end_date')
+            dataset = analytics_export.build_dataset(dataset_name, user_id, start_day, end_day, categories)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         
-        # Obter dados para exportação
-        export_data = {}
-        for category in categories:
-            try:
-                export_data[category] = analytics_service.get_detailed_analytics(user_id, category)
-            except:
-                continue
-        
-        # Gerar arquivo de exportação (implementação simplificada)
-        # Na prática, você usaria bibliotecas como pandas, openpyxl, reportlab
+        content_type, extension = analytics_export.FORMATS[export_type]
+        filename = f'analytics_{dataset.name}_{label}.{extension}'
         
-        if export_type == 'csv':
-            # Gerar CSV
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Headers
-            writer.writerow(['Categoria', 'Métrica', 'Valor', 'Período'])
-            
-            # Dados
-            for category, data in export_data.items():
-                for metric, value in data.items():
-                    writer.writerow([category, metric, value, period])
-            
-            csv_data = output.getvalue()
-            output.close()
-            
+        if delivery == 'storage':
+            path = analytics_export.export_to_file(dataset, export_type)
+            stored = analytics_export.store_export(path, filename, user_id, content_type, expires_in)
             return jsonify({
                 'success': True,
-                'data': {
-                    'download_url': f'/api/analytics/download/{user_id}_{period}.csv',
-                    'filename': f'analytics_{user_id}_{period}.csv',
-                    'type': 'csv',
-                    'size': len(csv_data.encode('utf-8'))
-                }
+                'data': dict(stored, filename=filename, type=export_type)
             })
         
-        else:
-            return jsonify({
-                'success': False,
-                'message': f'Exportação {export_type} não implementada ainda'
-            }), 501
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+        if export_type == 'csv':
+            # CSV sai direto do cursor para o cliente
+            return Response(stream_with_context(analytics_export.iter_csv(dataset)),
+                            mimetype=content_type, headers=headers)
+        
+        # XLSX e Parquet precisam do arquivo completo (diretório central/rodapé)
+        path = analytics_export.export_to_file(dataset, export_type)
+        try:
+            headers['Content-Length'] = str(os.path.getsize(path))
+            response = Response(analytics_export.iter_file(path), mimetype=content_type, headers=headers)
+        except Exception:
+            analytics_export.discard_file(path)
+            raise
+        # O gerador só limpa se chegar a ser iterado; o fechamento da resposta cobre HEAD e desconexões
+        response.call_on_close(lambda: analytics_export.discard_file(path))
+        return response
         
     except Exception as e:
         logger.error(f"Erro ao exportar analytics: {str(e)}")
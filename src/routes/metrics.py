@@ -187,4 +187,28 @@ def get_performance_metrics():
         return performance_data
         
     except Exception as e:
-        return {'error': str(e)}, 500 
\ No newline at end of file
+        return {'error': str(e)}, 500
+
+
+@metrics_bp.route('/queries', methods=['GET', 'DELETE'])
+@jwt_required()
+def get_query_profile():
+    """Profiling de SQL por fingerprint, rota e N+1 (apenas admins); DELETE zera"""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    
+    if not user or not getattr(user, 'is_admin', False):
+        return {'error': 'Unauthorized'}, 403
+    
+    from src.monitoring.sql_profiler import sql_profiler
+    
+    if request.method == 'DELETE':
+        sql_profiler.reset()
+        return {'message': 'Profiling de SQL reiniciado'}
+    
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'count', 'avg_ms', 'max_ms', 'n_plus_one', 'per_request'):
+        return {'error': f'Ordenação inválida: {sort}'}, 400
+    
+    return sql_profiler.report(limit=request.args.get('limit', 50, type=int), sort=sort)
+
@@ -11,6 +11,14 @@ logger = logging.getLogger(__name__)
 
 notifications_bp = Blueprint('notifications', __name__)
 
+@notifications_bp.record_once
+def start_unread_reconciliation(state):
+    """Corrige periodicamente desvios dos contadores de não lidas em cache"""
+    notification_service.unread_counter.start_reconciliation(
+        state.app,
+        interval=state.app.config.get('NOTIFICATION_UNREAD_RECONCILE_INTERVAL', 300)
+    )
+
 @notifications_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_notifications():
@@ -49,8 +57,7 @@ def get_unread_count():
     try:
         user_id = get_jwt_identity()
         
-        from models.notification import Notification
-        count = Notification.get_unread_count(user_id)
+        count = notification_service.unread_counter.get(user_id)
         
         return jsonify({
             'success': True,
@@ -325,7 +332,7 @@ def get_notification_stats():
         
         # Estatísticas básicas
         total = Notification.query.filter_by(user_id=user_id, is_archived=False).count()
-        unread = Notification.get_unread_count(user_id)
+        unread = notification_service.unread_counter.get(user_id)
         archived = Notification.query.filter_by(user_id=user_id, is_archived=True).count()
         
         # Estatísticas por tipo (últimos 30 dias)
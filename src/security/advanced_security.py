@@ -23,6 +23,8 @@ import redis
 import json
 from werkzeug.security import safe_str_cmp
 
+from src.security.waf_engine import WAFEngine, WAFRule
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -126,12 +128,16 @@ class WebApplicationFirewall:
             re.compile(r"[;&|`]"),
         ]
         self.rate_limits = {}
+        self.engine = WAFEngine(
+            WAFRule('suspicious', pattern.pattern, pattern.flags & ~re.UNICODE)
+            for pattern in self.suspicious_patterns
+        )
     
     def is_suspicious_request(self, request_data: str) -> Tuple[bool, str]:
-        """Detectar requisições suspeitas"""
-        for pattern in self.suspicious_patterns:
-            if pattern.search(request_data):
-                return True, f"Suspicious pattern detected: {pattern.pattern}"
+        """Detectar requisições suspeitas (uma única varredura)"""
+        rule = self.engine.first_match(request_data)
+        if rule is not None:
+            return True, f"Suspicious pattern detected: {rule.pattern}"
         return False, ""
     
     def check_rate_limit(self, ip: str, endpoint: str, limit: int = 60) -> bool:
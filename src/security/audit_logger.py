@@ -7,6 +7,9 @@ from flask import request, g
 from flask_jwt_extended import get_jwt_identity
 import os
 
+from src.security.audit_writer import AsyncAuditHandler
+from src.monitoring.request_timing import AuditSink, init_request_timing
+
 class AuditEventType(Enum):
     """Tipos de eventos de auditoria"""
     LOGIN_SUCCESS = "login_success"
@@ -73,27 +76,24 @@ class AuditLogger:
         )
         audit_handler.setFormatter(formatter)
         
-        self.logger.addHandler(audit_handler)
+        handlers = [audit_handler]
         
         # Handler para console em desenvolvimento
         if self.app.config.get('FLASK_ENV') == 'development':
             console_handler = logging.StreamHandler()
             console_handler.setFormatter(formatter)
-            self.logger.addHandler(console_handler)
+            handlers.append(console_handler)
+        
+        # Requisição só enfileira; a escrita em arquivo acontece em background
+        self.logger.addHandler(AsyncAuditHandler(
+            *handlers,
+            max_queue=self.app.config.get('AUDIT_QUEUE_SIZE', 10000)
+        ))
     
     def register_middleware(self):
-        """Registrar middleware para capturar eventos automáticos"""
-        
-        @self.app.before_request
-        def before_request():
-            g.start_time = datetime.utcnow()
-            g.request_id = self.generate_request_id()
-        
-        @self.app.after_request
-        def after_request(response):
-            # Log de request HTTP
-            self.log_http_request(response)
-            return response
+        """Registrar a auditoria HTTP como sink da instrumentação de requisições"""
+        # Tempo, request_id e dados do cliente vêm do RequestRecord; sem hooks próprios
+        init_request_timing(self.app, [AuditSink(self)])
     
     def generate_request_id(self) -> str:
         """Gerar ID único para request"""
@@ -153,34 +153,43 @@ class AuditLogger:
         # Log estruturado em JSON
         self.logger.info(json.dumps(audit_event, ensure_ascii=False, indent=None))
     
-    def log_http_request(self, response):
-        """Log de request HTTP"""
+    def log_http_request(self, record):
+        """Log de request HTTP (RequestRecord, fora do contexto da requisição)"""
         if not self.logger:
             return
         
         # Não logar requests de health check e assets
-        if request.endpoint in ['health_check', 'static']:
+        if record.endpoint in ['health_check', 'static']:
             return
         
-        duration = None
-        if hasattr(g, 'start_time'):
-            duration = (datetime.utcnow() - g.start_time).total_seconds()
+        # Log apenas requests importantes ou com erro
+        if record.status < 400 and record.method not in ['POST', 'PUT', 'DELETE']:
+            return
         
         http_event = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': datetime.utcfromtimestamp(record.started_at).isoformat(),
             'event_type': 'http_request',
-            'method': request.method,
-            'endpoint': request.endpoint,
-            'status_code': response.status_code,
-            'duration_seconds': duration,
-            'client_info': self.get_client_info(),
-            'user_info': self.get_user_info(),
-            'response_size': response.content_length
+            'method': record.method,
+            'endpoint': record.endpoint,
+            'route': record.label,
+            'status_code': record.status,
+            'duration_seconds': record.duration_ms / 1000,
+            'breakdown_ms': {name: round(value, 3) for name, value in record.breakdown.items()},
+            'client_info': {
+                'ip_address': record.ip,
+                'user_agent': record.user_agent,
+                'method': record.method,
+                'endpoint': record.endpoint,
+                'path': record.path,
+                'request_id': record.request_id
+            },
+            'user_info': {
+                'user_id': record.user_id,
+                'authenticated': record.user_id is not None
+            },
+            'response_size': record.response_size
         }
-        
-        # Log apenas requests importantes ou com erro
-        if response.status_code >= 400 or request.method in ['POST', 'PUT', 'DELETE']:
-            self.logger.info(json.dumps(http_event, ensure_ascii=False, indent=None))
+        self.logger.info(json.dumps(http_event, ensure_ascii=False, indent=None))
     
     def log_security_event(self, 
                           event_type: AuditEventType,
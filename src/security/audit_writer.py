@@ -0,0 +1,217 @@
+"""
+Escrita assíncrona em lote para trilhas de auditoria
+
+Eventos de auditoria acontecem em toda requisição que altera dados; gravá-los
+dentro da requisição (uma conexão, um INSERT e um commit por evento) serializa
+as requisições no lock de escrita do SQLite. Aqui as requisições só enfileiram
+e uma thread grava em lotes:
+
+- BatchWriter: fila limitada + thread que entrega lotes a uma função de flush
+  (ex.: executemany em uma transação). Fila cheia aplica backpressure por
+  alguns milissegundos e, persistindo, despeja os itens em um arquivo JSONL
+  que é reprocessado quando a fila esvazia. Sem arquivo de despejo os itens
+  são descartados, contados em `metrics['dropped']` e logados no máximo uma
+  vez por `drop_log_interval`.
+- AsyncAuditHandler: logging.QueueHandler com fila limitada; quando cheia,
+  grava direto no handler de destino em vez de descartar o registro.
+"""
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from typing import Any, Callable, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Fila limitada com gravação em lote por uma thread de background"""
+
+    def __init__(self, flush_func: Callable[[List[Any]], None], max_queue: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 0.5,
+                 block_timeout: float = 0.05, spill_path: Optional[str] = None,
+                 name: str = 'batch-writer', drop_log_interval: float = 60.0):
+        self.flush_func = flush_func
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.spill_path = spill_path
+        self.name = name
+        self.drop_log_interval = drop_log_interval
+        self._last_drop_log = None
+        self._dropped_since_log = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        # Serializa flush_func entre a thread e flush() chamado por outras threads
+        self._write_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self.metrics = {'enqueued': 0, 'written': 0, 'batches': 0, 'spilled': 0,
+                        'replayed': 0, 'errors': 0, 'blocked': 0, 'dropped': 0}
+
+    def start(self):
+        """Inicia a thread de gravação (idempotente)"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, item: Any):
+        """Enfileira um item; não bloqueia a requisição além de `block_timeout`"""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.metrics['blocked'] += 1
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self._spill([item])
+                return
+        self.metrics['enqueued'] += 1
+
+    def _drain(self, first: Any = None) -> List[Any]:
+        batch = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Any], spill_on_error: bool = True):
+        if not batch:
+            return
+        with self._write_lock:
+            try:
+                self.flush_func(batch)
+                self.metrics['written'] += len(batch)
+                self.metrics['batches'] += 1
+            except Exception as e:
+                self.metrics['errors'] += 1
+                logger.error(f"Erro ao gravar lote de {self.name} ({len(batch)} itens): {e}")
+                if spill_on_error:
+                    self._spill(batch)
+                else:
+                    raise
+
+    def _run(self):
+        while self._running:
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._replay_spill()
+                continue
+            batch = self._drain(first)
+            self._write(batch)
+            self._done(len(batch))
+            if self._queue.empty():
+                self._replay_spill()
+
+    def _done(self, count: int):
+        for _ in range(count):
+            self._queue.task_done()
+
+    def flush(self, timeout: float = 5.0):
+        """Grava tudo o que está na fila e espera o lote em andamento (síncrono)"""
+        while True:
+            batch = self._drain()
+            if not batch:
+                break
+            self._write(batch)
+            self._done(len(batch))
+
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+
+    def close(self):
+        """Para a thread e grava o que restou"""
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval * 2)
+        self.flush()
+
+    def _drop(self, count: int):
+        """Conta itens descartados; loga no máximo uma vez por intervalo"""
+        with self._spill_lock:
+            self.metrics['dropped'] += count
+            self._dropped_since_log += count
+            now = time.monotonic()
+            if self._last_drop_log is not None and now - self._last_drop_log < self.drop_log_interval:
+                return
+            dropped, self._dropped_since_log = self._dropped_since_log, 0
+            self._last_drop_log = now
+        logger.error(f"⚠️ Fila {self.name} cheia, {dropped} item(ns) descartado(s)")
+
+    def _spill(self, items: Sequence[Any]):
+        """Sem espaço na fila (ou banco indisponível): persiste em JSONL para reprocessar"""
+        if not self.spill_path:
+            self._drop(len(items))
+            return
+        try:
+            with self._spill_lock, open(self.spill_path, 'a', encoding='utf-8') as spill:
+                for item in items:
+                    spill.write(json.dumps(item, default=str) + '\n')
+            self.metrics['spilled'] += len(items)
+        except Exception as e:
+            logger.error(f"Erro ao despejar eventos de auditoria em disco: {e}")
+
+    def _replay_spill(self):
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        replay_path = f"{self.spill_path}.{int(time.time() * 1000)}.replay"
+        with self._spill_lock:
+            try:
+                os.replace(self.spill_path, replay_path)
+            except OSError:
+                return
+        try:
+            with open(replay_path, encoding='utf-8') as spill:
+                items = [json.loads(line) for line in spill if line.strip()]
+            for start in range(0, len(items), self.batch_size):
+                self._write(items[start:start + self.batch_size], spill_on_error=False)
+            self.metrics['replayed'] += len(items)
+            os.remove(replay_path)
+        except Exception as e:
+            # Devolve ao arquivo de spill para a próxima tentativa
+            logger.error(f"Erro ao reprocessar eventos de auditoria: {e}")
+            with self._spill_lock, open(replay_path, encoding='utf-8') as source, \
+                    open(self.spill_path, 'a', encoding='utf-8') as dst:
+                dst.write(source.read())
+            os.remove(replay_path)
+
+    def stats(self) -> dict:
+        stats = dict(self.metrics)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+class AsyncAuditHandler(logging.handlers.QueueHandler):
+    """QueueHandler com fila limitada que nunca descarta registros"""
+
+    def __init__(self, *handlers: logging.Handler, max_queue: int = 10000, block_timeout: float = 0.05):
+        super().__init__(queue.Queue(maxsize=max_queue))
+        self.handlers = handlers
+        self.block_timeout = block_timeout
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put(record, timeout=self.block_timeout)
+        except queue.Full:
+            # Backpressure esgotado: grava de forma síncrona
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
@@ -10,6 +10,7 @@ import io
 import base64
 import secrets
 import re
+import time
 from typing import Dict, List, Optional, Tuple, Any
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
@@ -27,6 +28,8 @@ import geoip2.database
 import asyncio
 from enum import Enum
 
+from src.security.waf_engine import WAFEngine, WAFRule, iter_strings
+
 logger = logging.getLogger(__name__)
 
 class SecurityLevel(Enum):
@@ -85,6 +88,9 @@ class TwoFactorAuth:
 
 class EnterpriseWAF:
     """Web Application Firewall Empresarial"""
+
+    # Categorias que bloqueiam: sempre confirmadas com a regex, mesmo após o orçamento
+    BLOCKING_THREATS = ('sql_injection', 'xss', 'path_traversal', 'command_injection')
     
     def __init__(self, redis_client):
         self.redis = redis_client
@@ -124,63 +130,73 @@ class EnterpriseWAF:
             'api': {'requests': 1000, 'window': 60},     # 1000 req/min
             'upload': {'requests': 10, 'window': 3600}   # 10 req/hour
         }
+
+        # Pré-filtro de literais sobre todos os padrões; block_score igual ao limiar de 'block'.
+        # Só as categorias fora de BLOCKING_THREATS podem ficar sem confirmação.
+        self.engine = WAFEngine(
+            [WAFRule(threat_type, pattern.pattern, pattern.flags & ~re.UNICODE,
+                     critical=threat_type in self.BLOCKING_THREATS)
+             for threat_type, patterns in self.threat_patterns.items()
+             for pattern in patterns],
+            block_score=75
+        )
+        self.header_engine = self.engine.subset(['suspicious_headers'])
     
     def analyze_request(self, request_data: Dict) -> Dict[str, Any]:
-        """Análise completa da requisição"""
-        threats_detected = []
-        risk_score = 0
-        
+        """Análise completa da requisição (uma varredura por campo, com saída antecipada)"""
+        deadline = time.perf_counter() + self.engine.budget
+
         # Analisar dados da requisição
-        content_to_check = []
-        
-        if request_data.get('json'):
-            content_to_check.append(json.dumps(request_data['json']))
-        
-        if request_data.get('form'):
-            content_to_check.extend(request_data['form'].values())
-        
+        content_to_check = [request_data.get('path', '')]
+
         if request_data.get('args'):
             content_to_check.extend(request_data['args'].values())
-        
-        content_to_check.append(request_data.get('path', ''))
-        
+
+        content_type = request_data.get('content_type')
+        content_length = request_data.get('content_length')
+        if not self.engine.should_skip_body(content_type):
+            if request_data.get('form'):
+                content_to_check.extend(request_data['form'].values())
+
+            if request_data.get('json'):
+                content_to_check.extend(iter_strings(request_data['json']))
+
         # Verificar padrões maliciosos
-        for threat_type, patterns in self.threat_patterns.items():
-            for content in content_to_check:
-                for pattern in patterns:
-                    if pattern.search(str(content)):
-                        threats_detected.append({
-                            'type': threat_type,
-                            'pattern': pattern.pattern,
-                            'content': str(content)[:100] + '...' if len(str(content)) > 100 else str(content)
-                        })
-                        risk_score += 25
-        
+        result = self.engine.scan(content_to_check, deadline=deadline)
+        threats_detected = result['threats']
+        risk_score = result['score']
+
         # Verificar headers suspeitos
         headers = request_data.get('headers', {})
-        for header, value in headers.items():
-            for pattern in self.threat_patterns['suspicious_headers']:
-                if pattern.search(str(value)):
+        if risk_score < self.engine.block_score:
+            for header, value in headers.items():
+                if self.header_engine.first_match(str(value)):
                     threats_detected.append({
                         'type': 'suspicious_header',
                         'header': header,
                         'value': str(value)
                     })
                     risk_score += 15
-        
+
         return {
             'threats_detected': threats_detected,
             'risk_score': min(risk_score, 100),
-            'action': self._determine_action(risk_score)
+            'action': self._determine_action(risk_score, bool(result['unverified'])),
+            'unverified_threats': result['unverified'],
+            'budget_exceeded': result['budget_exceeded']
         }
     
-    def _determine_action(self, risk_score: int) -> str:
-        """Determinar ação baseada no score de risco"""
+    def _determine_action(self, risk_score: int, unverified: bool = False) -> str:
+        """Determinar ação baseada no score de risco
+
+        Candidatas não verificadas (só regras de baixa severidade) pedem ao
+        menos monitor; as categorias de bloqueio são sempre confirmadas.
+        """
         if risk_score >= 75:
             return 'block'
         elif risk_score >= 50:
             return 'challenge'
-        elif risk_score >= 25:
+        elif risk_score >= 25 or unverified:
             return 'monitor'
         else:
             return 'allow'
@@ -312,6 +328,9 @@ class DeviceTracker:
 class SecurityAuditSystem:
     """Sistema avançado de auditoria de segurança"""
     
+    # Janela mantida nos índices (igual ao maior TTL de evento)
+    INDEX_RETENTION = 86400 * 90
+    
     def __init__(self, redis_client):
         self.redis = redis_client
         self.severity_levels = {
@@ -352,35 +371,44 @@ class SecurityAuditSystem:
             'critical': 86400 * 90  # 90 dias
         }.get(severity, 86400)
         
-        event_key = f"security_event:{event['id']}"
-        self.redis.setex(event_key, ttl, json.dumps(event))
-        
-        # Adicionar a índices para busca
-        self._index_event(event)
+        # Evento + índices em uma única ida ao Redis
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.setex(f"security_event:{event['id']}", ttl, json.dumps(event))
+        self._index_event(event, pipe)
+        pipe.execute()
         
         # Verificar se precisa de alerta
         if severity in ['error', 'critical']:
             self._trigger_alert(event)
     
-    def _index_event(self, event: Dict):
+    def _index_event(self, event: Dict, pipe):
         """Indexar evento para busca eficiente"""
         timestamp = datetime.fromisoformat(event['timestamp']).timestamp()
+        cutoff = timestamp - self.INDEX_RETENTION
         
+        index_keys = [
+            f"security_index:type:{event['type']}",
+            f"security_index:severity:{event['severity']}"
+        ]
         # Índice por usuário
         if event['user_id']:
-            user_index = f"security_index:user:{event['user_id']}"
-            self.redis.zadd(user_index, {event['id']: timestamp})
-            self.redis.expire(user_index, 86400 * 90)  # 90 dias
-        
-        # Índice por tipo
-        type_index = f"security_index:type:{event['type']}"
-        self.redis.zadd(type_index, {event['id']: timestamp})
-        self.redis.expire(type_index, 86400 * 90)
-        
-        # Índice por severidade
-        severity_index = f"security_index:severity:{event['severity']}"
-        self.redis.zadd(severity_index, {event['id']: timestamp})
-        self.redis.expire(severity_index, 86400 * 90)
+            index_keys.append(f"security_index:user:{event['user_id']}")
+        
+        for index_key in index_keys:
+            pipe.zadd(index_key, {event['id']: timestamp})
+            # Remove do índice ids mais antigos que a retenção (índices não crescem sem limite)
+            pipe.zremrangebyscore(index_key, '-inf', cutoff)
+            pipe.expire(index_key, self.INDEX_RETENTION)
+        
+        # Partição diária: buscas sem filtro leem só os dias do intervalo e
+        # a retenção é a expiração da chave inteira
+        day_key = self._day_index_key(event['timestamp'][:10])
+        pipe.zadd(day_key, {event['id']: timestamp})
+        pipe.expire(day_key, self.INDEX_RETENTION + 86400)
+    
+    @staticmethod
+    def _day_index_key(day: str) -> str:
+        return f"security_index:day:{day.replace('-', '')}"
     
     def _trigger_alert(self, event: Dict):
         """Disparar alerta para eventos críticos"""
@@ -401,53 +429,47 @@ class SecurityAuditSystem:
         # Em produção, enviar para sistema de notificação
         logger.critical(f"SECURITY ALERT: {json.dumps(alert)}")
     
-    def search_events(self, filters: Dict) -> List[Dict]:
+    def search_events(self, filters: Dict, limit: int = 100) -> List[Dict]:
         """Buscar eventos com filtros"""
-        events = []
+        start_time = filters.get('start_time')
+        end_time = filters.get('end_time')
+        
+        end_moment = datetime.fromisoformat(end_time) if end_time else datetime.utcnow()
+        start_moment = (datetime.fromisoformat(start_time) if start_time
+                        else end_moment - timedelta(seconds=self.INDEX_RETENTION))
+        start_timestamp = start_moment.timestamp()
+        end_timestamp = end_moment.timestamp()
         
         # Determinar qual índice usar
         if filters.get('user_id'):
-            index_key = f"security_index:user:{filters['user_id']}"
+            index_keys = [f"security_index:user:{filters['user_id']}"]
         elif filters.get('event_type'):
-            index_key = f"security_index:type:{filters['event_type']}"
+            index_keys = [f"security_index:type:{filters['event_type']}"]
         elif filters.get('severity'):
-            index_key = f"security_index:severity:{filters['severity']}"
+            index_keys = [f"security_index:severity:{filters['severity']}"]
         else:
-            # Busca geral (menos eficiente)
-            pattern = "security_event:*"
-            for key in self.redis.scan_iter(match=pattern, count=1000):
-                event_data = self.redis.get(key)
-                if event_data:
-                    events.append(json.loads(event_data.decode()))
-            
-            return sorted(events, key=lambda x: x['timestamp'], reverse=True)[:100]
-        
-        # Buscar por índice
-        start_time = filters.get('start_time')
-        end_time = filters.get('end_time')
-        
-        if start_time:
-            start_timestamp = datetime.fromisoformat(start_time).timestamp()
-        else:
-            start_timestamp = 0
-        
-        if end_time:
-            end_timestamp = datetime.fromisoformat(end_time).timestamp()
-        else:
-            end_timestamp = datetime.utcnow().timestamp()
-        
-        event_ids = self.redis.zrangebyscore(
-            index_key, start_timestamp, end_timestamp, 
-            start=0, num=100, desc=True
-        )
-        
-        # Carregar eventos completos
-        for event_id in event_ids:
-            event_data = self.redis.get(f"security_event:{event_id.decode()}")
-            if event_data:
-                events.append(json.loads(event_data.decode()))
+            # Busca geral: partições diárias do intervalo, da mais recente para a mais antiga
+            days = (end_moment.date() - start_moment.date()).days
+            index_keys = [
+                self._day_index_key((end_moment.date() - timedelta(days=offset)).isoformat())
+                for offset in range(days + 1)
+            ]
         
-        return events
+        event_ids = []
+        for index_key in index_keys:
+            event_ids.extend(self.redis.zrevrangebyscore(
+                index_key, end_timestamp, start_timestamp,
+                start=0, num=limit - len(event_ids)
+            ))
+            if len(event_ids) >= limit:
+                break
+        
+        if not event_ids:
+            return []
+        
+        # Carregar eventos completos com um único MGET
+        keys = [f"security_event:{event_id.decode()}" for event_id in event_ids]
+        return [json.loads(data) for data in self.redis.mget(keys) if data]
 
 # Inicialização do sistema de segurança empresarial
 def init_enterprise_security(app, redis_client, config: SecurityConfig):
@@ -462,15 +484,18 @@ def init_enterprise_security(app, redis_client, config: SecurityConfig):
     # Middleware de segurança global
     @app.before_request
     def enterprise_security_middleware():
-        # Coletar informações da requisição
+        # Coletar informações da requisição (corpos binários não são decodificados)
+        skip_body = waf.engine.should_skip_body(request.content_type)
         request_info = {
             'ip': request.remote_addr,
             'user_agent': request.headers.get('User-Agent'),
             'method': request.method,
             'path': request.path,
             'endpoint': request.endpoint,
-            'json': request.get_json(silent=True),
-            'form': dict(request.form),
+            'content_type': request.content_type,
+            'content_length': request.content_length,
+            'json': None if skip_body else request.get_json(silent=True),
+            'form': {} if skip_body else dict(request.form),
             'args': dict(request.args),
             'headers': dict(request.headers)
         }
@@ -0,0 +1,157 @@
+"""
+Rate limiting em memória com uso de memória limitado
+
+Cada chave ocupa uma entrada de tamanho fixo (sliding window counter com
+`__slots__`: contagem da janela atual e da anterior), em dicts particionados
+com lock por shard. Entradas ociosas são removidas por uma varredura em
+background e o número de chaves tem teto rígido com despejo LRU, de modo que
+tráfego de scanners (muitas chaves distintas) não faz a memória crescer.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Counter:
+    __slots__ = ('index', 'current', 'previous', 'window', 'expires_at')
+
+    def __init__(self, index: int, window: float):
+        self.index = index
+        self.current = 0
+        self.previous = 0
+        self.window = window
+        self.expires_at = 0.0
+
+    def roll(self, now: float) -> int:
+        """Avança para a janela de `now`; retorna o índice atual"""
+        index = int(now // self.window)
+        if index != self.index:
+            self.previous = self.current if index == self.index + 1 else 0
+            self.current = 0
+            self.index = index
+        return index
+
+    def estimate(self, now: float) -> float:
+        elapsed = now - self.index * self.window
+        return self.previous * (self.window - elapsed) / self.window + self.current
+
+
+class LocalLimiter:
+    """Contadores sliding window por chave, particionados e com teto de chaves"""
+
+    def __init__(self, max_keys: int = 100000, shards: int = 16, sweep_interval: float = 60.0):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._shards: List[OrderedDict] = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._per_shard = max(1, max_keys // shards)
+        self.evictions = 0
+        self.swept = 0
+        self._sweeper = None
+        self._running = False
+
+    def _shard(self, key: str) -> Tuple[threading.Lock, OrderedDict]:
+        index = hash(key) % len(self._shards)
+        return self._locks[index], self._shards[index]
+
+    def _get_or_create(self, shard: OrderedDict, key: str, window: float, now: float) -> _Counter:
+        """Chamado com o lock do shard adquirido"""
+        counter = shard.get(key)
+        if counter is None or counter.window != window:
+            counter = _Counter(int(now // window), window)
+            shard[key] = counter
+            while len(shard) > self._per_shard:
+                shard.popitem(last=False)
+                self.evictions += 1
+        else:
+            shard.move_to_end(key)
+        counter.roll(now)
+        # Após duas janelas sem uso, a entrada não influencia mais a estimativa
+        counter.expires_at = (counter.index + 2) * window
+        return counter
+
+    def acquire(self, key: str, capacity: int, window: float, want: int = 1,
+                minimum: int = 1) -> Tuple[int, int, float, float]:
+        """Consome até `want` unidades (mínimo `minimum`) de `capacity` por `window` segundos.
+
+        Retorna (concedidos, restantes, retry_after, reset_after) em segundos.
+        """
+        now = time.monotonic()
+        lock, shard = self._shard(key)
+        with lock:
+            counter = self._get_or_create(shard, key, window, now)
+            elapsed = now - counter.index * window
+            available = int(capacity - counter.estimate(now))
+            if available < minimum:
+                retry = window - elapsed
+                if counter.previous > 0 and counter.current + minimum <= capacity:
+                    # O peso da janela anterior cai linearmente: espera até sobrar espaço
+                    retry = window * (1 - (capacity - counter.current - minimum) / counter.previous) - elapsed
+                elif counter.current > 0:
+                    # A janela atual vira a anterior e ainda pesa: espera o peso dela cair o bastante
+                    retry += max(window * (1 - (capacity - minimum) / counter.current), 0)
+                return 0, max(available, 0), max(retry, 0.001), window - elapsed
+            granted = min(want, available)
+            counter.current += granted
+        return granted, available - granted, 0.0, window - elapsed
+
+    def record(self, key: str, window: float, amount: int = 1) -> float:
+        """Registra `amount` eventos e retorna a estimativa de eventos na última janela"""
+        now = time.monotonic()
+        lock, shard = self._shard(key)
+        with lock:
+            counter = self._get_or_create(shard, key, window, now)
+            counter.current += amount
+            return counter.estimate(now)
+
+    def reset(self, key: str):
+        lock, shard = self._shard(key)
+        with lock:
+            shard.pop(key, None)
+
+    def sweep(self) -> int:
+        """Remove entradas ociosas; um shard por vez para não segurar locks longamente"""
+        removed = 0
+        for shard, lock in zip(self._shards, self._locks):
+            now = time.monotonic()
+            with lock:
+                for key in [k for k, counter in shard.items() if counter.expires_at <= now]:
+                    del shard[key]
+                    removed += 1
+        self.swept += removed
+        return removed
+
+    def start_sweeper(self):
+        """Inicia a varredura periódica de chaves ociosas"""
+        if self._running:
+            return
+        self._running = True
+
+        def sweep_loop():
+            while self._running:
+                time.sleep(self.sweep_interval)
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Erro na varredura do rate limiter local: {e}")
+
+        self._sweeper = threading.Thread(target=sweep_loop, daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._running = False
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'keys': len(self),
+            'max_keys': self._per_shard * len(self._shards),
+            'evictions': self.evictions,
+            'swept': self.swept
+        }
@@ -0,0 +1,246 @@
+"""
+Motor de rate limiting atômico
+
+Cada verificação é um único script Lua no Redis (uma ida e volta, atômica),
+com memória O(1) por chave:
+- GCRA: guarda apenas o "theoretical arrival time" da chave;
+- sliding window counter: contadores da janela atual e da anterior, com
+  estimativa ponderada.
+
+Para limites altos, cada processo reserva um pequeno lote de tokens de uma
+vez e os consome localmente por até `lease_ttl` segundos; negações também
+ficam em cache local até o `retry_after`. Assim a maioria das verificações
+não vai ao Redis, sem ultrapassar o limite global.
+"""
+import math
+import time
+import logging
+import threading
+from typing import Dict, Tuple
+
+from src.security.local_limiter import LocalLimiter
+
+logger = logging.getLogger(__name__)
+
+# Retorno dos scripts: {concedidos, restantes, retry_after_ms, reset_after_ms}
+_GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local min = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+
+local available = math.floor((tolerance - (tat - now)) / interval)
+if available < min then
+    return {0, math.max(available, 0), tat + interval * min - tolerance - now, tat - now}
+end
+
+local grant = math.min(want, available)
+local new_tat = tat + interval * grant
+if new_tat > now then
+    redis.call('SET', KEYS[1], string.format('%d', new_tat), 'PX', new_tat - now)
+end
+return {grant, available - grant, 0, new_tat - now}
+"""
+
+_SLIDING_WINDOW_SCRIPT = """
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local min = tonumber(ARGV[4])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+
+local index = math.floor(now / window)
+local state = redis.call('HMGET', KEYS[1], 'index', 'current', 'previous')
+local current_index = tonumber(state[1]) or index
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if current_index ~= index then
+    if current_index == index - 1 then previous = current else previous = 0 end
+    current = 0
+end
+
+local elapsed = now % window
+local estimated = previous * (window - elapsed) / window + current
+local available = math.floor(limit - estimated)
+if available < min then
+    local retry = window - elapsed
+    local needed = current + min - limit
+    if previous > 0 and needed <= 0 then
+        -- O peso da janela anterior cai linearmente: espera até sobrar espaço
+        retry = math.ceil(window * (1 - (limit - current - min) / previous)) - elapsed
+    elseif needed > 0 and current > 0 then
+        -- A janela atual vira a anterior e ainda pesa: espera o peso dela cair o bastante
+        retry = retry + math.max(math.ceil(window * (1 - (limit - min) / current)), 0)
+    end
+    return {0, math.max(available, 0), math.max(retry, 1), window - elapsed}
+end
+
+local grant = math.min(want, available)
+if grant > 0 then
+    redis.call('HSET', KEYS[1], 'index', index, 'current', current + grant, 'previous', previous)
+    redis.call('PEXPIRE', KEYS[1], window * 2)
+end
+return {grant, available - grant, 0, window - elapsed}
+"""
+
+ALGORITHMS = ('gcra', 'sliding_window')
+
+
+class RateLimitDecision:
+    """Resultado de uma verificação de limite"""
+    __slots__ = ('allowed', 'limit', 'remaining', 'retry_after', 'reset_after')
+
+    def __init__(self, allowed: bool, limit: int, remaining: int,
+                 retry_after: float = 0.0, reset_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.retry_after = retry_after
+        self.reset_after = reset_after
+
+    def to_dict(self) -> Dict:
+        now = time.time()
+        return {
+            'allowed': self.allowed,
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'reset_time': int(now + self.reset_after),
+            'retry_after': int(math.ceil(self.retry_after))
+        }
+
+
+class _Lease:
+    """Tokens reservados no Redis para consumo local (ou negação em cache)"""
+    __slots__ = ('tokens', 'remaining', 'expires_at', 'reset_at', 'denied')
+
+    def __init__(self, tokens: int, remaining: int, expires_at: float, reset_at: float, denied: bool = False):
+        self.tokens = tokens
+        self.remaining = remaining
+        self.expires_at = expires_at
+        self.reset_at = reset_at
+        self.denied = denied
+
+
+class RateLimitEngine:
+    """Rate limiting GCRA / sliding window counter com pré-verificação local"""
+
+    def __init__(self, redis_client=None, algorithm: str = 'gcra',
+                 max_lease: int = 20, lease_ttl: float = 1.0, local_max_keys: int = 100000):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Algoritmo de rate limit desconhecido: {algorithm}")
+        self.redis = redis_client
+        self.algorithm = algorithm
+        self.max_lease = max_lease
+        self.lease_ttl = lease_ttl
+        self._script = None
+        if redis_client is not None:
+            source = _GCRA_SCRIPT if algorithm == 'gcra' else _SLIDING_WINDOW_SCRIPT
+            self._script = redis_client.register_script(source)
+        self._leases: Dict[str, _Lease] = {}
+        self.max_leases = local_max_keys
+        self._lock = threading.Lock()
+        # Estado em memória sem Redis (limitado em chaves, com varredura de ociosas)
+        self.local = LocalLimiter(max_keys=local_max_keys)
+        if redis_client is None:
+            self.local.start_sweeper()
+        self.metrics = {'local_hits': 0, 'redis_calls': 0, 'denied': 0}
+
+    def _storage_key(self, key: str) -> str:
+        # Sufixo evita WRONGTYPE com chaves antigas (sorted sets) ou do outro algoritmo
+        return f"{key}:{'gcra' if self.algorithm == 'gcra' else 'swc'}"
+
+    def lease_size(self, capacity: int) -> int:
+        """Limites baixos (login, registro) sempre consultam o Redis"""
+        return max(1, min(self.max_lease, capacity // 100))
+
+    def hit(self, key: str, limit: int, window: int, burst: int = 0, cost: int = 1) -> RateLimitDecision:
+        """Consome `cost` tokens de `key` (limite de `limit` por `window` segundos)"""
+        capacity = limit + burst
+        now = time.monotonic()
+
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease.expires_at > now:
+                if lease.denied:
+                    self.metrics['local_hits'] += 1
+                    self.metrics['denied'] += 1
+                    return RateLimitDecision(False, limit, 0, lease.expires_at - now, lease.reset_at - now)
+                if lease.tokens >= cost:
+                    lease.tokens -= cost
+                    self.metrics['local_hits'] += 1
+                    return RateLimitDecision(True, limit, lease.remaining + lease.tokens,
+                                             0.0, lease.reset_at - now)
+
+        want = max(cost, self.lease_size(capacity))
+        try:
+            granted, remaining, retry_after, reset_after = self._acquire(key, limit, window, burst, want, cost)
+        except Exception as e:
+            logger.error(f"Erro no rate limit {key}: {e}")
+            return RateLimitDecision(True, limit, limit)
+
+        with self._lock:
+            if len(self._leases) >= self.max_leases:
+                self._purge_leases(now)
+            if granted < cost:
+                self.metrics['denied'] += 1
+                self._leases[key] = _Lease(0, 0, now + retry_after, now + reset_after, denied=True)
+                return RateLimitDecision(False, limit, 0, retry_after, reset_after)
+
+            if granted > cost:
+                self._leases[key] = _Lease(granted - cost, remaining, now + self.lease_ttl, now + reset_after)
+            else:
+                self._leases.pop(key, None)
+        return RateLimitDecision(True, limit, remaining + granted - cost, 0.0, reset_after)
+
+    def _purge_leases(self, now: float):
+        """Remove leases vencidos; se ainda acima do teto, descarta todos (são só otimização)"""
+        for key in [k for k, lease in self._leases.items() if lease.expires_at <= now]:
+            del self._leases[key]
+        if len(self._leases) >= self.max_leases:
+            self._leases.clear()
+
+    def peek(self, key: str, limit: int, window: int, burst: int = 0) -> RateLimitDecision:
+        """Consulta o estado sem consumir tokens"""
+        granted, remaining, retry_after, reset_after = self._acquire(key, limit, window, burst, 0, 0)
+        return RateLimitDecision(True, limit, remaining, retry_after, reset_after)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._leases.pop(key, None)
+        self.local.reset(key)
+        if self.redis is not None:
+            self.redis.delete(self._storage_key(key))
+
+    def _acquire(self, key: str, limit: int, window: int, burst: int,
+                 want: int, minimum: int) -> Tuple[int, int, float, float]:
+        """(concedidos, restantes, retry_after s, reset_after s)"""
+        if self.redis is None:
+            return self.local.acquire(key, limit + burst, window, want, minimum)
+
+        self.metrics['redis_calls'] += 1
+        window_ms = window * 1000
+        if self.algorithm == 'gcra':
+            interval = max(1, window_ms // limit)
+            args = [interval, interval * (limit + burst), want, minimum]
+        else:
+            args = [window_ms, limit + burst, want, minimum]
+        granted, remaining, retry_ms, reset_ms = self._script(keys=[self._storage_key(key)], args=args)
+        return int(granted), int(remaining), int(retry_ms) / 1000.0, int(reset_ms) / 1000.0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.metrics)
+            stats['leases'] = len(self._leases)
+        stats['local'] = self.local.stats()
+        # Sem Redis o estado fica no LocalLimiter (sliding window counter)
+        stats['algorithm'] = self.algorithm if self.redis is not None else 'sliding_window'
+        stats['backend'] = 'redis' if self.redis is not None else 'memory'
+        return stats
@@ -1,16 +1,23 @@
-import time
-import redis
 from functools import wraps
-from flask import request, jsonify, current_app
-from typing import Dict, Optional, Tuple
-import hashlib
-import json
+from flask import request, jsonify
+from typing import Dict, Tuple
+import threading
+
+from src.config import Config
+from src.security.rate_limit_engine import RateLimitEngine
 
 class RateLimiter:
-    """Sistema de Rate Limiting avançado com Redis"""
+    """Sistema de Rate Limiting avançado com Redis
+
+    A conexão com o Redis (e o motor) só é criada na primeira verificação ou
+    em init_app, nunca no import do módulo.
+    """
     
-    def __init__(self, redis_client=None):
-        self.redis_client = redis_client or self._get_redis_client()
+    def __init__(self, redis_client=None, algorithm: str = None):
+        self._redis_client = redis_client
+        self.algorithm = algorithm
+        self._engine = None
+        self._engine_lock = threading.Lock()
         self.default_limits = {
             'login': {'requests': 5, 'window': 300},  # 5 tentativas por 5 min
             'register': {'requests': 3, 'window': 3600},  # 3 registros por hora
@@ -19,19 +26,38 @@ class RateLimiter:
             'ai': {'requests': 20, 'window': 3600}  # 20 requests IA por hora
         }
     
+    def init_app(self, app):
+        """Conecta ao Redis na inicialização do app em vez da primeira requisição"""
+        return self.engine
+    
+    @property
+    def engine(self) -> RateLimitEngine:
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    if self._redis_client is None:
+                        self._redis_client = self._get_redis_client()
+                    self._engine = RateLimitEngine(
+                        self._redis_client,
+                        algorithm=self.algorithm or getattr(Config, 'RATE_LIMIT_ALGORITHM', 'gcra'),
+                        max_lease=getattr(Config, 'RATE_LIMIT_MAX_LEASE', 20)
+                    )
+        return self._engine
+    
+    @property
+    def redis_client(self):
+        return self.engine.redis
+    
     def _get_redis_client(self):
-        """Conectar ao Redis ou usar fallback em memória"""
+        """Conectar ao Redis ou usar fallback em memória (None)"""
         try:
             import redis
-            return redis.Redis(
-                host=current_app.config.get('REDIS_HOST', 'localhost'),
-                port=current_app.config.get('REDIS_PORT', 6379),
-                db=current_app.config.get('REDIS_DB', 0),
-                decode_responses=True
-            )
-        except:
+            client = redis.from_url(getattr(Config, 'REDIS_URL', 'redis://localhost:6379/0'), socket_connect_timeout=1)
+            client.ping()
+            return client
+        except Exception:
             # Fallback para armazenamento em memória
-            return InMemoryStore()
+            return None
     
     def _get_client_id(self, request) -> str:
         """Obter identificador único do cliente"""
@@ -49,54 +75,14 @@ class RateLimiter:
         return f"ip:{ip}"
     
     def is_allowed(self, key: str, limit_type: str = 'api') -> Tuple[bool, Dict]:
-        """Verificar se request é permitido"""
+        """Verificar se request é permitido (uma chamada atômica ao Redis, no máximo)"""
         limits = self.default_limits.get(limit_type, self.default_limits['api'])
         
-        current_time = int(time.time())
-        window_start = current_time - limits['window']
-        
         # Chave Redis
         redis_key = f"rate_limit:{limit_type}:{key}"
         
-        try:
-            # Obter requests atuais
-            current_requests = self.redis_client.zcount(redis_key, window_start, current_time)
-            
-            if current_requests >= limits['requests']:
-                # Obter tempo de reset
-                oldest_request = self.redis_client.zrange(redis_key, 0, 0, withscores=True)
-                reset_time = int(oldest_request[0][1]) + limits['window'] if oldest_request else current_time + limits['window']
-                
-                return False, {
-                    'allowed': False,
-                    'limit': limits['requests'],
-                    'remaining': 0,
-                    'reset_time': reset_time,
-                    'retry_after': reset_time - current_time
-                }
-            
-            # Adicionar request atual
-            self.redis_client.zadd(redis_key, {str(current_time): current_time})
-            
-            # Limpar requests antigos
-            self.redis_client.zremrangebyscore(redis_key, 0, window_start)
-            
-            # Definir TTL
-            self.redis_client.expire(redis_key, limits['window'])
-            
-            remaining = limits['requests'] - current_requests - 1
-            
-            return True, {
-                'allowed': True,
-                'limit': limits['requests'],
-                'remaining': remaining,
-                'reset_time': current_time + limits['window']
-            }
-            
-        except Exception as e:
-            # Em caso de erro, permitir request
-            current_app.logger.error(f"Rate limiter error: {e}")
-            return True, {'allowed': True, 'error': str(e)}
+        decision = self.engine.hit(redis_key, limits['requests'], limits['window'])
+        return decision.allowed, decision.to_dict()
     
     def decorator(self, limit_type: str = 'api'):
         """Decorator para aplicar rate limiting"""
@@ -124,36 +110,6 @@ class RateLimiter:
             return wrapper
         return decorator_wrapper
 
-class InMemoryStore:
-    """Fallback para armazenamento em memória"""
-    
-    def __init__(self):
-        self.data = {}
-    
-    def zadd(self, key, mapping):
-        if key not in self.data:
-            self.data[key] = []
-        for value, score in mapping.items():
-            self.data[key].append((value, score))
-    
-    def zcount(self, key, min_score, max_score):
-        if key not in self.data:
-            return 0
-        return len([x for x in self.data[key] if min_score <= x[1] <= max_score])
-    
-    def zrange(self, key, start, end, withscores=False):
-        if key not in self.data:
-            return []
-        result = sorted(self.data[key], key=lambda x: x[1])[start:end+1]
-        return result if withscores else [x[0] for x in result]
-    
-    def zremrangebyscore(self, key, min_score, max_score):
-        if key in self.data:
-            self.data[key] = [x for x in self.data[key] if not (min_score <= x[1] <= max_score)]
-    
-    def expire(self, key, seconds):
-        pass  # Não implementado no fallback
-
 # Instância global
 rate_limiter = RateLimiter()
 
@@ -0,0 +1,353 @@
+"""
+Motor de detecção do WAF com pré-filtro de literais
+
+Como no Hyperscan, cada padrão é decomposto nos literais que obrigatoriamente
+aparecem em qualquer match ("UNION" e "SELECT" em UNION.*SELECT, um de
+";&|`$" em [;&|`$]...). Por campo, os literais são procurados com busca de
+substring (C, sem backtracking) e só os padrões cujos literais estão todos
+presentes são avaliados com a regex completa. Tráfego limpo quase nunca
+chega ao motor de regex.
+
+A análise para assim que o score de bloqueio é atingido e nunca falha
+aberta: o pré-filtro sempre percorre todos os campos, inteiros, e toda
+candidata de uma regra crítica (SQLi, XSS, ...) é confirmada com a regex
+sobre o campo inteiro. O orçamento de tempo e o limite `max_field_length`
+valem só para regras não críticas; candidata não crítica que fica sem
+confirmação sai como "não verificada" e quem chama escala a ação.
+"""
+import re
+import time
+from itertools import islice
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+    import sre_constants
+
+# Corpos binários: não têm campos textuais (get_json/form vêm vazios), não há o que varrer.
+# multipart/form-data não entra: os campos de texto do formulário são varridos, os arquivos não
+DEFAULT_SKIP_CONTENT_TYPES = (
+    'application/octet-stream',
+    'application/pdf',
+    'image/',
+    'audio/',
+    'video/',
+)
+
+# Caracteres que o `re` com IGNORECASE casa com letras ASCII, mas cujo lower() não é ASCII
+# ("UNİON" casa com UNION): o pré-filtro os dobra antes de procurar os literais
+_CASE_EQUIVALENTS = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's', '\u212a': 'k'})
+
+
+def fold_case(text: str) -> str:
+    """lower() que preserva o comprimento e cobre as equivalências do IGNORECASE com ASCII"""
+    if text.isascii():
+        return text.lower()
+    return text.translate(_CASE_EQUIVALENTS).lower()
+
+
+@dataclass(frozen=True)
+class WAFRule:
+    """Padrão de ameaça"""
+    threat_type: str
+    pattern: str
+    flags: int = 0
+    score: int = 25
+    critical: bool = True       # sempre verificada, sem orçamento nem truncamento
+
+
+def _factors(items) -> List[FrozenSet[str]]:
+    """Literais obrigatórios de uma sequência de ops: cada item é um conjunto "um destes"."""
+    factors: List[FrozenSet[str]] = []
+    run = ''
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run += chr(av)
+            continue
+        if run:
+            factors.append(frozenset([run]))
+            run = ''
+        if op is sre_constants.SUBPATTERN:
+            factors.extend(_factors(av[-1]))
+        elif op is sre_constants.BRANCH:
+            alternatives = [_best_factor(_factors(alternative)) for alternative in av[1]]
+            if all(alternatives):
+                factors.append(frozenset().union(*alternatives))
+        elif op is sre_constants.IN:
+            if all(code is sre_constants.LITERAL for code, _ in av):
+                factors.append(frozenset(chr(value) for _, value in av))
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+            factors.extend(_factors(av[2]))
+    if run:
+        factors.append(frozenset([run]))
+    return factors
+
+
+def _best_factor(factors: List[FrozenSet[str]]) -> Optional[FrozenSet[str]]:
+    """O fator mais seletivo (maior literal mínimo)"""
+    if not factors:
+        return None
+    return max(factors, key=lambda factor: min(len(literal) for literal in factor))
+
+
+def _leading_factor(items) -> Optional[FrozenSet[str]]:
+    """Literais com que todo match começa (após asserções de largura zero), se houver"""
+    for index, (op, av) in enumerate(items):
+        if op is sre_constants.AT:
+            continue
+        if op is sre_constants.LITERAL:
+            run = ''
+            for next_op, next_av in items[index:]:
+                if next_op is not sre_constants.LITERAL:
+                    break
+                run += chr(next_av)
+            return frozenset([run])
+        if op is sre_constants.SUBPATTERN:
+            return _leading_factor(list(av[-1]))
+        if op is sre_constants.BRANCH:
+            alternatives = [_leading_factor(list(alternative)) for alternative in av[1]]
+            return frozenset().union(*alternatives) if all(alternatives) else None
+        if op is sre_constants.IN and all(code is sre_constants.LITERAL for code, _ in av):
+            return frozenset(chr(value) for _, value in av)
+        return None
+    return None
+
+
+def leading_literals(pattern: str, flags: int = 0) -> Optional[FrozenSet[str]]:
+    """Literais que iniciam todo match de `pattern` (minúsculos se IGNORECASE)"""
+    try:
+        factor = _leading_factor(list(sre_parse.parse(pattern, flags)))
+    except Exception:
+        return None
+    if factor and flags & re.IGNORECASE:
+        if not all(literal.isascii() for literal in factor):
+            return None
+        factor = frozenset(literal.lower() for literal in factor)
+    return factor
+
+
+def required_literals(pattern: str, flags: int = 0) -> Tuple[FrozenSet[str], ...]:
+    """Literais que todo match de `pattern` contém (minúsculos se IGNORECASE)"""
+    try:
+        factors = _factors(sre_parse.parse(pattern, flags))
+    except Exception:
+        return ()
+    if flags & re.IGNORECASE:
+        # Fora do ASCII, lower() não cobre todas as equivalências do `re`: o fator é descartado
+        factors = [frozenset(literal.lower() for literal in factor) for factor in factors
+                   if all(literal.isascii() for literal in factor)]
+    return tuple(factors)
+
+
+def _walk_strings(value: Any) -> Iterator[str]:
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, dict):
+            for key, nested in item.items():
+                if isinstance(key, str):
+                    yield key
+                stack.append(nested)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+
+
+def iter_strings(value: Any, max_items: int = 10000) -> Iterator[str]:
+    """Strings (chaves e valores) de um JSON já decodificado, sem serializá-lo de volta.
+
+    Além de `max_items`, as strings restantes saem juntas em um único campo:
+    nada deixa de ser varrido, só deixa de custar uma varredura por item.
+    """
+    strings = _walk_strings(value)
+    yield from islice(strings, max_items)
+    rest = '\n'.join(strings)
+    if rest:
+        yield rest
+
+
+class _CompiledRule:
+    __slots__ = ('rule', 'regex', 'masks', 'anchor', 'ignorecase')
+
+    # Acima disso, volta para a busca da regex a partir da última ocorrência
+    MAX_ANCHORED_ATTEMPTS = 64
+
+    def __init__(self, rule: WAFRule, masks: Tuple[int, ...]):
+        self.rule = rule
+        self.regex = re.compile(rule.pattern, rule.flags)
+        # Um bitmask por fator: a regra só é candidata se todos tiverem algum literal presente
+        self.masks = masks
+        self.anchor = leading_literals(rule.pattern, rule.flags)
+        self.ignorecase = bool(rule.flags & re.IGNORECASE)
+
+    def search(self, text: str, haystack: str) -> bool:
+        """Confirma o match; com âncora, testa a regex só onde o literal inicial aparece.
+
+        Padrões como \\b(curl|nc)\\b não têm prefixo literal para o `re` otimizar
+        e custam dezenas de µs em textos longos; ancorados, custam poucos.
+        """
+        if self.anchor is None or len(haystack) != len(text):
+            return self.regex.search(text) is not None
+
+        match = self.regex.match
+        attempts = 0
+        for literal in self.anchor:
+            start = haystack.find(literal)
+            while start != -1:
+                attempts += 1
+                if attempts > self.MAX_ANCHORED_ATTEMPTS:
+                    return self.regex.search(text, start) is not None
+                if match(text, start):
+                    return True
+                start = haystack.find(literal, start + 1)
+        return False
+
+
+class WAFEngine:
+    """Varredura multi-padrão com pré-filtro de literais e saída antecipada"""
+
+    def __init__(self, rules: Iterable[WAFRule], block_score: int = 75,
+                 max_field_length: int = 16384, budget_ms: float = 0.5,
+                 skip_content_types: Tuple[str, ...] = DEFAULT_SKIP_CONTENT_TYPES):
+        self.rules: List[WAFRule] = list(rules)
+        self.block_score = block_score
+        self.max_field_length = max_field_length
+        self.budget = budget_ms / 1000.0
+        self.skip_content_types = skip_content_types
+        self._compile()
+
+    def _compile(self):
+        """Numera os literais (bit por literal) e traduz os fatores de cada regra em bitmasks"""
+        bits: Dict[Tuple[str, bool], int] = {}
+        self._compiled: List[_CompiledRule] = []
+        for rule in self.rules:
+            ignorecase = bool(rule.flags & re.IGNORECASE)
+            masks = []
+            for factor in required_literals(rule.pattern, rule.flags):
+                mask = 0
+                for literal in factor:
+                    mask |= bits.setdefault((literal, ignorecase), 1 << len(bits))
+                masks.append(mask)
+            self._compiled.append(_CompiledRule(rule, tuple(masks)))
+
+        self._literals = [(literal, bit) for (literal, ignorecase), bit in bits.items() if not ignorecase]
+        self._literals_lower = [(literal, bit) for (literal, ignorecase), bit in bits.items() if ignorecase]
+        # Regras sem literal obrigatório são sempre avaliadas
+        self._always = any(not compiled.masks for compiled in self._compiled)
+
+    def subset(self, threat_types: Iterable[str]) -> 'WAFEngine':
+        """Motor com apenas as regras dos tipos informados (mesma configuração)"""
+        wanted = set(threat_types)
+        return WAFEngine(
+            [rule for rule in self.rules if rule.threat_type in wanted],
+            block_score=self.block_score,
+            max_field_length=self.max_field_length,
+            budget_ms=self.budget * 1000.0,
+            skip_content_types=self.skip_content_types
+        )
+
+    def should_skip_body(self, content_type: Optional[str]) -> bool:
+        """Corpos binários não têm campos textuais para decodificar"""
+        if not content_type:
+            return False
+        content_type = content_type.lower()
+        return any(content_type.startswith(prefix) for prefix in self.skip_content_types)
+
+    def _matches(self, text: str, verify: bool = True) -> Iterator[Tuple[WAFRule, bool]]:
+        """(regra, confirmada) das regras candidatas no texto, na ordem de declaração.
+
+        O pré-filtro olha o texto inteiro. Regras críticas são confirmadas sempre
+        sobre o texto inteiro; as demais só com `verify` e só nos primeiros
+        `max_field_length` caracteres, saindo com confirmada=False quando a
+        confirmação não foi possível.
+        """
+        present = 0
+        for literal, bit in self._literals:
+            if literal in text:
+                present |= bit
+        lowered = text
+        if self._literals_lower:
+            lowered = fold_case(text)
+            for literal, bit in self._literals_lower:
+                if literal in lowered:
+                    present |= bit
+
+        # Caminho rápido: nenhum literal presente, nenhuma regex executada
+        if not present and not self._always:
+            return
+
+        truncated = len(text) > self.max_field_length
+        head = head_lowered = None
+
+        for compiled in self._compiled:
+            for mask in compiled.masks:
+                if not present & mask:
+                    break
+            else:
+                if compiled.rule.critical:
+                    if compiled.search(text, lowered if compiled.ignorecase else text):
+                        yield compiled.rule, True
+                    continue
+                if not verify:
+                    yield compiled.rule, False
+                    continue
+                if not truncated:
+                    if compiled.search(text, lowered if compiled.ignorecase else text):
+                        yield compiled.rule, True
+                    continue
+                if head is None:
+                    head = text[:self.max_field_length]
+                    head_lowered = fold_case(head) if self._literals_lower else head
+                if compiled.search(head, head_lowered if compiled.ignorecase else head):
+                    yield compiled.rule, True
+                else:
+                    yield compiled.rule, False
+
+    def first_match(self, text: str) -> Optional[WAFRule]:
+        """Primeira regra que casa com o texto (ou que não pôde ser descartada)"""
+        return next((rule for rule, _ in self._matches(text)), None)
+
+    def scan(self, fields: Iterable[Any], score_offset: int = 0,
+             deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Varre os campos; retorna ameaças, score, candidatas não verificadas e se o orçamento estourou
+
+        Com o orçamento estourado, os campos restantes ainda passam pelo
+        pré-filtro e pelas regras críticas; só as não críticas deixam de rodar.
+        """
+        threats: List[Dict[str, Any]] = []
+        unverified: Dict[str, Dict[str, Any]] = {}
+        score = score_offset
+        deadline = deadline or (time.perf_counter() + self.budget)
+        budget_exceeded = False
+
+        for field in fields:
+            if score >= self.block_score:
+                break
+            if not budget_exceeded and time.perf_counter() > deadline:
+                budget_exceeded = True
+
+            text = field if isinstance(field, str) else str(field)
+            for rule, confirmed in self._matches(text, verify=not budget_exceeded):
+                threat = {
+                    'type': rule.threat_type,
+                    'pattern': rule.pattern,
+                    'content': text[:100] + '...' if len(text) > 100 else text
+                }
+                if not confirmed:
+                    unverified.setdefault(rule.pattern, threat)
+                    continue
+                threats.append(threat)
+                score += rule.score
+                if score >= self.block_score:
+                    break
+
+        return {
+            'threats': threats,
+            'score': score,
+            'unverified': list(unverified.values()),
+            'budget_exceeded': budget_exceeded
+        }
@@ -0,0 +1,597 @@
+"""
+Rollups diários de atividade por usuário para o dashboard de analytics
+
+Em vez de dezenas de COUNT/SUM/AVG sobre as tabelas brutas (documentos,
+cards, apontamentos, wiki, IA, notificações) a cada carregamento, um
+compactador periódico recalcula os contadores por (usuário, dia) com uma
+consulta agrupada por fonte (agregações condicionais em um único SELECT,
+categorias em paralelo em conexões separadas) e os grava em `analytics_daily_activity` e
+`analytics_daily_breakdown`. As leituras do dashboard são um SUM sobre no
+máximo ~365 linhas por usuário, independente do tamanho do histórico.
+
+Cada linha diária também guarda um histograma por hora (24 contadores
+uint16) dos eventos de atividade do próprio usuário. Heatmaps são somas
+vetorizadas (NumPy) sobre esses arrays e a sequência de dias ativos é uma
+varredura de bits sobre o bitmap de dias com atividade.
+
+O recálculo é idempotente (apaga e regrava o intervalo de dias em uma
+transação); cada ciclo refaz os dias recentes, então o atraso máximo é o
+intervalo do compactador. Com vários workers, um lock no Redis (SET NX PX)
+faz com que só um deles compacte a cada ciclo.
+"""
+import uuid
+import time
+import logging
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from sqlalchemy import Integer, cast, func, text
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models.analytics import ACTIVITY_COUNTERS, UserDailyActivity, UserDailyBreakdown
+from services.metrics_query import MetricsQuery
+
+logger = logging.getLogger(__name__)
+
+_Key = Tuple[int, date]
+
+# Remove o lock só se ainda for do mesmo dono
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+HOURS = 24
+HOURLY_DTYPE = np.dtype('<u2')
+
+
+def _as_date(value) -> date:
+    """func.date() devolve str no SQLite e date nos demais bancos"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _enum_value(value) -> str:
+    return str(getattr(value, 'value', value) or 'unknown')
+
+
+def weekday_hour_heatmap(days: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Soma a matriz dias x 24 em uma grade 7 x 24 (segunda=0)"""
+    # date.fromordinal(1) é uma segunda-feira
+    weekdays = (np.asarray(days, dtype=np.int64) - 1) % 7
+    buckets = (weekdays[:, None] * HOURS + np.arange(HOURS)).ravel()
+    return np.bincount(buckets, weights=matrix.ravel(), minlength=7 * HOURS).reshape(7, HOURS)
+
+
+def streak_length(days: Iterable[int], today: int) -> int:
+    """Dias consecutivos (ordinais) terminando hoje, ou ontem se hoje não está em `days`"""
+    offsets = today - np.fromiter(days, dtype=np.int64)
+    offsets = offsets[offsets >= 0]
+    if not offsets.size:
+        return 0
+
+    # Bitmap de dias ativos, bit 0 = hoje; a sequência são os 1s finais
+    bits = np.zeros(int(offsets.max()) + 1, dtype=np.uint8)
+    bits[offsets] = 1
+    bitmap = int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+    if not bitmap & 1:
+        bitmap >>= 1
+    return (bitmap ^ (bitmap + 1)).bit_length() - 1
+
+
+class _Collected:
+    """Contadores parciais de uma categoria (mesclados ao final da compactação)"""
+
+    def __init__(self):
+        self.counters: Dict[_Key, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.breakdown: Dict[Tuple[int, date, str, str], int] = defaultdict(int)
+        self.hours: Dict[_Key, np.ndarray] = {}
+
+    def add(self, rows: Iterable, *names: str):
+        for user_id, day, *values in rows:
+            if user_id is None or day is None:
+                continue
+            bucket = self.counters[(int(user_id), _as_date(day))]
+            for name, value in zip(names, values):
+                bucket[name] += int(value or 0)
+
+    def add_breakdown(self, rows: Iterable, metric: str):
+        for user_id, day, key, count in rows:
+            if user_id is None or day is None:
+                continue
+            self.breakdown[(int(user_id), _as_date(day), metric, _enum_value(key)[:100])] += int(count or 0)
+
+    def merge(self, other: '_Collected'):
+        for key, values in other.counters.items():
+            bucket = self.counters[key]
+            for name, value in values.items():
+                bucket[name] += value
+        for key, count in other.breakdown.items():
+            self.breakdown[key] += count
+        for key, histogram in other.hours.items():
+            if key in self.hours:
+                self.hours[key] = self.hours[key] + histogram
+            else:
+                self.hours[key] = histogram
+
+
+class ActivityRollups:
+    """Compactador e leituras dos rollups diários de atividade"""
+
+    RECENT_DAYS = 2
+    BACKFILL_CHUNK_DAYS = 31
+    LOCK_KEY = 'jurisia:analytics:rollups:lock'
+    BACKFILL_LOCK_TTL = 6 * 3600
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._thread = None
+        self._running = False
+        self._lock = threading.Lock()
+        self.redis = None
+        self.last_run: Optional[datetime] = None
+
+    # === COMPACTAÇÃO ===
+
+    @staticmethod
+    def _seconds_between(dialect: str, start_column, end_column):
+        """Diferença em segundos entre duas colunas DateTime, por dialeto"""
+        if dialect == 'sqlite':
+            return (func.julianday(end_column) - func.julianday(start_column)) * 86400
+        if dialect == 'mysql':
+            return func.timestampdiff(text('SECOND'), start_column, end_column)
+        return func.extract('epoch', end_column) - func.extract('epoch', start_column)
+
+    @staticmethod
+    def _hour(dialect: str, column):
+        """Hora (0-23) de uma coluna DateTime, por dialeto"""
+        if dialect == 'sqlite':
+            return cast(func.strftime('%H', column), Integer)
+        return cast(func.extract('hour', column), Integer)
+
+    @staticmethod
+    def _activity_sources():
+        """(coluna do usuário, coluna de data/hora, filtros extras) dos eventos de atividade própria"""
+        sources = []
+        try:
+            from models.document import Document
+            sources.append((Document.user_id, Document.created_at, ()))
+            sources.append((Document.user_id, Document.updated_at, (Document.updated_at > Document.created_at,)))
+        except ImportError:
+            pass
+        try:
+            from models.kanban import KanbanCard, KanbanTimeEntry
+            sources.append((KanbanCard.created_by, KanbanCard.created_at, ()))
+            sources.append((KanbanCard.created_by, KanbanCard.completed_at, ()))
+            sources.append((KanbanTimeEntry.user_id, KanbanTimeEntry.start_time, ()))
+        except ImportError:
+            pass
+        try:
+            from models.wiki import WikiArticle, WikiComment, WikiLike
+            sources.append((WikiArticle.author_id, WikiArticle.created_at, ()))
+            sources.append((WikiComment.author_id, WikiComment.created_at, ()))
+            sources.append((WikiLike.user_id, WikiLike.created_at, ()))
+        except ImportError:
+            pass
+        try:
+            from models.ai_usage import AIUsageLog
+            sources.append((AIUsageLog.user_id, AIUsageLog.created_at, ()))
+        except ImportError:
+            pass
+        try:
+            from models.notification import Notification
+            sources.append((Notification.user_id, Notification.read_at, ()))
+        except ImportError:
+            pass
+        return sources
+
+    def _collect_hours(self, session, dialect: str, start: datetime, end: datetime, out: '_Collected'):
+        """Eventos de atividade de [start, end) por (usuário, dia, hora)"""
+        for user_column, column, extra in self._activity_sources():
+            day, hour = func.date(column), self._hour(dialect, column)
+            try:
+                rows = session.query(user_column, day, hour, func.count()).filter(
+                    column >= start, column < end, *extra
+                ).group_by(user_column, day, hour).all()
+            except Exception as e:
+                logger.error(f"Erro ao compactar atividade por hora ({column}): {e}")
+                session.rollback()
+                continue
+            for user_id, event_day, event_hour, count in rows:
+                if user_id is None or event_day is None or event_hour is None:
+                    continue
+                key = (int(user_id), _as_date(event_day))
+                if key not in out.hours:
+                    out.hours[key] = np.zeros(HOURS, dtype=np.int64)
+                out.hours[key][int(event_hour)] += int(count)
+
+    def _collect_documents(self, session, dialect: str, start: datetime, end: datetime, out: '_Collected'):
+        from models.document import Document
+
+        # Criados, tamanho e quebra por tipo no mesmo SELECT (agrupado também por tipo)
+        created_day = func.date(Document.created_at)
+        created = MetricsQuery(
+            Document.user_id, created_day, Document.tipo,
+            where=(Document.created_at >= start, Document.created_at < end), dialect=dialect
+        ).count('created').sum('size', Document.tamanho_estimado)
+        rows = created.all(session)
+        out.add(((user_id, day, count, size) for user_id, day, _, count, size in rows),
+                'documents_created', 'documents_size')
+        out.add_breakdown(((user_id, day, tipo, count) for user_id, day, tipo, count, _ in rows), 'document_type')
+
+        updated_day = func.date(Document.updated_at)
+        out.add(MetricsQuery(
+            Document.user_id, updated_day,
+            where=(Document.updated_at >= start, Document.updated_at < end,
+                   updated_day > func.date(Document.created_at)),
+            dialect=dialect
+        ).count('updated').all(session), 'documents_updated')
+
+    def _collect_kanban(self, session, dialect: str, start: datetime, end: datetime, out: '_Collected'):
+        from models.kanban import KanbanBoard, KanbanList, KanbanCard, KanbanTimeEntry
+
+        # Cards contam para o dono e para a equipe do board: agrega por board e expande
+        per_board: Dict[Tuple[int, Any], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        for column, name in ((KanbanCard.created_at, 'cards_created'),
+                             (KanbanCard.completed_at, 'cards_completed')):
+            day = func.date(column)
+            rows = session.query(KanbanList.board_id, day, func.count(KanbanCard.id)).join(
+                KanbanList, KanbanList.id == KanbanCard.list_id
+            ).filter(column >= start, column < end).group_by(KanbanList.board_id, day).all()
+            for board_id, card_day, count in rows:
+                per_board[(board_id, card_day)][name] += count
+
+        if per_board:
+            board_ids = {board_id for board_id, _ in per_board}
+            members: Dict[int, set] = {}
+            for board_id, owner_id, team_ids in session.query(
+                KanbanBoard.id, KanbanBoard.owner_id, KanbanBoard.team_ids
+            ).filter(KanbanBoard.id.in_(board_ids)).all():
+                members[board_id] = {owner_id, *(team_ids or [])}
+            expanded = []
+            for (board_id, card_day), values in per_board.items():
+                for user_id in members.get(board_id, ()):
+                    expanded.append((user_id, card_day, values['cards_created'], values['cards_completed']))
+            out.add(expanded, 'cards_created', 'cards_completed')
+
+        with_deadline = KanbanCard.due_date.isnot(None)
+        out.add(MetricsQuery(
+            KanbanCard.created_by, func.date(KanbanCard.completed_at),
+            where=(KanbanCard.status == 'completed',
+                   KanbanCard.completed_at >= start, KanbanCard.completed_at < end),
+            dialect=dialect
+        ).count('completed')
+         .count('on_time', with_deadline & (KanbanCard.completed_at <= KanbanCard.due_date))
+         .count('with_deadline', with_deadline)
+         .all(session), 'cards_completed_own', 'cards_completed_on_time', 'cards_completed_with_deadline')
+
+        out.add(MetricsQuery(
+            KanbanTimeEntry.user_id, func.date(KanbanTimeEntry.start_time),
+            where=(KanbanTimeEntry.start_time >= start, KanbanTimeEntry.start_time < end),
+            dialect=dialect
+        ).sum('minutes', KanbanTimeEntry.duration_minutes)
+         .sum('billable', KanbanTimeEntry.duration_minutes, KanbanTimeEntry.is_billable == True)
+         .all(session), 'minutes_logged', 'billable_minutes')
+
+    def _collect_wiki(self, session, dialect: str, start: datetime, end: datetime, out: '_Collected'):
+        from models.wiki import WikiArticle, WikiComment, WikiLike
+
+        for model, user_column, name in (
+            (WikiArticle, WikiArticle.author_id, 'wiki_articles'),
+            (WikiComment, WikiComment.author_id, 'wiki_comments'),
+            (WikiLike, WikiLike.user_id, 'wiki_likes_given'),
+        ):
+            day = func.date(model.created_at)
+            out.add(session.query(user_column, day, func.count(model.id)).filter(
+                model.created_at >= start, model.created_at < end
+            ).group_by(user_column, day).all(), name)
+
+        like_day = func.date(WikiLike.created_at)
+        out.add(session.query(WikiArticle.author_id, like_day, func.count(WikiLike.id)).join(
+            WikiArticle, WikiArticle.id == WikiLike.article_id
+        ).filter(
+            WikiLike.created_at >= start, WikiLike.created_at < end
+        ).group_by(WikiArticle.author_id, like_day).all(), 'wiki_likes_received')
+
+    def _collect_ai(self, session, dialect: str, start: datetime, end: datetime, out: '_Collected'):
+        try:
+            from models.ai_usage import AIUsageLog
+        except ImportError:
+            return
+
+        rows = MetricsQuery(
+            AIUsageLog.user_id, func.date(AIUsageLog.created_at), AIUsageLog.request_type,
+            where=(AIUsageLog.created_at >= start, AIUsageLog.created_at < end), dialect=dialect
+        ).count('requests').count('successful', AIUsageLog.status == 'success') \
+         .sum('tokens', AIUsageLog.tokens_used).sum('response_ms', AIUsageLog.response_time_ms).all(session)
+        out.add(((user_id, day, *values) for user_id, day, _, *values in rows),
+                'ai_requests', 'ai_successful', 'ai_tokens', 'ai_response_ms')
+        out.add_breakdown(((user_id, day, key, count) for user_id, day, key, count, *_ in rows), 'ai_request_type')
+
+    def _collect_notifications(self, session, dialect: str, start: datetime, end: datetime, out: '_Collected'):
+        from models.notification import Notification
+
+        read = Notification.is_read == True
+        rows = MetricsQuery(
+            Notification.user_id, func.date(Notification.created_at), Notification.type,
+            where=(Notification.created_at >= start, Notification.created_at < end), dialect=dialect
+        ).count('received').count('read', read).sum(
+            'read_seconds', self._seconds_between(dialect, Notification.created_at, Notification.read_at),
+            read & Notification.read_at.isnot(None)
+        ).all(session)
+        out.add(((user_id, day, *values) for user_id, day, _, *values in rows),
+                'notifications_received', 'notifications_read', 'notification_read_seconds')
+        out.add_breakdown(((user_id, day, key, count) for user_id, day, key, count, *_ in rows), 'notification_type')
+
+    def _collect(self, start: datetime, end: datetime) -> '_Collected':
+        """Contadores de [start, end): categorias independentes em paralelo, cada uma na sua conexão"""
+        categories = {
+            'documentos': self._collect_documents,
+            'Kanban': self._collect_kanban,
+            'Wiki': self._collect_wiki,
+            'IA': self._collect_ai,
+            'notificações': self._collect_notifications,
+            'atividade por hora': self._collect_hours,
+        }
+        engine = db.engine
+        dialect = engine.dialect.name
+
+        def run(label, collect, session=None):
+            out = _Collected()
+            own_session = session is None
+            session = session or Session(engine)
+            try:
+                collect(session, dialect, start, end, out)
+            except Exception as e:
+                logger.error(f"Erro ao compactar métricas de {label}: {e}")
+                session.rollback()
+            finally:
+                if own_session:
+                    session.close()
+            return out
+
+        result = _Collected()
+        # SQLite serializa o acesso (e `sqlite://` em memória é uma conexão só): roda em sequência
+        if dialect == 'sqlite' or self.max_workers <= 1:
+            for label, collect in categories.items():
+                result.merge(run(label, collect, db.session))
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analytics-rollup') as pool:
+            futures = [pool.submit(run, label, collect) for label, collect in categories.items()]
+            for future in futures:
+                result.merge(future.result())
+        return result
+
+    def compact(self, start_day: date, end_day: date) -> Dict[str, int]:
+        """Recalcula os rollups de [start_day, end_day] (inclusive) a partir das tabelas brutas"""
+        start = datetime.combine(start_day, datetime.min.time())
+        end = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+
+        with self._lock:
+            collected = self._collect(start, end)
+            counters, breakdown, hours = collected.counters, collected.breakdown, collected.hours
+            activity_rows = []
+            for user_id, day in set(counters) | set(hours):
+                if not start_day <= day <= end_day:
+                    continue
+                values = counters.get((user_id, day), {})
+                row = {name: values.get(name, 0) for name in ACTIVITY_COUNTERS}
+                histogram = hours.get((user_id, day))
+                row.update(
+                    user_id=user_id, day=day, updated_at=datetime.utcnow(),
+                    hourly_activity=np.minimum(histogram, 0xFFFF).astype(HOURLY_DTYPE).tobytes()
+                    if histogram is not None else None
+                )
+                activity_rows.append(row)
+            breakdown_rows = [
+                {'user_id': user_id, 'day': day, 'metric': metric, 'key': key, 'count': count}
+                for (user_id, day, metric, key), count in breakdown.items()
+                if start_day <= day <= end_day
+            ]
+
+            try:
+                UserDailyActivity.query.filter(
+                    UserDailyActivity.day.between(start_day, end_day)
+                ).delete(synchronize_session=False)
+                UserDailyBreakdown.query.filter(
+                    UserDailyBreakdown.day.between(start_day, end_day)
+                ).delete(synchronize_session=False)
+                if activity_rows:
+                    db.session.bulk_insert_mappings(UserDailyActivity, activity_rows)
+                if breakdown_rows:
+                    db.session.bulk_insert_mappings(UserDailyBreakdown, breakdown_rows)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Erro ao gravar rollups de analytics: {e}")
+                raise
+
+        self.last_run = datetime.utcnow()
+        return {'days': (end_day - start_day).days + 1, 'rows': len(activity_rows),
+                'breakdown_rows': len(breakdown_rows)}
+
+    def backfill(self, days: int) -> int:
+        """Preenche os últimos `days` dias em blocos (usado quando os rollups estão vazios)"""
+        today = datetime.utcnow().date()
+        written = 0
+        chunk_end = today
+        first_day = today - timedelta(days=days - 1)
+        while chunk_end >= first_day:
+            chunk_start = max(first_day, chunk_end - timedelta(days=self.BACKFILL_CHUNK_DAYS - 1))
+            written += self.compact(chunk_start, chunk_end)['rows']
+            chunk_end = chunk_start - timedelta(days=1)
+        return written
+
+    def compact_recent(self) -> Dict[str, int]:
+        """Refaz os dias recentes (hoje e ontem, para eventos que chegam após a meia-noite)"""
+        today = datetime.utcnow().date()
+        return self.compact(today - timedelta(days=self.RECENT_DAYS - 1), today)
+
+    def _connect(self, redis_url: Optional[str]):
+        """Conecta ao Redis do lock entre workers, se disponível"""
+        if not redis_url:
+            return
+        try:
+            import redis
+            client = redis.from_url(redis_url)
+            client.ping()
+            self.redis = client
+        except Exception as e:
+            logger.warning(f"⚠️ Redis não disponível para o lock dos rollups, compactando só neste processo: {e}")
+            self.redis = None
+
+    def _acquire_run(self, ttl: float) -> Optional[str]:
+        """Lock de execução entre workers; retorna o token ou None se outro worker o detém"""
+        token = uuid.uuid4().hex
+        if self.redis is None:
+            return token
+        try:
+            if self.redis.set(self.LOCK_KEY, token, nx=True, px=int(ttl * 1000)):
+                return token
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao adquirir lock dos rollups de analytics: {e}")
+            return None
+
+    def _release_run(self, token: str):
+        if self.redis is None:
+            return
+        try:
+            self.redis.eval(_RELEASE_SCRIPT, 1, self.LOCK_KEY, token)
+        except Exception as e:
+            logger.error(f"Erro ao liberar lock dos rollups de analytics: {e}")
+
+    def start_compactor(self, app, interval: int = 300, backfill_days: int = 400,
+                        redis_url: Optional[str] = None):
+        """Inicia a compactação periódica em background (com backfill se vazio)
+
+        O lock dura um intervalo e não é liberado ao fim do ciclo: cada ciclo
+        roda em um único worker, qualquer que seja o número de processos.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._connect(redis_url)
+
+        def compact_loop():
+            token = None
+            try:
+                with app.app_context():
+                    if db.session.query(UserDailyActivity.user_id).first() is None:
+                        token = self._acquire_run(self.BACKFILL_LOCK_TTL)
+                    if token:
+                        started = time.time()
+                        rows = self.backfill(backfill_days)
+                        logger.info(f"Backfill de rollups de analytics: {rows} linhas em {time.time() - started:.1f}s")
+            except Exception as e:
+                logger.error(f"Erro no backfill de rollups de analytics: {e}")
+            finally:
+                if token:
+                    self._release_run(token)
+
+            while self._running:
+                try:
+                    if self._acquire_run(interval):
+                        with app.app_context():
+                            self.compact_recent()
+                except Exception as e:
+                    logger.error(f"Erro na compactação de rollups de analytics: {e}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=compact_loop, daemon=True)
+        self._thread.start()
+
+    def stop_compactor(self):
+        self._running = False
+
+    # === LEITURAS ===
+
+    def totals(self, user_id: int, start_day: date, end_day: date) -> Dict[str, int]:
+        """Soma de todos os contadores do período em uma consulta"""
+        columns = [func.coalesce(func.sum(getattr(UserDailyActivity, name)), 0) for name in ACTIVITY_COUNTERS]
+        row = db.session.query(*columns).filter(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.day.between(start_day, end_day)
+        ).one()
+        return {name: int(value or 0) for name, value in zip(ACTIVITY_COUNTERS, row)}
+
+    def series(self, user_id: int, start_day: date, end_day: date,
+               counters: Iterable[str]) -> List[Dict[str, Any]]:
+        """Série diária (dias sem atividade preenchidos com zero)"""
+        counters = list(counters)
+        rows = db.session.query(
+            UserDailyActivity.day, *[getattr(UserDailyActivity, name) for name in counters]
+        ).filter(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.day.between(start_day, end_day)
+        ).all()
+        by_day = {_as_date(row[0]): row[1:] for row in rows}
+
+        result = []
+        day = start_day
+        while day <= end_day:
+            values = by_day.get(day)
+            point = {'date': day.isoformat()}
+            point.update({name: int(values[index] or 0) if values else 0
+                          for index, name in enumerate(counters)})
+            result.append(point)
+            day += timedelta(days=1)
+        return result
+
+    def breakdown(self, user_id: int, metric: str, start_day: date, end_day: date) -> List[Dict[str, Any]]:
+        """Contagens do período por categoria, da maior para a menor"""
+        total = func.sum(UserDailyBreakdown.count)
+        rows = db.session.query(UserDailyBreakdown.key, total).filter(
+            UserDailyBreakdown.user_id == user_id,
+            UserDailyBreakdown.metric == metric,
+            UserDailyBreakdown.day.between(start_day, end_day)
+        ).group_by(UserDailyBreakdown.key).order_by(total.desc()).all()
+        return [{'type': key, 'count': int(count)} for key, count in rows]
+
+    def first_day(self, user_id: int, counter: str, start_day: date, end_day: date) -> Optional[date]:
+        """Primeiro dia do período com o contador positivo"""
+        value = db.session.query(func.min(UserDailyActivity.day)).filter(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.day.between(start_day, end_day),
+            getattr(UserDailyActivity, counter) > 0
+        ).scalar()
+        return _as_date(value) if value else None
+
+    def activity_matrix(self, user_id: int, start_day: date, end_day: date) -> Tuple[np.ndarray, np.ndarray]:
+        """(ordinais dos dias ativos, matriz dias x 24 de eventos por hora)"""
+        rows = db.session.query(UserDailyActivity.day, UserDailyActivity.hourly_activity).filter(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.day.between(start_day, end_day),
+            UserDailyActivity.hourly_activity.isnot(None)
+        ).all()
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, HOURS), dtype=np.int64)
+        days = np.fromiter((_as_date(day).toordinal() for day, _ in rows), dtype=np.int64, count=len(rows))
+        matrix = np.frombuffer(b''.join(blob for _, blob in rows), dtype=HOURLY_DTYPE).reshape(-1, HOURS)
+        return days, matrix.astype(np.int64)
+
+    def activity_streak(self, user_id: int, today: Optional[date] = None) -> int:
+        """Dias consecutivos com atividade até hoje (ou até ontem, se hoje ainda não houve)"""
+        today = today or datetime.utcnow().date()
+        rows = db.session.query(UserDailyActivity.day).filter(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.day <= today,
+            UserDailyActivity.hourly_activity.isnot(None)
+        ).all()
+        return streak_length((_as_date(day).toordinal() for (day,) in rows), today.toordinal())
+
+
+# Instância global
+activity_rollups = ActivityRollups()
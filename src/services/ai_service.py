@@ -10,6 +10,7 @@ import os
 from dataclasses import dataclass
 from openai import OpenAI
 from src.config import Config
+from src.monitoring.request_timing import timed
 
 
 class DocumentType(Enum):
@@ -89,15 +90,16 @@ class LegalAIService:
             system_prompt, user_prompt = self._build_prompts(request)
             
             # Fazer chamada para OpenAI
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
+            with timed('ai'):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
             
             processing_time = time.time() - start_time
             content = response.choices[0].message.content
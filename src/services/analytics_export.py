@@ -0,0 +1,367 @@
+"""
+Exportação de analytics em streaming (CSV, XLSX e Parquet)
+
+As linhas vêm direto do banco em lotes (yield_per), dos rollups diários ou
+das tabelas brutas, e passam por um gerador até o formato de saída:
+
+- CSV: gerador de blocos de ~64 KB, servido como resposta chunked;
+- XLSX: XlsxWriter em modo constant_memory (uma linha em memória por vez)
+  gravando em arquivo temporário;
+- Parquet: pyarrow.ParquetWriter, um row group por lote.
+
+O arquivo temporário é servido em blocos e removido quando a resposta fecha,
+ou enviado ao CloudStorageService (upload em stream) com URL assinada. O
+storage local não assina nem expira URLs: com ele, a entrega volta a ser o
+download direto.
+Exportações de vários anos não carregam o resultado em memória.
+
+Textos que começam com =, +, - ou @ (e tab/CR) saem prefixados com `'` no
+CSV e no XLSX, para o Excel não os avaliar como fórmula.
+"""
+import os
+import io
+import csv
+import logging
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from extensions import db
+from models.analytics import ACTIVITY_COUNTERS, UserDailyActivity, UserDailyBreakdown
+
+# Dependências opcionais
+try:
+    import xlsxwriter
+    XLSX_AVAILABLE = True
+except ImportError:
+    XLSX_AVAILABLE = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 64 * 1024
+MAX_URL_EXPIRES_IN = 24 * 3600
+
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+# Colunas dos rollups diários por categoria do dashboard
+CATEGORY_COUNTERS = {
+    'documents': [name for name in ACTIVITY_COUNTERS if name.startswith('documents_')],
+    'kanban': [name for name in ACTIVITY_COUNTERS if name.startswith('cards_')] + ['minutes_logged', 'billable_minutes'],
+    'wiki': [name for name in ACTIVITY_COUNTERS if name.startswith('wiki_')],
+    'ai': [name for name in ACTIVITY_COUNTERS if name.startswith('ai_')],
+    'notifications': [name for name in ACTIVITY_COUNTERS if name.startswith('notification')],
+}
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'excel': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class ExportError(ValueError):
+    """Parâmetros de exportação inválidos ou formato indisponível"""
+
+
+class Dataset:
+    """Cabeçalho, tipos (para o Parquet) e gerador de linhas de uma exportação"""
+
+    def __init__(self, name: str, columns: Sequence[Tuple[str, str]], rows: Callable[[], Iterator[Sequence[Any]]]):
+        self.name = name
+        self.columns = list(columns)  # (nome, tipo): 'date', 'datetime', 'int', 'str'
+        self.rows = rows
+
+    @property
+    def header(self) -> List[str]:
+        return [name for name, _ in self.columns]
+
+
+def _stream(query, batch_size: int = BATCH_SIZE) -> Iterator[Sequence[Any]]:
+    """Linhas de uma consulta em lotes, sem materializar o resultado"""
+    return query.execution_options(yield_per=batch_size)
+
+
+def daily_activity_dataset(user_id: int, start_day: date, end_day: date,
+                           categories: Optional[Iterable[str]] = None) -> Dataset:
+    """Uma linha por dia com atividade, colunas dos rollups das categorias pedidas"""
+    counters: List[str] = []
+    for category in categories or CATEGORY_COUNTERS:
+        for name in CATEGORY_COUNTERS.get(category, []):
+            if name not in counters:
+                counters.append(name)
+    if not counters:
+        raise ExportError('Nenhuma categoria válida para exportação')
+
+    def rows():
+        query = db.session.query(
+            UserDailyActivity.day, *[getattr(UserDailyActivity, name) for name in counters]
+        ).filter(
+            UserDailyActivity.user_id == user_id,
+            UserDailyActivity.day.between(start_day, end_day)
+        ).order_by(UserDailyActivity.day)
+        yield from _stream(query)
+
+    return Dataset('daily_activity', [('day', 'date')] + [(name, 'int') for name in counters], rows)
+
+
+def breakdown_dataset(user_id: int, start_day: date, end_day: date) -> Dataset:
+    """Contagens diárias por categoria (tipo de documento, de requisição de IA, de notificação)"""
+    def rows():
+        query = db.session.query(
+            UserDailyBreakdown.day, UserDailyBreakdown.metric, UserDailyBreakdown.key, UserDailyBreakdown.count
+        ).filter(
+            UserDailyBreakdown.user_id == user_id,
+            UserDailyBreakdown.day.between(start_day, end_day)
+        ).order_by(UserDailyBreakdown.day, UserDailyBreakdown.metric, UserDailyBreakdown.key)
+        yield from _stream(query)
+
+    return Dataset('breakdown', [('day', 'date'), ('metric', 'str'), ('key', 'str'), ('count', 'int')], rows)
+
+
+def documents_dataset(user_id: int, start_day: date, end_day: date) -> Dataset:
+    """Documentos criados no período (tabela bruta)"""
+    def rows():
+        from models.document import Document
+
+        start = datetime.combine(start_day, datetime.min.time())
+        end = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+        query = db.session.query(
+            Document.id, Document.titulo, Document.tipo, Document.status,
+            Document.tamanho_estimado, Document.created_at, Document.updated_at
+        ).filter(
+            Document.user_id == user_id,
+            Document.created_at >= start, Document.created_at < end
+        ).order_by(Document.created_at)
+        for row in _stream(query):
+            yield (row[0], row[1], getattr(row[2], 'value', row[2]), getattr(row[3], 'value', row[3]), *row[4:])
+
+    return Dataset('documents', [
+        ('id', 'int'), ('titulo', 'str'), ('tipo', 'str'), ('status', 'str'),
+        ('tamanho_estimado', 'int'), ('created_at', 'datetime'), ('updated_at', 'datetime')
+    ], rows)
+
+
+def time_entries_dataset(user_id: int, start_day: date, end_day: date) -> Dataset:
+    """Apontamentos de horas do período (tabela bruta)"""
+    def rows():
+        from models.kanban import KanbanTimeEntry
+
+        start = datetime.combine(start_day, datetime.min.time())
+        end = datetime.combine(end_day + timedelta(days=1), datetime.min.time())
+        query = db.session.query(
+            KanbanTimeEntry.id, KanbanTimeEntry.card_id, KanbanTimeEntry.start_time, KanbanTimeEntry.end_time,
+            KanbanTimeEntry.duration_minutes, KanbanTimeEntry.is_billable, KanbanTimeEntry.description
+        ).filter(
+            KanbanTimeEntry.user_id == user_id,
+            KanbanTimeEntry.start_time >= start, KanbanTimeEntry.start_time < end
+        ).order_by(KanbanTimeEntry.start_time)
+        for row in _stream(query):
+            yield (*row[:5], int(bool(row[5])), row[6])
+
+    return Dataset('time_entries', [
+        ('id', 'int'), ('card_id', 'int'), ('start_time', 'datetime'), ('end_time', 'datetime'),
+        ('duration_minutes', 'int'), ('is_billable', 'int'), ('description', 'str')
+    ], rows)
+
+
+DATASETS = {
+    'daily_activity': daily_activity_dataset,
+    'breakdown': breakdown_dataset,
+    'documents': documents_dataset,
+    'time_entries': time_entries_dataset,
+}
+
+
+def build_dataset(name: str, user_id: int, start_day: date, end_day: date,
+                  categories: Optional[Iterable[str]] = None) -> Dataset:
+    if name not in DATASETS:
+        raise ExportError(f"Conjunto de dados inválido. Use: {', '.join(DATASETS)}")
+    if name == 'daily_activity':
+        return daily_activity_dataset(user_id, start_day, end_day, categories)
+    return DATASETS[name](user_id, start_day, end_day)
+
+
+# === ESCRITORES ===
+
+def _text(value: str) -> str:
+    """Neutraliza injeção de fórmula em planilhas (título "=HYPERLINK(...)" vira texto)"""
+    if value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return _text(value)
+    return value
+
+
+def iter_csv(dataset: Dataset, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """CSV em blocos de bytes (com BOM para o Excel reconhecer UTF-8)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(dataset.header)
+    for row in dataset.rows():
+        writer.writerow([_cell(value) for value in row])
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def write_csv(dataset: Dataset, path: str) -> None:
+    with open(path, 'wb') as output:
+        for chunk in iter_csv(dataset):
+            output.write(chunk)
+
+
+def write_xlsx(dataset: Dataset, path: str) -> None:
+    """XLSX em modo constant_memory: cada linha é descarregada no disco ao passar para a próxima"""
+    if not XLSX_AVAILABLE:
+        raise ExportError('Exportação Excel indisponível (XlsxWriter não instalado)')
+
+    workbook = xlsxwriter.Workbook(path, {
+        'constant_memory': True,
+        'tmpdir': tempfile.gettempdir(),
+        'strings_to_formulas': False,
+        'strings_to_urls': False
+    })
+    try:
+        sheet = workbook.add_worksheet(dataset.name[:31])
+        bold = workbook.add_format({'bold': True})
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+        datetime_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+        formats = [date_format if kind == 'date' else datetime_format if kind == 'datetime' else None
+                   for _, kind in dataset.columns]
+
+        sheet.write_row(0, 0, dataset.header, bold)
+        for index, row in enumerate(dataset.rows(), start=1):
+            for column, value in enumerate(row):
+                if value is None:
+                    continue
+                if isinstance(value, date) and not isinstance(value, datetime):
+                    value = datetime.combine(value, datetime.min.time())
+                if formats[column] is not None and isinstance(value, datetime):
+                    sheet.write_datetime(index, column, value, formats[column])
+                elif isinstance(value, str):
+                    sheet.write_string(index, column, _text(value))
+                else:
+                    sheet.write(index, column, value)
+    finally:
+        workbook.close()
+
+
+def write_parquet(dataset: Dataset, path: str, batch_size: int = BATCH_SIZE) -> None:
+    """Parquet com um row group por lote de linhas"""
+    if not PARQUET_AVAILABLE:
+        raise ExportError('Exportação Parquet indisponível (pyarrow não instalado)')
+
+    types = {'date': pa.date32(), 'datetime': pa.timestamp('us'), 'int': pa.int64(), 'str': pa.string()}
+    schema = pa.schema([(name, types[kind]) for name, kind in dataset.columns])
+
+    def flush(batch: List[Sequence[Any]], writer):
+        columns = list(zip(*batch))
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        ))
+
+    with pq.ParquetWriter(path, schema, compression='snappy') as writer:
+        batch: List[Sequence[Any]] = []
+        for row in dataset.rows():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush(batch, writer)
+                batch = []
+        if batch:
+            flush(batch, writer)
+
+
+WRITERS = {'csv': write_csv, 'excel': write_xlsx, 'parquet': write_parquet}
+
+
+def export_to_file(dataset: Dataset, export_type: str) -> str:
+    """Grava a exportação em um arquivo temporário e retorna o caminho"""
+    if export_type not in WRITERS:
+        raise ExportError(f"Tipo de exportação inválido. Use: {', '.join(WRITERS)}")
+    extension = FORMATS[export_type][1]
+    handle, path = tempfile.mkstemp(prefix='analytics_export_', suffix=f'.{extension}')
+    os.close(handle)
+    try:
+        WRITERS[export_type](dataset, path)
+    except Exception:
+        discard_file(path)
+        raise
+    return path
+
+
+def iter_file(path: str, chunk_size: int = CHUNK_SIZE, remove: bool = True) -> Iterator[bytes]:
+    """Lê o arquivo em blocos e o remove ao final.
+
+    Um gerador fechado antes do primeiro bloco (HEAD, cliente que desconecta)
+    não executa o `finally`: quem serve a resposta também registra
+    `discard_file` no fechamento dela.
+    """
+    try:
+        with open(path, 'rb') as source:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            discard_file(path)
+
+
+def discard_file(path: str) -> None:
+    """Remove o arquivo temporário da exportação (idempotente)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Erro ao remover exportação temporária {path}: {e}")
+
+
+def storage_delivery_available() -> bool:
+    """O provedor configurado gera URLs assinadas e com expiração (S3/GCS)"""
+    from services.cloud_storage_service import storage_service, LocalStorageProvider
+
+    return not isinstance(storage_service.provider, LocalStorageProvider)
+
+
+def store_export(path: str, filename: str, user_id: int, content_type: str,
+                 expires_in: int = 3600) -> Dict[str, Any]:
+    """Envia a exportação ao storage configurado e retorna URL assinada (no máximo 24 h)"""
+    from services.cloud_storage_service import storage_service
+
+    if not storage_delivery_available():
+        discard_file(path)
+        raise ExportError('Storage local não gera URLs assinadas; use a entrega por download')
+    expires_in = min(max(int(expires_in), 60), MAX_URL_EXPIRES_IN)
+    file_path = f"users/{user_id}/exports/{datetime.utcnow().strftime('%Y/%m/%d/%H%M%S')}_{filename}"
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as source:
+            storage_service.provider.upload_fileobj(source, file_path, content_type)
+        return {
+            'file_path': file_path,
+            'download_url': storage_service.get_file_url(file_path, expires_in),
+            'expires_in': expires_in,
+            'size': size
+        }
+    finally:
+        discard_file(path)
@@ -1,45 +1,53 @@
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-from sqlalchemy import func, and_, or_, desc, extract, text
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+from sqlalchemy import func, and_, or_, desc, text
 from extensions import db
+from src.cache import cached
+from services.activity_rollups import activity_rollups, weekday_hour_heatmap
+import numpy as np
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+PERIOD_DAYS = {'7days': 7, '30days': 30, '90days': 90, '1year': 365}
+
 class AnalyticsService:
     def __init__(self):
         pass
     
+    @staticmethod
+    def _period_days(start_date: datetime, end_date: datetime) -> Tuple[date, date]:
+        """Converte o período em dias inteiros (inclusive) dos rollups"""
+        end_day = end_date.date()
+        days = max((end_date - start_date).days, 1)
+        return end_day - timedelta(days=days - 1), end_day
+    
+    def _period_totals(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, int]:
+        start_day, end_day = self._period_days(start_date, end_date)
+        return activity_rollups.totals(user_id, start_day, end_day)
+    
+    @cached(
+        'analytics:overview',
+        ttl=300,
+        key_builder=lambda self, user_id, date_range='30days': f"{user_id}:{date_range}",
+        tags=lambda self, user_id, date_range='30days': [f"user:{user_id}"]
+    )
     def get_dashboard_overview(self, user_id: int, date_range: str = '30days') -> Dict[str, Any]:
         """Retorna visão geral do dashboard com métricas principais"""
         try:
             # Calcular período
             end_date = datetime.utcnow()
-            if date_range == '7days':
-                start_date = end_date - timedelta(days=7)
-            elif date_range == '30days':
-                start_date = end_date - timedelta(days=30)
-            elif date_range == '90days':
-                start_date = end_date - timedelta(days=90)
-            elif date_range == '1year':
-                start_date = end_date - timedelta(days=365)
-            else:
-                start_date = end_date - timedelta(days=30)
+            start_date = end_date - timedelta(days=PERIOD_DAYS.get(date_range, 30))
             
             overview = {
                 'period': {
                     'start_date': start_date.isoformat(),
                     'end_date': end_date.isoformat(),
                     'range': date_range
-                },
-                'documents': self._get_documents_metrics(user_id, start_date, end_date),
-                'kanban': self._get_kanban_metrics(user_id, start_date, end_date),
-                'wiki': self._get_wiki_metrics(user_id, start_date, end_date),
-                'ai_usage': self._get_ai_usage_metrics(user_id, start_date, end_date),
-                'productivity': self._get_productivity_metrics(user_id, start_date, end_date),
-                'notifications': self._get_notifications_metrics(user_id, start_date, end_date)
+                }
             }
+            overview.update(self.get_period_metrics(user_id, start_date, end_date))
             
             return overview
             
@@ -47,6 +55,20 @@ class AnalyticsService:
             logger.error(f"Erro ao obter overview do dashboard: {str(e)}")
             raise
     
+    def get_period_metrics(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+        """Métricas de um período arbitrário lidas dos rollups diários"""
+        totals = self._period_totals(user_id, start_date, end_date)
+        previous = self._period_totals(user_id, start_date - (end_date - start_date), start_date)
+        
+        return {
+            'documents': self._get_documents_metrics(user_id, start_date, end_date, totals, previous),
+            'kanban': self._get_kanban_metrics(user_id, start_date, end_date, totals),
+            'wiki': self._get_wiki_metrics(user_id, start_date, end_date, totals),
+            'ai_usage': self._get_ai_usage_metrics(user_id, start_date, end_date, totals),
+            'productivity': self._get_productivity_metrics(user_id, start_date, end_date, totals),
+            'notifications': self._get_notifications_metrics(user_id, start_date, end_date, totals)
+        }
+    
     def get_detailed_analytics(self, user_id: int, category: str, filters: Dict[str, Any] = None) -> Dict[str, Any]:
         """Retorna analytics detalhadas por categoria"""
         try:
@@ -87,55 +109,61 @@ class AnalyticsService:
             logger.error(f"Erro ao obter dados do gráfico: {str(e)}")
             raise
     
+    # === GRÁFICOS (séries diárias dos rollups) ===
+    
+    def _chart_series(self, user_id: int, period: str, counters: List[str]) -> Dict[str, Any]:
+        end_date = datetime.utcnow()
+        start_day, end_day = self._period_days(end_date - timedelta(days=PERIOD_DAYS.get(period, 30)), end_date)
+        series = activity_rollups.series(user_id, start_day, end_day, counters)
+        return {
+            'period': period,
+            'labels': [point['date'] for point in series],
+            'series': {name: [point[name] for point in series] for name in counters}
+        }
+    
+    def _get_documents_timeline_chart(self, user_id: int, period: str) -> Dict[str, Any]:
+        """Documentos criados e atualizados por dia"""
+        return self._chart_series(user_id, period, ['documents_created', 'documents_updated'])
+    
+    def _get_kanban_progress_chart(self, user_id: int, period: str) -> Dict[str, Any]:
+        """Cards criados/concluídos e minutos registrados por dia"""
+        return self._chart_series(user_id, period, ['cards_created', 'cards_completed', 'minutes_logged'])
+    
+    def _get_wiki_engagement_chart(self, user_id: int, period: str) -> Dict[str, Any]:
+        """Artigos, comentários e curtidas por dia"""
+        return self._chart_series(
+            user_id, period, ['wiki_articles', 'wiki_comments', 'wiki_likes_given', 'wiki_likes_received']
+        )
+    
+    def _get_ai_usage_trends_chart(self, user_id: int, period: str) -> Dict[str, Any]:
+        """Requisições e tokens de IA por dia"""
+        return self._chart_series(user_id, period, ['ai_requests', 'ai_successful', 'ai_tokens'])
+    
     # === MÉTRICAS DE DOCUMENTOS ===
     
-    def _get_documents_metrics(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    def _get_documents_metrics(self, user_id: int, start_date: datetime, end_date: datetime,
+                               totals: Dict[str, int], previous: Dict[str, int]) -> Dict[str, Any]:
         """Métricas de documentos"""
         try:
             from models.document import Document
             
-            # Total de documentos criados no período
-            documents_created = Document.query.filter(
-                Document.usuario_id == user_id,
-                Document.data_criacao.between(start_date, end_date)
-            ).count()
-            
-            # Total de documentos atualizados no período
-            documents_updated = Document.query.filter(
-                Document.usuario_id == user_id,
-                Document.data_modificacao.between(start_date, end_date),
-                Document.data_criacao < start_date
-            ).count()
-            
-            # Total geral de documentos do usuário
-            total_documents = Document.query.filter(Document.usuario_id == user_id).count()
+            start_day, end_day = self._period_days(start_date, end_date)
+            created = totals['documents_created']
             
-            # Documentos por tipo
-            documents_by_type = db.session.query(
-                Document.tipo,
-                func.count(Document.id).label('count')
-            ).filter(
-                Document.usuario_id == user_id,
-                Document.data_criacao.between(start_date, end_date)
-            ).group_by(Document.tipo).all()
-            
-            # Tamanho médio dos documentos
-            avg_size = db.session.query(
-                func.avg(Document.tamanho)
-            ).filter(
-                Document.usuario_id == user_id,
-                Document.data_criacao.between(start_date, end_date)
+            # Total geral de documentos do usuário (estado atual, não é métrica de período)
+            total_documents = db.session.query(func.count(Document.id)).filter(
+                Document.user_id == user_id
             ).scalar() or 0
             
+            avg_size = totals['documents_size'] / created if created else 0
+            
             return {
-                'created': documents_created,
-                'updated': documents_updated,
+                'created': created,
+                'updated': totals['documents_updated'],
                 'total': total_documents,
-                'by_type': [{'type': doc.tipo, 'count': doc.count} for doc in documents_by_type],
+                'by_type': activity_rollups.breakdown(user_id, 'document_type', start_day, end_day),
                 'avg_size_kb': round(avg_size / 1024, 2) if avg_size else 0,
-                'growth_rate': self._calculate_growth_rate(
-                    Document, 'data_criacao', user_id, start_date, end_date
-                )
+                'growth_rate': self._calculate_growth_rate(created, previous['documents_created'])
             }
             
         except Exception as e:
@@ -144,10 +172,11 @@ class AnalyticsService:
     
     # === MÉTRICAS DE KANBAN ===
     
-    def _get_kanban_metrics(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    def _get_kanban_metrics(self, user_id: int, start_date: datetime, end_date: datetime,
+                            totals: Dict[str, int]) -> Dict[str, Any]:
         """Métricas do sistema Kanban"""
         try:
-            from models.kanban import KanbanBoard, KanbanCard, KanbanTimeEntry
+            from models.kanban import KanbanBoard
             
             # Boards do usuário
             user_boards = KanbanBoard.query.filter(
@@ -157,40 +186,10 @@ class AnalyticsService:
                 )
             ).count()
             
-            # Cards criados no período
-            cards_created = KanbanCard.query.join(KanbanBoard).filter(
-                or_(
-                    KanbanBoard.owner_id == user_id,
-                    KanbanBoard.team_ids.contains([user_id])
-                ),
-                KanbanCard.created_at.between(start_date, end_date)
-            ).count()
-            
-            # Cards completados no período
-            cards_completed = KanbanCard.query.join(KanbanBoard).filter(
-                or_(
-                    KanbanBoard.owner_id == user_id,
-                    KanbanBoard.team_ids.contains([user_id])
-                ),
-                KanbanCard.completed_at.between(start_date, end_date)
-            ).count()
-            
-            # Tempo total trabalhado
-            total_time = db.session.query(
-                func.sum(KanbanTimeEntry.duration_minutes)
-            ).join(KanbanCard).join(KanbanBoard).filter(
-                KanbanTimeEntry.user_id == user_id,
-                KanbanTimeEntry.start_time.between(start_date, end_date)
-            ).scalar() or 0
-            
-            # Horas faturáveis
-            billable_hours = db.session.query(
-                func.sum(KanbanTimeEntry.duration_minutes)
-            ).join(KanbanCard).join(KanbanBoard).filter(
-                KanbanTimeEntry.user_id == user_id,
-                KanbanTimeEntry.is_billable == True,
-                KanbanTimeEntry.start_time.between(start_date, end_date)
-            ).scalar() or 0
+            cards_created = totals['cards_created']
+            cards_completed = totals['cards_completed']
+            total_time = totals['minutes_logged']
+            billable_hours = totals['billable_minutes']
             
             # Taxa de conclusão
             completion_rate = (cards_completed / cards_created * 100) if cards_created > 0 else 0
@@ -202,7 +201,7 @@ class AnalyticsService:
                 'completion_rate': round(completion_rate, 1),
                 'total_hours': round(total_time / 60, 1) if total_time else 0,
                 'billable_hours': round(billable_hours / 60, 1) if billable_hours else 0,
-                'productivity_score': self._calculate_productivity_score(user_id, start_date, end_date)
+                'productivity_score': self._calculate_productivity_score(totals)
             }
             
         except Exception as e:
@@ -214,54 +213,35 @@ class AnalyticsService:
     
     # === MÉTRICAS DE WIKI ===
     
-    def _get_wiki_metrics(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    def _get_wiki_metrics(self, user_id: int, start_date: datetime, end_date: datetime,
+                          totals: Dict[str, int]) -> Dict[str, Any]:
         """Métricas da Wiki"""
         try:
-            from models.wiki import WikiArticle, WikiComment, WikiLike
-            
-            # Artigos criados pelo usuário
-            articles_created = WikiArticle.query.filter(
-                WikiArticle.author_id == user_id,
-                WikiArticle.created_at.between(start_date, end_date)
-            ).count()
+            from models.wiki import WikiArticle
             
-            # Visualizações dos artigos do usuário
+            # Visualizações dos artigos do usuário (contador acumulado no próprio artigo)
             total_views = db.session.query(
                 func.sum(WikiArticle.view_count)
             ).filter(
                 WikiArticle.author_id == user_id
             ).scalar() or 0
             
-            # Curtidas recebidas
-            likes_received = db.session.query(
-                func.count(WikiLike.id)
-            ).join(WikiArticle).filter(
-                WikiArticle.author_id == user_id,
-                WikiLike.created_at.between(start_date, end_date)
-            ).scalar() or 0
-            
-            # Comentários feitos pelo usuário
-            comments_made = WikiComment.query.filter(
-                WikiComment.author_id == user_id,
-                WikiComment.created_at.between(start_date, end_date)
-            ).count()
-            
             # Artigo mais popular do usuário
             most_popular = WikiArticle.query.filter(
                 WikiArticle.author_id == user_id
             ).order_by(desc(WikiArticle.view_count)).first()
             
             return {
-                'articles_created': articles_created,
+                'articles_created': totals['wiki_articles'],
                 'total_views': total_views,
-                'likes_received': likes_received,
-                'comments_made': comments_made,
+                'likes_received': totals['wiki_likes_received'],
+                'comments_made': totals['wiki_comments'],
                 'most_popular_article': {
                     'title': most_popular.title,
                     'views': most_popular.view_count,
                     'likes': most_popular.like_count
                 } if most_popular else None,
-                'engagement_score': self._calculate_wiki_engagement_score(user_id, start_date, end_date)
+                'engagement_score': self._calculate_wiki_engagement_score(totals)
             }
             
         except Exception as e:
@@ -273,58 +253,23 @@ class AnalyticsService:
     
     # === MÉTRICAS DE IA ===
     
-    def _get_ai_usage_metrics(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    def _get_ai_usage_metrics(self, user_id: int, start_date: datetime, end_date: datetime,
+                              totals: Dict[str, int]) -> Dict[str, Any]:
         """Métricas de uso da IA"""
         try:
-            from models.ai_usage import AIUsageLog
+            start_day, end_day = self._period_days(start_date, end_date)
+            total_requests = totals['ai_requests']
             
-            # Total de requests de IA
-            total_requests = AIUsageLog.query.filter(
-                AIUsageLog.user_id == user_id,
-                AIUsageLog.created_at.between(start_date, end_date)
-            ).count()
-            
-            # Requests por tipo
-            requests_by_type = db.session.query(
-                AIUsageLog.request_type,
-                func.count(AIUsageLog.id).label('count')
-            ).filter(
-                AIUsageLog.user_id == user_id,
-                AIUsageLog.created_at.between(start_date, end_date)
-            ).group_by(AIUsageLog.request_type).all()
-            
-            # Tokens consumidos
-            total_tokens = db.session.query(
-                func.sum(AIUsageLog.tokens_used)
-            ).filter(
-                AIUsageLog.user_id == user_id,
-                AIUsageLog.created_at.between(start_date, end_date)
-            ).scalar() or 0
-            
-            # Tempo médio de resposta
-            avg_response_time = db.session.query(
-                func.avg(AIUsageLog.response_time_ms)
-            ).filter(
-                AIUsageLog.user_id == user_id,
-                AIUsageLog.created_at.between(start_date, end_date)
-            ).scalar() or 0
-            
-            # Taxa de sucesso
-            successful_requests = AIUsageLog.query.filter(
-                AIUsageLog.user_id == user_id,
-                AIUsageLog.status == 'success',
-                AIUsageLog.created_at.between(start_date, end_date)
-            ).count()
-            
-            success_rate = (successful_requests / total_requests * 100) if total_requests > 0 else 0
+            avg_response_time = totals['ai_response_ms'] / total_requests if total_requests else 0
+            success_rate = (totals['ai_successful'] / total_requests * 100) if total_requests > 0 else 0
             
             return {
                 'total_requests': total_requests,
-                'by_type': [{'type': req.request_type, 'count': req.count} for req in requests_by_type],
-                'total_tokens': total_tokens,
+                'by_type': activity_rollups.breakdown(user_id, 'ai_request_type', start_day, end_day),
+                'total_tokens': totals['ai_tokens'],
                 'avg_response_time_ms': round(avg_response_time, 2) if avg_response_time else 0,
                 'success_rate': round(success_rate, 1),
-                'efficiency_score': self._calculate_ai_efficiency_score(user_id, start_date, end_date)
+                'efficiency_score': self._calculate_ai_efficiency_score(totals)
             }
             
         except Exception as e:
@@ -336,7 +281,8 @@ class AnalyticsService:
     
     # === MÉTRICAS DE PRODUTIVIDADE ===
     
-    def _get_productivity_metrics(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    def _get_productivity_metrics(self, user_id: int, start_date: datetime, end_date: datetime,
+                                  totals: Dict[str, int]) -> Dict[str, Any]:
         """Métricas de produtividade"""
         try:
             # Atividade por dia da semana
@@ -349,10 +295,10 @@ class AnalyticsService:
             activity_streak = self._calculate_activity_streak(user_id)
             
             # Score de produtividade geral
-            productivity_score = self._calculate_overall_productivity_score(user_id, start_date, end_date)
+            productivity_score = self._calculate_overall_productivity_score(totals)
             
             # Metas e conquistas
-            achievements = self._get_user_achievements(user_id, start_date, end_date)
+            achievements = self._get_user_achievements(user_id, start_date, end_date, totals)
             
             return {
                 'weekday_pattern': weekday_activity,
@@ -372,52 +318,25 @@ class AnalyticsService:
     
     # === MÉTRICAS DE NOTIFICAÇÕES ===
     
-    def _get_notifications_metrics(self, user_id: int, start_date: datetime, end_date: datetime) -> Dict[str, Any]:
+    def _get_notifications_metrics(self, user_id: int, start_date: datetime, end_date: datetime,
+                                   totals: Dict[str, int]) -> Dict[str, Any]:
         """Métricas de notificações"""
         try:
-            from models.notification import Notification
-            
-            # Total de notificações recebidas
-            total_received = Notification.query.filter(
-                Notification.user_id == user_id,
-                Notification.created_at.between(start_date, end_date)
-            ).count()
-            
-            # Total lidas
-            total_read = Notification.query.filter(
-                Notification.user_id == user_id,
-                Notification.is_read == True,
-                Notification.created_at.between(start_date, end_date)
-            ).count()
+            start_day, end_day = self._period_days(start_date, end_date)
+            total_received = totals['notifications_received']
+            total_read = totals['notifications_read']
             
             # Taxa de leitura
             read_rate = (total_read / total_received * 100) if total_received > 0 else 0
             
-            # Notificações por tipo
-            by_type = db.session.query(
-                Notification.type,
-                func.count(Notification.id).label('count')
-            ).filter(
-                Notification.user_id == user_id,
-                Notification.created_at.between(start_date, end_date)
-            ).group_by(Notification.type).all()
-            
             # Tempo médio para leitura
-            avg_read_time = db.session.query(
-                func.avg(
-                    extract('epoch', Notification.read_at) - extract('epoch', Notification.created_at)
-                )
-            ).filter(
-                Notification.user_id == user_id,
-                Notification.is_read == True,
-                Notification.created_at.between(start_date, end_date)
-            ).scalar() or 0
+            avg_read_time = totals['notification_read_seconds'] / total_read if total_read else 0
             
             return {
                 'total_received': total_received,
                 'total_read': total_read,
                 'read_rate': round(read_rate, 1),
-                'by_type': [{'type': notif.type.value, 'count': notif.count} for notif in by_type],
+                'by_type': activity_rollups.breakdown(user_id, 'notification_type', start_day, end_day),
                 'avg_read_time_minutes': round(avg_read_time / 60, 1) if avg_read_time else 0
             }
             
@@ -430,62 +349,22 @@ class AnalyticsService:
     
     # === MÉTODOS AUXILIARES ===
     
-    def _calculate_growth_rate(self, model, date_field, user_id: int, start_date: datetime, end_date: datetime) -> float:
-        """Calcula taxa de crescimento"""
-        try:
-            period_days = (end_date - start_date).days
-            previous_start = start_date - timedelta(days=period_days)
-            
-            current_count = model.query.filter(
-                getattr(model, 'usuario_id', getattr(model, 'user_id', None)) == user_id,
-                getattr(model, date_field).between(start_date, end_date)
-            ).count()
-            
-            previous_count = model.query.filter(
-                getattr(model, 'usuario_id', getattr(model, 'user_id', None)) == user_id,
-                getattr(model, date_field).between(previous_start, start_date)
-            ).count()
-            
-            if previous_count == 0:
-                return 100.0 if current_count > 0 else 0.0
-            
-            return ((current_count - previous_count) / previous_count) * 100
-            
-        except Exception as e:
-            logger.error(f"Erro ao calcular taxa de crescimento: {str(e)}")
-            return 0.0
+    def _calculate_growth_rate(self, current_count: int, previous_count: int) -> float:
+        """Calcula taxa de crescimento em relação ao período anterior"""
+        if previous_count == 0:
+            return 100.0 if current_count > 0 else 0.0
+        
+        return ((current_count - previous_count) / previous_count) * 100
     
-    def _calculate_productivity_score(self, user_id: int, start_date: datetime, end_date: datetime) -> float:
+    def _calculate_productivity_score(self, totals: Dict[str, int]) -> float:
         """Calcula score de produtividade"""
         try:
-            # Implementar lógica de cálculo baseada em várias métricas
-            # Por exemplo: cards completados, tempo trabalhado, deadlines cumpridos, etc.
-            
-            from models.kanban import KanbanCard, KanbanTimeEntry
-            
-            # Cards completados no prazo
-            completed_on_time = KanbanCard.query.filter(
-                KanbanCard.created_by == user_id,
-                KanbanCard.status == 'completed',
-                KanbanCard.completed_at.between(start_date, end_date),
-                KanbanCard.completed_at <= KanbanCard.due_date
-            ).count()
-            
-            # Total de cards com deadline
-            total_with_deadline = KanbanCard.query.filter(
-                KanbanCard.created_by == user_id,
-                KanbanCard.status == 'completed',
-                KanbanCard.completed_at.between(start_date, end_date),
-                KanbanCard.due_date.isnot(None)
-            ).count()
+            # Cards completados no prazo / total de cards com deadline
+            completed_on_time = totals['cards_completed_on_time']
+            total_with_deadline = totals['cards_completed_with_deadline']
             
-            # Horas trabalhadas
-            hours_worked = db.session.query(
-                func.sum(KanbanTimeEntry.duration_minutes)
-            ).filter(
-                KanbanTimeEntry.user_id == user_id,
-                KanbanTimeEntry.start_time.between(start_date, end_date)
-            ).scalar() or 0
+            # Minutos trabalhados
+            hours_worked = totals['minutes_logged']
             
             # Cálculo do score (0-100)
             deadline_score = (completed_on_time / total_with_deadline * 40) if total_with_deadline > 0 else 0
@@ -498,128 +377,80 @@ class AnalyticsService:
             logger.error(f"Erro ao calcular score de produtividade: {str(e)}")
             return 0.0
     
-    def _calculate_wiki_engagement_score(self, user_id: int, start_date: datetime, end_date: datetime) -> float:
+    def _calculate_wiki_engagement_score(self, totals: Dict[str, int]) -> float:
         """Calcula score de engajamento na wiki"""
-        try:
-            from models.wiki import WikiArticle, WikiComment, WikiLike
-            
-            # Artigos criados
-            articles = WikiArticle.query.filter(
-                WikiArticle.author_id == user_id,
-                WikiArticle.created_at.between(start_date, end_date)
-            ).count()
-            
-            # Comentários feitos
-            comments = WikiComment.query.filter(
-                WikiComment.author_id == user_id,
-                WikiComment.created_at.between(start_date, end_date)
-            ).count()
-            
-            # Curtidas dadas
-            likes = WikiLike.query.filter(
-                WikiLike.user_id == user_id,
-                WikiLike.created_at.between(start_date, end_date)
-            ).count()
-            
-            # Score baseado em atividade (0-100)
-            score = min(articles * 20 + comments * 5 + likes * 2, 100)
-            
-            return score
-            
-        except Exception as e:
-            logger.error(f"Erro ao calcular score de engajamento: {str(e)}")
-            return 0.0
+        # Score baseado em atividade (0-100)
+        return min(totals['wiki_articles'] * 20 + totals['wiki_comments'] * 5 + totals['wiki_likes_given'] * 2, 100)
     
-    def _calculate_ai_efficiency_score(self, user_id: int, start_date: datetime, end_date: datetime) -> float:
+    def _calculate_ai_efficiency_score(self, totals: Dict[str, int]) -> float:
         """Calcula score de eficiência no uso da IA"""
-        try:
-            from models.ai_usage import AIUsageLog
-            
-            # Total de requests
-            total_requests = AIUsageLog.query.filter(
-                AIUsageLog.user_id == user_id,
-                AIUsageLog.created_at.between(start_date, end_date)
-            ).count()
-            
-            if total_requests == 0:
-                return 0.0
-            
-            # Requests bem-sucedidos
-            successful = AIUsageLog.query.filter(
-                AIUsageLog.user_id == user_id,
-                AIUsageLog.status == 'success',
-                AIUsageLog.created_at.between(start_date, end_date)
-            ).count()
-            
-            # Score baseado na taxa de sucesso
-            success_rate = (successful / total_requests) * 100
-            
-            return success_rate
-            
-        except Exception as e:
-            logger.error(f"Erro ao calcular score de eficiência da IA: {str(e)}")
+        if totals['ai_requests'] == 0:
             return 0.0
+        
+        # Score baseado na taxa de sucesso
+        return (totals['ai_successful'] / totals['ai_requests']) * 100
+    
+    def _activity_by_weekday_hour(self, user_id: int, start_date: datetime, end_date: datetime) -> np.ndarray:
+        """Matriz 7 x 24 (segunda=0) de eventos de atividade no período"""
+        start_day, end_day = self._period_days(start_date, end_date)
+        return weekday_hour_heatmap(*activity_rollups.activity_matrix(user_id, start_day, end_day))
     
     def _get_weekday_activity_pattern(self, user_id: int, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
         """Padrão de atividade por dia da semana"""
         try:
-            # Implementar consulta que agregue atividade por dia da semana
-            # Usando diferentes tabelas (documentos, kanban, wiki, etc.)
-            
+            totals = self._activity_by_weekday_hour(user_id, start_date, end_date).sum(axis=1)
             weekdays = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
-            pattern = []
-            
-            for i, day in enumerate(weekdays):
-                # Placeholder - implementar consulta real
-                activity_count = 10 + i * 2  # Dados fictícios
-                pattern.append({
-                    'day': day,
-                    'day_number': i + 1,
-                    'activity_count': activity_count
-                })
             
-            return pattern
+            return [
+                {'day': day, 'day_number': i + 1, 'activity_count': int(totals[i])}
+                for i, day in enumerate(weekdays)
+            ]
             
         except Exception as e:
             logger.error(f"Erro ao obter padrão de atividade semanal: {str(e)}")
             return []
     
     def _get_hourly_activity_pattern(self, user_id: int, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
-        """Padrão de atividade por hora do dia"""
+        """Padrão de atividade por hora do dia (UTC)"""
         try:
-            pattern = []
-            
-            for hour in range(24):
-                # Placeholder - implementar consulta real
-                activity_count = max(0, 10 - abs(hour - 14))  # Pico às 14h
-                pattern.append({
-                    'hour': hour,
-                    'activity_count': activity_count
-                })
+            totals = self._activity_by_weekday_hour(user_id, start_date, end_date).sum(axis=0)
             
-            return pattern
+            return [{'hour': hour, 'activity_count': int(totals[hour])} for hour in range(24)]
             
         except Exception as e:
             logger.error(f"Erro ao obter padrão de atividade horário: {str(e)}")
             return []
     
+    def _get_productivity_heatmap(self, user_id: int, period: str) -> Dict[str, Any]:
+        """Heatmap dia da semana x hora de atividade"""
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=PERIOD_DAYS.get(period, 30))
+        heatmap = self._activity_by_weekday_hour(user_id, start_date, end_date)
+        
+        return {
+            'period': period,
+            'weekdays': ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo'],
+            'hours': list(range(24)),
+            'values': heatmap.astype(int).tolist(),
+            'max': int(heatmap.max()) if heatmap.size else 0
+        }
+    
     def _calculate_activity_streak(self, user_id: int) -> int:
         """Calcula sequência de dias consecutivos com atividade"""
         try:
-            # Placeholder - implementar lógica real
-            return 7  # 7 dias consecutivos
+            return activity_rollups.activity_streak(user_id)
             
         except Exception as e:
             logger.error(f"Erro ao calcular sequência de atividade: {str(e)}")
             return 0
     
-    def _calculate_overall_productivity_score(self, user_id: int, start_date: datetime, end_date: datetime) -> float:
+    def _calculate_overall_productivity_score(self, totals: Dict[str, int]) -> float:
         """Score geral de produtividade"""
         try:
             # Combinar diferentes scores
-            kanban_score = self._calculate_productivity_score(user_id, start_date, end_date)
-            wiki_score = self._calculate_wiki_engagement_score(user_id, start_date, end_date)
-            ai_score = self._calculate_ai_efficiency_score(user_id, start_date, end_date)
+            kanban_score = self._calculate_productivity_score(totals)
+            wiki_score = self._calculate_wiki_engagement_score(totals)
+            ai_score = self._calculate_ai_efficiency_score(totals)
             
             # Média ponderada
             overall = (kanban_score * 0.5 + wiki_score * 0.3 + ai_score * 0.2)
@@ -630,7 +461,8 @@ class AnalyticsService:
             logger.error(f"Erro ao calcular score geral: {str(e)}")
             return 0.0
     
-    def _get_user_achievements(self, user_id: int, start_date: datetime, end_date: datetime) -> List[Dict[str, Any]]:
+    def _get_user_achievements(self, user_id: int, start_date: datetime, end_date: datetime,
+                               totals: Dict[str, int]) -> List[Dict[str, Any]]:
         """Conquistas do usuário no período"""
         try:
             achievements = []
@@ -638,30 +470,20 @@ class AnalyticsService:
             # Verificar diferentes conquistas
             # Exemplo: "Criou primeiro artigo", "Completou 10 tarefas", etc.
             
-            from models.wiki import WikiArticle
-            from models.kanban import KanbanCard
-            
             # Primeira publicação na wiki
-            first_article = WikiArticle.query.filter(
-                WikiArticle.author_id == user_id,
-                WikiArticle.created_at.between(start_date, end_date)
-            ).first()
-            
-            if first_article:
+            if totals['wiki_articles']:
+                start_day, end_day = self._period_days(start_date, end_date)
+                first_day = activity_rollups.first_day(user_id, 'wiki_articles', start_day, end_day)
                 achievements.append({
                     'id': 'first_article',
                     'title': 'Primeiro Artigo',
                     'description': 'Publicou seu primeiro artigo na base de conhecimento',
                     'icon': '📝',
-                    'earned_at': first_article.created_at.isoformat()
+                    'earned_at': (first_day or end_date.date()).isoformat()
                 })
             
             # Tasks completadas
-            completed_tasks = KanbanCard.query.filter(
-                KanbanCard.created_by == user_id,
-                KanbanCard.status == 'completed',
-                KanbanCard.completed_at.between(start_date, end_date)
-            ).count()
+            completed_tasks = totals['cards_completed_own']
             
             if completed_tasks >= 10:
                 achievements.append({
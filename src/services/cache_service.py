@@ -1,38 +1,21 @@
 """
 Serviço de Cache Redis Estratégico para JurisIA
 """
-import redis
-import json
-import pickle
 import hashlib
-from datetime import datetime, timedelta
 from typing import Any, Optional, Dict, List
-from functools import wraps
 import logging
-from src.config import Config
+from src.cache import cache as shared_cache, TieredCache, cached as stampede_cached
 
 logger = logging.getLogger(__name__)
 
 class CacheService:
-    def __init__(self):
-        self.redis_client = None
-        self.enabled = False
-        self._connect()
+    """Fachada sobre o cache unificado (L1 em memória + Redis)"""
     
-    def _connect(self):
-        """Conecta ao Redis se disponível"""
-        try:
-            redis_url = getattr(Config, 'REDIS_URL', 'redis://localhost:6379/0')
-            self.redis_client = redis.from_url(redis_url, decode_responses=False)
-            
-            # Testa a conexão
-            self.redis_client.ping()
-            self.enabled = True
-            logger.info("✅ Redis conectado e cache habilitado")
-            
-        except Exception as e:
-            logger.warning(f"⚠️ Redis não disponível, cache desabilitado: {e}")
-            self.enabled = False
+    def __init__(self, tiered_cache: TieredCache = None):
+        self.cache = tiered_cache or shared_cache
+        self.redis_client = self.cache.redis
+        # A camada em memória sempre está disponível, mesmo sem Redis
+        self.enabled = True
     
     def _make_key(self, prefix: str, identifier: str) -> str:
         """Gera chave única para cache"""
@@ -40,87 +23,39 @@ class CacheService:
     
     def _serialize(self, data: Any) -> bytes:
         """Serializa dados para armazenamento"""
-        try:
-            # Tenta JSON primeiro (mais rápido)
-            return json.dumps(data, default=str).encode('utf-8')
-        except (TypeError, ValueError):
-            # Usa pickle para objetos complexos
-            return pickle.dumps(data)
+        return self.cache.codec.encode(data)
     
     def _deserialize(self, data: bytes) -> Any:
         """Deserializa dados do cache"""
-        try:
-            # Tenta JSON primeiro
-            return json.loads(data.decode('utf-8'))
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            # Usa pickle
-            return pickle.loads(data)
+        return self.cache.codec.decode(data)
     
-    def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
-        """Define valor no cache com TTL"""
-        if not self.enabled:
-            return False
-            
-        try:
-            serialized = self._serialize(value)
-            return self.redis_client.setex(key, ttl, serialized)
-        except Exception as e:
-            logger.error(f"Erro ao definir cache {key}: {e}")
-            return False
+    def set(self, key: str, value: Any, ttl: int = 3600, tags: Optional[List[str]] = None) -> bool:
+        """Define valor no cache com TTL, associado às tags das entidades de origem"""
+        return self.cache.set(key, value, ttl, tags=tags)
     
     def get(self, key: str) -> Any:
         """Obtém valor do cache"""
-        if not self.enabled:
-            return None
-            
-        try:
-            data = self.redis_client.get(key)
-            if data is None:
-                return None
-            return self._deserialize(data)
-        except Exception as e:
-            logger.error(f"Erro ao obter cache {key}: {e}")
-            return None
+        return self.cache.get(key)
     
     def delete(self, key: str) -> bool:
         """Remove chave do cache"""
-        if not self.enabled:
-            return False
-            
-        try:
-            return bool(self.redis_client.delete(key))
-        except Exception as e:
-            logger.error(f"Erro ao deletar cache {key}: {e}")
-            return False
+        return self.cache.delete(key)
     
     def delete_pattern(self, pattern: str) -> int:
-        """Remove chaves por padrão"""
-        if not self.enabled:
-            return 0
-            
-        try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                return self.redis_client.delete(*keys)
-            return 0
-        except Exception as e:
-            logger.error(f"Erro ao deletar padrão {pattern}: {e}")
-            return 0
+        """Remove chaves por padrão (varredura SCAN; prefira invalidate_tags)"""
+        return self.cache.delete_pattern(pattern)
+    
+    def invalidate_tags(self, *tags: str) -> int:
+        """Remove as entradas derivadas das entidades informadas"""
+        return self.cache.invalidate_tags(*tags)
     
     def exists(self, key: str) -> bool:
         """Verifica se chave existe"""
-        if not self.enabled:
-            return False
-            
-        try:
-            return bool(self.redis_client.exists(key))
-        except Exception as e:
-            logger.error(f"Erro ao verificar existência {key}: {e}")
-            return False
+        return self.cache.exists(key)
     
     def increment(self, key: str, amount: int = 1) -> Optional[int]:
         """Incrementa contador"""
-        if not self.enabled:
+        if not self.redis_client:
             return None
             
         try:
@@ -131,7 +66,7 @@ class CacheService:
     
     def set_hash(self, key: str, mapping: Dict[str, Any], ttl: int = 3600) -> bool:
         """Define hash no cache"""
-        if not self.enabled:
+        if not self.redis_client:
             return False
             
         try:
@@ -151,7 +86,7 @@ class CacheService:
     
     def get_hash(self, key: str, field: Optional[str] = None) -> Any:
         """Obtém hash do cache"""
-        if not self.enabled:
+        if not self.redis_client:
             return None
             
         try:
@@ -174,11 +109,16 @@ class StrategicCache:
     def __init__(self, cache_service: CacheService):
         self.cache = cache_service
     
+    @staticmethod
+    def tag(entity: str, entity_id: Any) -> str:
+        """Tag de dependência de uma entidade (ex.: document:42)"""
+        return f"{entity}:{entity_id}"
+    
     # Cache de usuários
     def cache_user(self, user_id: int, user_data: Dict, ttl: int = 1800):
         """Cache dados do usuário por 30min"""
         key = self.cache._make_key("user", str(user_id))
-        return self.cache.set(key, user_data, ttl)
+        return self.cache.set(key, user_data, ttl, tags=[self.tag("user", user_id)])
     
     def get_user(self, user_id: int) -> Optional[Dict]:
         """Obtém usuário do cache"""
@@ -186,15 +126,14 @@ class StrategicCache:
         return self.cache.get(key)
     
     def invalidate_user(self, user_id: int):
-        """Invalida cache do usuário"""
-        key = self.cache._make_key("user", str(user_id))
-        return self.cache.delete(key)
+        """Invalida cache do usuário e tudo o que deriva dele"""
+        return self.cache.invalidate_tags(self.tag("user", user_id))
     
     # Cache de documentos
     def cache_document(self, doc_id: int, doc_data: Dict, ttl: int = 3600):
         """Cache documento por 1h"""
         key = self.cache._make_key("document", str(doc_id))
-        return self.cache.set(key, doc_data, ttl)
+        return self.cache.set(key, doc_data, ttl, tags=[self.tag("document", doc_id)])
     
     def get_document(self, doc_id: int) -> Optional[Dict]:
         """Obtém documento do cache"""
@@ -202,26 +141,30 @@ class StrategicCache:
         return self.cache.get(key)
     
     def invalidate_document(self, doc_id: int):
-        """Invalida cache do documento"""
-        key = self.cache._make_key("document", str(doc_id))
-        return self.cache.delete(key)
+        """Invalida cache do documento e tudo o que deriva dele"""
+        return self.cache.invalidate_tags(self.tag("document", doc_id))
     
     # Cache de templates
     def cache_template(self, template_id: int, template_data: Dict, ttl: int = 7200):
         """Cache template por 2h"""
         key = self.cache._make_key("template", str(template_id))
-        return self.cache.set(key, template_data, ttl)
+        return self.cache.set(key, template_data, ttl, tags=[self.tag("template", template_id)])
     
     def get_template(self, template_id: int) -> Optional[Dict]:
         """Obtém template do cache"""
         key = self.cache._make_key("template", str(template_id))
         return self.cache.get(key)
     
+    def invalidate_template(self, template_id: int):
+        """Invalida cache do template e tudo o que deriva dele"""
+        return self.cache.invalidate_tags(self.tag("template", template_id))
+    
     # Cache de busca
-    def cache_search(self, query_hash: str, results: List, ttl: int = 1800):
+    def cache_search(self, query_hash: str, results: List, ttl: int = 1800,
+                     tags: Optional[List[str]] = None):
         """Cache resultados de busca por 30min"""
         key = self.cache._make_key("search", query_hash)
-        return self.cache.set(key, results, ttl)
+        return self.cache.set(key, results, ttl, tags=tags)
     
     def get_search(self, query_hash: str) -> Optional[List]:
         """Obtém resultados de busca do cache"""
@@ -229,10 +172,12 @@ class StrategicCache:
         return self.cache.get(key)
     
     # Cache de sessão
-    def cache_session(self, session_id: str, session_data: Dict, ttl: int = 3600):
+    def cache_session(self, session_id: str, session_data: Dict, ttl: int = 3600,
+                      user_id: Optional[int] = None):
         """Cache dados da sessão por 1h"""
         key = self.cache._make_key("session", session_id)
-        return self.cache.set(key, session_data, ttl)
+        tags = [self.tag("user", user_id)] if user_id is not None else None
+        return self.cache.set(key, session_data, ttl, tags=tags)
     
     def get_session(self, session_id: str) -> Optional[Dict]:
         """Obtém dados da sessão"""
@@ -240,10 +185,11 @@ class StrategicCache:
         return self.cache.get(key)
     
     # Cache de estatísticas
-    def cache_stats(self, stats_type: str, stats_data: Dict, ttl: int = 600):
+    def cache_stats(self, stats_type: str, stats_data: Dict, ttl: int = 600,
+                    tags: Optional[List[str]] = None):
         """Cache estatísticas por 10min"""
         key = self.cache._make_key("stats", stats_type)
-        return self.cache.set(key, stats_data, ttl)
+        return self.cache.set(key, stats_data, ttl, tags=tags)
     
     def get_stats(self, stats_type: str) -> Optional[Dict]:
         """Obtém estatísticas do cache"""
@@ -252,34 +198,23 @@ class StrategicCache:
 
 
 # Decorador para cache automático
-def cached(prefix: str, ttl: int = 3600, key_func=None):
-    """Decorador para cache automático de funções"""
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # Gera chave baseada nos argumentos
-            if key_func:
-                cache_key = key_func(*args, **kwargs)
-            else:
-                # Hash dos argumentos
-                args_str = str(args) + str(sorted(kwargs.items()))
-                cache_key = hashlib.md5(args_str.encode()).hexdigest()
-            
-            full_key = cache_service._make_key(prefix, cache_key)
-            
-            # Tenta obter do cache
-            cached_result = cache_service.get(full_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Executa e armazena no cache
-            result = func(*args, **kwargs)
-            if result is not None:
-                cache_service.set(full_key, result, ttl)
-            
-            return result
-        return wrapper
-    return decorator
+def cached(prefix: str, ttl: int = 3600, key_func=None, tags_func=None, stale_ttl: int = None):
+    """Decorador para cache automático de funções
+
+    Protegido contra stampede: uma única recomputação por chave (no processo e
+    entre processos), servindo o valor vencido enquanto ela acontece.
+    `tags_func` recebe os mesmos argumentos da função e retorna as tags das
+    entidades das quais o resultado deriva.
+    """
+    def key_builder(*args, **kwargs):
+        if key_func:
+            return key_func(*args, **kwargs)
+        # Hash dos argumentos
+        args_str = str(args) + str(sorted(kwargs.items()))
+        return hashlib.md5(args_str.encode()).hexdigest()
+    
+    return stampede_cached(prefix, ttl=ttl, key_builder=key_builder, tags=tags_func,
+                           stale_ttl=stale_ttl, cache=shared_cache)
 
 
 # Instâncias globais
@@ -291,9 +226,9 @@ def cache_get(key: str) -> Any:
     """Função de conveniência para obter do cache"""
     return cache_service.get(key)
 
-def cache_set(key: str, value: Any, ttl: int = 3600) -> bool:
+def cache_set(key: str, value: Any, ttl: int = 3600, tags: Optional[List[str]] = None) -> bool:
     """Função de conveniência para definir no cache"""
-    return cache_service.set(key, value, ttl)
+    return cache_service.set(key, value, ttl, tags=tags)
 
 def cache_delete(key: str) -> bool:
     """Função de conveniência para deletar do cache"""
@@ -301,4 +236,8 @@ def cache_delete(key: str) -> bool:
 
 def cache_invalidate_pattern(pattern: str) -> int:
     """Função de conveniência para invalidar por padrão"""
-    return cache_service.delete_pattern(pattern) 
\ No newline at end of file
+    return cache_service.delete_pattern(pattern)
+
+def cache_invalidate_tags(*tags: str) -> int:
+    """Função de conveniência para invalidar por tags de entidade"""
+    return cache_service.invalidate_tags(*tags)
@@ -4,6 +4,7 @@ Inclui compressão automática, CDN e otimização de imagens
 """
 import os
 import io
+import shutil
 import hashlib
 import mimetypes
 from datetime import datetime, timedelta
@@ -52,6 +53,10 @@ class CloudStorageProvider:
         """Upload de arquivo - retorna URL pública"""
         raise NotImplementedError
     
+    def upload_fileobj(self, file_obj, file_path: str, content_type: str = None) -> str:
+        """Upload a partir de um arquivo aberto (privado; use get_file_url para acesso)"""
+        return self.upload_file(file_obj.read(), file_path, content_type)
+    
     def download_file(self, file_path: str) -> bytes:
         """Download de arquivo"""
         raise NotImplementedError
@@ -134,6 +139,28 @@ class AWSS3Provider(CloudStorageProvider):
             logger.error(f"Erro no upload S3: {e}")
             raise
     
+    def upload_fileobj(self, file_obj, file_path: str, content_type: str = None) -> str:
+        """Upload multipart em stream para S3 (sem carregar o arquivo em memória)"""
+        try:
+            if not content_type:
+                content_type, _ = mimetypes.guess_type(file_path)
+                content_type = content_type or 'application/octet-stream'
+            
+            self.s3_client.upload_fileobj(
+                file_obj,
+                self.bucket_name,
+                file_path,
+                ExtraArgs={
+                    'ContentType': content_type,
+                    'Metadata': {'uploaded_at': datetime.now().isoformat()}
+                }
+            )
+            return f"s3://{self.bucket_name}/{file_path}"
+            
+        except ClientError as e:
+            logger.error(f"Erro no upload S3: {e}")
+            raise
+    
     def download_file(self, file_path: str) -> bytes:
         """Download do S3"""
         try:
@@ -248,6 +275,22 @@ class GCPStorageProvider(CloudStorageProvider):
             logger.error(f"Erro no upload GCS: {e}")
             raise
     
+    def upload_fileobj(self, file_obj, file_path: str, content_type: str = None) -> str:
+        """Upload resumable em stream para GCS (sem carregar o arquivo em memória)"""
+        try:
+            blob = self.bucket.blob(file_path)
+            if not content_type:
+                content_type, _ = mimetypes.guess_type(file_path)
+                content_type = content_type or 'application/octet-stream'
+            
+            blob.metadata = {'uploaded_at': datetime.now().isoformat()}
+            blob.upload_from_file(file_obj, content_type=content_type)
+            return f"gs://{self.bucket_name}/{file_path}"
+            
+        except Exception as e:
+            logger.error(f"Erro no upload GCS: {e}")
+            raise
+    
     def download_file(self, file_path: str) -> bytes:
         """Download do GCS"""
         try:
@@ -328,6 +371,21 @@ class LocalStorageProvider(CloudStorageProvider):
             logger.error(f"Erro no upload local: {e}")
             raise
     
+    def upload_fileobj(self, file_obj, file_path: str, content_type: str = None) -> str:
+        """Cópia local em blocos"""
+        try:
+            full_path = os.path.join(self.base_path, file_path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            
+            with open(full_path, 'wb') as f:
+                shutil.copyfileobj(file_obj, f, 64 * 1024)
+            
+            return f"{self.base_url}/{file_path}"
+            
+        except Exception as e:
+            logger.error(f"Erro no upload local: {e}")
+            raise
+    
     def download_file(self, file_path: str) -> bytes:
         """Download local"""
         try:
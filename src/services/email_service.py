@@ -201,33 +201,42 @@ class EmailService:
             }
         }
     
+    def _build_message(self, to_email: str, subject: str, html_content: str, text_content: str = None) -> MIMEMultipart:
+        """Monta a mensagem MIME (texto + HTML)"""
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = self.from_email
+        msg['To'] = to_email
+        
+        # Adicionar versão texto se não fornecida
+        if not text_content:
+            # Criar versão texto simples removendo HTML
+            import re
+            text_content = re.sub('<[^<]+?>', '', html_content)
+            text_content = re.sub(r'\s+', ' ', text_content).strip()
+        
+        # Adicionar conteúdo
+        msg.attach(MIMEText(text_content, 'plain', 'utf-8'))
+        msg.attach(MIMEText(html_content, 'html', 'utf-8'))
+        return msg
+    
+    def _open_smtp(self) -> smtplib.SMTP:
+        """Abre conexão SMTP autenticada"""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        if self.use_tls:
+            server.starttls()
+        
+        if self.smtp_username and self.smtp_password:
+            server.login(self.smtp_username, self.smtp_password)
+        return server
+    
     def _send_smtp_email(self, to_email: str, subject: str, html_content: str, text_content: str = None) -> bool:
         """Envia email via SMTP"""
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = self.from_email
-            msg['To'] = to_email
-            
-            # Adicionar versão texto se não fornecida
-            if not text_content:
-                # Criar versão texto simples removendo HTML
-                import re
-                text_content = re.sub('<[^<]+?>', '', html_content)
-                text_content = re.sub(r'\s+', ' ', text_content).strip()
-            
-            # Adicionar conteúdo
-            msg.attach(MIMEText(text_content, 'plain', 'utf-8'))
-            msg.attach(MIMEText(html_content, 'html', 'utf-8'))
+            msg = self._build_message(to_email, subject, html_content, text_content)
             
             # Conectar e enviar
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                if self.use_tls:
-                    server.starttls()
-                
-                if self.smtp_username and self.smtp_password:
-                    server.login(self.smtp_username, self.smtp_password)
-                
+            with self._open_smtp() as server:
                 server.send_message(msg)
             
             self.logger.info(f"Email SMTP enviado com sucesso para {to_email}")
@@ -237,6 +246,30 @@ class EmailService:
             self.logger.error(f"Erro ao enviar email SMTP para {to_email}: {str(e)}")
             return False
     
+    def send_bulk_emails(self, messages: List[Dict[str, str]], batch_size: int = 100) -> int:
+        """
+        Envia vários emails reutilizando uma conexão SMTP por lote.
+        Cada mensagem: {'to_email', 'subject', 'html_content'}. Retorna quantos foram enviados.
+        """
+        sent = 0
+        for start in range(0, len(messages), batch_size):
+            batch = messages[start:start + batch_size]
+            try:
+                with self._open_smtp() as server:
+                    for message in batch:
+                        try:
+                            server.send_message(self._build_message(
+                                message['to_email'], message['subject'], message['html_content']
+                            ))
+                            sent += 1
+                        except smtplib.SMTPRecipientsRefused as e:
+                            self.logger.warning(f"Destinatário recusado {message['to_email']}: {str(e)}")
+            except Exception as e:
+                self.logger.error(f"Erro ao enviar lote de {len(batch)} emails: {str(e)}")
+        
+        self.logger.info(f"{sent}/{len(messages)} emails enviados em lote")
+        return sent
+    
     def send_email(self, to_email: str, template_name: str, template_vars: Dict[str, Any]) -> bool:
         """Envia email usando template especificado"""
         try:
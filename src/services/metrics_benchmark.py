@@ -0,0 +1,238 @@
+"""
+Benchmark das consultas de métricas de documentos do dashboard de analytics
+
+Uso:
+    python -m src.services.metrics_benchmark [--documents 1000000] [--users 500]
+        [--iterations 50] [--db /tmp/metrics_benchmark.db] [--json]
+
+Semeia um SQLite com a tabela `documents` (mesmas colunas e índices usados
+pelas métricas) e compara, para usuários aleatórios e janela de 30 dias:
+
+- legacy: as 7 consultas da implementação anterior de _get_documents_metrics
+  (criados, atualizados, total, por tipo, tamanho médio e as duas contagens
+  da taxa de crescimento);
+- single_select: as mesmas métricas em um único SELECT com agregações
+  condicionais (MetricsQuery), agrupado por tipo;
+- rollup: leitura do rollup diário (o caminho usado pelo dashboard).
+"""
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import statistics
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table, Date, create_engine,
+                        func, select)
+
+from .metrics_query import MetricsQuery
+
+TYPES = ('rich_text', 'markdown', 'template', 'contract')
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+metadata = MetaData()
+documents = Table(
+    'documents', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, nullable=False),
+    Column('tipo', String(20)),
+    Column('tamanho_estimado', Integer),
+    Column('created_at', DateTime),
+    Column('updated_at', DateTime),
+)
+rollup = Table(
+    'documents_daily', metadata,
+    Column('user_id', Integer, primary_key=True),
+    Column('day', Date, primary_key=True),
+    Column('tipo', String(20), primary_key=True),
+    Column('created', Integer),
+    Column('updated', Integer),
+    Column('size', Integer),
+)
+
+
+def seed(path: str, total: int, users: int, days: int = 730, now: datetime = None) -> float:
+    """Cria o banco com `total` documentos distribuídos em `days` dias; retorna segundos gastos"""
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f'sqlite:///{path}')
+    metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    rng = random.Random(42)
+    batch = []
+    for index in range(1, total + 1):
+        created = now - timedelta(seconds=rng.randrange(days * 86400))
+        updated = min(now, created + timedelta(seconds=rng.randrange(30 * 86400)))
+        batch.append((index, rng.randrange(1, users + 1), rng.choice(TYPES), rng.randrange(200, 20000),
+                      created.strftime(DATE_FORMAT), updated.strftime(DATE_FORMAT)))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?)", batch)
+    conn.execute("CREATE INDEX idx_documents_user_created ON documents (user_id, created_at)")
+    conn.execute("CREATE INDEX idx_documents_user_updated ON documents (user_id, updated_at)")
+    conn.commit()
+    conn.close()
+    return time.perf_counter() - started
+
+
+def build_rollup(engine) -> float:
+    """Compacta os documentos em linhas diárias (como o compactador de analytics)"""
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(rollup.delete())
+        day = func.date(documents.c.created_at)
+        conn.execute(rollup.insert().from_select(
+            ['user_id', 'day', 'tipo', 'created', 'updated', 'size'],
+            select(documents.c.user_id, day, documents.c.tipo, func.count(), 0,
+                   func.sum(documents.c.tamanho_estimado))
+            .group_by(documents.c.user_id, day, documents.c.tipo)
+        ))
+    return time.perf_counter() - started
+
+
+def legacy(conn, user_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+    """Uma consulta por métrica (implementação anterior)"""
+    d = documents.c
+    previous_start = start - (end - start)
+    in_period = d.created_at.between(start, end)
+    created = conn.execute(select(func.count()).where(d.user_id == user_id, in_period)).scalar()
+    updated = conn.execute(select(func.count()).where(
+        d.user_id == user_id, d.updated_at.between(start, end), d.created_at < start
+    )).scalar()
+    total = conn.execute(select(func.count()).where(d.user_id == user_id)).scalar()
+    by_type = conn.execute(select(d.tipo, func.count()).where(d.user_id == user_id, in_period)
+                           .group_by(d.tipo)).all()
+    avg_size = conn.execute(select(func.avg(d.tamanho_estimado)).where(d.user_id == user_id, in_period)).scalar()
+    current = conn.execute(select(func.count()).where(d.user_id == user_id, in_period)).scalar()
+    previous = conn.execute(select(func.count()).where(
+        d.user_id == user_id, d.created_at.between(previous_start, start)
+    )).scalar()
+    return {'created': created, 'updated': updated, 'total': total, 'by_type': dict(by_type),
+            'avg_size': avg_size or 0, 'previous': previous, 'current': current}
+
+
+def single_select(conn, user_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+    """As mesmas métricas em um SELECT com agregações condicionais"""
+    d = documents.c
+    previous_start = start - (end - start)
+    in_period = d.created_at.between(start, end)
+    # Só as linhas que alguma métrica de período usa; o total (estado atual) vem de uma
+    # subconsulta escalar que o SQLite resolve pelo índice, sem ler a tabela
+    total = select(func.count()).where(d.user_id == user_id).scalar_subquery()
+    rows = MetricsQuery(
+        d.tipo,
+        where=(d.user_id == user_id, (d.created_at >= previous_start) | (d.updated_at >= start)),
+        dialect=conn.dialect.name
+    ).count('created', in_period) \
+        .count('updated', d.updated_at.between(start, end) & (d.created_at < start)) \
+        .count('previous', d.created_at.between(previous_start, start)) \
+        .sum('size', d.tamanho_estimado, in_period) \
+        .value('total', total) \
+        .all(conn)
+    created = sum(row[1] for row in rows)
+    size = sum(row[4] for row in rows)
+    return {'created': created, 'updated': sum(row[2] for row in rows),
+            'total': rows[0][5] if rows else conn.execute(select(total)).scalar(),
+            'by_type': {row[0]: row[1] for row in rows if row[1]},
+            'avg_size': size / created if created else 0,
+            'previous': sum(row[3] for row in rows), 'current': created}
+
+
+def from_rollup(conn, user_id: int, start: datetime, end: datetime) -> Dict[str, Any]:
+    """Soma das linhas diárias do período atual e do anterior"""
+    r = rollup.c
+    previous_start = (start - (end - start)).date()
+    rows = conn.execute(select(
+        r.tipo,
+        func.sum(r.created).filter(r.day >= start.date()),
+        func.sum(r.size).filter(r.day >= start.date()),
+        func.sum(r.created).filter(r.day < start.date()),
+    ).where(r.user_id == user_id, r.day.between(previous_start, end.date())).group_by(r.tipo)).all()
+    created = sum(row[1] or 0 for row in rows)
+    return {'created': created, 'by_type': {row[0]: row[1] for row in rows if row[1]},
+            'avg_size': sum(row[2] or 0 for row in rows) / created if created else 0,
+            'previous': sum(row[3] or 0 for row in rows)}
+
+
+def _time(engine, query: Callable, user_ids: List[int], start: datetime, end: datetime) -> Dict[str, float]:
+    timings = []
+    with engine.connect() as conn:
+        query(conn, user_ids[0], start, end)  # aquece cache de páginas e de statements
+        for user_id in user_ids:
+            began = time.perf_counter()
+            query(conn, user_id, start, end)
+            timings.append((time.perf_counter() - began) * 1000)
+    timings.sort()
+    return {
+        'mean_ms': round(statistics.mean(timings), 2),
+        'p50_ms': round(timings[len(timings) // 2], 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2)
+    }
+
+
+def run(path: str, total: int, users: int, iterations: int, reseed: bool = False) -> Dict[str, Any]:
+    report: Dict[str, Any] = {'documents': total, 'users': users, 'iterations': iterations}
+    if reseed or not os.path.exists(path):
+        report['seed_s'] = round(seed(path, total, users), 1)
+
+    engine = create_engine(f'sqlite:///{path}')
+    report['rollup_build_s'] = round(build_rollup(engine), 2)
+
+    end = datetime.utcnow()
+    start = end - timedelta(days=30)
+    rng = random.Random(7)
+    user_ids = [rng.randrange(1, users + 1) for _ in range(iterations)]
+
+    # Mesmo resultado nas duas implementações sobre os dados brutos
+    with engine.connect() as conn:
+        for user_id in user_ids[:5]:
+            old, new = legacy(conn, user_id, start, end), single_select(conn, user_id, start, end)
+            for key in ('created', 'updated', 'total', 'by_type', 'previous'):
+                assert old[key] == new[key], (key, old[key], new[key])
+
+    report['results'] = {
+        name: _time(engine, query, user_ids, start, end)
+        for name, query in (('legacy', legacy), ('single_select', single_select), ('rollup', from_rollup))
+    }
+    engine.dispose()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark das métricas de documentos')
+    parser.add_argument('--documents', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--db', default='/tmp/metrics_benchmark.db')
+    parser.add_argument('--reseed', action='store_true', help='Recria o banco mesmo se já existir')
+    parser.add_argument('--json', action='store_true', help='Saída em JSON')
+    args = parser.parse_args(argv)
+
+    report = run(args.db, args.documents, args.users, args.iterations, args.reseed)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        return
+
+    print(f"{report['documents']} documentos, {report['users']} usuários, {report['iterations']} consultas")
+    if 'seed_s' in report:
+        print(f"  seed: {report['seed_s']}s")
+    print(f"  build do rollup: {report['rollup_build_s']}s")
+    print(f"  {'variante':<16}{'média ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, timing in report['results'].items():
+        print(f"  {name:<16}{timing['mean_ms']:>10}{timing['p50_ms']:>10}{timing['p95_ms']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Agregações condicionais em um único SELECT
+
+Métricas de uma mesma categoria (criados, atualizados, concluídos no prazo,
+tamanho médio...) costumam ser COUNT/SUM/AVG com filtros diferentes sobre a
+mesma tabela. Em vez de uma consulta por métrica, MetricsQuery monta uma só:
+
+    SELECT user_id, date(created_at),
+           COUNT(*) FILTER (WHERE status = 'completed'),
+           SUM(duration) FILTER (WHERE is_billable) ...
+
+`FILTER (WHERE ...)` é usado no PostgreSQL e no SQLite >= 3.30; nos demais
+bancos a mesma métrica vira SUM(CASE WHEN ... THEN ... END).
+"""
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import case, func, select
+
+
+def supports_filter_clause(dialect_name: str) -> bool:
+    """Se o banco aceita `agregado(...) FILTER (WHERE ...)`"""
+    if dialect_name == 'postgresql':
+        return True
+    if dialect_name == 'sqlite':
+        return sqlite3.sqlite_version_info >= (3, 30, 0)
+    return False
+
+
+class MetricsQuery:
+    """Monta um SELECT com várias agregações condicionais e agrupamento opcional"""
+
+    def __init__(self, *group_by, where: Tuple = (), dialect: str = 'postgresql'):
+        self.group_by = list(group_by)
+        self.where = list(where)
+        self.use_filter = supports_filter_clause(dialect)
+        self._metrics: List[Tuple[str, Any]] = []
+
+    def _conditional(self, aggregate, column, condition):
+        if condition is None:
+            return aggregate(column)
+        if self.use_filter:
+            return aggregate(column).filter(condition)
+        # Fallback: valores fora do filtro viram NULL (ignorados por SUM/AVG/COUNT)
+        return aggregate(case((condition, column)))
+
+    def count(self, name: str, condition=None) -> 'MetricsQuery':
+        if condition is None:
+            expression = func.count()
+        elif self.use_filter:
+            expression = func.count().filter(condition)
+        else:
+            expression = func.sum(case((condition, 1), else_=0))
+        self._metrics.append((name, func.coalesce(expression, 0)))
+        return self
+
+    def sum(self, name: str, column, condition=None) -> 'MetricsQuery':
+        self._metrics.append((name, func.coalesce(self._conditional(func.sum, column, condition), 0)))
+        return self
+
+    def avg(self, name: str, column, condition=None) -> 'MetricsQuery':
+        self._metrics.append((name, self._conditional(func.avg, column, condition)))
+        return self
+
+    def max(self, name: str, column, condition=None) -> 'MetricsQuery':
+        self._metrics.append((name, self._conditional(func.max, column, condition)))
+        return self
+
+    def value(self, name: str, expression) -> 'MetricsQuery':
+        """Expressão já pronta (ex.: subconsulta escalar) no mesmo SELECT"""
+        self._metrics.append((name, expression))
+        return self
+
+    @property
+    def names(self) -> List[str]:
+        return [name for name, _ in self._metrics]
+
+    def statement(self, select_from=None):
+        columns = self.group_by + [expression.label(name) for name, expression in self._metrics]
+        statement = select(*columns)
+        if select_from is not None:
+            statement = statement.select_from(select_from)
+        if self.where:
+            statement = statement.where(*self.where)
+        if self.group_by:
+            statement = statement.group_by(*self.group_by)
+        return statement
+
+    def all(self, executor, select_from=None) -> List[Tuple]:
+        """Executa em uma Session ou Connection; linhas com (grupos..., métricas...)"""
+        return [tuple(row) for row in executor.execute(self.statement(select_from)).all()]
+
+    def one(self, executor, select_from=None) -> Dict[str, Any]:
+        """Sem agrupamento: dicionário nome -> valor"""
+        row = executor.execute(self.statement(select_from)).one()
+        return dict(zip(self.names, row))
@@ -5,13 +5,12 @@ Métricas, Logs Estruturados e Alertas
 import os
 import time
 import logging
-import threading
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
 from collections import defaultdict, deque
 from dataclasses import dataclass, asdict
+from enum import Enum
 import json
-import psutil
 from functools import wraps
 
 import sentry_sdk
@@ -21,6 +20,8 @@ from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTEN
 import structlog
 
 from src.config import Config
+from src.monitoring.metrics_core import LastSeen, MetricsRegistry, Window, full_name, label_key
+from src.monitoring.system_sampler import SystemSample, SystemSampler, system_sampler
 
 # Configuração de logging estruturado
 class LogLevel(Enum):
@@ -67,6 +68,7 @@ class StructuredLogger:
         # Log estruturado em JSON
         log_data = asdict(log_event)
         log_data['timestamp'] = log_data['timestamp'].isoformat()
+        log_data['level'] = level.value
         
         # Envia para o logger apropriado
         if level == LogLevel.DEBUG:
@@ -96,173 +98,95 @@ class StructuredLogger:
         self._log(LogLevel.CRITICAL, message, **kwargs)
 
 class MetricsCollector:
-    def __init__(self):
-        self.metrics: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
-        self.counters: Dict[str, int] = defaultdict(int)
-        self.gauges: Dict[str, float] = {}
-        self.histograms: Dict[str, List[float]] = defaultdict(list)
-        self.lock = threading.Lock()
+    """Fachada de métricas sobre o núcleo sem lock (src/monitoring/metrics_core.py)
+    
+    Cada chamada resolve a métrica pelo nome e pelas tags; em caminhos quentes
+    guarde a métrica devolvida por `registry` e use inc/observe/set direto.
+    """
+    
+    def __init__(self, registry: MetricsRegistry = None):
+        self.registry = registry or MetricsRegistry()
     
     def counter(self, name: str, value: int = 1, tags: Dict[str, str] = None):
         """Incrementa contador"""
-        with self.lock:
-            full_name = self._make_metric_name(name, tags)
-            self.counters[full_name] += value
-            
-            self._record_metric(MetricEvent(
-                name=name,
-                value=value,
-                unit="count",
-                timestamp=datetime.now(),
-                tags=tags or {},
-                metadata={"type": "counter"}
-            ))
+        self.registry.counter(name, tags).inc(value)
     
     def gauge(self, name: str, value: float, tags: Dict[str, str] = None):
         """Define valor de gauge"""
-        with self.lock:
-            full_name = self._make_metric_name(name, tags)
-            self.gauges[full_name] = value
-            
-            self._record_metric(MetricEvent(
-                name=name,
-                value=value,
-                unit="gauge",
-                timestamp=datetime.now(),
-                tags=tags or {},
-                metadata={"type": "gauge"}
-            ))
+        self.registry.gauge(name, tags).set(value)
     
     def histogram(self, name: str, value: float, tags: Dict[str, str] = None):
         """Adiciona valor ao histograma"""
-        with self.lock:
-            full_name = self._make_metric_name(name, tags)
-            self.histograms[full_name].append(value)
-            
-            # Mantém apenas os últimos 1000 valores
-            if len(self.histograms[full_name]) > 1000:
-                self.histograms[full_name] = self.histograms[full_name][-1000:]
-            
-            self._record_metric(MetricEvent(
-                name=name,
-                value=value,
-                unit="histogram",
-                timestamp=datetime.now(),
-                tags=tags or {},
-                metadata={"type": "histogram"}
-            ))
+        self.registry.histogram(name, tags).observe(value)
     
     def timer(self, name: str, tags: Dict[str, str] = None):
-        """Context manager para medir tempo"""
-        return TimerContext(self, name, tags)
+        """Context manager para medir tempo (histograma `<name>_duration` em ms)"""
+        return self.registry.histogram(f"{name}_duration", tags).time()
     
     def _make_metric_name(self, name: str, tags: Dict[str, str] = None) -> str:
         """Gera nome completo da métrica com tags"""
-        if not tags:
-            return name
-        
-        tag_str = ",".join(f"{k}={v}" for k, v in sorted(tags.items()))
-        return f"{name}#{tag_str}"
+        return full_name(name, label_key(tags))
     
-    def _record_metric(self, metric: MetricEvent):
-        """Registra métrica no histórico"""
-        self.metrics[metric.name].append(metric)
+    @property
+    def gauges(self) -> Dict[str, float]:
+        return {full_name(g.name, g.labels): g.value for g in self.registry.metrics('gauge')}
     
     def get_metrics(self) -> Dict[str, Any]:
         """Obtém todas as métricas"""
-        with self.lock:
-            return {
-                "counters": dict(self.counters),
-                "gauges": dict(self.gauges),
-                "histograms": {
-                    name: {
-                        "count": len(values),
-                        "min": min(values) if values else 0,
-                        "max": max(values) if values else 0,
-                        "avg": sum(values) / len(values) if values else 0
-                    }
-                    for name, values in self.histograms.items()
-                }
-            }
+        snapshot = self.registry.snapshot()
+        return {
+            "counters": {name: data['value'] for name, data in snapshot['counters'].items()},
+            "gauges": {name: data['value'] for name, data in snapshot['gauges'].items()},
+            "histograms": snapshot['histograms']
+        }
     
     def reset_metrics(self):
         """Reset todas as métricas"""
-        with self.lock:
-            self.counters.clear()
-            self.gauges.clear()
-            self.histograms.clear()
-            self.metrics.clear()
-
-class TimerContext:
-    def __init__(self, collector: MetricsCollector, name: str, tags: Dict[str, str] = None):
-        self.collector = collector
-        self.name = name
-        self.tags = tags
-        self.start_time = None
-    
-    def __enter__(self):
-        self.start_time = time.time()
-        return self
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.start_time:
-            duration = time.time() - self.start_time
-            self.collector.histogram(f"{self.name}_duration", duration * 1000, self.tags)
+        self.registry.reset()
 
 class SystemMonitor:
-    def __init__(self, metrics_collector: MetricsCollector):
+    def __init__(self, metrics_collector: MetricsCollector, sampler: SystemSampler = None):
         self.metrics = metrics_collector
+        self.sampler = sampler or system_sampler
         self.monitoring = False
-        self.monitor_thread = None
     
     def start_monitoring(self, interval: int = 30):
-        """Inicia monitoramento de sistema"""
+        """Inicia monitoramento de sistema (assina o sampler compartilhado)"""
         if self.monitoring:
             return
         
         self.monitoring = True
-        self.monitor_thread = threading.Thread(
-            target=self._monitor_loop, 
-            args=(interval,),
-            daemon=True
-        )
-        self.monitor_thread.start()
+        self.sampler.subscribe(self._collect_system_metrics, every=interval)
+        self.sampler.start()
     
     def stop_monitoring(self):
         """Para monitoramento de sistema"""
         self.monitoring = False
-        if self.monitor_thread:
-            self.monitor_thread.join()
+        self.sampler.unsubscribe(self._collect_system_metrics)
     
-    def _monitor_loop(self, interval: int):
-        """Loop de monitoramento"""
-        while self.monitoring:
-            try:
-                self._collect_system_metrics()
-                time.sleep(interval)
-            except Exception as e:
-                logger.error("Erro no monitoramento de sistema", error=str(e))
-    
-    def _collect_system_metrics(self):
-        """Coleta métricas do sistema"""
+    def _collect_system_metrics(self, sample: SystemSample):
+        """Publica a amostra do sistema como gauges"""
         # CPU
-        cpu_percent = psutil.cpu_percent()
-        self.metrics.gauge("system.cpu.usage", cpu_percent, {"unit": "percent"})
+        self.metrics.gauge("system.cpu.usage", sample.cpu_percent, {"unit": "percent"})
         
         # Memória
-        memory = psutil.virtual_memory()
-        self.metrics.gauge("system.memory.usage", memory.percent, {"unit": "percent"})
-        self.metrics.gauge("system.memory.available", memory.available / 1024 / 1024, {"unit": "MB"})
+        self.metrics.gauge("system.memory.usage", sample.memory_percent, {"unit": "percent"})
+        self.metrics.gauge("system.memory.available", sample.memory_available_mb, {"unit": "MB"})
         
         # Disco
-        disk = psutil.disk_usage('/')
-        self.metrics.gauge("system.disk.usage", disk.percent, {"unit": "percent"})
-        self.metrics.gauge("system.disk.free", disk.free / 1024 / 1024 / 1024, {"unit": "GB"})
+        self.metrics.gauge("system.disk.usage", sample.disk_percent, {"unit": "percent"})
+        self.metrics.gauge("system.disk.free", sample.disk_free_gb, {"unit": "GB"})
+        self.metrics.gauge("system.disk.read_rate", sample.disk_read_rate, {"unit": "bytes_per_sec"})
+        self.metrics.gauge("system.disk.write_rate", sample.disk_write_rate, {"unit": "bytes_per_sec"})
+        
+        # Rede
+        self.metrics.gauge("system.network.sent_rate", sample.net_sent_rate, {"unit": "bytes_per_sec"})
+        self.metrics.gauge("system.network.recv_rate", sample.net_recv_rate, {"unit": "bytes_per_sec"})
         
         # Processo atual
-        process = psutil.Process()
-        self.metrics.gauge("process.memory.rss", process.memory_info().rss / 1024 / 1024, {"unit": "MB"})
-        self.metrics.gauge("process.cpu.percent", process.cpu_percent(), {"unit": "percent"})
+        self.metrics.gauge("process.memory.rss", sample.process_rss_mb, {"unit": "MB"})
+        self.metrics.gauge("process.cpu.percent", sample.process_cpu_percent, {"unit": "percent"})
+        self.metrics.gauge("process.connections", sample.connections, {"unit": "count"})
 
 class AlertManager:
     def __init__(self, metrics_collector: MetricsCollector):
@@ -333,6 +257,14 @@ class MonitoringService:
         self.metric_events = deque(maxlen=50000)
         self.analytics_events = deque(maxlen=50000)
         
+        # Métricas de requisição: por rota (resolvidas uma vez por chave) e agregadas na janela
+        window = Window(getattr(Config, 'REALTIME_WINDOW', 300), 10)
+        self._request_metrics: Dict[tuple, tuple] = {}
+        self._component_metrics: Dict[tuple, Any] = {}
+        self.requests_window = self.metrics.registry.histogram("http_requests", window=window)
+        self.errors_window = self.metrics.registry.counter("http_errors", window=window)
+        self.active_users = LastSeen(ttl=300)
+        
         # Configurar Sentry se DSN disponível
         if self.sentry_dsn:
             self.setup_sentry()
@@ -389,37 +321,46 @@ class MonitoringService:
             print(f"Erro ao configurar logging estruturado: {str(e)}")
     
     def record_request(self, method: str, endpoint: str, status_code: int, 
-                      duration: float, user_id: Optional[str] = None):
-        """Registra métricas de requisição"""
+                      duration: float, user_id: Optional[str] = None,
+                      breakdown: Optional[Dict[str, float]] = None):
+        """Registra métricas de requisição (duration em segundos, breakdown em ms por componente)"""
         if not self.enable_metrics:
             return
         
         try:
-            # Prometheus metrics
-            self.metrics.counter(f"http_requests_total", 1, {
-                "method": method,
-                "endpoint": endpoint,
-                "status": str(status_code)
-            })
-            
-            self.metrics.gauge(f"http_request_duration_seconds", duration, {
-                "method": method,
-                "endpoint": endpoint
-            })
-            
-            # Real-time stats
-            current_minute = int(time.time() // 60)
-            self.metrics.gauge(f"active_users_total", 1, {"user_id": user_id})
-            
-            # Log estruturado
-            self.logger.info(
-                "HTTP request processed",
-                method=method,
-                endpoint=endpoint,
-                status_code=status_code,
-                duration=duration,
-                user_id=user_id
-            )
+            key = (method, endpoint, status_code)
+            handles = self._request_metrics.get(key)
+            if handles is None:
+                handles = self._request_metrics[key] = (
+                    self.metrics.registry.counter("http_requests_total", {
+                        "method": method,
+                        "endpoint": endpoint,
+                        "status": str(status_code)
+                    }),
+                    self.metrics.registry.histogram("http_request_duration_ms", {
+                        "method": method,
+                        "endpoint": endpoint
+                    })
+                )
+            
+            duration_ms = duration * 1000
+            handles[0].inc()
+            handles[1].observe(duration_ms)
+            
+            # Agregados com janela deslizante para as estatísticas em tempo real
+            self.requests_window.observe(duration_ms)
+            if status_code >= 500:
+                self.errors_window.inc()
+            if user_id:
+                self.active_users.touch(user_id)
+            
+            for component, component_ms in (breakdown or {}).items():
+                histogram = self._component_metrics.get((endpoint, component))
+                if histogram is None:
+                    histogram = self._component_metrics[(endpoint, component)] = self.metrics.registry.histogram(
+                        f"http_request_{component}_ms", {"endpoint": endpoint}
+                    )
+                histogram.observe(component_ms)
             
         except Exception as e:
             self.logger.error(f"Erro ao registrar métricas de requisição: {str(e)}")
@@ -533,32 +474,18 @@ class MonitoringService:
     
     def get_session_id(self, user_id: str) -> str:
         """Obtém ou cria session ID para usuário"""
-        if user_id not in self.metrics.gauges:
-            self.metrics.gauge(f"active_users_total", 1, {"user_id": user_id})
-        
+        self.active_users.touch(user_id)
         return f"session_{user_id}_{int(time.time())}"
     
     def update_user_session(self, user_id: str, activity_type: str):
         """Atualiza informações da sessão do usuário"""
-        if user_id in self.metrics.gauges:
-            self.metrics.gauge(f"active_users_total", 1, {"user_id": user_id})
-        
-        # Atualizar contagem de usuários ativos
+        self.active_users.touch(user_id)
         self.update_active_users_count()
     
     def update_active_users_count(self):
-        """Atualiza contagem de usuários ativos"""
+        """Atualiza contagem de usuários ativos (últimos 5 minutos)"""
         try:
-            current_time = time.time()
-            active_threshold = current_time - 300  # 5 minutos
-            
-            active_users = sum(
-                1 for user_id, _ in self.metrics.gauges.items()
-                if user_id.startswith("active_users_total") and current_time > active_threshold
-            )
-            
-            self.metrics.gauge(f"active_users_total", active_users)
-            
+            self.metrics.gauge("active_users_total", self.active_users.count())
         except Exception as e:
             self.logger.error(f"Erro ao atualizar usuários ativos: {str(e)}")
     
@@ -580,35 +507,21 @@ class MonitoringService:
             return ""
     
     def get_real_time_stats(self) -> Dict[str, Any]:
-        """Retorna estatísticas em tempo real"""
+        """Retorna estatísticas em tempo real (janela deslizante de REALTIME_WINDOW segundos)"""
         try:
-            current_time = time.time()
-            
-            # Calcular RPM (requests per minute)
-            current_minute = int(current_time // 60)
-            recent_requests = [
-                req for req in self.metrics.histograms.get(f"http_request_duration_seconds", [])
-                if req >= current_minute - 5
-            ]
-            rpm = sum(recent_requests) / 5
-            
-            # Calcular média de tempo de resposta
-            response_times = list(self.metrics.histograms.get(f"http_request_duration_seconds", []))
-            avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-            
-            # Calcular taxa de erro
-            recent_errors = [
-                err for err in self.metrics.histograms.get(f"http_request_duration_seconds", [])
-                if err >= current_minute - 5
-            ]
-            error_rate = sum(recent_errors) / len(recent_requests) if recent_requests else 0
+            requests = self.requests_window.window_summary()
+            errors = self.errors_window.window_total()
             
             return {
-                'requests_per_minute': rpm,
-                'average_response_time': avg_response_time,
-                'error_rate': error_rate,
-                'active_users': len(self.metrics.gauges),
-                'timestamp': current_time
+                'requests_per_minute': requests['rate_per_minute'],
+                'average_response_time': requests['avg'],
+                'response_time_p50': requests['p50'],
+                'response_time_p95': requests['p95'],
+                'response_time_p99': requests['p99'],
+                'error_rate': errors / requests['count'] if requests['count'] else 0,
+                'active_users': self.active_users.count(),
+                'window_seconds': self.requests_window.window.seconds,
+                'timestamp': time.time()
             }
             
         except Exception as e:
@@ -678,7 +591,7 @@ class MonitoringService:
             'analytics_enabled': self.enable_analytics,
             'events_in_buffer': len(self.analytics_events),
             'metrics_in_buffer': len(self.metric_events),
-            'active_user_sessions': len(self.metrics.gauges)
+            'active_user_sessions': self.active_users.count()
         }
         
         return health
@@ -737,39 +650,59 @@ class MonitoringService:
 def monitor_performance(name: str = None, tags: Dict[str, str] = None):
     """Decorador para monitorar performance de funções"""
     def decorator(func):
+        metric_name = name or f"{func.__module__}.{func.__name__}"
+        handles = None
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            metric_name = name or f"{func.__module__}.{func.__name__}"
-            
-            with monitoring_service.metrics.timer(metric_name, tags):
-                try:
-                    result = func(*args, **kwargs)
-                    monitoring_service.metrics.counter(f"{metric_name}.success", tags=tags)
-                    return result
-                except Exception as e:
-                    monitoring_service.metrics.counter(f"{metric_name}.error", tags=tags)
-                    logger.error(f"Erro em {metric_name}", error=str(e), function=func.__name__)
-                    raise
+            nonlocal handles
+            if handles is None:
+                registry = monitoring_service.metrics.registry
+                handles = (registry.histogram(f"{metric_name}_duration", tags),
+                           registry.counter(f"{metric_name}.success", tags),
+                           registry.counter(f"{metric_name}.error", tags))
+            
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                handles[1].inc()
+                return result
+            except Exception as e:
+                handles[2].inc()
+                logger.error(f"Erro em {metric_name}", error=str(e), function=func.__name__)
+                raise
+            finally:
+                handles[0].observe((time.perf_counter() - started) * 1000)
         return wrapper
     return decorator
 
 def monitor_api_endpoint(endpoint: str = None):
     """Decorador específico para endpoints da API"""
     def decorator(func):
+        endpoint_name = endpoint or func.__name__
+        handles = None
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            endpoint_name = endpoint or func.__name__
-            tags = {"endpoint": endpoint_name}
-            
-            with monitoring_service.metrics.timer("api.request", tags):
-                try:
-                    result = func(*args, **kwargs)
-                    monitoring_service.metrics.counter("api.request.success", tags=tags)
-                    return result
-                except Exception as e:
-                    monitoring_service.metrics.counter("api.request.error", tags=tags)
-                    logger.error("Erro na API", endpoint=endpoint_name, error=str(e))
-                    raise
+            nonlocal handles
+            if handles is None:
+                registry = monitoring_service.metrics.registry
+                tags = {"endpoint": endpoint_name}
+                handles = (registry.histogram("api.request_duration", tags),
+                           registry.counter("api.request.success", tags),
+                           registry.counter("api.request.error", tags))
+            
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                handles[1].inc()
+                return result
+            except Exception as e:
+                handles[2].inc()
+                logger.error("Erro na API", endpoint=endpoint_name, error=str(e))
+                raise
+            finally:
+                handles[0].observe((time.perf_counter() - started) * 1000)
         return wrapper
     return decorator
 
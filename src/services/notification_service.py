@@ -1,18 +1,29 @@
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, insert
 import logging
+import threading
 from extensions import db, socketio
 from models.notification import Notification, NotificationType, NotificationPriority, NotificationTemplate, NotificationSettings
 from models.user import User
 from services.email_service import EmailService
+from services.unread_counter import unread_counter
 import json
 
 logger = logging.getLogger(__name__)
 
+# Colunas aceitas no INSERT em lote
+BULK_COLUMNS = [
+    'user_id', 'title', 'message', 'expires_at', 'category', 'tags',
+    'meta_data', 'action_url', 'action_text', 'dismiss_url'
+]
+
 class NotificationService:
+    BULK_BATCH_SIZE = 1000
+    
     def __init__(self):
         self.email_service = EmailService()
+        self.unread_counter = unread_counter
     
     def create_notification(self, user_id: int, title: str, message: str, 
                           type: NotificationType = NotificationType.INFO,
@@ -55,7 +66,9 @@ class NotificationService:
             if not template:
                 raise ValueError(f"Template '{template_name}' não encontrado")
             
-            return template.create_notification(user_id, **template_vars)
+            notification = template.create_notification(user_id, **template_vars)
+            self._update_unread_count(user_id, delta=1)
+            return notification
             
         except Exception as e:
             logger.error(f"Erro ao criar notificação por template: {str(e)}")
@@ -79,8 +92,8 @@ class NotificationService:
                                 .limit(limit)\
                                 .all()
             
-            # Contar não lidas
-            unread_count = Notification.get_unread_count(user_id)
+            # Contar não lidas (contador em cache)
+            unread_count = self.unread_counter.get(user_id)
             
             return {
                 'notifications': [n.to_dict() for n in notifications],
@@ -104,10 +117,12 @@ class NotificationService:
             if not notification:
                 return False
             
+            was_unread = not notification.is_read and not notification.is_archived
             notification.mark_as_read()
             
             # Atualizar contadores em tempo real
-            self._update_unread_count(user_id)
+            if was_unread:
+                self._update_unread_count(user_id, delta=-1)
             
             return True
             
@@ -121,6 +136,7 @@ class NotificationService:
             Notification.mark_all_as_read(user_id)
             
             # Atualizar contadores em tempo real
+            self.unread_counter.reset(user_id, 0)
             self._update_unread_count(user_id)
             
             return True
@@ -140,10 +156,12 @@ class NotificationService:
             if not notification:
                 return False
             
+            was_unread = not notification.is_read and not notification.is_archived
             notification.archive()
             
             # Atualizar contadores em tempo real
-            self._update_unread_count(user_id)
+            if was_unread:
+                self._update_unread_count(user_id, delta=-1)
             
             return True
             
@@ -162,11 +180,13 @@ class NotificationService:
             if not notification:
                 return False
             
+            was_unread = not notification.is_read and not notification.is_archived
             db.session.delete(notification)
             db.session.commit()
             
             # Atualizar contadores em tempo real
-            self._update_unread_count(user_id)
+            if was_unread:
+                self._update_unread_count(user_id, delta=-1)
             
             return True
             
@@ -213,27 +233,61 @@ class NotificationService:
             return False
     
     def create_bulk_notifications(self, notifications_data: List[Dict[str, Any]]) -> List[Notification]:
-        """Cria múltiplas notificações em lote"""
+        """Cria múltiplas notificações em lote (INSERT ... RETURNING por lote)"""
         try:
             notifications = []
             
-            for data in notifications_data:
-                notification = Notification(**data)
-                db.session.add(notification)
-                notifications.append(notification)
+            for start in range(0, len(notifications_data), self.BULK_BATCH_SIZE):
+                rows = [
+                    self._bulk_row(data)
+                    for data in notifications_data[start:start + self.BULK_BATCH_SIZE]
+                ]
+                notifications.extend(db.session.scalars(
+                    insert(Notification).returning(Notification), rows
+                ).all())
             
+            # Desanexar antes do commit mantém os atributos carregados (sem SELECT por objeto)
+            for notification in notifications:
+                db.session.expunge(notification)
             db.session.commit()
             
-            # Enviar notificações em tempo real
+            # Agrupar por usuário: um envio WebSocket e um ajuste de contador por usuário
+            per_user: Dict[int, List[Notification]] = {}
             for notification in notifications:
-                self._send_realtime_notification(notification)
+                per_user.setdefault(notification.user_id, []).append(notification)
+            
+            for user_id, user_notifications in per_user.items():
+                self._send_realtime_batch(user_id, user_notifications)
+                unread = sum(1 for n in user_notifications if not n.is_read and not n.is_archived)
+                if unread:
+                    self._update_unread_count(user_id, delta=unread)
             
+            # Emails enviados em lote, fora da requisição
+            self._dispatch_bulk_emails(per_user)
+            
+            logger.info(f"{len(notifications)} notificações criadas em lote para {len(per_user)} usuários")
             return notifications
             
         except Exception as e:
+            db.session.rollback()
             logger.error(f"Erro ao criar notificações em lote: {str(e)}")
             raise
     
+    @staticmethod
+    def _bulk_row(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Normaliza os dados de uma notificação para o INSERT em lote"""
+        data = dict(data)
+        if 'metadata' in data:
+            data['meta_data'] = data.pop('metadata')
+        
+        row = {column: data.get(column) for column in BULK_COLUMNS}
+        row['type'] = NotificationType(data.get('type') or NotificationType.INFO)
+        row['priority'] = NotificationPriority(data.get('priority') or NotificationPriority.MEDIUM)
+        row['is_read'] = bool(data.get('is_read', False))
+        row['is_archived'] = bool(data.get('is_archived', False))
+        row['created_at'] = data.get('created_at') or datetime.utcnow()
+        return row
+    
     def cleanup_old_notifications(self, days: int = 30) -> int:
         """Remove notificações antigas"""
         try:
@@ -258,7 +312,7 @@ class NotificationService:
     
     # Métodos privados para WebSocket e email
     
-    def _send_realtime_notification(self, notification: Notification):
+    def _send_realtime_notification(self, notification: Notification, update_count: bool = True):
         """Envia notificação em tempo real via WebSocket"""
         try:
             if socketio:
@@ -268,18 +322,36 @@ class NotificationService:
                     notification.to_dict(),
                     room=f'user_{notification.user_id}'
                 )
-                
-                # Atualizar contador de não lidas
-                self._update_unread_count(notification.user_id)
+            
+            # Atualizar contador de não lidas
+            if update_count:
+                self._update_unread_count(notification.user_id, delta=1)
                 
         except Exception as e:
             logger.error(f"Erro ao enviar notificação em tempo real: {str(e)}")
     
-    def _update_unread_count(self, user_id: int):
-        """Atualiza contador de notificações não lidas em tempo real"""
+    def _send_realtime_batch(self, user_id: int, notifications: List[Notification]):
+        """Envia as notificações de um usuário em um único evento WebSocket"""
         try:
             if socketio:
-                unread_count = Notification.get_unread_count(user_id)
+                socketio.emit(
+                    'new_notifications',
+                    {'notifications': [n.to_dict() for n in notifications]},
+                    room=f'user_{user_id}'
+                )
+        except Exception as e:
+            logger.error(f"Erro ao enviar lote de notificações em tempo real: {str(e)}")
+    
+    def _update_unread_count(self, user_id: int, delta: int = 0):
+        """Ajusta o contador em cache e envia o valor em tempo real"""
+        try:
+            unread_count = None
+            if delta:
+                unread_count = self.unread_counter.increment(user_id, delta)
+            
+            if socketio:
+                if unread_count is None:
+                    unread_count = self.unread_counter.get(user_id)
                 socketio.emit(
                     'unread_count_updated',
                     {'count': unread_count},
@@ -293,44 +365,106 @@ class NotificationService:
         """Verifica se deve enviar notificação por email"""
         try:
             settings = NotificationSettings.query.filter_by(user_id=user_id).first()
-            
-            if not settings or not settings.email_enabled:
-                return False
-            
-            # Verificar configurações específicas por tipo
-            type_mapping = {
-                NotificationType.LEGAL: settings.legal_notifications,
-                NotificationType.TASK: settings.task_notifications,
-                NotificationType.DOCUMENT: settings.document_notifications,
-                NotificationType.AI: settings.ai_notifications,
-                NotificationType.SYSTEM: settings.system_notifications,
-            }
-            
-            return type_mapping.get(notification_type, True)
+            return self._email_allowed(settings, notification_type)
             
         except Exception as e:
             logger.error(f"Erro ao verificar configurações de email: {str(e)}")
             return False
     
-    def _send_email_notification(self, notification: Notification):
-        """Envia notificação por email"""
+    @staticmethod
+    def _email_allowed(settings: Optional[NotificationSettings], notification_type: NotificationType) -> bool:
+        """Aplica as preferências de email do usuário ao tipo de notificação"""
+        if not settings or not settings.email_enabled:
+            return False
+        
+        # Verificar configurações específicas por tipo
+        type_mapping = {
+            NotificationType.LEGAL: settings.legal_notifications,
+            NotificationType.TASK: settings.task_notifications,
+            NotificationType.DOCUMENT: settings.document_notifications,
+            NotificationType.AI: settings.ai_notifications,
+            NotificationType.SYSTEM: settings.system_notifications,
+        }
+        
+        return type_mapping.get(notification_type, True)
+    
+    def _dispatch_bulk_emails(self, per_user: Dict[int, List[Notification]]):
+        """Carrega preferências e emails de todos os destinatários e envia em lote"""
         try:
-            user = User.query.get(notification.user_id)
-            if not user or not user.email:
-                return
-            
-            # Template de email para notificação
-            subject = f"[JurisIA] {notification.title}"
+            user_ids = list(per_user)
+            settings_by_user = {}
+            users_by_id = {}
+            for start in range(0, len(user_ids), self.BULK_BATCH_SIZE):
+                chunk = user_ids[start:start + self.BULK_BATCH_SIZE]
+                settings_by_user.update({
+                    settings.user_id: settings
+                    for settings in NotificationSettings.query.filter(
+                        NotificationSettings.user_id.in_(chunk)
+                    ).all()
+                })
+            
+            recipients = [
+                user_id for user_id in user_ids
+                if any(self._email_allowed(settings_by_user.get(user_id), n.type) for n in per_user[user_id])
+            ]
+            for start in range(0, len(recipients), self.BULK_BATCH_SIZE):
+                chunk = recipients[start:start + self.BULK_BATCH_SIZE]
+                users_by_id.update(
+                    db.session.query(User.id, User.email).filter(User.id.in_(chunk)).all()
+                )
             
-            body = f"""
+            messages = []
+            for user_id in recipients:
+                email = users_by_id.get(user_id)
+                if not email:
+                    continue
+                for notification in per_user[user_id]:
+                    if self._email_allowed(settings_by_user.get(user_id), notification.type):
+                        messages.append({
+                            'to_email': email,
+                            'subject': f"[JurisIA] {notification.title}",
+                            'html_content': self._render_email_body(notification)
+                        })
+            
+            if messages:
+                threading.Thread(
+                    target=self.email_service.send_bulk_emails,
+                    args=(messages,),
+                    daemon=True
+                ).start()
+                
+        except Exception as e:
+            logger.error(f"Erro ao preparar emails em lote: {str(e)}")
+    
+    @staticmethod
+    def _render_email_body(notification: Notification) -> str:
+        """Corpo HTML do email de uma notificação"""
+        action = ''
+        if notification.action_url:
+            action = (
+                f'<p><a href="{notification.action_url}" style="background: #1890ff; color: white; '
+                f'padding: 10px 20px; text-decoration: none; border-radius: 4px;">{notification.action_text}</a></p>'
+            )
+        return f"""
             <h2>{notification.title}</h2>
             <p>{notification.message}</p>
             
-            {f'<p><a href="{notification.action_url}" style="background: #1890ff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px;">{notification.action_text}</a></p>' if notification.action_url else ''}
+            {action}
             
             <hr>
             <p><small>Esta é uma notificação automática do sistema JurisIA. Para alterar suas preferências de notificação, acesse seu perfil no sistema.</small></p>
             """
+    
+    def _send_email_notification(self, notification: Notification):
+        """Envia notificação por email"""
+        try:
+            user = User.query.get(notification.user_id)
+            if not user or not user.email:
+                return
+            
+            # Template de email para notificação
+            subject = f"[JurisIA] {notification.title}"
+            body = self._render_email_body(notification)
             
             self.email_service.send_email(
                 to_email=user.email,
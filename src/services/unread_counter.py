@@ -0,0 +1,253 @@
+"""
+Contadores de notificações não lidas mantidos em cache
+
+Os contadores são atualizados de forma incremental (criação, leitura,
+arquivamento, remoção) em vez de executar um COUNT a cada evento. Um COUNT
+só acontece quando o contador não está em cache; uma reconciliação periódica
+corrige eventuais desvios com uma única consulta agrupada por lote de usuários.
+
+Sem Redis, os contadores ficam em memória por processo (cada worker tem os
+seus; um ajuste feito em um worker só chega aos outros pelo TTL ou pela
+reconciliação), limitados a LOCAL_MAX_ENTRIES usuários (LRU) e com o mesmo TTL.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+
+from config import Config
+from extensions import db
+from models.notification import Notification
+
+logger = logging.getLogger(__name__)
+
+# Só altera contadores já em cache (um contador ausente será recarregado via COUNT)
+_INCREMENT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    local value = redis.call('INCRBY', KEYS[1], ARGV[1])
+    if value < 0 then
+        redis.call('SET', KEYS[1], 0, 'KEEPTTL')
+        value = 0
+    end
+    return value
+end
+return nil
+"""
+
+
+class UnreadCounterCache:
+    """Contadores de não lidas por usuário (Redis ou memória local)"""
+
+    KEY_PREFIX = 'jurisia:notifications:unread'
+    TTL = 3600
+    RECONCILE_BATCH = 500
+    LOCAL_MAX_ENTRIES = 10000
+
+    def __init__(self, redis_url: Optional[str] = None):
+        self.redis = None
+        self._increment = None
+        # Fallback sem Redis: user_id -> (contador, expira_em), em ordem de uso
+        self._local: 'OrderedDict[int, Tuple[int, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._connect(redis_url)
+
+    def _connect(self, redis_url: Optional[str]):
+        """Conecta ao Redis se disponível"""
+        if not redis_url:
+            return
+        try:
+            import redis
+            client = redis.from_url(redis_url)
+            client.ping()
+            self.redis = client
+            self._increment = client.register_script(_INCREMENT_SCRIPT)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis não disponível para contadores de notificação, usando memória: {e}")
+            self.redis = None
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{user_id}"
+
+    @property
+    def _users_key(self) -> str:
+        return f"{self.KEY_PREFIX}:users"
+
+    def _local_get(self, user_id: int) -> Optional[int]:
+        """Contador em memória ainda válido (chamar com o lock)"""
+        entry = self._local.get(user_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._local[user_id]
+            return None
+        self._local.move_to_end(user_id)
+        return entry[0]
+
+    def _local_set(self, user_id: int, count: int, keep_ttl: bool = False):
+        """Grava em memória, descartando os menos usados acima do limite (chamar com o lock)"""
+        entry = self._local.get(user_id)
+        expires_at = entry[1] if keep_ttl and entry is not None else time.monotonic() + self.TTL
+        self._local[user_id] = (count, expires_at)
+        self._local.move_to_end(user_id)
+        while len(self._local) > self.LOCAL_MAX_ENTRIES:
+            self._local.popitem(last=False)
+
+    def get(self, user_id: int) -> int:
+        """Contador atual; carrega com um COUNT apenas se não estiver em cache"""
+        user_id = int(user_id)
+        if self.redis is not None:
+            try:
+                value = self.redis.get(self._key(user_id))
+                if value is not None:
+                    return int(value)
+            except Exception as e:
+                logger.error(f"Erro ao ler contador de não lidas {user_id}: {e}")
+                return Notification.get_unread_count(user_id)
+        else:
+            with self._lock:
+                value = self._local_get(user_id)
+            if value is not None:
+                return value
+
+        count = Notification.get_unread_count(user_id)
+        self._store(user_id, count, only_if_missing=True)
+        return count
+
+    def _store(self, user_id: int, count: int, only_if_missing: bool = False):
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                pipe.set(self._key(user_id), count, ex=self.TTL, nx=only_if_missing)
+                pipe.sadd(self._users_key, user_id)
+                pipe.execute()
+            except Exception as e:
+                logger.error(f"Erro ao gravar contador de não lidas {user_id}: {e}")
+        else:
+            with self._lock:
+                if not only_if_missing or self._local_get(user_id) is None:
+                    self._local_set(user_id, count)
+
+    def increment(self, user_id: int, amount: int = 1) -> Optional[int]:
+        """Ajusta o contador em cache; retorna None se ele não estiver carregado"""
+        user_id = int(user_id)
+        if self.redis is not None:
+            try:
+                value = self._increment(keys=[self._key(user_id)], args=[amount])
+                return int(value) if value is not None else None
+            except Exception as e:
+                logger.error(f"Erro ao incrementar contador de não lidas {user_id}: {e}")
+                self.invalidate(user_id)
+                return None
+
+        with self._lock:
+            value = self._local_get(user_id)
+            if value is None:
+                return None
+            value = max(0, value + amount)
+            self._local_set(user_id, value, keep_ttl=True)
+            return value
+
+    def decrement(self, user_id: int, amount: int = 1) -> Optional[int]:
+        return self.increment(user_id, -amount)
+
+    def reset(self, user_id: int, value: int = 0):
+        """Define o contador (ex.: 0 após marcar todas como lidas)"""
+        self._store(int(user_id), value)
+
+    def invalidate(self, user_id: int):
+        """Descarta o contador; o próximo get recarrega do banco"""
+        user_id = int(user_id)
+        if self.redis is not None:
+            try:
+                self.redis.delete(self._key(user_id))
+            except Exception as e:
+                logger.error(f"Erro ao invalidar contador de não lidas {user_id}: {e}")
+        else:
+            with self._lock:
+                self._local.pop(user_id, None)
+
+    def _cached_users(self) -> List[int]:
+        if self.redis is not None:
+            return [int(user_id) for user_id in self.redis.smembers(self._users_key)]
+        with self._lock:
+            return list(self._local)
+
+    @staticmethod
+    def _count_unread(user_ids: Iterable[int]) -> Dict[int, int]:
+        """COUNT agrupado por usuário em uma única consulta"""
+        rows = db.session.query(
+            Notification.user_id,
+            func.count(Notification.id)
+        ).filter(
+            Notification.user_id.in_(list(user_ids)),
+            Notification.is_read == False,
+            Notification.is_archived == False
+        ).group_by(Notification.user_id).all()
+        return {user_id: count for user_id, count in rows}
+
+    def reconcile(self) -> Dict[str, int]:
+        """Corrige desvios dos contadores em cache comparando com o banco"""
+        checked = drifted = 0
+        user_ids = self._cached_users()
+
+        for start in range(0, len(user_ids), self.RECONCILE_BATCH):
+            batch = user_ids[start:start + self.RECONCILE_BATCH]
+            actual = self._count_unread(batch)
+
+            if self.redis is not None:
+                cached = self.redis.mget([self._key(user_id) for user_id in batch])
+                pipe = self.redis.pipeline()
+                for user_id, value in zip(batch, cached):
+                    if value is None:
+                        # Expirou: deixa de ser acompanhado
+                        pipe.srem(self._users_key, user_id)
+                        continue
+                    checked += 1
+                    if int(value) != actual.get(user_id, 0):
+                        drifted += 1
+                        pipe.set(self._key(user_id), actual.get(user_id, 0), keepttl=True, xx=True)
+                pipe.execute()
+            else:
+                with self._lock:
+                    for user_id in batch:
+                        value = self._local_get(user_id)
+                        if value is None:
+                            continue
+                        checked += 1
+                        if value != actual.get(user_id, 0):
+                            drifted += 1
+                            self._local_set(user_id, actual.get(user_id, 0), keep_ttl=True)
+
+        if drifted:
+            logger.warning(f"Reconciliação de não lidas: {drifted}/{checked} contadores corrigidos")
+        return {'checked': checked, 'drifted': drifted}
+
+    def start_reconciliation(self, app, interval: int = 300):
+        """Inicia reconciliação periódica em background"""
+        if self._running:
+            return
+        self._running = True
+
+        def reconcile_loop():
+            while self._running:
+                time.sleep(interval)
+                try:
+                    with app.app_context():
+                        self.reconcile()
+                except Exception as e:
+                    logger.error(f"Erro na reconciliação de contadores de não lidas: {e}")
+
+        self._thread = threading.Thread(target=reconcile_loop, daemon=True)
+        self._thread.start()
+
+    def stop_reconciliation(self):
+        self._running = False
+
+
+# Instância global
+unread_counter = UnreadCounterCache(getattr(Config, 'REDIS_URL', None))
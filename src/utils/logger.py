@@ -212,6 +212,19 @@ class MetricsCollector:
             else:
                 self.metrics[metric] += value
     
+    def handle(self, records):
+        """Sink da instrumentação de requisições"""
+        for record in records:
+            self.increment('requests')
+            if record.status >= 400:
+                self.increment('errors')
+            if record.duration_ms > 1000:
+                self.increment('slow_requests')
+            if record.user_id:
+                self.increment('users_active', record.user_id)
+            self.increment('db_operations', record.calls.get('db', 0))
+            self.increment('ai_operations', record.calls.get('ai', 0))
+    
     def get_metrics(self):
         """Obter métricas atuais"""
         metrics_copy = self.metrics.copy()
@@ -0,0 +1,171 @@
+"""
+Agregação de eventos de alta frequência (cursor e digitação) por sala
+
+Em vez de reenviar cada evento do cliente para a sala inteira, mantém apenas
+a última posição de cursor de cada usuário e as mudanças de estado de
+digitação, enviando um único frame por sala a cada tick (50–100 ms).
+
+Como nos eventos individuais (include_self=False), ninguém recebe o próprio
+cursor ou digitação de volta: a sala recebe o frame completo sem os sids de
+quem enviou, e cada um destes recebe um frame com os eventos dos outros.
+"""
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RoomEventCoalescer:
+    """Coalesce cursores e indicadores de digitação em frames periódicos por sala"""
+
+    TYPING_TIMEOUT = 5.0
+
+    def __init__(self, emit: Callable, tick: float = 0.075):
+        self.emit = emit
+        self.tick = tick
+        self._lock = threading.Lock()
+        # sala -> user_id -> (sid de origem, último payload de cursor)
+        self._cursors: Dict[str, Dict[Any, Tuple[Optional[str], Dict]]] = {}
+        # sala -> user_id -> (sid de origem, mudança de digitação pendente)
+        self._typing_changes: Dict[str, Dict[Any, Tuple[Optional[str], Dict]]] = {}
+        # (sala, user_id) -> (último sinal, nome) dos usuários digitando
+        self._typing_state: Dict[Tuple[str, Any], Tuple[float, str]] = {}
+        self._metrics = {
+            'received': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'frames_sent': 0,
+            'events_sent': 0
+        }
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        """Inicia a thread de envio periódico"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Para a thread de envio após um último flush"""
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        self.flush()
+
+    def cursor(self, room: str, user_id, payload: Dict, sid: Optional[str] = None):
+        """Registra posição de cursor; substitui a anterior ainda não enviada"""
+        with self._lock:
+            self._metrics['received'] += 1
+            pending = self._cursors.setdefault(room, {})
+            if user_id in pending:
+                self._metrics['coalesced'] += 1
+            pending[user_id] = (sid, payload)
+
+    def typing(self, room: str, user_id, username: str, typing: bool, sid: Optional[str] = None):
+        """Registra sinal de digitação; apenas mudanças de estado são enviadas"""
+        now = time.time()
+        with self._lock:
+            self._metrics['received'] += 1
+            self._set_typing(room, user_id, username, typing, now, sid)
+
+    def _set_typing(self, room: str, user_id, username: str, typing: bool, now: float,
+                    sid: Optional[str] = None):
+        key = (room, user_id)
+        current = key in self._typing_state
+        if typing:
+            self._typing_state[key] = (now, username)
+        else:
+            self._typing_state.pop(key, None)
+
+        if current == typing:
+            # Mesmo estado (ex.: typing_start a cada tecla): nada a enviar
+            self._metrics['dropped'] += 1
+            return
+
+        changes = self._typing_changes.setdefault(room, {})
+        if user_id in changes:
+            # Começou e parou dentro do mesmo tick: as mudanças se anulam
+            del changes[user_id]
+            self._metrics['coalesced'] += 1
+        else:
+            changes[user_id] = (sid, {
+                'user_id': user_id,
+                'username': username,
+                'typing': typing
+            })
+
+    def forget(self, user_id):
+        """Encerra a digitação do usuário em todas as salas (ex.: ao desconectar)"""
+        now = time.time()
+        with self._lock:
+            for (room, typing_user), (_, username) in list(self._typing_state.items()):
+                if typing_user == user_id:
+                    self._set_typing(room, user_id, username, False, now)
+            for pending in self._cursors.values():
+                pending.pop(user_id, None)
+
+    def _expire_typing(self, now: float):
+        """Converte em 'parou de digitar' os usuários sem sinal recente"""
+        for (room, user_id), (last_signal, username) in list(self._typing_state.items()):
+            if now - last_signal >= self.TYPING_TIMEOUT:
+                self._set_typing(room, user_id, username, False, now)
+
+    def flush(self):
+        """Envia um frame por sala com os cursores e mudanças de digitação pendentes"""
+        timestamp = datetime.utcnow().isoformat()
+        with self._lock:
+            self._expire_typing(time.time())
+            cursors, self._cursors = self._cursors, {}
+            typing_changes, self._typing_changes = self._typing_changes, {}
+
+        for room in set(cursors) | set(typing_changes):
+            room_cursors = list(cursors.get(room, {}).values())
+            room_typing = list(typing_changes.get(room, {}).values())
+            senders = {sid for sid, _ in room_cursors + room_typing if sid is not None}
+
+            # Sala inteira, menos quem enviou; cada remetente recebe só os eventos dos outros
+            self._send(room, room_cursors, room_typing, timestamp, room, skip_sid=list(senders) or None)
+            for sender in senders:
+                self._send(room, room_cursors, room_typing, timestamp, sender, exclude=sender)
+
+    def _send(self, room: str, cursors: List[Tuple[Optional[str], Dict]],
+              typing: List[Tuple[Optional[str], Dict]], timestamp: str, to: str,
+              exclude: Optional[str] = None, skip_sid: Optional[List[str]] = None):
+        frame = {
+            'room': room,
+            'cursors': [payload for sid, payload in cursors if exclude is None or sid != exclude],
+            'typing': [payload for sid, payload in typing if exclude is None or sid != exclude],
+            'timestamp': timestamp
+        }
+        events = len(frame['cursors']) + len(frame['typing'])
+        if not events:
+            return
+        try:
+            if skip_sid:
+                self.emit('room_activity', frame, room=to, skip_sid=skip_sid)
+            else:
+                self.emit('room_activity', frame, room=to)
+            with self._lock:
+                self._metrics['frames_sent'] += 1
+                self._metrics['events_sent'] += events
+        except Exception as e:
+            logger.error(f"Erro ao enviar frame de atividade da sala {room}: {str(e)}")
+
+    def _loop(self):
+        while self._running:
+            time.sleep(self.tick)
+            self.flush()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Contadores de eventos recebidos, coalescidos, descartados e enviados"""
+        with self._lock:
+            metrics = dict(self._metrics)
+            metrics['typing_users'] = len(self._typing_state)
+        metrics['tick_ms'] = int(self.tick * 1000)
+        return metrics
@@ -0,0 +1,470 @@
+"""
+Edição colaborativa no servidor (Operational Transform)
+
+O servidor mantém o estado de cada documento aberto, aplica as operações
+recebidas e as transforma contra as operações concorrentes já aceitas.
+O conteúdo é persistido periodicamente, em lote e com debounce, em vez de
+salvar o documento inteiro a cada alteração.
+
+Formato de operação (mesmo do ot.js): lista de componentes onde
+  - inteiro positivo  -> manter N caracteres
+  - string            -> inserir texto
+  - inteiro negativo  -> remover N caracteres
+A operação deve percorrer o documento inteiro (base_length == len(texto)).
+"""
+import json
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Operation = List[Any]
+
+KEY_PREFIX = 'jurisia:collab'
+
+
+class OperationError(ValueError):
+    """Operação inválida para o estado atual do documento"""
+
+
+class StaleRevisionError(OperationError):
+    """Revisão do cliente é anterior ao histórico mantido; exige ressincronização"""
+
+
+# ---- Operações ----
+
+def normalize(operation: Operation) -> Operation:
+    """Valida e compacta uma operação (une componentes adjacentes do mesmo tipo)"""
+    if not isinstance(operation, list):
+        raise OperationError('Operação deve ser uma lista')
+
+    result: Operation = []
+    for component in operation:
+        if isinstance(component, bool) or not isinstance(component, (int, str)):
+            raise OperationError(f'Componente inválido: {component!r}')
+        if component == 0 or component == '':
+            continue
+        if result and type(result[-1]) is type(component) and (
+            isinstance(component, str) or (result[-1] > 0) == (component > 0)
+        ):
+            result[-1] += component
+        elif isinstance(component, str) and result and isinstance(result[-1], int) and result[-1] < 0:
+            # Inserção sempre antes da remoção na mesma posição (forma canônica)
+            if len(result) > 1 and isinstance(result[-2], str):
+                result[-2] += component
+            else:
+                result.insert(len(result) - 1, component)
+        else:
+            result.append(component)
+    return result
+
+
+def base_length(operation: Operation) -> int:
+    """Tamanho do texto ao qual a operação se aplica"""
+    return sum(abs(c) for c in operation if isinstance(c, int))
+
+
+def apply_operation(text: str, operation: Operation) -> str:
+    """Aplica a operação ao texto"""
+    if base_length(operation) != len(text):
+        raise OperationError(
+            f'Operação espera {base_length(operation)} caracteres, documento tem {len(text)}'
+        )
+
+    parts = []
+    index = 0
+    for component in operation:
+        if isinstance(component, str):
+            parts.append(component)
+        elif component > 0:
+            parts.append(text[index:index + component])
+            index += component
+        else:
+            index -= component
+    return ''.join(parts)
+
+
+def transform(a: Operation, b: Operation) -> Tuple[Operation, Operation]:
+    """
+    Transforma duas operações concorrentes sobre o mesmo texto.
+    Retorna (a', b') tal que apply(apply(t, a), b') == apply(apply(t, b), a').
+    Em inserções na mesma posição, `a` tem prioridade.
+    """
+    if base_length(a) != base_length(b):
+        raise OperationError('Operações concorrentes com tamanhos de base diferentes')
+
+    a_prime: Operation = []
+    b_prime: Operation = []
+    ops_a, ops_b = list(a), list(b)
+    i = j = 0
+    head_a = ops_a[0] if ops_a else None
+    head_b = ops_b[0] if ops_b else None
+
+    def next_a():
+        nonlocal i
+        i += 1
+        return ops_a[i] if i < len(ops_a) else None
+
+    def next_b():
+        nonlocal j
+        j += 1
+        return ops_b[j] if j < len(ops_b) else None
+
+    while head_a is not None or head_b is not None:
+        if isinstance(head_a, str):
+            a_prime.append(head_a)
+            b_prime.append(len(head_a))
+            head_a = next_a()
+            continue
+        if isinstance(head_b, str):
+            a_prime.append(len(head_b))
+            b_prime.append(head_b)
+            head_b = next_b()
+            continue
+        if head_a is None or head_b is None:
+            raise OperationError('Operações incompatíveis')
+
+        length = min(abs(head_a), abs(head_b))
+        if head_a > 0 and head_b > 0:
+            a_prime.append(length)
+            b_prime.append(length)
+        elif head_a < 0 and head_b > 0:
+            a_prime.append(-length)
+        elif head_a > 0 and head_b < 0:
+            b_prime.append(-length)
+        # Ambos removem o mesmo trecho: nada a fazer
+
+        head_a = _consume(head_a, length) or next_a()
+        head_b = _consume(head_b, length) or next_b()
+
+    return normalize(a_prime), normalize(b_prime)
+
+
+def _consume(component: int, length: int) -> Optional[int]:
+    """Consome `length` caracteres de um componente retain/delete"""
+    if component > 0:
+        rest = component - length
+    else:
+        rest = component + length
+    return rest or None
+
+
+# ---- Sessões de documento ----
+
+class DocumentSession:
+    """Estado em memória de um documento aberto (um único processo)"""
+
+    HISTORY_SIZE = 200
+
+    def __init__(self, document_id: int, text: str):
+        self.document_id = document_id
+        self.text = text
+        self.revision = 0
+        self.history = deque(maxlen=self.HISTORY_SIZE)
+        self.lock = threading.Lock()
+        self.dirty_since: Optional[float] = None
+        self.last_change = time.time()
+        self.last_editor = None
+
+    def apply(self, revision: int, operation: Operation, user_id) -> Tuple[Operation, int]:
+        """Transforma a operação contra as concorrentes e a aplica"""
+        operation = normalize(operation)
+        with self.lock:
+            concurrent = self.revision - revision
+            if concurrent < 0 or concurrent > len(self.history):
+                raise StaleRevisionError(
+                    f'Revisão {revision} fora do histórico (atual: {self.revision})'
+                )
+            for entry in list(self.history)[len(self.history) - concurrent:]:
+                operation, _ = transform(operation, entry['operation'])
+
+            self.text = apply_operation(self.text, operation)
+            self.revision += 1
+            self.history.append({
+                'revision': self.revision,
+                'operation': operation,
+                'user_id': user_id
+            })
+            self.last_change = time.time()
+            self.last_editor = user_id
+            if self.dirty_since is None:
+                self.dirty_since = self.last_change
+            return operation, self.revision
+
+    def snapshot(self, recent: int = 50) -> Dict[str, Any]:
+        """Conteúdo atual mais as operações recentes (para quem entra depois)"""
+        with self.lock:
+            return {
+                'document_id': self.document_id,
+                'content': self.text,
+                'revision': self.revision,
+                'recent_operations': list(self.history)[-recent:]
+            }
+
+    def take_pending(self, debounce: float, max_delay: float, force: bool = False) -> Optional[Dict]:
+        """Retorna o conteúdo a persistir se o debounce venceu (e limpa o estado sujo)"""
+        with self.lock:
+            if self.dirty_since is None:
+                return None
+            now = time.time()
+            if not force and now - self.last_change < debounce and now - self.dirty_since < max_delay:
+                return None
+            self.dirty_since = None
+            return {
+                'id': self.document_id,
+                'conteudo': self.text,
+                'ultima_edicao_user_id': self.last_editor
+            }
+
+    def mark_dirty(self):
+        with self.lock:
+            if self.dirty_since is None:
+                self.dirty_since = time.time()
+
+
+class RedisDocumentSession:
+    """Estado do documento no Redis, compartilhado entre workers (WATCH/MULTI)"""
+
+    HISTORY_SIZE = 200
+    TTL = 24 * 3600
+
+    def __init__(self, redis_client, document_id: int, text: str):
+        self.redis = redis_client
+        self.document_id = document_id
+        base = f"{KEY_PREFIX}:doc:{document_id}"
+        self.text_key = f"{base}:text"
+        self.revision_key = f"{base}:rev"
+        self.ops_key = f"{base}:ops"
+        self.editor_key = f"{base}:editor"
+        self.dirty_key = f"{KEY_PREFIX}:dirty"
+        self.last_change = time.time()
+
+        # Apenas o primeiro worker inicializa o estado
+        if self.redis.set(self.text_key, text, nx=True, ex=self.TTL):
+            self.redis.set(self.revision_key, 0, ex=self.TTL)
+
+    def apply(self, revision: int, operation: Operation, user_id) -> Tuple[Operation, int]:
+        from redis.exceptions import WatchError
+
+        operation = normalize(operation)
+        with self.redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.revision_key)
+                    current = int(pipe.get(self.revision_key) or 0)
+                    concurrent = current - revision
+                    history_size = pipe.llen(self.ops_key)
+                    if concurrent < 0 or concurrent > history_size:
+                        pipe.unwatch()
+                        raise StaleRevisionError(
+                            f'Revisão {revision} fora do histórico (atual: {current})'
+                        )
+
+                    transformed = operation
+                    if concurrent:
+                        for raw in pipe.lrange(self.ops_key, -concurrent, -1):
+                            transformed, _ = transform(transformed, json.loads(raw)['operation'])
+
+                    text = (pipe.get(self.text_key) or b'').decode('utf-8')
+                    text = apply_operation(text, transformed)
+                    now = time.time()
+
+                    pipe.multi()
+                    pipe.set(self.text_key, text, ex=self.TTL)
+                    pipe.incr(self.revision_key)
+                    pipe.expire(self.revision_key, self.TTL)
+                    pipe.rpush(self.ops_key, json.dumps({
+                        'revision': current + 1,
+                        'operation': transformed,
+                        'user_id': user_id
+                    }))
+                    pipe.ltrim(self.ops_key, -self.HISTORY_SIZE, -1)
+                    pipe.expire(self.ops_key, self.TTL)
+                    pipe.set(self.editor_key, json.dumps(user_id), ex=self.TTL)
+                    pipe.zadd(self.dirty_key, {str(self.document_id): now}, nx=True)
+                    pipe.execute()
+
+                    self.last_change = now
+                    return transformed, current + 1
+                except WatchError:
+                    continue
+
+    def snapshot(self, recent: int = 50) -> Dict[str, Any]:
+        pipe = self.redis.pipeline()
+        pipe.get(self.text_key)
+        pipe.get(self.revision_key)
+        pipe.lrange(self.ops_key, -recent, -1)
+        text, revision, ops = pipe.execute()
+        return {
+            'document_id': self.document_id,
+            'content': (text or b'').decode('utf-8'),
+            'revision': int(revision or 0),
+            'recent_operations': [json.loads(raw) for raw in ops]
+        }
+
+    def take_pending(self, debounce: float, max_delay: float, force: bool = False) -> Optional[Dict]:
+        dirty_since = self.redis.zscore(self.dirty_key, str(self.document_id))
+        if dirty_since is None:
+            return None
+        now = time.time()
+        if not force and now - self.last_change < debounce and now - dirty_since < max_delay:
+            return None
+        # ZREM funciona como "claim": apenas um worker persiste cada lote
+        if not self.redis.zrem(self.dirty_key, str(self.document_id)):
+            return None
+        text, editor = self.redis.mget(self.text_key, self.editor_key)
+        return {
+            'id': self.document_id,
+            'conteudo': (text or b'').decode('utf-8'),
+            'ultima_edicao_user_id': json.loads(editor) if editor else None
+        }
+
+    def mark_dirty(self):
+        self.redis.zadd(self.dirty_key, {str(self.document_id): time.time()}, nx=True)
+
+
+# ---- Motor de colaboração ----
+
+class CollaborationEngine:
+    """Gerencia as sessões de documento e a persistência em lote"""
+
+    SESSION_IDLE_TTL = 600
+
+    def __init__(self, loader: Callable[[int], Optional[str]] = None,
+                 persister: Callable[[List[Dict]], None] = None,
+                 redis_client=None, flush_interval: float = 2.0,
+                 debounce: float = 2.0, max_delay: float = 10.0):
+        self.loader = loader
+        self.persister = persister
+        self.redis = redis_client
+        self.flush_interval = flush_interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.sessions: Dict[int, Any] = {}
+        self.app = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+    def init_app(self, app):
+        """Associa a aplicação (contexto para persistir) e inicia a persistência"""
+        self.app = app
+        self.start()
+
+    def get_session(self, document_id: int):
+        """Obtém (ou carrega) a sessão do documento"""
+        document_id = int(document_id)
+        session = self.sessions.get(document_id)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self.sessions.get(document_id)
+            if session is None:
+                text = self.loader(document_id) if self.loader else None
+                if text is None:
+                    raise OperationError(f'Documento {document_id} não encontrado')
+                if self.redis is not None:
+                    session = RedisDocumentSession(self.redis, document_id, text)
+                else:
+                    session = DocumentSession(document_id, text)
+                self.sessions[document_id] = session
+            return session
+
+    def apply(self, document_id: int, revision: int, operation: Operation, user_id) -> Tuple[Operation, int]:
+        return self.get_session(document_id).apply(int(revision), operation, user_id)
+
+    def snapshot(self, document_id: int, recent: int = 50) -> Dict[str, Any]:
+        return self.get_session(document_id).snapshot(recent)
+
+    def start(self):
+        """Inicia a thread de persistência periódica"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Para a thread e persiste tudo o que estiver pendente"""
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        if self.app is not None:
+            with self.app.app_context():
+                self.flush(force=True)
+        else:
+            self.flush(force=True)
+
+    def flush(self, force: bool = False) -> int:
+        """Persiste em um único lote os documentos cujo debounce venceu"""
+        with self._lock:
+            sessions = list(self.sessions.values())
+
+        batch = []
+        for session in sessions:
+            try:
+                pending = session.take_pending(self.debounce, self.max_delay, force)
+                if pending:
+                    batch.append((session, pending))
+            except Exception as e:
+                logger.error(f"Erro ao preparar persistência do documento {session.document_id}: {str(e)}")
+
+        if batch and self.persister:
+            try:
+                self.persister([pending for _, pending in batch])
+                logger.info(f"{len(batch)} documento(s) colaborativo(s) persistido(s)")
+            except Exception as e:
+                logger.error(f"Erro ao persistir documentos colaborativos: {str(e)}")
+                for session, _ in batch:
+                    session.mark_dirty()
+                return 0
+
+        self._evict_idle()
+        return len(batch)
+
+    def _evict_idle(self):
+        """Remove sessões locais sem edição recente e sem alterações pendentes"""
+        now = time.time()
+        with self._lock:
+            for document_id, session in list(self.sessions.items()):
+                if now - session.last_change < self.SESSION_IDLE_TTL:
+                    continue
+                if isinstance(session, DocumentSession) and session.dirty_since is not None:
+                    continue
+                del self.sessions[document_id]
+
+    def _loop(self):
+        while self._running:
+            time.sleep(self.flush_interval)
+            if self.app is not None:
+                with self.app.app_context():
+                    self.flush()
+            else:
+                self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'open_sessions': len(self.sessions),
+            'backend': 'redis' if self.redis is not None else 'memory',
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+
+def create_collaboration_engine(redis_url: Optional[str] = None, **kwargs) -> CollaborationEngine:
+    """Cria o motor com estado no Redis se disponível, senão em memória"""
+    redis_client = None
+    if redis_url:
+        try:
+            import redis
+            redis_client = redis.from_url(redis_url)
+            redis_client.ping()
+            logger.info("✅ Estado de colaboração compartilhado via Redis")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis não disponível para colaboração, usando memória local: {e}")
+            redis_client = None
+    return CollaborationEngine(redis_client=redis_client, **kwargs)
@@ -1,16 +1,74 @@
+from flask import request
 from flask_socketio import emit, join_room, leave_room, disconnect
 from flask_jwt_extended import decode_token
-from extensions import socketio
+from config import Config
+from extensions import db, socketio
 from models.user import User
-from models.notification import Notification
+from models.document import Document
+from services.unread_counter import unread_counter
+from websocket.presence import create_presence_store, PresenceBroadcaster
+from websocket.collaboration import (
+    create_collaboration_engine, OperationError, StaleRevisionError
+)
+from websocket.coalescer import RoomEventCoalescer
 import logging
 import json
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-# Dicionário para rastrear usuários conectados
-connected_users = {}
+# Presença compartilhada entre workers (Redis) ou local (memória)
+presence = create_presence_store(Config.PRESENCE_REDIS_URL)
+presence_broadcaster = PresenceBroadcaster(
+    presence,
+    socketio.emit,
+    interval=Config.PRESENCE_FLUSH_INTERVAL
+)
+
+# Cursores e digitação enviados em frames periódicos por sala
+event_coalescer = RoomEventCoalescer(
+    socketio.emit,
+    tick=Config.WEBSOCKET_COALESCE_TICK_MS / 1000
+)
+
+
+def _load_document_content(document_id: int):
+    """Carrega o conteúdo inicial de um documento para a sessão colaborativa"""
+    document = Document.query.get(document_id)
+    return document.conteudo if document else None
+
+
+def _persist_documents(batch: list):
+    """Persiste em uma única transação o conteúdo de vários documentos"""
+    from sqlalchemy import update
+    
+    now = datetime.utcnow()
+    rows = []
+    for item in batch:
+        row = {
+            'id': item['id'],
+            'conteudo': item['conteudo'],
+            'tamanho_estimado': len(item['conteudo']),
+            'tempo_leitura': max(1, len(item['conteudo'].split()) // 200),
+            'updated_at': now
+        }
+        if item.get('ultima_edicao_user_id'):
+            row['ultima_edicao_user_id'] = int(item['ultima_edicao_user_id'])
+        rows.append(row)
+    
+    db.session.execute(update(Document), rows)
+    db.session.commit()
+
+
+# Estado colaborativo dos documentos abertos (persistido em lote)
+collaboration_engine = create_collaboration_engine(
+    Config.COLLABORATION_REDIS_URL,
+    loader=_load_document_content,
+    persister=_persist_documents,
+    flush_interval=Config.COLLABORATION_FLUSH_INTERVAL,
+    debounce=Config.COLLABORATION_SAVE_DEBOUNCE,
+    max_delay=Config.COLLABORATION_SAVE_MAX_DELAY
+)
 
 @socketio.on('connect')
 def handle_connect(auth):
@@ -44,26 +102,25 @@ def handle_connect(auth):
             join_room(f'user_{user_id}')
             
             # Registrar usuário conectado
-            connected_users[request.sid] = {
+            first_connection = presence.register(request.sid, {
                 'user_id': user_id,
                 'username': user.nome,
                 'email': user.email,
-                'connected_at': datetime.utcnow().isoformat(),
-                'rooms': [f'user_{user_id}']
-            }
+                'connected_at': datetime.utcnow().isoformat()
+            })
+            presence.join_room(request.sid, f'user_{user_id}')
             
             logger.info(f"Usuário {user.nome} conectado via WebSocket (ID: {user_id})")
             
             # Enviar contagem de notificações não lidas
-            unread_count = Notification.get_unread_count(user_id)
+            unread_count = unread_counter.get(user_id)
             emit('unread_count_updated', {'count': unread_count})
             
-            # Notificar outros usuários sobre a conexão (opcional)
-            emit('user_connected', {
-                'user_id': user_id,
-                'username': user.nome,
-                'timestamp': datetime.utcnow().isoformat()
-            }, broadcast=True, include_self=False)
+            # Notificar outros usuários apenas na primeira conexão (enviado em lote)
+            presence_broadcaster.start()
+            event_coalescer.start()
+            if first_connection:
+                presence_broadcaster.user_online(user_id, user.nome)
             
             return True
             
@@ -81,22 +138,21 @@ def handle_connect(auth):
 def handle_disconnect():
     """Desconecta usuário do WebSocket"""
     try:
-        if request.sid in connected_users:
-            user_info = connected_users[request.sid]
+        user_info = presence.unregister(request.sid)
+        if user_info:
             user_id = user_info['user_id']
             username = user_info['username']
             
-            # Remover usuário da lista de conectados
-            del connected_users[request.sid]
-            
             logger.info(f"Usuário {username} desconectado do WebSocket (ID: {user_id})")
             
-            # Notificar outros usuários sobre a desconexão (opcional)
-            emit('user_disconnected', {
-                'user_id': user_id,
-                'username': username,
-                'timestamp': datetime.utcnow().isoformat()
-            }, broadcast=True, include_self=False)
+            if user_info['last_connection']:
+                event_coalescer.forget(user_id)
+            
+            # Notificar outros usuários apenas quando a última conexão fecha
+            for room in user_info['left_rooms']:
+                presence_broadcaster.room_left(room, user_id, username)
+            if user_info['last_connection']:
+                presence_broadcaster.user_offline(user_id, username)
             
     except Exception as e:
         logger.error(f"Erro na desconexão WebSocket: {str(e)}")
@@ -105,14 +161,14 @@ def handle_disconnect():
 def handle_join_room(data):
     """Permite usuário entrar em uma sala específica"""
     try:
-        if request.sid not in connected_users:
+        user_info = presence.get_session(request.sid)
+        if not user_info:
             return False
         
         room = data.get('room')
         if not room:
             return False
         
-        user_info = connected_users[request.sid]
         user_id = user_info['user_id']
         
         # Verificar permissões (implementar lógica de autorização)
@@ -122,19 +178,15 @@ def handle_join_room(data):
         
         join_room(room)
         
-        # Atualizar lista de salas do usuário
-        if room not in user_info['rooms']:
-            user_info['rooms'].append(room)
-        
         logger.info(f"Usuário {user_info['username']} entrou na sala {room}")
         
-        # Notificar outros usuários na sala
-        emit('user_joined_room', {
-            'user_id': user_id,
-            'username': user_info['username'],
-            'room': room,
-            'timestamp': datetime.utcnow().isoformat()
-        }, room=room, include_self=False)
+        # Atualizar salas do usuário e notificar a sala (enviado em lote)
+        if presence.join_room(request.sid, room):
+            presence_broadcaster.room_joined(room, user_id, user_info['username'])
+        
+        # Quem entra depois recebe o estado atual e as operações recentes
+        if room.startswith('document_'):
+            emit('document_snapshot', collaboration_engine.snapshot(room.replace('document_', '')))
         
         return True
         
@@ -146,31 +198,23 @@ def handle_join_room(data):
 def handle_leave_room(data):
     """Permite usuário sair de uma sala específica"""
     try:
-        if request.sid not in connected_users:
+        user_info = presence.get_session(request.sid)
+        if not user_info:
             return False
         
         room = data.get('room')
         if not room:
             return False
         
-        user_info = connected_users[request.sid]
         user_id = user_info['user_id']
         
         leave_room(room)
         
-        # Remover sala da lista do usuário
-        if room in user_info['rooms']:
-            user_info['rooms'].remove(room)
-        
         logger.info(f"Usuário {user_info['username']} saiu da sala {room}")
         
-        # Notificar outros usuários na sala
-        emit('user_left_room', {
-            'user_id': user_id,
-            'username': user_info['username'],
-            'room': room,
-            'timestamp': datetime.utcnow().isoformat()
-        }, room=room, include_self=False)
+        # Atualizar salas do usuário e notificar a sala (enviado em lote)
+        if presence.leave_room(request.sid, room):
+            presence_broadcaster.room_left(room, user_id, user_info['username'])
         
         return True
         
@@ -182,10 +226,10 @@ def handle_leave_room(data):
 def handle_send_message(data):
     """Envia mensagem para uma sala específica"""
     try:
-        if request.sid not in connected_users:
+        user_info = presence.get_session(request.sid)
+        if not user_info:
             return False
         
-        user_info = connected_users[request.sid]
         user_id = user_info['user_id']
         room = data.get('room')
         message = data.get('message')
@@ -224,21 +268,17 @@ def handle_send_message(data):
 def handle_typing_start(data):
     """Indica que usuário começou a digitar"""
     try:
-        if request.sid not in connected_users:
+        user_info = presence.get_session(request.sid)
+        if not user_info:
             return False
         
-        user_info = connected_users[request.sid]
         room = data.get('room')
         
         if not room or room not in user_info['rooms']:
             return False
         
-        emit('user_typing', {
-            'user_id': user_info['user_id'],
-            'username': user_info['username'],
-            'room': room,
-            'typing': True
-        }, room=room, include_self=False)
+        # Apenas mudanças de estado são enviadas, no próximo frame da sala
+        event_coalescer.typing(room, user_info['user_id'], user_info['username'], True, request.sid)
         
         return True
         
@@ -250,21 +290,16 @@ def handle_typing_start(data):
 def handle_typing_stop(data):
     """Indica que usuário parou de digitar"""
     try:
-        if request.sid not in connected_users:
+        user_info = presence.get_session(request.sid)
+        if not user_info:
             return False
         
-        user_info = connected_users[request.sid]
         room = data.get('room')
         
         if not room or room not in user_info['rooms']:
             return False
         
-        emit('user_typing', {
-            'user_id': user_info['user_id'],
-            'username': user_info['username'],
-            'room': room,
-            'typing': False
-        }, room=room, include_self=False)
+        event_coalescer.typing(room, user_info['user_id'], user_info['username'], False, request.sid)
         
         return True
         
@@ -276,10 +311,10 @@ def handle_typing_stop(data):
 def handle_document_editing(data):
     """Sincroniza edição colaborativa de documentos"""
     try:
-        if request.sid not in connected_users:
+        user_info = presence.get_session(request.sid)
+        if not user_info:
             return False
         
-        user_info = connected_users[request.sid]
         document_id = data.get('document_id')
         operation = data.get('operation')
         
@@ -294,10 +329,25 @@ def handle_document_editing(data):
             emit('error', {'message': 'Sem permissão para editar documento'})
             return False
         
-        # Aplicar operação e sincronizar com outros usuários
+        # Transformar contra operações concorrentes e aplicar no servidor
+        try:
+            operation, revision = collaboration_engine.apply(
+                document_id, data.get('revision', 0), operation, user_info['user_id']
+            )
+        except StaleRevisionError:
+            emit('document_resync', collaboration_engine.snapshot(document_id))
+            return False
+        except OperationError as e:
+            emit('error', {'message': f'Operação inválida: {str(e)}'})
+            return False
+        
+        emit('document_ack', {'document_id': document_id, 'revision': revision})
+        
+        # Sincronizar operação transformada com outros usuários
         sync_data = {
             'document_id': document_id,
             'operation': operation,
+            'revision': revision,
             'user_id': user_info['user_id'],
             'username': user_info['username'],
             'timestamp': datetime.utcnow().isoformat()
@@ -315,10 +365,10 @@ def handle_document_editing(data):
 def handle_cursor_position(data):
     """Sincroniza posição do cursor em edição colaborativa"""
     try:
-        if request.sid not in connected_users:
+        user_info = presence.get_session(request.sid)
+        if not user_info:
             return False
         
-        user_info = connected_users[request.sid]
         document_id = data.get('document_id')
         position = data.get('position')
         
@@ -335,7 +385,8 @@ def handle_cursor_position(data):
             'timestamp': datetime.utcnow().isoformat()
         }
         
-        emit('cursor_updated', cursor_data, room=room, include_self=False)
+        # Mantém apenas a última posição do usuário até o próximo frame da sala
+        event_coalescer.cursor(room, user_info['user_id'], cursor_data, request.sid)
         
         return True
         
@@ -347,15 +398,7 @@ def handle_cursor_position(data):
 def handle_get_online_users():
     """Retorna lista de usuários online"""
     try:
-        online_users = []
-        for sid, user_info in connected_users.items():
-            online_users.append({
-                'user_id': user_info['user_id'],
-                'username': user_info['username'],
-                'connected_at': user_info['connected_at']
-            })
-        
-        emit('online_users', {'users': online_users})
+        emit('online_users', {'users': presence.online_users()})
         
         return True
         
@@ -441,13 +484,15 @@ def broadcast_system_message(message: str, type: str = 'info'):
 def get_online_stats():
     """Retorna estatísticas de usuários online"""
     try:
-        total_connected = len(connected_users)
-        unique_users = len(set(user_info['user_id'] for user_info in connected_users.values()))
+        stats = presence.stats()
         
         return {
-            'total_connections': total_connected,
-            'unique_users': unique_users,
-            'connected_users': list(connected_users.values())
+            'total_connections': stats['total_connections'],
+            'unique_users': stats['unique_users'],
+            'connected_users': presence.online_users(),
+            'worker_id': presence.worker_id,
+            'worker_connections': len(presence.local_sessions()),
+            'realtime_events': event_coalescer.metrics()
         }
         
     except Exception as e:
@@ -0,0 +1,410 @@
+"""
+Presença distribuída para o servidor WebSocket
+
+Cada worker mantém localmente as sessões (sid) que atende, enquanto as
+contagens de conexões por usuário e a participação em salas ficam no Redis,
+compartilhadas entre todos os workers. Sem Redis, um armazenamento em memória
+com a mesma interface é usado (modo de processo único).
+
+Os eventos de presença são acumulados e enviados em lote a cada intervalo,
+descartando transições que se anulam (conectou e desconectou na mesma janela).
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'jurisia:presence'
+
+# Incrementa a contagem global e a contribuição do worker; retorna a contagem global
+_CONNECT_SCRIPT = """
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+redis.call('HINCRBY', KEYS[3], ARGV[1], 1)
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+return count
+"""
+
+# Decrementa e remove campos zerados; retorna a contagem global restante
+_DISCONNECT_SCRIPT = """
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], -1)
+if count <= 0 then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    if KEYS[2] ~= '' then redis.call('HDEL', KEYS[2], ARGV[1]) end
+end
+local own = redis.call('HINCRBY', KEYS[3], ARGV[2], -1)
+if own <= 0 then redis.call('HDEL', KEYS[3], ARGV[2]) end
+return count
+"""
+
+_ROOM_JOIN_SCRIPT = """
+local count = redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+return count
+"""
+
+# Remove as contribuições de um worker que parou de enviar heartbeat.
+# Retorna os dados públicos (JSON) dos usuários que ficaram offline.
+_REAP_SCRIPT = """
+local offline = {}
+local conns = redis.call('HGETALL', KEYS[3])
+for i = 1, #conns, 2 do
+    local count = redis.call('HINCRBY', KEYS[1], conns[i], -tonumber(conns[i + 1]))
+    if count <= 0 then
+        redis.call('HDEL', KEYS[1], conns[i])
+        local info = redis.call('HGET', KEYS[2], conns[i])
+        redis.call('HDEL', KEYS[2], conns[i])
+        table.insert(offline, info or cjson.encode({user_id = conns[i]}))
+    end
+end
+local rooms = redis.call('HGETALL', KEYS[4])
+for i = 1, #rooms, 2 do
+    local sep = string.find(rooms[i], '|', 1, true)
+    local room_key = ARGV[1] .. ':room:' .. string.sub(rooms[i], 1, sep - 1)
+    local user_id = string.sub(rooms[i], sep + 1)
+    local count = redis.call('HINCRBY', room_key, user_id, -tonumber(rooms[i + 1]))
+    if count <= 0 then redis.call('HDEL', room_key, user_id) end
+end
+redis.call('DEL', KEYS[3], KEYS[4])
+redis.call('ZREM', KEYS[5], ARGV[2])
+return offline
+"""
+
+
+class PresenceStore:
+    """Sessões locais do worker + agregados de presença (em memória)"""
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._user_counts: Dict[str, int] = {}
+        self._user_info: Dict[str, Dict[str, Any]] = {}
+        self._room_counts: Dict[str, Dict[str, int]] = {}
+
+    # ---- Sessões locais (um sid sempre pertence ao mesmo worker) ----
+
+    def register(self, sid: str, info: Dict[str, Any]) -> bool:
+        """Registra conexão; retorna True se for a primeira conexão do usuário"""
+        session = dict(info, rooms=[])
+        with self._lock:
+            self._sessions[sid] = session
+        public_info = {
+            'user_id': info['user_id'],
+            'username': info.get('username'),
+            'connected_at': info.get('connected_at')
+        }
+        return self._incr_user(str(info['user_id']), public_info) == 1
+
+    def unregister(self, sid: str) -> Optional[Dict[str, Any]]:
+        """
+        Remove conexão e suas salas. Retorna a sessão removida com as chaves
+        `last_connection` e `left_rooms` (salas que o usuário deixou de ocupar)
+        """
+        with self._lock:
+            session = self._sessions.pop(sid, None)
+        if session is None:
+            return None
+
+        user_id = str(session['user_id'])
+        left_rooms = [
+            room for room in session['rooms']
+            if self._decr_room(room, user_id) <= 0
+        ]
+        session['last_connection'] = self._decr_user(user_id) <= 0
+        session['left_rooms'] = left_rooms
+        return session
+
+    def get_session(self, sid: str) -> Optional[Dict[str, Any]]:
+        """Obtém sessão local pelo sid"""
+        return self._sessions.get(sid)
+
+    def local_sessions(self) -> List[Dict[str, Any]]:
+        """Lista sessões atendidas por este worker"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def join_room(self, sid: str, room: str) -> bool:
+        """Adiciona sala à sessão; retorna True se o usuário acabou de entrar nela"""
+        session = self._sessions.get(sid)
+        if session is None or room in session['rooms']:
+            return False
+        session['rooms'].append(room)
+        return self._incr_room(room, str(session['user_id'])) == 1
+
+    def leave_room(self, sid: str, room: str) -> bool:
+        """Remove sala da sessão; retorna True se o usuário saiu totalmente dela"""
+        session = self._sessions.get(sid)
+        if session is None or room not in session['rooms']:
+            return False
+        session['rooms'].remove(room)
+        return self._decr_room(room, str(session['user_id'])) <= 0
+
+    # ---- Agregados (sobrescritos pelo backend Redis) ----
+
+    def _incr_user(self, user_id: str, info: Dict[str, Any]) -> int:
+        with self._lock:
+            count = self._user_counts.get(user_id, 0) + 1
+            self._user_counts[user_id] = count
+            self._user_info[user_id] = info
+            return count
+
+    def _decr_user(self, user_id: str) -> int:
+        with self._lock:
+            count = self._user_counts.get(user_id, 0) - 1
+            if count <= 0:
+                self._user_counts.pop(user_id, None)
+                self._user_info.pop(user_id, None)
+            else:
+                self._user_counts[user_id] = count
+            return count
+
+    def _incr_room(self, room: str, user_id: str) -> int:
+        with self._lock:
+            members = self._room_counts.setdefault(room, {})
+            members[user_id] = members.get(user_id, 0) + 1
+            return members[user_id]
+
+    def _decr_room(self, room: str, user_id: str) -> int:
+        with self._lock:
+            members = self._room_counts.get(room, {})
+            count = members.get(user_id, 0) - 1
+            if count <= 0:
+                members.pop(user_id, None)
+                if not members:
+                    self._room_counts.pop(room, None)
+            else:
+                members[user_id] = count
+            return count
+
+    def online_users(self) -> List[Dict[str, Any]]:
+        """Usuários online em todos os workers"""
+        with self._lock:
+            return list(self._user_info.values())
+
+    def room_members(self, room: str) -> List[str]:
+        """IDs dos usuários presentes em uma sala"""
+        with self._lock:
+            return list(self._room_counts.get(room, {}))
+
+    def stats(self) -> Dict[str, int]:
+        """Totais de conexões e usuários únicos"""
+        with self._lock:
+            return {
+                'total_connections': sum(self._user_counts.values()),
+                'unique_users': len(self._user_counts)
+            }
+
+    def heartbeat(self) -> List[Dict[str, Any]]:
+        """Mantém o worker vivo; retorna (user_id, username) de quem ficou offline por workers mortos"""
+        return []
+
+
+class RedisPresenceStore(PresenceStore):
+    """Agregados de presença compartilhados entre workers via Redis"""
+
+    WORKER_TIMEOUT = 30
+
+    def __init__(self, redis_client):
+        super().__init__()
+        self.redis = redis_client
+        self._connect = redis_client.register_script(_CONNECT_SCRIPT)
+        self._disconnect = redis_client.register_script(_DISCONNECT_SCRIPT)
+        self._room_join = redis_client.register_script(_ROOM_JOIN_SCRIPT)
+        self._reap = redis_client.register_script(_REAP_SCRIPT)
+        self.heartbeat()
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join((KEY_PREFIX,) + parts)
+
+    @property
+    def _worker_conns_key(self) -> str:
+        return self._key('worker', self.worker_id, 'conns')
+
+    @property
+    def _worker_rooms_key(self) -> str:
+        return self._key('worker', self.worker_id, 'rooms')
+
+    def _incr_user(self, user_id: str, info: Dict[str, Any]) -> int:
+        return int(self._connect(
+            keys=[self._key('conns'), self._key('users'), self._worker_conns_key],
+            args=[user_id, json.dumps(info, default=str)]
+        ))
+
+    def _decr_user(self, user_id: str) -> int:
+        return int(self._disconnect(
+            keys=[self._key('conns'), self._key('users'), self._worker_conns_key],
+            args=[user_id, user_id]
+        ))
+
+    def _incr_room(self, room: str, user_id: str) -> int:
+        return int(self._room_join(
+            keys=[self._key('room', room), self._worker_rooms_key],
+            args=[user_id, f"{room}|{user_id}"]
+        ))
+
+    def _decr_room(self, room: str, user_id: str) -> int:
+        return int(self._disconnect(
+            keys=[self._key('room', room), '', self._worker_rooms_key],
+            args=[user_id, f"{room}|{user_id}"]
+        ))
+
+    def online_users(self) -> List[Dict[str, Any]]:
+        return [json.loads(raw) for raw in self.redis.hvals(self._key('users'))]
+
+    def room_members(self, room: str) -> List[str]:
+        return [
+            member.decode() if isinstance(member, bytes) else member
+            for member in self.redis.hkeys(self._key('room', room))
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        counts = [int(value) for value in self.redis.hvals(self._key('conns'))]
+        return {
+            'total_connections': sum(counts),
+            'unique_users': len(counts)
+        }
+
+    def heartbeat(self) -> List[Dict[str, Any]]:
+        """Renova o heartbeat e remove contribuições de workers sem heartbeat"""
+        now = time.time()
+        workers_key = self._key('workers')
+        self.redis.zadd(workers_key, {self.worker_id: now})
+
+        offline = []
+        stale = self.redis.zrangebyscore(workers_key, 0, now - self.WORKER_TIMEOUT)
+        for worker in stale:
+            worker = worker.decode() if isinstance(worker, bytes) else worker
+            reaped = self._reap(
+                keys=[
+                    self._key('conns'),
+                    self._key('users'),
+                    self._key('worker', worker, 'conns'),
+                    self._key('worker', worker, 'rooms'),
+                    workers_key
+                ],
+                args=[KEY_PREFIX, worker]
+            )
+            offline.extend(json.loads(info) for info in reaped)
+            logger.warning(f"Presença do worker {worker} removida (sem heartbeat)")
+        return offline
+
+
+class PresenceBroadcaster:
+    """Acumula mudanças de presença e as envia em lote a cada intervalo"""
+
+    HEARTBEAT_INTERVAL = 10
+
+    def __init__(self, store: PresenceStore, emit: Callable, interval: float = 0.5):
+        self.store = store
+        self.emit = emit
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._rooms: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._thread = None
+        self._running = False
+        self._last_heartbeat = 0.0
+
+    def start(self):
+        """Inicia a thread de envio"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Para a thread de envio após um último flush"""
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        self.flush()
+
+    @staticmethod
+    def _queue(pending: Dict[str, Dict[str, Any]], user_id: str, online: bool, data: Dict):
+        current = pending.get(user_id)
+        if current is not None and current['online'] != online:
+            # Transições opostas na mesma janela se anulam
+            del pending[user_id]
+        else:
+            pending[user_id] = dict(data, online=online)
+
+    def user_online(self, user_id, username: str):
+        with self._lock:
+            self._queue(self._users, str(user_id), True,
+                        {'user_id': user_id, 'username': username})
+
+    def user_offline(self, user_id, username: str):
+        with self._lock:
+            self._queue(self._users, str(user_id), False,
+                        {'user_id': user_id, 'username': username})
+
+    def room_joined(self, room: str, user_id, username: str):
+        with self._lock:
+            self._queue(self._rooms.setdefault(room, {}), str(user_id), True,
+                        {'user_id': user_id, 'username': username})
+
+    def room_left(self, room: str, user_id, username: str):
+        with self._lock:
+            self._queue(self._rooms.setdefault(room, {}), str(user_id), False,
+                        {'user_id': user_id, 'username': username})
+
+    @staticmethod
+    def _split(pending: Dict[str, Dict[str, Any]]) -> Dict[str, List[Dict]]:
+        batch = {'online': [], 'offline': []}
+        for entry in pending.values():
+            online = entry.pop('online')
+            batch['online' if online else 'offline'].append(entry)
+        return batch
+
+    def flush(self):
+        """Envia as mudanças acumuladas"""
+        with self._lock:
+            users, self._users = self._users, {}
+            rooms, self._rooms = self._rooms, {}
+
+        timestamp = datetime.utcnow().isoformat()
+        try:
+            if users:
+                self.emit('presence_changed', dict(self._split(users), timestamp=timestamp))
+            for room, pending in rooms.items():
+                if pending:
+                    self.emit('room_presence_changed',
+                              dict(self._split(pending), room=room, timestamp=timestamp),
+                              room=room)
+        except Exception as e:
+            logger.error(f"Erro ao enviar presença: {str(e)}")
+
+    def _loop(self):
+        while self._running:
+            time.sleep(self.interval)
+            now = time.time()
+            if now - self._last_heartbeat >= self.HEARTBEAT_INTERVAL:
+                self._last_heartbeat = now
+                try:
+                    for user in self.store.heartbeat():
+                        self.user_offline(user['user_id'], user.get('username'))
+                except Exception as e:
+                    logger.error(f"Erro no heartbeat de presença: {str(e)}")
+            self.flush()
+
+
+def create_presence_store(redis_url: Optional[str] = None) -> PresenceStore:
+    """Cria store Redis se disponível, senão o store em memória"""
+    if redis_url:
+        try:
+            import redis
+            client = redis.from_url(redis_url)
+            client.ping()
+            logger.info("✅ Presença WebSocket compartilhada via Redis")
+            return RedisPresenceStore(client)
+        except Exception as e:
+            logger.warning(f"⚠️ Redis não disponível para presença, usando memória local: {e}")
+    return PresenceStore()
@@ -32,11 +32,12 @@ def create_websocket_app():
     # CORS para permitir conexões do frontend
     CORS(app, origins=Config.CORS_ORIGINS, supports_credentials=True)
     
-    # Configurar SocketIO
+    # Configurar SocketIO (com fila de mensagens, vários workers atendem a mesma sala)
     socketio = SocketIO(
         app,
         cors_allowed_origins=Config.CORS_ORIGINS,
         async_mode='threading',
+        message_queue=Config.SOCKETIO_MESSAGE_QUEUE,
         logger=True,
         engineio_logger=True,
         ping_timeout=60,
@@ -57,6 +58,10 @@ def create_websocket_app():
         handle_get_online_users
     )
     
+    # Persistência periódica da edição colaborativa
+    from websocket.events import collaboration_engine
+    collaboration_engine.init_app(app)
+    
     # Eventos básicos
     @socketio.on('connect')
     def on_connect(auth):
@@ -0,0 +1,131 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+activity_rollups = pytest.importorskip('services.activity_rollups', exc_type=ImportError)
+
+
+class TestCompactorLock:
+    """Um único executor do compactador entre workers"""
+
+    @pytest.fixture
+    def workers(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')  # EVAL no fakeredis
+        client = fakeredis.FakeRedis()
+        first, second = activity_rollups.ActivityRollups(), activity_rollups.ActivityRollups()
+        first.redis = second.redis = client
+        return first, second
+
+    def test_only_one_worker_runs_per_cycle(self, workers):
+        first, second = workers
+        token = first._acquire_run(300)
+        assert token
+        assert second._acquire_run(300) is None
+
+    def test_release_only_by_owner(self, workers):
+        first, second = workers
+        token = first._acquire_run(300)
+        second._release_run('outro-token')
+        assert second._acquire_run(300) is None
+
+        first._release_run(token)
+        assert second._acquire_run(300)
+
+    def test_without_redis_runs_locally(self):
+        assert activity_rollups.ActivityRollups()._acquire_run(300)
+
+
+class TestCompactorGate:
+    """O compactador só sobe com ANALYTICS_ROLLUP_COMPACTOR ligado e fora de testes"""
+
+    @pytest.fixture
+    def started(self, monkeypatch):
+        routes = pytest.importorskip('routes.analytics', exc_type=ImportError)
+        calls = []
+        monkeypatch.setattr(routes.activity_rollups, 'start_compactor',
+                            lambda app, **kwargs: calls.append(kwargs))
+
+        def register(**config):
+            app = Flask(__name__)
+            app.config.update(config)
+            app.register_blueprint(routes.analytics_bp, url_prefix='/api/analytics')
+            return calls
+        return register
+
+    def test_off_by_default(self, started):
+        assert started() == []
+
+    def test_never_in_tests(self, started):
+        assert started(ANALYTICS_ROLLUP_COMPACTOR=True, TESTING=True) == []
+
+    def test_enabled(self, started):
+        calls = started(ANALYTICS_ROLLUP_COMPACTOR=True, ANALYTICS_ROLLUP_INTERVAL=60,
+                        REDIS_URL='redis://cache:6379/0')
+        assert calls == [{'interval': 60, 'backfill_days': 400, 'redis_url': 'redis://cache:6379/0'}]
+
+
+TODAY = date(2026, 10, 18)
+
+
+def ordinals(*days_ago):
+    return [(TODAY - timedelta(days=ago)).toordinal() for ago in days_ago]
+
+
+class TestStreak:
+    """Sequência de dias ativos pelo bitmap (bit 0 = hoje)"""
+
+    def streak(self, *days_ago):
+        return activity_rollups.streak_length(ordinals(*days_ago), TODAY.toordinal())
+
+    def test_no_activity(self):
+        assert self.streak() == 0
+
+    def test_only_today(self):
+        assert self.streak(0) == 1
+
+    def test_today_not_active_yet_keeps_yesterday(self):
+        assert self.streak(1, 2, 3) == 3
+
+    def test_gap_breaks_streak(self):
+        assert self.streak(0, 1, 3, 4, 5) == 2
+        assert self.streak(2, 3) == 0
+
+    def test_duplicates_and_future_days(self):
+        assert self.streak(0, 0, 1, -1, -5) == 2
+        assert self.streak(-1) == 0
+
+    def test_long_streak_crosses_byte_boundaries(self):
+        assert self.streak(*range(1000)) == 1000
+        assert self.streak(*range(64), *range(65, 400)) == 64
+
+
+class TestHeatmap:
+    """Grade 7 x 24 (segunda=0) a partir das linhas diárias"""
+
+    def test_empty_period(self):
+        heatmap = activity_rollups.weekday_hour_heatmap(np.zeros(0, dtype=np.int64),
+                                                        np.zeros((0, 24), dtype=np.int64))
+        assert heatmap.shape == (7, 24)
+        assert not heatmap.any()
+
+    def test_days_fold_into_weekdays(self):
+        monday, sunday = date(2026, 10, 19), date(2026, 10, 25)
+        days = np.array([monday.toordinal(), sunday.toordinal(), (monday + timedelta(days=7)).toordinal()])
+        matrix = np.zeros((3, 24), dtype=np.int64)
+        matrix[0, 9] = 2
+        matrix[1, 23] = 5
+        matrix[2, 9] = 3
+        matrix[2, 0] = 1
+
+        heatmap = activity_rollups.weekday_hour_heatmap(days, matrix)
+        assert heatmap[0, 9] == 5
+        assert heatmap[0, 0] == 1
+        assert heatmap[6, 23] == 5
+        assert heatmap.sum() == matrix.sum()
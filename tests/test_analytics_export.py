@@ -0,0 +1,108 @@
+import os
+import sys
+import csv
+import io
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+analytics_export = pytest.importorskip('services.analytics_export', exc_type=ImportError)
+
+
+def _dataset(rows):
+    return analytics_export.Dataset('documentos', [('dia', 'date'), ('titulo', 'str'), ('total', 'int')],
+                                    lambda: iter(rows))
+
+
+def _read_csv(chunks):
+    text = b''.join(chunks).decode('utf-8').lstrip('﻿')
+    return list(csv.reader(io.StringIO(text)))
+
+
+class TestFormulaEscaping:
+    """Textos que o Excel avaliaria como fórmula saem prefixados com '"""
+
+    @pytest.mark.parametrize('value', ['=HYPERLINK("http://x","y")', '+1+1', '-2+3', '@SUM(A1)',
+                                       '\t=1', '\r=1'])
+    def test_formula_prefixes_are_escaped(self, value):
+        rows = _read_csv(analytics_export.iter_csv(_dataset([(date(2024, 1, 2), value, 1)])))
+        assert rows[1] == ['2024-01-02', "'" + value, '1']
+
+    def test_plain_text_and_numbers_are_kept(self):
+        rows = _read_csv(analytics_export.iter_csv(_dataset([(date(2024, 1, 2), 'Contrato = ok', -5)])))
+        assert rows[1] == ['2024-01-02', 'Contrato = ok', '-5']
+
+    def test_chunks_split_large_exports(self):
+        dataset = _dataset([(date(2024, 1, 2), 'x' * 100, n) for n in range(2000)])
+        chunks = list(analytics_export.iter_csv(dataset, chunk_size=4096))
+        assert len(chunks) > 1
+        assert len(_read_csv(chunks)) == 2001
+
+    def test_xlsx_writes_formulas_as_text(self, tmp_path):
+        if not analytics_export.XLSX_AVAILABLE:
+            pytest.skip('XlsxWriter não instalado')
+        import zipfile
+
+        path = str(tmp_path / 'export.xlsx')
+        analytics_export.write_xlsx(_dataset([(date(2024, 1, 2), '=1+1', 3)]), path)
+        with zipfile.ZipFile(path) as archive:
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+            strings = archive.read('xl/sharedStrings.xml').decode('utf-8') \
+                if 'xl/sharedStrings.xml' in archive.namelist() else sheet
+        assert '<f>' not in sheet
+        assert "'=1+1" in strings
+
+
+class TestTempFiles:
+    """Arquivos temporários da exportação são sempre removidos"""
+
+    def test_iter_file_removes_after_reading(self):
+        path = analytics_export.export_to_file(_dataset([(date(2024, 1, 2), 'a', 1)]), 'csv')
+        content = b''.join(analytics_export.iter_file(path, chunk_size=8))
+        assert content.startswith('﻿dia'.encode('utf-8'))
+        assert not os.path.exists(path)
+
+    def test_discard_file_is_idempotent(self):
+        path = analytics_export.export_to_file(_dataset([]), 'csv')
+        analytics_export.discard_file(path)
+        analytics_export.discard_file(path)
+        assert not os.path.exists(path)
+
+    def test_failed_writer_removes_file(self, monkeypatch):
+        created = []
+
+        def failing(dataset, path):
+            created.append(path)
+            raise RuntimeError('falha no meio da exportação')
+
+        monkeypatch.setitem(analytics_export.WRITERS, 'csv', failing)
+        with pytest.raises(RuntimeError):
+            analytics_export.export_to_file(_dataset([]), 'csv')
+        assert created and not os.path.exists(created[0])
+
+    def test_invalid_type(self):
+        with pytest.raises(analytics_export.ExportError):
+            analytics_export.export_to_file(_dataset([]), 'pdf')
+
+
+class TestLocalStorageDelivery:
+    """Storage local não gera URL assinada: a entrega por storage é recusada"""
+
+    @pytest.fixture
+    def storage(self, tmp_path, monkeypatch):
+        cloud_storage = pytest.importorskip('services.cloud_storage_service', exc_type=ImportError)
+        monkeypatch.setattr(cloud_storage.Config, 'LOCAL_STORAGE_PATH', str(tmp_path / 'uploads'), raising=False)
+        monkeypatch.setattr(cloud_storage.storage_service, 'provider', cloud_storage.LocalStorageProvider())
+        return tmp_path / 'uploads'
+
+    def test_local_provider_is_not_available(self, storage):
+        assert analytics_export.storage_delivery_available() is False
+
+    def test_store_export_refuses_and_cleans_up(self, storage):
+        path = analytics_export.export_to_file(_dataset([(date(2024, 1, 2), 'a', 1)]), 'csv')
+        with pytest.raises(analytics_export.ExportError):
+            analytics_export.store_export(path, 'analytics.csv', 1, 'text/csv')
+        assert not os.path.exists(path)
+        assert not any(storage.rglob('*.csv'))
@@ -0,0 +1,161 @@
+import json
+import random
+from collections import Counter
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.src.services import audit_store
+from backend.src.services.audit_store import COLUMNS, DAY, AuditEventStore, partition_name
+
+# 2026-03-30 00:00 UTC: a janela de testes atravessa a virada de março para abril
+BASE = datetime(2026, 3, 30, tzinfo=timezone.utc).timestamp()
+RISKS = ('low', 'medium', 'high', 'critical')
+TYPES = ('login', 'login_failed', 'document_view')
+
+
+def event(index, ts, event_type='login', risk='low', success=True, ip='10.0.0.1', user_id=1):
+    values = {'id': f'evt-{index}', 'ts': ts, 'event_type': event_type, 'user_id': user_id,
+              'ip_address': ip, 'action': 'test', 'details': json.dumps({'n': index}),
+              'risk_level': risk, 'success': int(success)}
+    return tuple(values.get(column) for column in COLUMNS)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AuditEventStore(str(tmp_path / 'audit.db'), retention_days=0)
+    conn = store.connect()
+    store.init_schema(conn)
+    yield store, conn
+    conn.close()
+
+
+@pytest.fixture
+def events():
+    rng = random.Random(7)
+    return [
+        event(index, BASE + rng.uniform(0, 4 * DAY), rng.choice(TYPES), rng.choice(RISKS),
+              rng.random() > 0.3, f'10.0.0.{rng.randrange(5)}', rng.randrange(1, 4))
+        for index in range(500)
+    ]
+
+
+def brute_force(rows, start_ts):
+    counts, ips = Counter(), Counter()
+    for row in rows:
+        if row[1] >= start_ts:
+            counts[row[11]] += 1
+            if row[11] in ('high', 'critical'):
+                ips[row[5]] += 1
+    return counts, ips
+
+
+class TestPartitions:
+    """Uma tabela por mês, criada na primeira escrita"""
+
+    def test_rows_go_to_their_month(self, store, events):
+        store, conn = store
+        store.insert_many(conn, events)
+        assert store.partitions(conn) == ['audit_events_p202604', 'audit_events_p202603']
+        for name in store.partitions(conn):
+            expected = sum(1 for row in events if partition_name(row[1]) == name)
+            assert conn.execute(f'SELECT COUNT(*) FROM {name}').fetchone()[0] == expected
+
+    def test_query_spans_partitions_newest_first(self, store, events):
+        store, conn = store
+        store.insert_many(conn, events)
+        found = store.query_events(conn, user_id=2, risk_level='high', limit=20)
+
+        expected = sorted((row for row in events if row[3] == 2 and row[11] == 'high'),
+                          key=lambda row: row[1], reverse=True)[:20]
+        assert [item['id'] for item in found] == [row[0] for row in expected]
+        assert found[0]['details'] == json.loads(expected[0][10])
+
+    def test_range_reads_only_its_partitions(self, store, events):
+        store, conn = store
+        store.insert_many(conn, events)
+        april = datetime(2026, 4, 1, tzinfo=timezone.utc).timestamp()
+        assert store._partitions_between(conn, april + DAY, None) == ['audit_events_p202604']
+        assert store._partitions_between(conn, None, april - 1) == ['audit_events_p202603']
+
+
+class TestRollupTriggers:
+    """Os triggers mantêm os rollups diários na mesma transação do INSERT"""
+
+    def test_daily_rollup_matches_rows(self, store, events):
+        store, conn = store
+        store.insert_many(conn, events[:250])
+        store.insert_many(conn, events[250:])
+
+        expected = Counter((int(row[1] // DAY), row[2], row[11], row[12]) for row in events)
+        rollup = {tuple(row[:4]): row[4] for row in conn.execute('SELECT * FROM audit_daily_rollup')}
+        assert rollup == dict(expected)
+
+    def test_ip_rollup_only_high_risk(self, store, events):
+        store, conn = store
+        store.insert_many(conn, events)
+
+        expected = Counter((int(row[1] // DAY), row[5]) for row in events if row[11] in ('high', 'critical'))
+        rollup = {tuple(row[:2]): row[2] for row in conn.execute('SELECT * FROM audit_daily_ip_rollup')}
+        assert rollup == dict(expected)
+
+    def test_duplicate_ids_are_counted_once(self, store):
+        store, conn = store
+        row = event(1, BASE + 10, risk='critical')
+        store.insert_many(conn, [row])
+        store.insert_many(conn, [row])
+        assert conn.execute('SELECT SUM(count) FROM audit_daily_rollup').fetchone()[0] == 1
+        assert conn.execute('SELECT SUM(count) FROM audit_daily_ip_rollup').fetchone()[0] == 1
+
+    @pytest.mark.parametrize('start_offset', [0, 0.5 * DAY, 1.75 * DAY, 3 * DAY + 1])
+    def test_summary_matches_brute_force(self, store, events, start_offset):
+        store, conn = store
+        store.insert_many(conn, events)
+        start_ts = BASE + start_offset
+
+        summary = store.summary(conn, start_ts, RISKS, 'login_failed')
+        counts, ips = brute_force(events, start_ts)
+        assert summary['total_events'] == sum(counts.values())
+        assert summary['risk_summary'] == {risk: counts[risk] for risk in RISKS}
+        assert {item['ip_address']: item['count'] for item in summary['suspicious_ips']} == dict(ips)
+        assert summary['failed_logins'] == sum(
+            1 for row in events if row[1] >= start_ts and row[2] == 'login_failed' and not row[12]
+        )
+
+
+class TestRetention:
+    """Retenção remove partições e dias de rollup inteiros"""
+
+    def test_drops_expired_months(self, store, events, monkeypatch):
+        store, conn = store
+        store.insert_many(conn, events)
+        # 39 dias antes de 10/05 é 01/04: março inteiro fora da janela, abril ainda dentro
+        monkeypatch.setattr(audit_store.time, 'time',
+                            lambda: datetime(2026, 5, 10, tzinfo=timezone.utc).timestamp())
+
+        assert store.apply_retention(conn, days=39) == ['audit_events_p202603']
+        assert store.partitions(conn) == ['audit_events_p202604']
+        cutoff_day = int(datetime(2026, 4, 1, tzinfo=timezone.utc).timestamp() // DAY)
+        assert conn.execute('SELECT MIN(day) FROM audit_daily_rollup').fetchone()[0] >= cutoff_day
+
+
+class TestLegacyMigration:
+    def test_single_table_is_moved(self, tmp_path):
+        path = str(tmp_path / 'audit.db')
+        conn = AuditEventStore(path).connect()
+        conn.execute(
+            'CREATE TABLE audit_events (id TEXT, timestamp TEXT, event_type TEXT, user_id INTEGER, '
+            'user_email TEXT, ip_address TEXT, user_agent TEXT, resource_type TEXT, resource_id TEXT, '
+            'action TEXT, details TEXT, risk_level TEXT, success BOOLEAN, error_message TEXT, '
+            'session_id TEXT, request_id TEXT)'
+        )
+        conn.execute("INSERT INTO audit_events (id, timestamp, event_type, ip_address, action, risk_level, "
+                     "success) VALUES ('a', '2026-03-31T10:00:00+00:00', 'login', '1.2.3.4', 'x', 'high', 1)")
+        conn.commit()
+
+        store = AuditEventStore(path, retention_days=0)
+        store.init_schema(conn)
+        assert store.partitions(conn) == ['audit_events_p202603']
+        assert [item['id'] for item in store.query_events(conn)] == ['a']
+        assert conn.execute('SELECT count FROM audit_daily_ip_rollup').fetchone()[0] == 1
+        conn.close()
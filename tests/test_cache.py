@@ -0,0 +1,198 @@
+import time
+import pickle
+import threading
+import pytest
+
+from datetime import datetime
+
+from src.cache.codec import Codec, FORMAT_MSGPACK, FORMAT_PICKLE, COMPRESSION_NONE
+from src.cache.local import LocalCache, MISSING
+from src.cache.tiered import TieredCache
+from src.cache.stampede import cached
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+class TestLocalCache:
+    """Testes para a camada de cache em memória"""
+
+    def test_lru_eviction(self):
+        """Entrada menos recente é removida quando o shard enche"""
+        cache = LocalCache(max_entries=2, shards=1)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is MISSING
+        assert cache.get('c') == 3
+        assert cache.stats()['evictions'] == 1
+
+    def test_ttl_expiry(self):
+        """Entrada expirada não é retornada"""
+        cache = LocalCache()
+        cache.set('a', 1, ttl=0.05)
+        assert cache.get('a') == 1
+        time.sleep(0.1)
+        assert cache.get('a') is MISSING
+
+
+class TestCodec:
+    """Testes para o codec de serialização do cache"""
+
+    def test_structured_roundtrip_with_header(self):
+        """Dicts usam o formato estruturado; cabeçalho identifica formato e compressão"""
+        codec = Codec(format='msgpack', compression='lz4', threshold=64)
+        value = {'id': 1, 'conteudo': 'cláusula ' * 100, 'tags': ['a', 'b']}
+        data = codec.encode(value)
+        assert data[0] >> 4 == FORMAT_MSGPACK
+        assert data[0] & 0x0F != COMPRESSION_NONE
+        assert codec.decode(memoryview(data)) == value
+
+    def test_falls_back_to_pickle_and_reads_legacy(self):
+        """Tipos fora do JSON usam pickle; valores antigos sem cabeçalho continuam legíveis"""
+        codec = Codec()
+        value = {'created_at': datetime(2025, 1, 1)}
+        data = codec.encode(value)
+        assert data[0] >> 4 == FORMAT_PICKLE
+        assert codec.decode(data) == value
+        assert codec.decode(pickle.dumps(value, protocol=4)) == value
+
+
+class TestTieredCache:
+    """Testes para o cache em duas camadas"""
+
+    @pytest.fixture
+    def server(self):
+        return fakeredis.FakeServer()
+
+    def _cache(self, server):
+        return TieredCache(redis_client=fakeredis.FakeRedis(server=server))
+
+    def test_redis_hit_promotes_to_local(self, server):
+        """Hit no Redis popula o L1 do outro worker"""
+        writer, reader = self._cache(server), self._cache(server)
+        writer.set('jurisia:user:1', {'nome': 'Ana'})
+
+        assert reader.get('jurisia:user:1') == {'nome': 'Ana'}
+        assert reader.get('jurisia:user:1') == {'nome': 'Ana'}
+
+        stats = reader.stats()['namespaces']['user']
+        assert stats['redis_hits'] == 1
+        assert stats['local_hits'] == 1
+        assert stats['hit_ratio'] == 1.0
+
+    def test_pubsub_invalidation(self, server):
+        """Escrita em um worker invalida o L1 dos demais"""
+        first, second = self._cache(server), self._cache(server)
+        second.start_invalidation_listener()
+        try:
+            time.sleep(0.2)
+            first.set('jurisia:doc:1', 'v1')
+            assert second.get('jurisia:doc:1') == 'v1'
+
+            first.set('jurisia:doc:1', 'v2')
+            deadline = time.time() + 2
+            while time.time() < deadline and second.local.get('jurisia:doc:1') is not MISSING:
+                time.sleep(0.05)
+            assert second.get('jurisia:doc:1') == 'v2'
+        finally:
+            second.stop_invalidation_listener()
+
+    def test_miss_metrics(self, server):
+        """Misses são contabilizados por namespace"""
+        cache = self._cache(server)
+        assert cache.get('jurisia:search:x', 'default') == 'default'
+        assert cache.stats()['namespaces']['search']['misses'] == 1
+
+    def test_tag_invalidation(self, server):
+        """Invalidar uma tag remove só as entradas marcadas, também no L1 dos outros workers"""
+        first, second = self._cache(server), self._cache(server)
+        first.set('jurisia:document:42', {'id': 42}, tags=['document:42'])
+        first.set('jurisia:search:abc', ['42'], tags=['document:42', 'user:7'])
+        first.set('jurisia:document:43', {'id': 43}, tags=['document:43'])
+        assert second.get('jurisia:search:abc') == ['42']
+
+        assert first.invalidate_tags('document:42') == 2
+        second.handle_invalidation(
+            '{"keys": ["jurisia:document:42", "jurisia:search:abc"], "origin": "x"}'
+        )
+        assert second.get('jurisia:search:abc') is None
+        assert first.get('jurisia:document:42') is None
+        assert first.get('jurisia:document:43') == {'id': 43}
+        assert not first.redis.exists(first.tag_key('document:42'))
+
+    def test_tag_invalidation_without_redis(self):
+        """Sem Redis o índice de tags é mantido em memória"""
+        cache = TieredCache()
+        cache.set('jurisia:user:7', 'u', tags=['user:7'])
+        cache.set('jurisia:user:8', 'v', tags=['user:8'])
+        assert cache.invalidate_tags('user:7') == 1
+        assert cache.get('jurisia:user:7') is None
+        assert cache.get('jurisia:user:8') == 'v'
+
+
+class TestStampedeProtection:
+    """Testes para o decorador cached com proteção contra stampede"""
+
+    def _run_concurrently(self, func, count=20):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(func())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_single_flight_on_miss(self):
+        """Chamadas concorrentes em um miss executam a função uma única vez"""
+        calls = []
+
+        @cached('test:overview', ttl=60, cache=TieredCache(), key_builder=lambda: 'k')
+        def overview():
+            calls.append(1)
+            time.sleep(0.1)
+            return {'total': 10}
+
+        assert self._run_concurrently(overview) == [{'total': 10}] * 20
+        assert len(calls) == 1
+
+    def test_single_flight_across_processes(self):
+        """Workers distintos compartilham a recomputação via lock no Redis"""
+        server = fakeredis.FakeServer()
+        calls = []
+
+        def make_worker():
+            @cached('test:shared', ttl=60, beta=0, key_builder=lambda: 'k',
+                    cache=TieredCache(redis_client=fakeredis.FakeRedis(server=server)))
+            def compute():
+                calls.append(1)
+                time.sleep(0.2)
+                return 'v'
+            return compute
+
+        workers = [make_worker() for _ in range(4)]
+        threads = [threading.Thread(target=worker) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+
+    def test_serves_stale_while_revalidating(self):
+        """Valor vencido é servido enquanto um único chamador recomputa"""
+        calls = []
+
+        @cached('test:stale', ttl=1, stale_ttl=60, beta=0, cache=TieredCache(), key_builder=lambda: 'k')
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return len(calls)
+
+        assert compute() == 1
+        time.sleep(1.1)
+        results = self._run_concurrently(compute, count=10)
+        assert sorted(results) == [1] * 9 + [2]
+        assert len(calls) == 2
+        assert compute.stampede.metrics()['stale_served'] == 9
@@ -0,0 +1,82 @@
+import pytest
+
+from src.websocket.coalescer import RoomEventCoalescer
+
+
+class _Emitter:
+    def __init__(self):
+        self.frames = []
+
+    def __call__(self, event, frame, room=None, skip_sid=None):
+        self.frames.append({'to': room, 'skip_sid': sorted(skip_sid or []),
+                            'cursors': [c['user_id'] for c in frame['cursors']],
+                            'typing': [(t['user_id'], t['typing']) for t in frame['typing']]})
+
+
+@pytest.fixture
+def emitter():
+    return _Emitter()
+
+
+@pytest.fixture
+def coalescer(emitter):
+    return RoomEventCoalescer(emitter)
+
+
+class TestCoalescing:
+    """Só o último cursor e as mudanças de estado de digitação são enviados"""
+
+    def test_last_cursor_wins(self, coalescer, emitter):
+        for position in range(5):
+            coalescer.cursor('doc_1', 1, {'user_id': 1, 'position': position})
+        coalescer.flush()
+
+        assert emitter.frames == [{'to': 'doc_1', 'skip_sid': [], 'cursors': [1], 'typing': []}]
+        assert coalescer.metrics()['coalesced'] == 4
+
+    def test_repeated_typing_start_is_dropped(self, coalescer, emitter):
+        coalescer.typing('doc_1', 1, 'ana', True)
+        coalescer.flush()
+        coalescer.typing('doc_1', 1, 'ana', True)
+        coalescer.flush()
+        assert [frame['typing'] for frame in emitter.frames] == [[(1, True)]]
+
+    def test_start_and_stop_in_same_tick_cancel(self, coalescer, emitter):
+        coalescer.typing('doc_1', 1, 'ana', True)
+        coalescer.typing('doc_1', 1, 'ana', False)
+        coalescer.flush()
+        assert emitter.frames == []
+
+
+class TestSenderExclusion:
+    """Como include_self=False: ninguém recebe o próprio cursor/digitação de volta"""
+
+    def test_sender_does_not_receive_own_cursor(self, coalescer, emitter):
+        coalescer.cursor('doc_1', 1, {'user_id': 1}, sid='sid-ana')
+        coalescer.flush()
+
+        # Só a sala, sem o remetente; o frame individual dele ficaria vazio e não é enviado
+        assert emitter.frames == [{'to': 'doc_1', 'skip_sid': ['sid-ana'], 'cursors': [1], 'typing': []}]
+
+    def test_each_sender_receives_the_others(self, coalescer, emitter):
+        coalescer.cursor('doc_1', 1, {'user_id': 1}, sid='sid-ana')
+        coalescer.cursor('doc_1', 2, {'user_id': 2}, sid='sid-bia')
+        coalescer.typing('doc_1', 2, 'bia', True, sid='sid-bia')
+        coalescer.flush()
+
+        by_target = {frame['to']: frame for frame in emitter.frames}
+        assert by_target['doc_1'] == {'to': 'doc_1', 'skip_sid': ['sid-ana', 'sid-bia'],
+                                      'cursors': [1, 2], 'typing': [(2, True)]}
+        assert by_target['sid-ana']['cursors'] == [2]
+        assert by_target['sid-ana']['typing'] == [(2, True)]
+        assert by_target['sid-bia']['cursors'] == [1]
+        assert by_target['sid-bia']['typing'] == []
+
+    def test_server_generated_events_go_to_everyone(self, coalescer, emitter):
+        coalescer.typing('doc_1', 1, 'ana', True, sid='sid-ana')
+        coalescer.flush()
+        emitter.frames.clear()
+
+        coalescer.forget(1)
+        coalescer.flush()
+        assert emitter.frames == [{'to': 'doc_1', 'skip_sid': [], 'cursors': [], 'typing': [(1, False)]}]
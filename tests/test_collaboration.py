@@ -0,0 +1,173 @@
+import random
+import pytest
+
+from src.websocket.collaboration import (
+    CollaborationEngine, DocumentSession, OperationError, RedisDocumentSession,
+    StaleRevisionError, apply_operation, normalize, transform
+)
+
+
+def _converge(text, a, b):
+    """Aplica a;b' e b;a' e retorna os dois documentos resultantes"""
+    a_prime, b_prime = transform(a, b)
+    return (apply_operation(apply_operation(text, a), b_prime),
+            apply_operation(apply_operation(text, b), a_prime))
+
+
+def _random_operation(rng, text):
+    operation = []
+    index = 0
+    while index < len(text):
+        length = rng.randint(1, min(4, len(text) - index))
+        roll = rng.random()
+        if roll < 0.4:
+            operation.append(length)
+            index += length
+        elif roll < 0.7:
+            operation.append(-length)
+            index += length
+        else:
+            operation.append(rng.choice(['x', 'yz', 'Q']))
+    if rng.random() < 0.5:
+        operation.append('fim')
+    return normalize(operation)
+
+
+class TestTransform:
+    """Testes de convergência do transform"""
+
+    def test_insert_at_same_position(self):
+        """Inserções na mesma posição convergem; a primeira operação fica antes"""
+        left, right = _converge('abc', [1, 'X', 2], [1, 'Y', 2])
+        assert left == right == 'aXYbc'
+
+    def test_delete_delete_overlap(self):
+        """Remoções sobrepostas removem o trecho uma única vez"""
+        left, right = _converge('abcdef', [1, -3, 2], [2, -3, 1])
+        assert left == right == 'af'
+
+    def test_same_delete(self):
+        """Remoção idêntica dos dois lados vira no-op na transformada"""
+        a_prime, b_prime = transform([1, -2, 1], [1, -2, 1])
+        assert a_prime == b_prime == [2]
+
+    def test_insert_inside_deleted_range(self):
+        """Texto inserido dentro de um trecho removido por outro sobrevive"""
+        left, right = _converge('abcdef', [3, 'X', 3], [1, -4, 1])
+        assert left == right == 'aXf'
+
+    def test_random_operations_converge(self):
+        """apply(apply(t, a), b') == apply(apply(t, b), a') para operações aleatórias"""
+        for seed in range(2000):
+            rng = random.Random(seed)
+            text = ''.join(rng.choice('abcdef') for _ in range(rng.randint(0, 12)))
+            a, b = _random_operation(rng, text), _random_operation(rng, text)
+            left, right = _converge(text, a, b)
+            assert left == right, (text, a, b)
+
+    def test_base_length_mismatch(self):
+        with pytest.raises(OperationError):
+            transform([3], [4])
+
+
+class TestDocumentSession:
+    """Testes da sessão de documento (histórico e revisões)"""
+
+    def test_concurrent_operations_are_rebased(self):
+        """Duas edições na mesma revisão: a segunda é transformada contra a primeira"""
+        session = DocumentSession(1, 'contrato')
+        session.apply(0, ['Novo ', 8], user_id=1)
+        transformed, revision = session.apply(0, [8, '.'], user_id=2)
+
+        assert session.text == 'Novo contrato.'
+        assert transformed == [13, '.']
+        assert revision == 2
+
+    def test_stale_revision_replays_history(self):
+        """Cliente três revisões atrás converge com quem já viu todas"""
+        session = DocumentSession(1, 'abc')
+        local = [3, 'Z']
+        for index, operation in enumerate([['1', 3], [4, '2'], [1, -1, 3]]):
+            session.apply(index, operation, user_id=1)
+
+        transformed, revision = session.apply(0, local, user_id=2)
+
+        # O cliente recebe as três operações do servidor transformadas contra a sua
+        client_text = apply_operation('abc', local)
+        for entry in list(session.history)[:3]:
+            _, server_prime = transform(local, entry['operation'])
+            local, _ = transform(local, entry['operation'])
+            client_text = apply_operation(client_text, server_prime)
+        assert client_text == session.text == '1bcZ2'
+        assert revision == 4
+
+    def test_revision_outside_history(self, monkeypatch):
+        """Revisão futura ou anterior ao histórico mantido exige ressincronização"""
+        monkeypatch.setattr(DocumentSession, 'HISTORY_SIZE', 2)
+        session = DocumentSession(1, 'abc')
+        with pytest.raises(StaleRevisionError):
+            session.apply(1, [3], user_id=1)
+
+        for revision in range(3):
+            session.apply(revision, [3 + revision, 'x'], user_id=1)
+        with pytest.raises(StaleRevisionError):
+            session.apply(0, [3, 'y'], user_id=2)
+        assert session.apply(1, [4, 'y'], user_id=2)[1] == 4
+
+    def test_pending_content_is_persisted_in_batch(self):
+        """Alterações são entregues ao persister uma vez, depois do debounce"""
+        batches = []
+        engine = CollaborationEngine(loader=lambda document_id: 'abc', persister=batches.append,
+                                     debounce=0, max_delay=0)
+        engine.apply(7, 0, [3, 'd'], user_id=3)
+        engine.apply(7, 1, [4, 'e'], user_id=3)
+
+        assert engine.flush() == 1
+        assert batches == [[{'id': 7, 'conteudo': 'abcde', 'ultima_edicao_user_id': 3}]]
+        assert engine.flush() == 0
+
+    def test_failed_persist_keeps_document_dirty(self):
+        def failing(batch):
+            raise RuntimeError('banco indisponível')
+
+        engine = CollaborationEngine(loader=lambda document_id: 'abc', persister=failing,
+                                     debounce=0, max_delay=0)
+        engine.apply(7, 0, [3, 'd'], user_id=3)
+        assert engine.flush() == 0
+        assert engine.get_session(7).dirty_since is not None
+
+
+class TestRedisDocumentSession:
+    """Estado compartilhado entre workers via Redis"""
+
+    @pytest.fixture
+    def redis_client(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        return fakeredis.FakeRedis()
+
+    def test_workers_converge(self, redis_client):
+        """Dois workers aplicando edições concorrentes chegam ao mesmo documento"""
+        worker_a = CollaborationEngine(loader=lambda document_id: 'abc', redis_client=redis_client)
+        worker_b = CollaborationEngine(loader=lambda document_id: 'ignorado', redis_client=redis_client)
+
+        worker_a.apply(1, 0, [1, -1, 1], user_id=1)
+        transformed, revision = worker_b.apply(1, 0, [2, 'X', 1], user_id=2)
+
+        assert transformed == [1, 'X', 1]
+        assert revision == 2
+        assert worker_a.snapshot(1)['content'] == worker_b.snapshot(1)['content'] == 'aXc'
+
+    def test_pending_is_claimed_once(self, redis_client):
+        """Só um worker persiste cada lote (ZREM como claim)"""
+        first = RedisDocumentSession(redis_client, 1, 'abc')
+        second = RedisDocumentSession(redis_client, 1, 'abc')
+        first.apply(0, [3, 'd'], user_id=5)
+
+        pending = first.take_pending(debounce=0, max_delay=0)
+        assert pending == {'id': 1, 'conteudo': 'abcd', 'ultima_edicao_user_id': 5}
+        assert second.take_pending(debounce=0, max_delay=0) is None
+
+    def test_stale_revision(self, redis_client):
+        session = RedisDocumentSession(redis_client, 1, 'abc')
+        with pytest.raises(StaleRevisionError):
+            session.apply(3, [3, 'x'], user_id=1)
@@ -0,0 +1,140 @@
+import gzip
+import json
+
+import pytest
+from flask import Flask, Response, send_file
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+from src.performance.compression import BROTLI_AVAILABLE, ResponseCompressor, init_compression
+
+PAYLOAD = {'itens': [{'id': n, 'titulo': f'Contrato {n}'} for n in range(200)]}
+
+
+class _Rows:
+    """Iterável com recurso próprio (como um cursor ou arquivo aberto)"""
+
+    def __init__(self, closed):
+        self.closed = closed
+
+    def __iter__(self):
+        for n in range(100):
+            yield f'{n},linha {n}\n'
+
+    def close(self):
+        self.closed.append(True)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config['COMPRESS_MIN_SIZE'] = 500
+    closed = []
+
+    @app.route('/json')
+    def as_json():
+        return PAYLOAD
+
+    @app.route('/pequeno')
+    def small():
+        return {'ok': True}
+
+    @app.route('/pdf')
+    def pdf():
+        return Response(b'%PDF-1.4 ' + b'x' * 5000, mimetype='application/pdf')
+
+    @app.route('/eventos')
+    def events():
+        return Response('data: x\n\n' * 500, mimetype='text/event-stream')
+
+    @app.route('/stream')
+    def stream():
+        return Response(_Rows(closed), mimetype='text/csv')
+
+    @app.route('/arquivo')
+    def file():
+        path = tmp_path / 'dados.txt'
+        path.write_text('texto ' * 2000)
+        return send_file(str(path), mimetype='text/plain')
+
+    app.closed = closed
+    init_compression(app)
+    return app
+
+
+class TestNegotiation:
+    """Escolha da codificação a partir do Accept-Encoding"""
+
+    def _negotiate(self, header):
+        return ResponseCompressor().negotiate(parse_accept_header(header, Accept))
+
+    def test_gzip(self):
+        assert self._negotiate('gzip, deflate') == 'gzip'
+
+    def test_identity_only(self):
+        assert self._negotiate('identity') is None
+        assert self._negotiate('') is None
+
+    def test_q_zero_is_refused(self):
+        assert self._negotiate('gzip;q=0, identity') is None
+
+    def test_brotli_preferred_on_tie(self):
+        expected = 'br' if BROTLI_AVAILABLE else 'gzip'
+        assert self._negotiate('gzip, br') == expected
+
+    def test_higher_quality_wins(self):
+        assert self._negotiate('br;q=0.1, gzip;q=0.9') == 'gzip'
+
+
+class TestResponses:
+    """Compressão efetiva do corpo, tipos ignorados e Vary"""
+
+    def test_json_is_gzipped(self, app):
+        response = app.test_client().get('/json', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert json.loads(gzip.decompress(response.data)) == PAYLOAD
+
+    def test_vary_without_accept_encoding(self, app):
+        response = app.test_client().get('/json')
+        assert 'Content-Encoding' not in response.headers
+        assert 'Accept-Encoding' in response.headers['Vary']
+
+    def test_small_body_is_kept(self, app):
+        response = app.test_client().get('/pequeno', headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+    @pytest.mark.parametrize('path', ['/pdf', '/eventos', '/arquivo'])
+    def test_skipped_types(self, app, path):
+        response = app.test_client().get(path, headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+
+    def test_skipped_binary_has_no_vary(self, app):
+        response = app.test_client().get('/pdf', headers={'Accept-Encoding': 'gzip'})
+        assert 'Accept-Encoding' not in response.headers.get('Vary', '')
+
+    def test_streamed_body(self, app):
+        response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        assert gzip.decompress(response.data).decode().splitlines()[-1] == '99,linha 99'
+        response.close()
+        assert app.closed == [True]
+
+
+class TestStreamClose:
+    """O iterável original fecha com a resposta, mesmo sem ter sido iterado"""
+
+    def test_close_without_iterating(self, app):
+        with app.test_request_context('/stream', headers={'Accept-Encoding': 'gzip'}):
+            response = app.full_dispatch_request()
+            assert response.headers['Content-Encoding'] == 'gzip'
+            response.close()
+        assert app.closed == [True]
+
+    def test_close_after_partial_read(self, app):
+        response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'},
+                                         buffered=False)
+        next(iter(response.response))
+        response.close()
+        assert app.closed == [True]
@@ -0,0 +1,118 @@
+import pytest
+
+from frontend.src.services import disk_cache
+from frontend.src.services.disk_cache import MISSING, DiskCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(disk_cache.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / 'cache' / 'cache.sqlite3'))
+    yield cache
+    cache.close()
+
+
+def stored(cache):
+    """Totais recontados direto da tabela, para comparar com os dos triggers"""
+    return cache._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+
+
+class TestEntries:
+    def test_round_trip_and_default(self, cache):
+        cache.set('a', {'itens': [1, 2]}, ttl=60)
+        assert cache.get('a') == {'itens': [1, 2]}
+        assert cache.get('b') is MISSING
+        assert cache.get('b', None) is None
+        assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 2)
+
+    def test_expiry(self, cache, clock):
+        cache.set('a', 1, ttl=60)
+        clock[0] += 61
+        assert cache.get('a') is MISSING
+        assert cache.stats()['entries'] == 0
+
+    def test_cleanup_expired(self, cache, clock):
+        cache.set('curto', 1, ttl=10)
+        cache.set('longo', 2, ttl=100)
+        clock[0] += 50
+        assert cache.cleanup_expired() == 1
+        assert cache.get('longo') == 2
+
+    def test_corrupted_entry_is_dropped(self, cache):
+        cache.set('a', 1, ttl=60)
+        cache._conn.execute("UPDATE entries SET value = x'00' WHERE key = 'a'")
+        assert cache.get('a') is MISSING
+        assert cache.stats()['entries'] == 0
+
+    def test_persists_across_instances(self, tmp_path, clock):
+        path = str(tmp_path / 'cache.sqlite3')
+        first = DiskCache(path)
+        first.set('a', 'valor', ttl=60)
+        first.close()
+
+        second = DiskCache(path)
+        assert second.get('a') == 'valor'
+        second.close()
+
+
+class TestTotals:
+    """Os triggers mantêm entradas e bytes iguais à recontagem da tabela"""
+
+    def test_insert_update_delete(self, cache):
+        cache.set('a', 'x' * 100, ttl=60)
+        cache.set('b', 'y' * 300, ttl=60)
+        cache.set('a', 'x' * 1000, ttl=60)
+        cache.delete('b')
+        stats = cache.stats()
+        assert (stats['entries'], stats['bytes']) == stored(cache)
+        assert stats['entries'] == 1
+
+        cache.clear()
+        assert (cache.stats()['entries'], cache.stats()['bytes']) == (0, 0)
+
+
+class TestEviction:
+    """Acima do limite, saem primeiro os expirados e depois os menos acessados"""
+
+    def test_least_recently_accessed_is_evicted(self, tmp_path, clock):
+        cache = DiskCache(str(tmp_path / 'cache.sqlite3'), max_bytes=3000)
+        for index in range(5):
+            cache.set(f'k{index}', 'x' * 500, ttl=3600)
+            clock[0] += DiskCache.TOUCH_INTERVAL + 1
+        cache.get('k0')   # acesso recente: k0 sobrevive
+        clock[0] += 1
+        cache.set('k5', 'x' * 1000, ttl=3600)
+
+        stats = cache.stats()
+        assert stats['bytes'] <= 3000 * 0.9
+        assert (stats['entries'], stats['bytes']) == stored(cache)
+        assert stats['evictions'] > 0
+        assert cache.get('k0') != MISSING
+        assert cache.get('k5') != MISSING
+        assert cache.get('k1') is MISSING
+        cache.close()
+
+    def test_expired_go_first(self, tmp_path, clock):
+        cache = DiskCache(str(tmp_path / 'cache.sqlite3'), max_bytes=2000)
+        cache.set('velho', 'x' * 900, ttl=10)
+        cache.set('novo', 'x' * 500, ttl=3600)
+        clock[0] += 20
+        cache.set('outro', 'x' * 700, ttl=3600)
+
+        assert cache.stats()['evictions'] == 0
+        assert cache.get('novo') != MISSING
+        assert cache.get('outro') != MISSING
+        cache.close()
+
+    def test_touch_is_throttled(self, cache, clock):
+        cache.set('a', 1, ttl=3600)
+        clock[0] += DiskCache.TOUCH_INTERVAL - 1
+        cache.get('a')
+        accessed = cache._conn.execute("SELECT accessed_at FROM entries WHERE key = 'a'").fetchone()[0]
+        assert accessed == 1000.0
@@ -0,0 +1,87 @@
+import os
+import sys
+from datetime import date
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+forecasting = pytest.importorskip('analytics.forecasting', exc_type=ImportError)
+SeriesModel = forecasting.SeriesModel
+
+START = date(2024, 1, 1)
+
+
+def fit(values, labels=('serie',)):
+    return SeriesModel.fit('teste', labels, START, np.asarray(values, dtype=float), '2026-01-01')
+
+
+class TestDegenerateSeries:
+    """Séries vazias, curtas ou constantes não quebram o ajuste"""
+
+    def test_all_zeros(self):
+        model = fit(np.zeros(730))
+        total, low, high = model.forecast(30)
+        assert (total[0], low[0], high[0]) == (0.0, 0.0, 0.0)
+        assert model.accuracy[0] == 0.0
+        assert model.monthly_change()[0] == 0.0
+        assert model.seasonal_effect(30)[0] == 0.0
+
+    def test_single_observation(self):
+        values = np.zeros(730)
+        values[-1] = 5
+        model = fit(values)
+        assert (model.days, model.trend, model.weekly, model.yearly) == (1, False, 0, 0)
+        assert model.predict(7)[:, 0] == pytest.approx([5.0] * 7)
+        assert np.isfinite(model.residual_std).all()
+
+    def test_leading_zeros_are_not_history(self):
+        values = np.zeros(730)
+        values[-20:] = 3
+        model = fit(values)
+        assert model.days == 20
+        assert model.start == START.toordinal() + 710
+        assert (model.trend, model.weekly) == (True, 0)
+
+    def test_constant(self):
+        model = fit(np.full(400, 10.0))
+        assert model.predict(14)[:, 0] == pytest.approx([10.0] * 14)
+        assert model.residual_std[0] == pytest.approx(0.0, abs=1e-9)
+        assert model.accuracy[0] == pytest.approx(1.0)
+        assert model.monthly_change()[0] == pytest.approx(0.0, abs=1e-9)
+
+    def test_forecast_never_negative(self):
+        model = fit(np.linspace(100, 1, 60))
+        total, low, _ = model.forecast(365)
+        assert (model.predict(365) >= 0).all()
+        assert total[0] >= 0 and low[0] >= 0
+
+
+class TestFit:
+    """Tendência, sazonalidade e várias colunas no mesmo ajuste"""
+
+    def test_linear_trend(self):
+        model = fit(2.0 * np.arange(100) + 10)
+        assert model.slope[0] == pytest.approx(2.0)
+        assert model.predict(3)[:, 0] == pytest.approx([210.0, 212.0, 214.0])
+
+    def test_weekly_pattern(self):
+        week = np.array([10, 12, 11, 13, 15, 2, 1], dtype=float)
+        model = fit(np.tile(week, 20))
+        assert model.weekly == forecasting.WEEKLY_HARMONICS
+        assert model.predict(7)[:, 0] == pytest.approx(week, abs=1e-6)
+
+    def test_columns_are_independent(self):
+        values = np.column_stack([np.full(60, 4.0), np.zeros(60)])
+        model = fit(values, labels=('civil', 'trabalhista'))
+        assert model.predict(5).shape == (5, 2)
+        assert model.predict(5)[:, 0] == pytest.approx([4.0] * 5)
+        assert model.predict(5)[:, 1] == pytest.approx([0.0] * 5)
+        assert model.accuracy.tolist() == pytest.approx([1.0, 0.0])
+
+    def test_cache_round_trip(self):
+        model = fit(np.tile([1, 2, 3, 4, 5, 0, 0], 10))
+        restored = SeriesModel.from_dict(model.to_dict())
+        assert restored.predict(10) == pytest.approx(model.predict(10))
+        assert restored.forecast(10)[2] == pytest.approx(model.forecast(10)[2])
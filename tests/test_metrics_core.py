@@ -0,0 +1,132 @@
+import random
+import threading
+
+import pytest
+
+from src.monitoring import metrics_core
+from src.monitoring.metrics_core import (
+    BUCKET_LOWER, BUCKET_UPPER, BUCKETS, Counter, Histogram, MetricsRegistry, Window, bucket_index
+)
+
+# Interpolação dentro do bucket: erro relativo de até uma largura (1/8 da oitava)
+MAX_ERROR = 1 / 8
+
+
+def exact(values, q):
+    ordered = sorted(values)
+    return ordered[max(0, int(round(q * len(ordered))) - 1)]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(metrics_core, '_monotonic', lambda: now[0])
+    return now
+
+
+class TestBuckets:
+    """Cada valor cai no bucket cujos limites o contêm"""
+
+    @pytest.mark.parametrize('value', [0.001, 0.5, 1.0, 1.07, 3.3, 250.0, 99999.9])
+    def test_value_within_bounds(self, value):
+        index = bucket_index(value)
+        assert BUCKET_LOWER[index] <= value < BUCKET_UPPER[index]
+
+    def test_out_of_range(self):
+        assert bucket_index(0) == bucket_index(-5) == bucket_index(1e-9) == 0
+        assert bucket_index(1e12) == BUCKETS - 1
+
+
+class TestQuantileAccuracy:
+    """Quantis dentro do erro relativo dos buckets contra o valor exato"""
+
+    @pytest.mark.parametrize('distribution', ['uniform', 'lognormal', 'exponential'])
+    def test_against_exact_percentiles(self, distribution):
+        rng = random.Random(42)
+        generate = {
+            'uniform': lambda: rng.uniform(1, 1000),
+            'lognormal': lambda: rng.lognormvariate(3, 1.2),
+            'exponential': lambda: rng.expovariate(1 / 50),
+        }[distribution]
+        values = [generate() for _ in range(20000)]
+        histogram = Histogram('latencia')
+        for value in values:
+            histogram.observe(value)
+
+        summary = histogram.summary()
+        for q in (0.5, 0.95, 0.99):
+            expected = exact(values, q)
+            assert abs(summary[f'p{int(q * 100)}'] - expected) / expected <= MAX_ERROR
+
+    def test_single_value_is_exact(self):
+        histogram = Histogram('latencia')
+        for _ in range(10):
+            histogram.observe(42.0)
+        assert histogram.summary() == {'count': 10, 'sum': 420.0, 'avg': 42.0, 'min': 42.0,
+                                       'max': 42.0, 'p50': 42.0, 'p95': 42.0, 'p99': 42.0}
+
+    def test_empty(self):
+        assert Histogram('latencia').summary()['p99'] == 0.0
+
+
+class TestShards:
+    """Shards por thread somam nas leituras, inclusive de threads encerradas"""
+
+    def test_threads_are_merged(self):
+        counter, histogram = Counter('req'), Histogram('latencia')
+
+        def work():
+            for _ in range(1000):
+                counter.inc()
+                histogram.observe(10.0)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        del threads
+
+        assert counter.value == 4000
+        assert histogram.summary()['count'] == 4000
+        # Shards de threads encerradas vão para o agregado aposentado
+        assert len(counter._cells) == 0
+
+
+class TestWindow:
+    """Eventos fora da janela deslizante deixam de contar"""
+
+    def test_counter_window(self, clock):
+        counter = Counter('req', window=Window(seconds=60, slots=6))
+        counter.inc(5)
+        clock[0] += 30
+        counter.inc(3)
+        assert counter.window_total() == 8
+
+        clock[0] += 40
+        assert counter.window_total() == 3
+        clock[0] += 60
+        assert counter.window_total() == 0
+        assert counter.value == 8
+
+    def test_histogram_window_quantiles(self, clock):
+        histogram = Histogram('latencia', window=Window(seconds=60, slots=6))
+        for _ in range(100):
+            histogram.observe(1000.0)
+        clock[0] += 90
+        for _ in range(100):
+            histogram.observe(10.0)
+
+        window = histogram.window_summary()
+        assert window['count'] == 100
+        assert abs(window['p99'] - 10.0) / 10.0 <= MAX_ERROR
+        assert histogram.summary()['p99'] == pytest.approx(1000.0, rel=MAX_ERROR)
+
+
+class TestRegistry:
+    def test_same_labels_same_metric(self):
+        registry = MetricsRegistry()
+        first = registry.counter('req', {'rota': '/a', 'metodo': 'GET'})
+        assert registry.counter('req', {'metodo': 'GET', 'rota': '/a'}) is first
+        first.inc()
+        assert registry.snapshot()['counters'] == {'req#metodo=GET,rota=/a': {'value': 1}}
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+from src.services import metrics_benchmark, metrics_query
+from src.services.metrics_benchmark import documents
+from src.services.metrics_query import MetricsQuery
+
+NOW = datetime(2026, 1, 1, 12)
+
+
+@pytest.fixture(params=['filter', 'case'])
+def dialect(request, monkeypatch):
+    """FILTER (WHERE ...) e o fallback SUM(CASE ...) rodam no mesmo SQLite"""
+    if request.param == 'case':
+        monkeypatch.setattr(metrics_query, 'supports_filter_clause', lambda dialect_name: False)
+    return request.param
+
+
+@pytest.fixture(scope='module')
+def engine(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('metrics') / 'metrics.db')
+    metrics_benchmark.seed(path, total=3000, users=5, days=120, now=NOW)
+    engine = create_engine(f'sqlite:///{path}')
+    yield engine
+    engine.dispose()
+
+
+class TestStatement:
+    def test_filter_clause(self, dialect):
+        d = documents.c
+        sql = str(MetricsQuery(dialect='sqlite').count('criados', d.tipo == 'contract')
+                  .sum('tamanho', d.tamanho_estimado, d.tipo == 'contract').statement())
+        if dialect == 'filter':
+            assert sql.count('FILTER (WHERE') == 2 and 'CASE' not in sql
+        else:
+            assert sql.count('CASE WHEN') == 2 and 'FILTER' not in sql
+
+
+class TestEquivalence:
+    """O SELECT único devolve as mesmas métricas que as consultas separadas"""
+
+    @pytest.mark.parametrize('user_id', [1, 3, 5])
+    def test_matches_legacy(self, engine, dialect, user_id):
+        start, end = NOW - timedelta(days=30), NOW
+        with engine.connect() as conn:
+            expected = metrics_benchmark.legacy(conn, user_id, start, end)
+            actual = metrics_benchmark.single_select(conn, user_id, start, end)
+
+        assert actual['avg_size'] == pytest.approx(expected.pop('avg_size'))
+        actual.pop('avg_size')
+        assert actual == expected
+
+    def test_user_without_documents(self, engine, dialect):
+        start, end = NOW - timedelta(days=30), NOW
+        with engine.connect() as conn:
+            expected = metrics_benchmark.legacy(conn, 999, start, end)
+            actual = metrics_benchmark.single_select(conn, 999, start, end)
+        assert actual == expected == {'created': 0, 'updated': 0, 'total': 0, 'by_type': {},
+                                      'avg_size': 0, 'previous': 0, 'current': 0}
+
+    def test_empty_conditions_coalesce(self, engine, dialect):
+        d = documents.c
+        with engine.connect() as conn:
+            row = MetricsQuery(where=(d.user_id == 1,), dialect='sqlite') \
+                .count('nenhum', d.tipo == 'inexistente') \
+                .sum('tamanho', d.tamanho_estimado, d.tipo == 'inexistente') \
+                .avg('media', d.tamanho_estimado, d.tipo == 'inexistente') \
+                .count('todos') \
+                .one(conn)
+            total = conn.execute(documents.select().where(d.user_id == 1)).all()
+        # COUNT e SUM viram 0; AVG sem linhas continua NULL
+        assert row == {'nenhum': 0, 'tamanho': 0, 'media': None, 'todos': len(total)}
@@ -0,0 +1,143 @@
+import os
+import smtplib
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+email_service = pytest.importorskip('services.email_service', exc_type=ImportError)
+
+
+class _SMTP:
+    """Conexão SMTP simulada; registra os destinatários entregues"""
+
+    def __init__(self, log, refuse=(), fail=False):
+        self.log = log
+        self.refuse = refuse
+        self.fail = fail
+        log['connections'] += 1
+
+    def __enter__(self):
+        if self.fail:
+            raise smtplib.SMTPServerDisconnected('conexão perdida')
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def send_message(self, message):
+        if message['To'] in self.refuse:
+            raise smtplib.SMTPRecipientsRefused({message['To']: (550, b'recusado')})
+        self.log['sent'].append(message['To'])
+
+
+def messages(count):
+    return [{'to_email': f'user{n}@exemplo.com', 'subject': f'Aviso {n}', 'html_content': f'<p>{n}</p>'}
+            for n in range(count)]
+
+
+class TestBulkEmails:
+    """Uma conexão SMTP por lote em vez de uma por email"""
+
+    @pytest.fixture
+    def smtp(self, monkeypatch):
+        log = {'connections': 0, 'sent': [], 'refuse': (), 'fail_batches': ()}
+
+        def open_smtp(service):
+            return _SMTP(log, refuse=log['refuse'], fail=log['connections'] in log['fail_batches'])
+
+        monkeypatch.setattr(email_service.EmailService, '_open_smtp', open_smtp)
+        return log
+
+    def test_one_connection_per_batch(self, smtp):
+        sent = email_service.EmailService().send_bulk_emails(messages(250), batch_size=100)
+        assert sent == 250
+        assert smtp['connections'] == 3
+        assert smtp['sent'] == [f'user{n}@exemplo.com' for n in range(250)]
+
+    def test_refused_recipient_does_not_stop_the_batch(self, smtp):
+        smtp['refuse'] = ('user1@exemplo.com',)
+        assert email_service.EmailService().send_bulk_emails(messages(3)) == 2
+        assert smtp['sent'] == ['user0@exemplo.com', 'user2@exemplo.com']
+
+    def test_failed_connection_loses_only_its_batch(self, smtp):
+        smtp['fail_batches'] = (1,)
+        assert email_service.EmailService().send_bulk_emails(messages(30), batch_size=10) == 20
+        assert smtp['connections'] == 3
+
+
+class _Session:
+    """INSERT ... RETURNING simulado: devolve as linhas como notificações"""
+
+    def __init__(self):
+        self.inserts = 0
+        self.committed = False
+
+    def scalars(self, statement, rows):
+        self.inserts += 1
+        created = [
+            SimpleNamespace(id=self.inserts * 10000 + index, to_dict=lambda row=row: {'title': row['title']}, **row)
+            for index, row in enumerate(rows)
+        ]
+        return SimpleNamespace(all=lambda: created)
+
+    def expunge(self, obj):
+        pass
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+class TestFanOut:
+    """Um INSERT por lote e um envio WebSocket e ajuste de contador por usuário"""
+
+    @pytest.fixture
+    def service(self, monkeypatch):
+        notification_service = pytest.importorskip('services.notification_service', exc_type=ImportError)
+        emitted, increments, emails = [], [], []
+        session = _Session()
+        monkeypatch.setattr(notification_service, 'db', SimpleNamespace(session=session))
+        monkeypatch.setattr(notification_service, 'socketio', SimpleNamespace(
+            emit=lambda event, data, room=None: emitted.append((event, room, data))
+        ))
+
+        service = notification_service.NotificationService()
+        service.BULK_BATCH_SIZE = 2
+        service.unread_counter = SimpleNamespace(
+            increment=lambda user_id, delta: increments.append((user_id, delta)) or delta,
+            get=lambda user_id: 0
+        )
+        monkeypatch.setattr(service, '_dispatch_bulk_emails', emails.append)
+        return service, session, emitted, increments, emails
+
+    def test_grouped_per_user(self, service):
+        service, session, emitted, increments, emails = service
+        created = service.create_bulk_notifications([
+            {'user_id': 1, 'title': 'a'},
+            {'user_id': 2, 'title': 'b'},
+            {'user_id': 1, 'title': 'c'},
+            {'user_id': 1, 'title': 'd', 'is_read': True},
+            {'user_id': 3, 'title': 'e', 'is_archived': True},
+        ])
+
+        assert len(created) == 5
+        assert (session.inserts, session.committed) == (3, True)
+        batches = {room: [n['title'] for n in data['notifications']]
+                   for event, room, data in emitted if event == 'new_notifications'}
+        assert batches == {'user_1': ['a', 'c', 'd'], 'user_2': ['b'], 'user_3': ['e']}
+        # Só notificações não lidas e não arquivadas contam; usuário 3 não tem nenhuma
+        assert increments == [(1, 2), (2, 1)]
+        assert [event for event, _, _ in emitted].count('unread_count_updated') == 2
+        assert sorted(emails[0]) == [1, 2, 3]
+
+    def test_row_normalization(self, service):
+        service, *_ = service
+        row = service._bulk_row({'user_id': 1, 'title': 't', 'message': 'm', 'metadata': {'k': 1}})
+        assert row['meta_data'] == {'k': 1}
+        assert (row['is_read'], row['is_archived']) == (False, False)
+        assert row['created_at'] is not None
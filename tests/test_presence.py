@@ -0,0 +1,80 @@
+import pytest
+
+from src.websocket import presence
+from src.websocket.presence import PresenceBroadcaster, RedisPresenceStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(presence.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def client():
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')  # EVAL no fakeredis
+    return fakeredis.FakeRedis()
+
+
+class _Emitter:
+    def __init__(self):
+        self.events = []
+
+    def __call__(self, event, data, room=None):
+        self.events.append((event, data, room))
+
+
+class TestHeartbeatReaper:
+    """Workers sem heartbeat têm a presença removida pelos demais"""
+
+    def test_live_worker_is_kept(self, client, clock):
+        dead, alive = RedisPresenceStore(client), RedisPresenceStore(client)
+        dead.register('sid-ana', {'user_id': 1, 'username': 'ana'})
+
+        clock[0] += RedisPresenceStore.WORKER_TIMEOUT - 1
+        assert alive.heartbeat() == []
+        assert [user['username'] for user in alive.online_users()] == ['ana']
+
+    def test_dead_worker_is_reaped(self, client, clock):
+        dead, alive = RedisPresenceStore(client), RedisPresenceStore(client)
+        dead.register('sid-ana', {'user_id': 1, 'username': 'ana'})
+        dead.join_room('sid-ana', 'doc_1')
+        alive.register('sid-bia', {'user_id': 2, 'username': 'bia'})
+
+        clock[0] += RedisPresenceStore.WORKER_TIMEOUT + 1
+        offline = alive.heartbeat()
+
+        assert [(user['user_id'], user['username']) for user in offline] == [(1, 'ana')]
+        assert [user['username'] for user in alive.online_users()] == ['bia']
+        assert alive.room_members('doc_1') == []
+        assert alive.stats() == {'total_connections': 1, 'unique_users': 1}
+        # Removido uma única vez
+        assert alive.heartbeat() == []
+
+    def test_user_connected_elsewhere_stays_online(self, client, clock):
+        dead, alive = RedisPresenceStore(client), RedisPresenceStore(client)
+        dead.register('sid-ana-1', {'user_id': 1, 'username': 'ana'})
+        alive.register('sid-ana-2', {'user_id': 1, 'username': 'ana'})
+
+        clock[0] += RedisPresenceStore.WORKER_TIMEOUT + 1
+        assert alive.heartbeat() == []
+        assert alive.stats() == {'total_connections': 1, 'unique_users': 1}
+
+    def test_broadcaster_emits_reaped_usernames(self, client, clock, monkeypatch):
+        dead, alive = RedisPresenceStore(client), RedisPresenceStore(client)
+        dead.register('sid-ana', {'user_id': 1, 'username': 'ana'})
+        clock[0] += RedisPresenceStore.WORKER_TIMEOUT + 1
+
+        emitter = _Emitter()
+        broadcaster = PresenceBroadcaster(alive, emitter)
+        # Uma única volta do loop, sem dormir
+        monkeypatch.setattr(presence.time, 'sleep', lambda seconds: setattr(broadcaster, '_running', False))
+        broadcaster._running = True
+        broadcaster._loop()
+
+        [(event, data, room)] = emitter.events
+        assert (event, room) == ('presence_changed', None)
+        assert data['online'] == []
+        assert data['offline'] == [{'user_id': 1, 'username': 'ana'}]
@@ -0,0 +1,129 @@
+import time
+import pytest
+
+from src.security.local_limiter import LocalLimiter
+from src.security.rate_limit_engine import RateLimitEngine
+
+fakeredis = pytest.importorskip('fakeredis')
+pytest.importorskip('lupa')  # EVALSHA no fakeredis
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis()
+
+
+@pytest.mark.parametrize('algorithm', ['gcra', 'sliding_window'])
+class TestRedisScripts:
+    """Testes dos scripts Lua (uma ida ao Redis por verificação)"""
+
+    def test_limit_is_enforced(self, redis_client, algorithm):
+        """Até `limit` verificações passam; a seguinte é negada com retry_after"""
+        engine = RateLimitEngine(redis_client, algorithm)
+        decisions = [engine.hit('ip:1', limit=5, window=60) for _ in range(6)]
+
+        assert [d.allowed for d in decisions] == [True] * 5 + [False]
+        assert [d.remaining for d in decisions[:5]] == [4, 3, 2, 1, 0]
+        # Sliding window: o resto da janela mais o tempo até o peso da anterior liberar espaço
+        assert 0 < decisions[-1].retry_after <= 2 * 60
+        # Outra chave não é afetada
+        assert engine.hit('ip:2', limit=5, window=60).allowed
+
+    def test_allowed_again_after_retry(self, redis_client, algorithm):
+        """Depois do retry_after informado, a chave volta a ser aceita"""
+        engine = RateLimitEngine(redis_client, algorithm)
+        for _ in range(5):
+            engine.hit('ip:1', limit=5, window=1)
+        denied = engine.hit('ip:1', limit=5, window=1)
+        assert not denied.allowed
+
+        time.sleep(denied.retry_after + 0.05)
+        assert engine.hit('ip:1', limit=5, window=1).allowed
+
+    def test_reset(self, redis_client, algorithm):
+        engine = RateLimitEngine(redis_client, algorithm)
+        for _ in range(6):
+            engine.hit('ip:1', limit=5, window=60)
+        engine.reset('ip:1')
+        assert engine.hit('ip:1', limit=5, window=60).remaining == 4
+
+    def test_leases_are_shared_across_instances(self, redis_client, algorithm):
+        """Dois processos com leases locais não passam do limite global somados"""
+        first = RateLimitEngine(redis_client, algorithm)
+        second = RateLimitEngine(redis_client, algorithm)
+        limit = 1000
+        assert first.lease_size(limit) == 10
+
+        allowed = 0
+        for _ in range(limit):
+            allowed += first.hit('api:user', limit=limit, window=36000).allowed
+            allowed += second.hit('api:user', limit=limit, window=36000).allowed
+
+        assert allowed == limit
+        assert not first.hit('api:user', limit=limit, window=36000).allowed
+        assert not second.hit('api:user', limit=limit, window=36000).allowed
+        # A maior parte das verificações é atendida pelo lote reservado localmente
+        redis_calls = first.stats()['redis_calls'] + second.stats()['redis_calls']
+        assert redis_calls < limit // 5
+
+
+class TestGCRA:
+    """Comportamento específico do GCRA"""
+
+    def test_full_capacity_after_window(self, redis_client):
+        """Sem tráfego por uma janela inteira, a capacidade volta ao máximo"""
+        engine = RateLimitEngine(redis_client, 'gcra')
+        for _ in range(6):
+            engine.hit('ip:1', limit=5, window=1)
+        time.sleep(1.05)
+        assert [engine.hit('ip:1', limit=5, window=1).allowed for _ in range(6)] == [True] * 5 + [False]
+
+    def test_denial_is_cached_locally(self, redis_client):
+        """Negação fica em cache até o retry_after, sem nova ida ao Redis"""
+        engine = RateLimitEngine(redis_client, 'gcra')
+        for _ in range(6):
+            engine.hit('ip:1', limit=5, window=60)
+        calls = engine.stats()['redis_calls']
+
+        assert not engine.hit('ip:1', limit=5, window=60).allowed
+        assert engine.stats()['redis_calls'] == calls
+
+
+class TestLocalLimiter:
+    """Sliding window em memória (sem Redis)"""
+
+    def test_allowed_again_after_retry(self):
+        limiter = LocalLimiter()
+        for _ in range(5):
+            limiter.acquire('ip:1', capacity=5, window=0.5)
+        granted, _, retry_after, _ = limiter.acquire('ip:1', capacity=5, window=0.5)
+        assert granted == 0
+
+        time.sleep(retry_after + 0.01)
+        assert limiter.acquire('ip:1', capacity=5, window=0.5)[0] == 1
+
+
+class TestRateLimiter:
+    """Fachada usada pelos decorators de rota"""
+
+    def test_import_does_not_connect(self, monkeypatch):
+        """A instância global só conecta ao Redis na primeira verificação"""
+        from src.security import rate_limiter as module
+
+        connects = []
+        monkeypatch.setattr(module.RateLimiter, '_get_redis_client', lambda self: connects.append(1))
+        limiter = module.RateLimiter()
+        assert connects == []
+
+        assert limiter.is_allowed('ip:1', 'login')[0]
+        assert limiter.is_allowed('ip:1', 'login')[0]
+        assert connects == [1]
+        assert limiter.engine.stats()['backend'] == 'memory'
+
+    def test_login_limit(self, redis_client):
+        from src.security.rate_limiter import RateLimiter
+
+        limiter = RateLimiter(redis_client)
+        results = [limiter.is_allowed('ip:1', 'login') for _ in range(6)]
+        assert [allowed for allowed, _ in results] == [True] * 5 + [False]
+        assert results[-1][1]['retry_after'] > 0
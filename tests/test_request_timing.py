@@ -0,0 +1,84 @@
+import logging
+
+import pytest
+from flask import Flask
+
+from src.monitoring.request_timing import init_request_timing
+from src.security.audit_writer import BatchWriter
+
+
+class _Collect:
+    def __init__(self):
+        self.records = []
+
+    def handle(self, records):
+        self.records.extend(records)
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+
+    @app.route('/items/<int:item_id>')
+    def item(item_id):
+        return {'id': item_id}
+
+    return app
+
+
+class TestRequestInstrumentation:
+    """Um registro por requisição, entregue a todos os sinks"""
+
+    def test_records_reach_sinks(self, app):
+        sink = _Collect()
+        instrumentation = init_request_timing(app, [sink])
+        response = app.test_client().get('/items/7', headers={'X-Request-ID': 'abc'})
+        instrumentation.flush()
+
+        assert 'X-Response-Time' in response.headers
+        [record] = sink.records
+        assert (record.request_id, record.label, record.status) == ('abc', '/items/<int:item_id>', 200)
+
+    def test_sinks_are_added_once(self, app):
+        sink = _Collect()
+        first = init_request_timing(app, [sink])
+        assert init_request_timing(app, [sink]) is first
+        assert first.sinks.count(sink) == 1
+
+    def test_performance_monitor_sink(self, app):
+        """O PerformanceMonitor registrado em create_app recebe as requisições"""
+        performance_metrics = pytest.importorskip('src.monitoring.performance_metrics', exc_type=ImportError)
+        monitor = performance_metrics.PerformanceMonitor()
+        instrumentation = init_request_timing(app, [monitor])
+        app.test_client().get('/items/1')
+        app.test_client().get('/nao-existe')
+        instrumentation.flush()
+
+        assert [log['status_code'] for log in monitor.request_logs] == [200, 404]
+        assert monitor.request_counter == 2
+        assert monitor.error_counter == 1
+
+
+class TestBatchWriterDrops:
+    """Fila cheia sem arquivo de despejo: descarte contado e log limitado"""
+
+    def test_drops_are_counted_and_logged_once(self, caplog):
+        writer = BatchWriter(lambda batch: None, max_queue=1, block_timeout=0,
+                             name='request-timing', drop_log_interval=60)
+        with caplog.at_level(logging.ERROR, logger='src.security.audit_writer'):
+            for _ in range(5):
+                writer.submit({'n': 1})
+
+        assert writer.metrics['dropped'] == 4
+        assert len(caplog.records) == 1
+        assert 'request-timing' in caplog.records[0].getMessage()
+        assert 'auditoria' not in caplog.records[0].getMessage()
+
+    def test_drop_log_reports_accumulated_count(self, caplog):
+        writer = BatchWriter(lambda batch: None, max_queue=1, block_timeout=0,
+                             name='request-timing', drop_log_interval=0)
+        writer.submit({'n': 1})
+        with caplog.at_level(logging.ERROR, logger='src.security.audit_writer'):
+            writer.submit({'n': 2})
+            writer.submit({'n': 3})
+        assert len(caplog.records) == 2
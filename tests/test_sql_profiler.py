@@ -0,0 +1,121 @@
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from src.monitoring.request_timing import init_request_timing
+from src.monitoring.sql_profiler import SQLProfiler, fingerprint, normalize, sql_profiler
+
+
+class TestNormalize:
+    """Literais, binds e listas viram `?`; a mesma query tem um só fingerprint"""
+
+    def test_literals_and_binds(self):
+        assert normalize("SELECT * FROM users WHERE id = 42 AND email = 'a@b.com'") == \
+            'SELECT * FROM users WHERE id = ? AND email = ?'
+        assert normalize('SELECT * FROM users WHERE id = %(id_1)s') == \
+            normalize('SELECT * FROM users WHERE id = :id') == \
+            normalize('SELECT * FROM users WHERE id = $1') == \
+            'SELECT * FROM users WHERE id = ?'
+
+    def test_in_lists_and_values_collapse(self):
+        assert normalize('SELECT * FROM t WHERE id IN (1, 2, 3)') == \
+            normalize('SELECT * FROM t WHERE id IN (?)') == 'SELECT * FROM t WHERE id IN (?)'
+        assert normalize('INSERT INTO t (a, b) VALUES (1, 2), (3, 4), (5, 6)') == \
+            'INSERT INTO t (a, b) VALUES (?, ?)'
+
+    def test_comments_whitespace_and_escaped_quotes(self):
+        assert normalize("SELECT  /* dica */ nome\n FROM t -- fim\nWHERE nome = 'O''Brien'") == \
+            'SELECT nome FROM t WHERE nome = ?'
+
+    def test_identifiers_with_digits_are_kept(self):
+        assert normalize('SELECT col1 FROM t2 WHERE x = 1.5') == 'SELECT col1 FROM t2 WHERE x = ?'
+
+    def test_fingerprint_is_stable(self):
+        assert fingerprint('SELECT * FROM t WHERE id = 1') == fingerprint('SELECT * FROM t WHERE id = 99')
+        assert fingerprint('SELECT * FROM t WHERE id = 1') != fingerprint('SELECT * FROM u WHERE id = 1')
+
+
+class TestNPlusOne:
+    """Mesmo fingerprint acima do limite na mesma requisição é sinalizado"""
+
+    @pytest.fixture
+    def app(self):
+        engine = create_engine('sqlite://')
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE itens (id INTEGER PRIMARY KEY, nome TEXT)'))
+            conn.execute(text("INSERT INTO itens (nome) VALUES ('a'), ('b')"))
+
+        app = Flask(__name__)
+        app.config['SQL_N_PLUS_ONE_THRESHOLD'] = 10
+
+        @app.route('/itens/<int:count>')
+        def items(count):
+            with engine.connect() as conn:
+                for item_id in range(count):
+                    conn.execute(text('SELECT nome FROM itens WHERE id = :id'), {'id': item_id})
+            return {'ok': True}
+
+        sql_profiler.reset()
+        yield app
+        sql_profiler.reset()
+
+    def test_repeated_query_is_flagged(self, app):
+        instrumentation = init_request_timing(app)
+        app.test_client().get('/itens/15')
+        instrumentation.flush()
+
+        report = sql_profiler.report()
+        [flagged] = report['n_plus_one']
+        assert (flagged['route'], flagged['count']) == ('/itens/<int:count>', 15)
+        assert report['fingerprints'][0]['per_request'] == 15
+        assert report['routes']['/itens/<int:count>']['max_queries'] == 15
+
+    def test_below_threshold_is_not_flagged(self, app):
+        instrumentation = init_request_timing(app)
+        app.test_client().get('/itens/3')
+        instrumentation.flush()
+        assert sql_profiler.report()['n_plus_one'] == []
+
+    def test_fingerprints_are_bounded(self):
+        profiler = SQLProfiler(max_fingerprints=3)
+        for table in range(5):
+            profiler.track(f'SELECT * FROM t{table}', 1.0)
+        assert [item['statement'] for item in profiler.report()['fingerprints']] == \
+            [f'SELECT * FROM t{table}' for table in (2, 3, 4)]
+
+
+class TestSlowQueriesRoute:
+    """/api/performance/slow-queries exige JWT de administrador"""
+
+    @pytest.fixture
+    def client(self, monkeypatch):
+        flask_jwt = pytest.importorskip('flask_jwt_extended')
+        advanced_cache = pytest.importorskip('src.performance.advanced_cache', exc_type=ImportError)
+        # Papel do usuário sem banco (só ele importa para a rota)
+        monkeypatch.setattr(advanced_cache, '_is_admin', lambda user_id: user_id == '2')
+
+        app = Flask(__name__)
+        app.config['JWT_SECRET_KEY'] = 'teste' * 8
+        flask_jwt.JWTManager(app)
+        advanced_cache.register_performance_routes(app)
+        with app.app_context():
+            tokens = {role: flask_jwt.create_access_token(identity=user_id)
+                      for user_id, role in (('1', 'user'), ('2', 'admin'))}
+        return app.test_client(), tokens
+
+    def test_requires_token(self, client):
+        test_client, _ = client
+        assert test_client.get('/api/performance/slow-queries').status_code == 401
+
+    def test_non_admin_is_refused(self, client):
+        test_client, tokens = client
+        response = test_client.get('/api/performance/slow-queries',
+                                   headers={'Authorization': f"Bearer {tokens['user']}"})
+        assert response.status_code == 403
+
+    def test_admin_sees_slow_queries(self, client):
+        test_client, tokens = client
+        response = test_client.get('/api/performance/slow-queries',
+                                   headers={'Authorization': f"Bearer {tokens['admin']}"})
+        assert response.status_code == 200
+        assert 'slow_queries' in response.get_json()
@@ -0,0 +1,103 @@
+import os
+import socket
+from collections import namedtuple
+
+import pytest
+
+from src.monitoring import system_sampler
+from src.monitoring.system_sampler import SystemSampler, _process_connections, _rate
+
+TCP_HEADER = ('  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt'
+              '   uid  timeout inode\n')
+
+
+def tcp_line(slot, state, inode):
+    return (f'   {slot}: 0100007F:1F90 0100007F:C350 {state} 00000000:00000000 00:00000000'
+            f' 00000000  1000        0 {inode} 1 0000000000000000 20 4 30 10 -1\n')
+
+
+class TestTcpTables:
+    """Só conexões ESTABLISHED cujos inodes são sockets do processo"""
+
+    @pytest.fixture
+    def tables(self, tmp_path, monkeypatch):
+        tcp, tcp6 = tmp_path / 'tcp', tmp_path / 'tcp6'
+        tcp.write_text(TCP_HEADER + tcp_line(0, '01', 111) + tcp_line(1, '0A', 222)
+                       + tcp_line(2, '01', 999))
+        tcp6.write_text(TCP_HEADER + tcp_line(0, '01', 333) + 'linha truncada\n')
+        monkeypatch.setattr(system_sampler, 'TCP_TABLES', (str(tcp), str(tcp6)))
+        return tcp, tcp6
+
+    def test_established_owned_sockets(self, tables, monkeypatch):
+        # 111 e 333 estabelecidas; 222 em LISTEN; 999 é de outro processo; 444 é um socket UDP/unix
+        monkeypatch.setattr(system_sampler, '_socket_inodes', lambda: {'111', '222', '333', '444'})
+        assert _process_connections(None) == (2, 4)
+
+    def test_no_sockets_skips_tables(self, tables, monkeypatch):
+        monkeypatch.setattr(system_sampler, '_socket_inodes', set)
+        monkeypatch.setattr(system_sampler, 'TCP_TABLES', ('/nao/existe',))
+        assert _process_connections(None) == (0, 0)
+
+    def test_missing_table_is_ignored(self, tables, monkeypatch):
+        monkeypatch.setattr(system_sampler, '_socket_inodes', lambda: {'111'})
+        monkeypatch.setattr(system_sampler, 'TCP_TABLES', ('/nao/existe',) + system_sampler.TCP_TABLES)
+        assert _process_connections(None) == (1, 1)
+
+    @pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='requer /proc')
+    def test_real_connection(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        client = socket.create_connection(server.getsockname())
+        accepted, _ = server.accept()
+        try:
+            established, open_sockets = _process_connections(None)
+            # As duas pontas da conexão são deste processo; o listener não conta
+            assert established >= 2
+            assert open_sockets >= 3
+        finally:
+            for sock in (client, accepted, server):
+                sock.close()
+
+
+class TestRates:
+    """Taxas a partir da diferença entre contadores"""
+
+    def test_rate(self):
+        assert _rate(1500, 500, 10) == 100.0
+        assert _rate(1500, None, 10) == 0.0
+        assert _rate(1500, 500, 0) == 0.0
+        # Contador reiniciado (ex.: interface recriada)
+        assert _rate(100, 500, 10) == 0.0
+
+    def test_sample_deltas(self, monkeypatch):
+        Net = namedtuple('Net', 'bytes_sent bytes_recv packets_sent packets_recv')
+        Cpu = namedtuple('Cpu', 'user system idle iowait')
+        clock = [1000.0]
+        readings = iter([
+            (Net(1000, 5000, 1, 1), Cpu(10, 10, 80, 0)),
+            (Net(3000, 6000, 2, 2), Cpu(40, 20, 130, 10)),
+        ])
+        current = {}
+
+        def advance():
+            current['net'], current['cpu'] = next(readings)
+
+        monkeypatch.setattr(system_sampler.time, 'time', lambda: clock[0])
+        monkeypatch.setattr(system_sampler.psutil, 'net_io_counters', lambda: current['net'])
+        monkeypatch.setattr(system_sampler.psutil, 'cpu_times', lambda: current['cpu'])
+        monkeypatch.setattr(system_sampler.psutil, 'disk_io_counters', lambda: None)
+
+        sampler = SystemSampler()
+        advance()
+        first = sampler.sample()
+        assert (first.interval, first.net_sent_rate, first.cpu_percent) == (0.0, 0.0, 0.0)
+
+        clock[0] += 10
+        advance()
+        second = sampler.sample()
+        assert second.interval == 10
+        assert (second.net_sent_rate, second.net_recv_rate) == (200.0, 100.0)
+        assert second.disk_read_rate == 0.0
+        # 100 de CPU no intervalo, 60 ociosos (idle + iowait): 40% ocupado
+        assert second.cpu_percent == 40.0
